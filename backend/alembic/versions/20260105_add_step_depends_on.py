@@ -0,0 +1,33 @@
+"""add depends_on to calculation_steps
+
+Revision ID: 20260105_step_depends_on
+Revises: 20251230_dim_analyses
+Create Date: 2026-01-05
+
+计算步骤依赖关系：声明 depends_on 的流程按依赖图并发执行相互独立的步骤
+- NULL：依赖所有排序在前的步骤（原有串行语义）
+- 空数组：无依赖
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '20260105_step_depends_on'
+down_revision = '20251230_dim_analyses'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('calculation_steps', sa.Column(
+        'depends_on',
+        postgresql.ARRAY(sa.Integer()),
+        nullable=True,
+        comment='依赖的步骤ID列表（为空则依赖所有排序在前的步骤）'
+    ))
+
+
+def downgrade():
+    op.drop_column('calculation_steps', 'depends_on')
@@ -0,0 +1,37 @@
+"""add fingerprint to calculation_step_logs
+
+Revision ID: 20260106_step_log_fingerprint
+Revises: 20260105_step_depends_on
+Create Date: 2026-01-06
+
+增量重算：记录步骤输入指纹（渲染后代码+参数+源表版本），
+重新计算时指纹未变化的步骤复用上次结果
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20260106_step_log_fingerprint'
+down_revision = '20260105_step_depends_on'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('calculation_step_logs', sa.Column(
+        'fingerprint',
+        sa.String(64),
+        nullable=True,
+        comment='步骤输入指纹(渲染后代码+参数+源表版本)'
+    ))
+    op.create_index(
+        'ix_calculation_step_logs_task_step_dept',
+        'calculation_step_logs',
+        ['task_id', 'step_id', 'department_id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_calculation_step_logs_task_step_dept', table_name='calculation_step_logs')
+    op.drop_column('calculation_step_logs', 'fingerprint')
@@ -0,0 +1,47 @@
+"""add sequence_type to model_nodes
+
+Revision ID: 20260107_node_sequence_type
+Revises: 20260106_step_log_fingerprint
+Create Date: 2026-01-07
+
+序列节点类别（doctor/nurse/tech），汇总计算按该字段归类，不再匹配节点名称。
+已有序列节点按名称回填（中文关键字及不区分大小写的英文名称）。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20260107_node_sequence_type'
+down_revision = '20260106_step_log_fingerprint'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('model_nodes', sa.Column(
+        'sequence_type',
+        sa.String(20),
+        nullable=True,
+        comment='序列类别(doctor/nurse/tech，仅序列节点)'
+    ))
+
+    op.execute("""
+        UPDATE model_nodes
+        SET sequence_type = CASE
+            WHEN name LIKE '%医生%' THEN 'doctor'
+            WHEN name LIKE '%护理%' THEN 'nurse'
+            WHEN name LIKE '%医技%' THEN 'tech'
+            WHEN name LIKE '%医师%' OR name LIKE '%医疗%' THEN 'doctor'
+            WHEN name LIKE '%护士%' THEN 'nurse'
+            WHEN name LIKE '%技师%' THEN 'tech'
+            WHEN name ILIKE '%doctor%' OR name ILIKE '%physician%' THEN 'doctor'
+            WHEN name ILIKE '%nurse%' OR name ILIKE '%nursing%' THEN 'nurse'
+            WHEN name ILIKE '%tech%' THEN 'tech'
+        END
+        WHERE node_type = 'sequence'
+    """)
+
+
+def downgrade():
+    op.drop_column('model_nodes', 'sequence_type')
@@ -0,0 +1,39 @@
+"""add calculation_result_rollups table
+
+Revision ID: 20260108_result_rollups
+Revises: 20260107_node_sequence_type
+Create Date: 2026-01-08
+
+计算结果汇总缓存：任务完成时生成，报表接口直接读取。
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '20260108_result_rollups'
+down_revision = '20260107_node_sequence_type'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'calculation_result_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.String(100), nullable=False, comment='任务ID'),
+        sa.Column('scope', sa.String(20), nullable=False, comment='汇总范围(summary/department/hospital)'),
+        sa.Column('department_id', sa.Integer(), nullable=False, server_default='0', comment='科室ID（全院范围为0）'),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False, comment='汇总数据'),
+        sa.Column('created_at', sa.DateTime(), nullable=True, comment='创建时间'),
+        sa.ForeignKeyConstraint(['task_id'], ['calculation_tasks.task_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('task_id', 'scope', 'department_id', name='uq_calculation_result_rollups_task_scope_dept')
+    )
+    op.create_index('ix_calculation_result_rollups_id', 'calculation_result_rollups', ['id'])
+
+
+def downgrade():
+    op.drop_index('ix_calculation_result_rollups_id', table_name='calculation_result_rollups')
+    op.drop_table('calculation_result_rollups')
@@ -0,0 +1,180 @@
+"""partition charge_details by year_month
+
+Revision ID: 20260109_charge_partitions
+Revises: 20260108_result_rollups
+Create Date: 2026-01-09
+
+收费明细暂存表按月份（year_month）范围分区：
+- 数据准备步骤调用 prepare_charge_details_period('YYYY-MM') 只清空（或创建）本月分区，
+  不同月份的任务可以同时计算，按月份查询只扫描一个分区
+- year_month 为空或没有对应分区的数据写入默认分区
+- charge_detail_periods 记录各月份已加载数据的输入指纹，输入未变化时计算引擎跳过重新加载
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20260109_charge_partitions'
+down_revision = '20260108_result_rollups'
+branch_labels = None
+depends_on = None
+
+
+PREPARE_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION prepare_charge_details_period(p_year_month VARCHAR)
+RETURNS VOID AS $$
+DECLARE
+    partition_name TEXT;
+    upper_bound TEXT;
+BEGIN
+    IF p_year_month IS NULL OR p_year_month !~ '^\d{4}-\d{2}$' THEN
+        RAISE EXCEPTION '无效的月份: %', p_year_month;
+    END IF;
+
+    -- 同一月份的加载串行执行，不同月份互不影响
+    PERFORM pg_advisory_xact_lock(hashtext('charge_details:' || p_year_month));
+
+    -- 重新加载期间该月份视为未加载
+    DELETE FROM charge_detail_periods WHERE year_month = p_year_month;
+
+    partition_name := 'charge_details_' || replace(p_year_month, '-', '_');
+    IF to_regclass(partition_name) IS NULL THEN
+        upper_bound := to_char(to_date(p_year_month || '-01', 'YYYY-MM-DD') + INTERVAL '1 month', 'YYYY-MM');
+        -- 默认分区中该月份的数据会与新分区冲突，先清除（随后整月重新加载）
+        DELETE FROM charge_details_default WHERE year_month = p_year_month;
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF charge_details FOR VALUES FROM (%L) TO (%L)',
+            partition_name, p_year_month, upper_bound
+        );
+    ELSE
+        EXECUTE format('TRUNCATE TABLE %I', partition_name);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _id_sequence(conn, table_name: str):
+    return conn.execute(
+        sa.text("SELECT pg_get_serial_sequence(:table_name, 'id')"),
+        {"table_name": table_name}
+    ).scalar()
+
+
+def _create_indexes(conn, table_name: str):
+    """在分区表上创建索引（自动应用到各分区）；分区内月份相同，索引不再包含 year_month"""
+    columns = {c['name'] for c in sa.inspect(conn).get_columns(table_name)}
+    indexes = [
+        ('idx_charge_details_dept', ['prescribing_dept_code']),
+        ('idx_charge_details_exec_dept', ['executing_dept_code']),
+        ('idx_charge_details_item', ['item_code']),
+        ('idx_charge_details_type_item', ['business_type', 'item_code']),
+        ('idx_charge_details_time', ['charge_time']),
+    ]
+    for index_name, index_columns in indexes:
+        if set(index_columns) <= columns:
+            op.create_index(index_name, table_name, index_columns)
+
+
+def upgrade():
+    conn = op.get_bind()
+    tables = sa.inspect(conn).get_table_names()
+
+    op.create_table(
+        'charge_detail_periods',
+        sa.Column('year_month', sa.String(7), nullable=False, comment='月份(YYYY-MM)'),
+        sa.Column('fingerprint', sa.String(64), nullable=False, comment='加载步骤的输入指纹'),
+        sa.Column('row_count', sa.BigInteger(), nullable=False, comment='加载行数'),
+        sa.Column('task_id', sa.String(100), nullable=True, comment='加载该月份数据的任务ID'),
+        sa.Column('loaded_at', sa.DateTime(), nullable=False, server_default=sa.text('now()'), comment='加载时间'),
+        sa.PrimaryKeyConstraint('year_month'),
+        comment='收费明细已加载月份'
+    )
+
+    relkind = conn.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass('charge_details')")
+    ).scalar()
+    if relkind == 'p':
+        op.execute(PREPARE_FUNCTION)
+        return
+
+    if 'charge_details' in tables:
+        # 已有非分区表：改名后按原表结构创建分区表，再按月份迁移数据
+        op.execute("ALTER TABLE charge_details RENAME TO charge_details_legacy")
+        legacy_columns = [c['name'] for c in sa.inspect(conn).get_columns('charge_details_legacy')]
+        if 'year_month' not in legacy_columns:
+            op.execute("ALTER TABLE charge_details_legacy ADD COLUMN year_month VARCHAR(7)")
+            legacy_columns.append('year_month')
+
+        op.execute("""
+            CREATE TABLE charge_details (
+                LIKE charge_details_legacy INCLUDING DEFAULTS INCLUDING COMMENTS
+            ) PARTITION BY RANGE (year_month)
+        """)
+        sequence = _id_sequence(conn, 'charge_details_legacy')
+        if sequence:
+            op.execute(f"ALTER SEQUENCE {sequence} OWNED BY charge_details.id")
+    else:
+        op.execute("""
+            CREATE TABLE charge_details (
+                id BIGSERIAL,
+                patient_id VARCHAR(50) NOT NULL,
+                prescribing_dept_code VARCHAR(50) NOT NULL,
+                executing_dept_code VARCHAR(50),
+                item_code VARCHAR(100) NOT NULL,
+                item_name VARCHAR(200),
+                amount DECIMAL(20, 4) NOT NULL DEFAULT 0,
+                quantity DECIMAL(20, 4) NOT NULL DEFAULT 0,
+                charge_time TIMESTAMP NOT NULL,
+                business_type VARCHAR(20),
+                year_month VARCHAR(7),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) PARTITION BY RANGE (year_month)
+        """)
+        op.execute("COMMENT ON COLUMN charge_details.year_month IS '月份(YYYY-MM)，分区键'")
+
+    op.execute("CREATE TABLE charge_details_default PARTITION OF charge_details DEFAULT")
+    op.execute(PREPARE_FUNCTION)
+
+    if 'charge_details' in tables:
+        month_expr = "COALESCE(year_month, TO_CHAR(charge_time, 'YYYY-MM'))"
+        months = conn.execute(sa.text(
+            f"SELECT DISTINCT {month_expr} FROM charge_details_legacy WHERE charge_time IS NOT NULL"
+        )).scalars().all()
+        for year_month in months:
+            conn.execute(sa.text("SELECT prepare_charge_details_period(:ym)"), {"ym": year_month})
+
+        column_list = ", ".join(f'"{c}"' for c in legacy_columns)
+        select_list = ", ".join(month_expr if c == 'year_month' else f'"{c}"' for c in legacy_columns)
+        op.execute(f"INSERT INTO charge_details ({column_list}) SELECT {select_list} FROM charge_details_legacy")
+        op.execute("DROP TABLE charge_details_legacy")
+
+    _create_indexes(conn, 'charge_details')
+
+
+def downgrade():
+    conn = op.get_bind()
+    op.execute("DROP FUNCTION IF EXISTS prepare_charge_details_period(VARCHAR)")
+    op.drop_table('charge_detail_periods')
+
+    relkind = conn.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass('charge_details')")
+    ).scalar()
+    if relkind != 'p':
+        return
+
+    # 还原为普通表（保留 year_month 列）
+    op.execute("ALTER TABLE charge_details RENAME TO charge_details_partitioned")
+    op.execute("""
+        CREATE TABLE charge_details (
+            LIKE charge_details_partitioned INCLUDING DEFAULTS INCLUDING COMMENTS
+        )
+    """)
+    sequence = _id_sequence(conn, 'charge_details_partitioned')
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY charge_details.id")
+    op.execute("INSERT INTO charge_details SELECT * FROM charge_details_partitioned")
+    op.execute("DROP TABLE charge_details_partitioned")
+    op.execute("ALTER TABLE charge_details ADD PRIMARY KEY (id)")
+    _create_indexes(conn, 'charge_details')
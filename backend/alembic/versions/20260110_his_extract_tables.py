@@ -0,0 +1,49 @@
+"""add his_extract_tables table
+
+Revision ID: 20260110_his_extract
+Revises: 20260109_charge_partitions
+Create Date: 2026-01-10
+
+HIS源表增量抽取配置和水位：数据准备不再每次从HIS全量复制收费明细，
+只抽取水位之后新增或变化的数据合并到暂存库。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20260110_his_extract'
+down_revision = '20260109_charge_partitions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'his_extract_tables',
+        sa.Column('id', sa.Integer(), nullable=False, comment='主键'),
+        sa.Column('source_data_source_id', sa.Integer(), nullable=False, comment='HIS数据源ID'),
+        sa.Column('source_table', sa.String(100), nullable=False, comment='源表名'),
+        sa.Column('target_data_source_id', sa.Integer(), nullable=False, comment='暂存库数据源ID（PostgreSQL）'),
+        sa.Column('target_table', sa.String(100), nullable=False, comment='暂存表名'),
+        sa.Column('watermark_column', sa.String(100), nullable=False, server_default='FYFSSJ', comment='水位列（收费时间或变更时间列）'),
+        sa.Column('key_columns', sa.JSON(), nullable=True, comment='主键列，配置后按主键合并变化的行'),
+        sa.Column('batch_size', sa.Integer(), nullable=False, server_default='10000', comment='每批抽取行数'),
+        sa.Column('is_enabled', sa.Boolean(), nullable=False, server_default=sa.true(), comment='是否启用'),
+        sa.Column('watermark_value', sa.Text(), nullable=True, comment='已抽取到的水位值'),
+        sa.Column('last_extracted_at', sa.TIMESTAMP(), nullable=True, comment='最近抽取时间'),
+        sa.Column('last_row_count', sa.BigInteger(), nullable=True, comment='最近一次抽取行数'),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False, comment='创建时间'),
+        sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False, comment='更新时间'),
+        sa.ForeignKeyConstraint(['source_data_source_id'], ['data_sources.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['target_data_source_id'], ['data_sources.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('target_data_source_id', 'target_table', name='uq_his_extract_target'),
+        comment='HIS源表增量抽取配置'
+    )
+    op.create_index('ix_his_extract_tables_id', 'his_extract_tables', ['id'])
+
+
+def downgrade():
+    op.drop_index('ix_his_extract_tables_id', table_name='his_extract_tables')
+    op.drop_table('his_extract_tables')
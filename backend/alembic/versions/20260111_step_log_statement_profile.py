@@ -0,0 +1,34 @@
+"""add statement_profile to calculation_step_logs
+
+Revision ID: 20260111_step_profile
+Revises: 20260110_his_extract
+Create Date: 2026-01-11
+
+记录步骤内每条语句的耗时、影响行数和（超过阈值时的）执行计划。
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '20260111_step_profile'
+down_revision = '20260110_his_extract'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'calculation_step_logs',
+        sa.Column(
+            'statement_profile',
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=True,
+            comment='语句级耗时、影响行数和执行计划'
+        )
+    )
+
+
+def downgrade():
+    op.drop_column('calculation_step_logs', 'statement_profile')
@@ -0,0 +1,52 @@
+"""add calculation_drilldown_items table
+
+Revision ID: 20260112_drilldown_cube
+Revises: 20260111_step_profile
+Create Date: 2026-01-12
+
+维度下钻汇总表：任务完成时按科室/全院、维度节点预先聚合收费项目，
+覆盖索引包含下钻接口需要的全部列。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20260112_drilldown_cube'
+down_revision = '20260111_step_profile'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'calculation_drilldown_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.String(100), nullable=False, comment='计算任务ID'),
+        sa.Column('department_id', sa.Integer(), nullable=False, server_default='0', comment='科室ID（全院汇总为0）'),
+        sa.Column('node_id', sa.Integer(), nullable=False, comment='维度节点ID'),
+        sa.Column('rank', sa.Integer(), nullable=False, comment='金额排名（0为合计行）'),
+        sa.Column('item_code', sa.String(100), nullable=True, comment='收费项目编码'),
+        sa.Column('item_name', sa.String(200), nullable=True, comment='收费项目名称'),
+        sa.Column('item_category', sa.String(100), nullable=True, comment='项目类别'),
+        sa.Column('unit_price', sa.String(50), nullable=True, comment='单价'),
+        sa.Column('amount', sa.DECIMAL(20, 4), nullable=False, server_default='0', comment='金额'),
+        sa.Column('quantity', sa.DECIMAL(20, 4), nullable=False, server_default='0', comment='数量'),
+        sa.Column('item_count', sa.Integer(), nullable=True, comment='收费项目总数（仅合计行）'),
+        sa.Column('created_at', sa.DateTime(), nullable=True, comment='创建时间'),
+        sa.ForeignKeyConstraint(['task_id'], ['calculation_tasks.task_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # 覆盖索引：下钻查询按 (task_id, department_id, node_id) 定位并按排名读取，无需回表
+    op.create_index(
+        'uq_calculation_drilldown_items_lookup',
+        'calculation_drilldown_items',
+        ['task_id', 'department_id', 'node_id', 'rank'],
+        unique=True,
+        postgresql_include=['item_code', 'item_name', 'item_category', 'unit_price', 'amount', 'quantity', 'item_count']
+    )
+
+
+def downgrade():
+    op.drop_index('uq_calculation_drilldown_items_lookup', table_name='calculation_drilldown_items')
+    op.drop_table('calculation_drilldown_items')
@@ -0,0 +1,31 @@
+"""add max_concurrency to ai_interfaces
+
+Revision ID: 20260113_ai_max_concurrency
+Revises: 20260112_drilldown_cube
+Create Date: 2026-01-13
+
+AI分类任务按接口配置的最大并发请求数并行调用
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20260113_ai_max_concurrency'
+down_revision = '20260112_drilldown_cube'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('ai_interfaces', sa.Column(
+        'max_concurrency',
+        sa.Integer(),
+        nullable=False,
+        server_default='3',
+        comment='最大并发请求数'
+    ))
+
+
+def downgrade():
+    op.drop_column('ai_interfaces', 'max_concurrency')
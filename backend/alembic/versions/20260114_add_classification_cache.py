@@ -0,0 +1,43 @@
+"""add classification_cache table
+
+Revision ID: 20260114_classification_cache
+Revises: 20260113_ai_max_concurrency
+Create Date: 2026-01-14
+
+AI分类结果缓存：相同项目名称和维度列表的分类结果跨任务、跨模型版本复用
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20260114_classification_cache'
+down_revision = '20260113_ai_max_concurrency'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'classification_cache',
+        sa.Column('id', sa.Integer(), nullable=False, comment='主键'),
+        sa.Column('hospital_id', sa.Integer(), nullable=False, comment='医疗机构ID'),
+        sa.Column('context_hash', sa.String(64), nullable=False, comment='分类上下文哈希（末级维度列表、模型、提示词）'),
+        sa.Column('name_key', sa.String(200), nullable=False, comment='规范化后的收费项目名称'),
+        sa.Column('item_name', sa.String(200), nullable=False, comment='收费项目名称'),
+        sa.Column('dimension_code', sa.String(50), nullable=False, comment='维度编码'),
+        sa.Column('dimension_path', sa.String(500), nullable=False, comment='维度路径'),
+        sa.Column('confidence', sa.Numeric(5, 4), nullable=True, comment='AI确信度（0-1）'),
+        sa.Column('hit_count', sa.Integer(), nullable=False, server_default='0', comment='命中次数'),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('now()'), comment='分类时间'),
+        sa.Column('last_used_at', sa.DateTime(), nullable=False, server_default=sa.text('now()'), comment='最近使用时间'),
+        sa.ForeignKeyConstraint(['hospital_id'], ['hospitals.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('hospital_id', 'context_hash', 'name_key', name='uq_classification_cache_key')
+    )
+    op.create_index('ix_classification_cache_hospital_last_used', 'classification_cache', ['hospital_id', 'last_used_at'])
+
+
+def downgrade():
+    op.drop_index('ix_classification_cache_hospital_last_used', table_name='classification_cache')
+    op.drop_table('classification_cache')
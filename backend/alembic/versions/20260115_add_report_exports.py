@@ -0,0 +1,39 @@
+"""add report_exports table
+
+Revision ID: 20260115_report_exports
+Revises: 20260114_classification_cache
+Create Date: 2026-01-15
+
+后台报表导出记录：下载接口据此识别未知或已过期的导出ID，清理任务按保留期限删除导出文件
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20260115_report_exports'
+down_revision = '20260114_classification_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'report_exports',
+        sa.Column('id', sa.String(36), nullable=False, comment='导出ID（同后台任务ID）'),
+        sa.Column('hospital_id', sa.Integer(), nullable=False, comment='医疗机构ID'),
+        sa.Column('batch_id', sa.String(100), nullable=False, comment='批次ID'),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending', comment='状态：pending/completed/failed'),
+        sa.Column('file_path', sa.String(500), nullable=True, comment='导出文件路径'),
+        sa.Column('error_message', sa.Text(), nullable=True, comment='错误信息'),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('now()'), comment='发起时间'),
+        sa.Column('completed_at', sa.DateTime(), nullable=True, comment='完成时间'),
+        sa.ForeignKeyConstraint(['hospital_id'], ['hospitals.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_report_exports_created_at', 'report_exports', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_report_exports_created_at', table_name='report_exports')
+    op.drop_table('report_exports')
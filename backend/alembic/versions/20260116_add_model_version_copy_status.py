@@ -0,0 +1,28 @@
+"""add copy_status to model_versions
+
+Revision ID: 20260116_version_copy_status
+Revises: 20260115_report_exports
+Create Date: 2026-01-16
+
+后台复制模型版本时先创建版本再复制内容，复制完成前不能激活或创建计算任务
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20260116_version_copy_status'
+down_revision = '20260115_report_exports'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'model_versions',
+        sa.Column('copy_status', sa.String(20), nullable=True, comment='后台复制状态：copying 表示节点等内容仍在复制，为空表示可用')
+    )
+
+
+def downgrade():
+    op.drop_column('model_versions', 'copy_status')
@@ -91,6 +91,7 @@ def _build_response(ai_interface: AIInterface, db: Session) -> AIInterfaceRespon
         api_key_masked=mask_api_key(ai_interface.api_key_encrypted),
         call_delay=ai_interface.call_delay,
         daily_limit=ai_interface.daily_limit,
+        max_concurrency=ai_interface.max_concurrency,
         is_active=ai_interface.is_active,
         created_at=ai_interface.created_at,
         updated_at=ai_interface.updated_at,
@@ -163,6 +164,7 @@ def create_ai_interface(
         api_key_encrypted=encrypted_key,
         call_delay=data.call_delay,
         daily_limit=data.daily_limit,
+        max_concurrency=data.max_concurrency,
         is_active=data.is_active,
     )
     
@@ -270,6 +272,8 @@ def update_ai_interface(
         ai_interface.call_delay = data.call_delay
     if data.daily_limit is not None:
         ai_interface.daily_limit = data.daily_limit
+    if data.max_concurrency is not None:
+        ai_interface.max_concurrency = data.max_concurrency
     if data.is_active is not None:
         ai_interface.is_active = data.is_active
     
@@ -412,10 +412,13 @@ def query_drilldown_from_calculation_details(
     department_id: int,
     node_id: int,
     hospital_id: int
-) -> tuple[list, str]:
+) -> tuple[list, str, dict]:
     """
     从 calculation_details 表查询下钻数据
     
+    优先读取任务完成时生成的下钻汇总（金额最高的前 N 个项目及全部项目合计），
+    没有汇总数据（如历史任务）时实时分组聚合
+    
     Args:
         db: 数据库会话
         task_id: 任务ID
@@ -424,12 +427,17 @@ def query_drilldown_from_calculation_details(
         hospital_id: 医疗机构ID
         
     Returns:
-        (数据列表, 错误信息)
+        (数据列表, 错误信息, 合计)，合计包含 total_amount/total_quantity/item_count
     """
     from decimal import Decimal
     from sqlalchemy import text
-    from app.models.calculation_detail import CalculationDetail
     from app.models.charge_item import ChargeItem
+    from app.services.drilldown_cube_service import DrilldownCubeService
+    
+    cached = DrilldownCubeService.get_node(db, task_id, department_id, node_id)
+    if cached is not None:
+        items, totals = cached
+        return items, "", totals
     
     is_hospital_summary = (department_id == 0)
     
@@ -478,7 +486,7 @@ def query_drilldown_from_calculation_details(
     rows = result.fetchall()
     
     if not rows:
-        return [], "未找到该维度的收费明细数据"
+        return [], "未找到该维度的收费明细数据", {}
     
     # 获取收费项目的单价信息和名称
     item_codes = [row[0] for row in rows]
@@ -508,7 +516,20 @@ def query_drilldown_from_calculation_details(
             "quantity": Decimal(str(row[4])) if row[4] else Decimal('0')
         })
     
-    return items, ""
+    totals = {
+        "total_amount": sum((item["amount"] for item in items), Decimal('0')),
+        "total_quantity": sum((item["quantity"] for item in items), Decimal('0')),
+        "item_count": len(items),
+    }
+    return items, "", totals
+
+
+def get_drilldown_message(items: list, totals: dict) -> Optional[str]:
+    """下钻汇总只保留金额最高的前 N 个项目，项目被截断时返回提示信息"""
+    item_count = totals.get("item_count", 0)
+    if item_count > len(items):
+        return f"共 {item_count} 个收费项目，仅显示金额最高的 {len(items)} 个，合计为全部项目的合计"
+    return None
 
 
 @router.get("/dimension-drilldown", response_model=DimensionDrillDownResponse)
@@ -607,18 +628,14 @@ def get_dimension_drilldown_by_task(
         dept_name = department.accounting_unit_name or department.his_name
     
     # 优先从 calculation_details 表查询
-    items_data, error_msg = query_drilldown_from_calculation_details(
+    items_data, error_msg, totals = query_drilldown_from_calculation_details(
         db, task_id, department_id, node_id, hospital_id
     )
     
     if items_data:
-        # 使用 calculation_details 的数据
-        items = []
-        total_amount = Decimal('0')
-        total_quantity = Decimal('0')
-        
-        for item in items_data:
-            items.append(DimensionDrillDownItem(
+        # 使用 calculation_details 的数据（合计为全部项目的合计）
+        items = [
+            DimensionDrillDownItem(
                 period=period,
                 department_code=dept_code or "全院",
                 department_name=dept_name,
@@ -628,16 +645,16 @@ def get_dimension_drilldown_by_task(
                 unit_price=item["unit_price"],
                 amount=item["amount"],
                 quantity=item["quantity"]
-            ))
-            total_amount += item["amount"]
-            total_quantity += item["quantity"]
+            )
+            for item in items_data
+        ]
         
         return DimensionDrillDownResponse(
             dimension_name=dimension_name,
             items=items,
-            total_amount=total_amount,
-            total_quantity=total_quantity,
-            message=None
+            total_amount=totals["total_amount"],
+            total_quantity=totals["total_quantity"],
+            message=get_drilldown_message(items_data, totals)
         )
     
     # 回退到 charge_details 表查询（兼容旧任务）
@@ -687,7 +704,7 @@ def get_dimension_drilldown_by_task(
                         SUM(amount) as total_amount,
                         SUM(quantity) as total_quantity
                     FROM charge_details
-                    WHERE TO_CHAR(charge_time, 'YYYY-MM') = :period
+                    WHERE year_month = :period
                     AND item_code = ANY(:item_codes)
                     AND business_type = :business_type
                     GROUP BY item_code, item_name
@@ -706,7 +723,7 @@ def get_dimension_drilldown_by_task(
                         SUM(amount) as total_amount,
                         SUM(quantity) as total_quantity
                     FROM charge_details
-                    WHERE TO_CHAR(charge_time, 'YYYY-MM') = :period
+                    WHERE year_month = :period
                     AND item_code = ANY(:item_codes)
                     GROUP BY item_code, item_name
                     ORDER BY total_amount DESC
@@ -724,7 +741,7 @@ def get_dimension_drilldown_by_task(
                     SUM(quantity) as total_quantity
                 FROM charge_details
                 WHERE {dept_code_field} = :dept_code
-                AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                AND year_month = :period
                 AND item_code = ANY(:item_codes)
                 AND business_type = :business_type
                 GROUP BY item_code, item_name
@@ -745,7 +762,7 @@ def get_dimension_drilldown_by_task(
                     SUM(quantity) as total_quantity
                 FROM charge_details
                 WHERE {dept_code_field} = :dept_code
-                AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                AND year_month = :period
                 AND item_code = ANY(:item_codes)
                 GROUP BY item_code, item_name
                 ORDER BY total_amount DESC
@@ -986,18 +1003,14 @@ def preview_dimension_drilldown(
         raise HTTPException(status_code=400, detail="该维度不是末级维度，无法下钻")
     
     # 优先从 calculation_details 表查询
-    items_data, error_msg = query_drilldown_from_calculation_details(
+    items_data, error_msg, totals = query_drilldown_from_calculation_details(
         db, task.task_id, department_id, node_id, hospital_id
     )
     
     if items_data:
-        # 使用 calculation_details 的数据
-        items = []
-        total_amount = Decimal('0')
-        total_quantity = Decimal('0')
-        
-        for item in items_data:
-            items.append(DimensionDrillDownItem(
+        # 使用 calculation_details 的数据（合计为全部项目的合计）
+        items = [
+            DimensionDrillDownItem(
                 period=period,
                 department_code=dept_code,
                 department_name=dept_name,
@@ -1007,16 +1020,16 @@ def preview_dimension_drilldown(
                 unit_price=item["unit_price"],
                 amount=item["amount"],
                 quantity=item["quantity"]
-            ))
-            total_amount += item["amount"]
-            total_quantity += item["quantity"]
+            )
+            for item in items_data
+        ]
         
         return DimensionDrillDownResponse(
             dimension_name=dimension_name,
             items=items,
-            total_amount=total_amount,
-            total_quantity=total_quantity,
-            message=None
+            total_amount=totals["total_amount"],
+            total_quantity=totals["total_quantity"],
+            message=get_drilldown_message(items_data, totals)
         )
     
     # 回退到 charge_details 表查询（兼容旧任务）
@@ -1065,7 +1078,7 @@ def preview_dimension_drilldown(
                     SUM(quantity) as total_quantity
                 FROM charge_details
                 WHERE {dept_code_field} = :dept_code
-                AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                AND year_month = :period
                 AND item_code = ANY(:item_codes)
                 AND business_type = :business_type
                 GROUP BY item_code, item_name
@@ -1086,7 +1099,7 @@ def preview_dimension_drilldown(
                     SUM(quantity) as total_quantity
                 FROM charge_details
                 WHERE {dept_code_field} = :dept_code
-                AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                AND year_month = :period
                 AND item_code = ANY(:item_codes)
                 GROUP BY item_code, item_name
                 ORDER BY total_amount DESC
@@ -1283,7 +1296,7 @@ def preview_business_content(
                         SUM(quantity) as total_quantity
                     FROM charge_details
                     WHERE {dept_code_field} = :dept_code
-                    AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                    AND year_month = :period
                     AND item_code = ANY(:item_codes)
                     AND business_type = :business_type
                     GROUP BY item_code, item_name
@@ -1305,7 +1318,7 @@ def preview_business_content(
                         SUM(quantity) as total_quantity
                     FROM charge_details
                     WHERE {dept_code_field} = :dept_code
-                    AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                    AND year_month = :period
                     AND item_code = ANY(:item_codes)
                     GROUP BY item_code, item_name
                     ORDER BY total_amount DESC
@@ -1880,7 +1893,7 @@ def get_business_content(
                         SUM(quantity) as total_quantity
                     FROM charge_details
                     WHERE {dept_code_field} = :dept_code
-                    AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                    AND year_month = :period
                     AND item_code = ANY(:item_codes)
                     AND business_type = :business_type
                     GROUP BY item_code, item_name
@@ -1902,7 +1915,7 @@ def get_business_content(
                         SUM(quantity) as total_quantity
                     FROM charge_details
                     WHERE {dept_code_field} = :dept_code
-                    AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                    AND year_month = :period
                     AND item_code = ANY(:item_codes)
                     GROUP BY item_code, item_name
                     ORDER BY total_amount DESC
@@ -2122,7 +2135,7 @@ def get_dimension_drilldown(
                     SUM(quantity) as total_quantity
                 FROM charge_details
                 WHERE {dept_code_field} = :dept_code
-                AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                AND year_month = :period
                 AND item_code = ANY(:item_codes)
                 AND business_type = :business_type
                 GROUP BY item_code, item_name
@@ -2143,7 +2156,7 @@ def get_dimension_drilldown(
                     SUM(quantity) as total_quantity
                 FROM charge_details
                 WHERE {dept_code_field} = :dept_code
-                AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                AND year_month = :period
                 AND item_code = ANY(:item_codes)
                 GROUP BY item_code, item_name
                 ORDER BY total_amount DESC
@@ -2,6 +2,7 @@
 计算步骤管理API
 """
 import time
+from types import SimpleNamespace
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
@@ -23,6 +24,7 @@ from app.schemas.calculation_step import (
 )
 from app.services.data_source_service import DataSourceService
 from app.utils.hospital_filter import validate_hospital_access
+from app.utils.step_dag import build_step_dependencies
 
 router = APIRouter()
 
@@ -54,6 +56,50 @@ def _get_step_with_hospital_check(db: Session, step_id: int) -> CalculationStep:
     return step
 
 
+def _validate_step_dependencies(
+    db: Session,
+    workflow_id: int,
+    depends_on: Optional[list],
+    step: Optional[CalculationStep] = None,
+):
+    """
+    验证步骤依赖：依赖的步骤必须属于同一流程，且依赖关系不能成环
+    
+    Raises:
+        HTTPException: 依赖无效
+    """
+    if depends_on is None:
+        return
+    
+    workflow_steps = db.query(CalculationStep).filter(
+        CalculationStep.workflow_id == workflow_id
+    ).order_by(CalculationStep.sort_order).all()
+    workflow_step_ids = {s.id for s in workflow_steps}
+    
+    invalid_ids = [dep_id for dep_id in depends_on if dep_id not in workflow_step_ids]
+    if invalid_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"依赖的步骤不存在或不属于该流程: {invalid_ids}"
+        )
+    if step and step.id in depends_on:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="步骤不能依赖自身"
+        )
+    
+    # 用待保存的依赖替换当前步骤后检查是否成环（新建步骤不会被其他步骤依赖，无需检查）
+    if step:
+        candidates = [
+            SimpleNamespace(id=s.id, depends_on=depends_on if s.id == step.id else s.depends_on)
+            for s in workflow_steps
+        ]
+        try:
+            build_step_dependencies(candidates)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.get("", response_model=CalculationStepListResponse)
 def get_calculation_steps(
     workflow_id: int = Query(..., description="计算流程ID"),
@@ -125,6 +171,9 @@ def create_calculation_step(
                 detail="数据源不存在"
             )
     
+    # 验证步骤依赖
+    _validate_step_dependencies(db, step_in.workflow_id, step_in.depends_on)
+    
     # 如果没有指定sort_order，自动设置为最大值+1
     if step_in.sort_order is None or step_in.sort_order == 0:
         max_order = db.query(func.coalesce(func.max(CalculationStep.sort_order), 0)).filter(
@@ -193,6 +242,8 @@ def update_calculation_step(
     
     # 更新字段
     update_data = step_in.model_dump(exclude_unset=True)
+    if "depends_on" in update_data:
+        _validate_step_dependencies(db, step.workflow_id, update_data["depends_on"], step=step)
     for field, value in update_data.items():
         setattr(step, field, value)
     
@@ -17,8 +17,11 @@ from app.models.department import Department
 from app.models.model_version import ModelVersion
 from app.models.calculation_workflow import CalculationWorkflow
 from app.models.model_node import ModelNode
+from app.models.calculation_step import CalculationStep
+from app.models.calculation_step_log import CalculationStepLog
 from app.schemas.calculation_task import (
     CalculationTaskCreate,
+    CalculationTaskRecalculate,
     CalculationTaskResponse,
     CalculationTaskListResponse,
     SummaryListResponse,
@@ -35,11 +38,20 @@ from app.schemas.calculation_task import (
     BatchInfo,
     BatchListResponse
 )
+from app.services.result_rollup_service import ResultRollup, load_sequence_types
+from app.services.result_rollup_cache_service import ResultRollupCacheService
+from app.services.drilldown_cube_service import DrilldownCubeService
 from app.tasks.calculation_tasks import execute_calculation_task
 from app.utils.hospital_filter import (
     apply_hospital_filter,
     validate_hospital_access,
 )
+from app.utils.sequence_type import (
+    SEQUENCE_TYPE_DOCTOR,
+    SEQUENCE_TYPE_NURSE,
+    SEQUENCE_TYPE_TECH,
+    SEQUENCE_TYPES,
+)
 
 router = APIRouter()
 
@@ -136,6 +148,9 @@ def create_calculation_task(
     # 验证模型版本所属医疗机构
     validate_hospital_access(db, model_version)
     
+    if model_version.copy_status:
+        raise HTTPException(status_code=400, detail="模型版本仍在复制中，复制完成后才能创建计算任务")
+    
     # 如果指定了workflow_id，验证是否存在
     if task_data.workflow_id:
         workflow = db.query(CalculationWorkflow).filter(
@@ -175,7 +190,8 @@ def create_calculation_task(
             model_version_id=task_data.model_version_id,
             workflow_id=task_data.workflow_id,
             department_ids=task_data.department_ids,
-            period=task_data.period
+            period=task_data.period,
+            chunk_size=task_data.chunk_size
         )
         print(f"[INFO] Celery任务已提交: celery_task_id={result.id}")
     except Exception as e:
@@ -326,6 +342,72 @@ def cancel_calculation_task(
     return {"success": True, "message": "任务已取消"}
 
 
+@router.post("/tasks/{task_id}/recalculate", response_model=CalculationTaskResponse)
+def recalculate_calculation_task(
+    task_id: str,
+    recalc_data: CalculationTaskRecalculate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """重新计算已有任务
+    
+    在原任务上重新执行计算流程（任务ID不变，报表和批次引用保持有效）。
+    增量模式下输入指纹未变化的步骤直接复用上次的计算结果，
+    例如只调整了个别维度权重时，只需重新执行受影响的步骤。
+    """
+    task = _get_task_with_hospital_check(db, task_id)
+    
+    if task.status in ["pending", "running"]:
+        raise HTTPException(status_code=400, detail="任务正在排队或运行中，不能重新计算")
+    if not task.workflow_id:
+        raise HTTPException(status_code=400, detail="任务未指定计算流程，不能重新计算")
+    
+    # 未指定科室时沿用上次计算的科室（批量模式的步骤日志科室为空）
+    department_ids = recalc_data.department_ids
+    if not department_ids:
+        department_ids = [
+            row[0] for row in db.query(CalculationStepLog.department_id).filter(
+                CalculationStepLog.task_id == task_id,
+                CalculationStepLog.department_id.isnot(None)
+            ).distinct().order_by(CalculationStepLog.department_id).all()
+        ] or None
+    
+    # 重新计算科室的汇总数据、汇总缓存和下钻汇总在计算完成后重新生成，其他科室的汇总数据保留
+    summary_query = db.query(CalculationSummary).filter(CalculationSummary.task_id == task_id)
+    if department_ids:
+        summary_query = summary_query.filter(CalculationSummary.department_id.in_(department_ids))
+    summary_query.delete(synchronize_session=False)
+    ResultRollupCacheService.invalidate(db, task_id)
+    DrilldownCubeService.invalidate(db, task_id)
+    
+    task.status = "pending"
+    task.progress = Decimal("0")
+    task.error_message = None
+    task.started_at = None
+    task.completed_at = None
+    db.commit()
+    db.refresh(task)
+    
+    try:
+        print(f"[INFO] 提交重新计算任务: task_id={task_id}, incremental={recalc_data.incremental}")
+        result = execute_calculation_task.delay(
+            task_id=task_id,
+            model_version_id=task.model_version_id,
+            workflow_id=task.workflow_id,
+            department_ids=department_ids,
+            period=task.period,
+            chunk_size=recalc_data.chunk_size,
+            recalculate_mode="incremental" if recalc_data.incremental else "full"
+        )
+        print(f"[INFO] Celery任务已提交: celery_task_id={result.id}")
+    except Exception as e:
+        print(f"[ERROR] 提交异步任务失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+    
+    return task
+
+
 @router.get("/results/summary", response_model=SummaryListResponse)
 def get_results_summary(
     period: Optional[str] = Query(None, description="评估月份(YYYY-MM)"),
@@ -337,7 +419,6 @@ def get_results_summary(
 ):
     """获取科室汇总数据 - 使用明细表相同的逐级汇总算法，显示所有参与核算的科室"""
     from decimal import Decimal
-    from collections import defaultdict
     from app.utils.hospital_filter import get_current_hospital_id_or_raise
     
     # 参数验证：task_id和period不能同时为空
@@ -367,74 +448,33 @@ def get_results_summary(
     all_active_depts = all_active_depts_query.all()
     dept_map = {d.id: d for d in all_active_depts}
     
-    # 查询所有计算结果（维度和序列）
-    all_results_query = db.query(CalculationResult).filter(
-        CalculationResult.task_id == task.task_id
-    )
-    
-    if department_id:
-        all_results_query = all_results_query.filter(CalculationResult.department_id == department_id)
-    
-    all_results = all_results_query.all()
-    
-    # 按科室分组
-    results_by_dept = defaultdict(list)
-    for result in all_results:
-        results_by_dept[result.department_id].append(result)
-    
-    # 使用明细表相同的算法计算每个科室的汇总
-    def calculate_sum_from_children(node_id, results):
-        """递归计算节点的价值（从子节点汇总） - 与明细表算法完全相同"""
-        # 找到当前节点
-        current_node = next((r for r in results if r.node_id == node_id), None)
-        if not current_node:
-            return Decimal('0')
-        
-        # 找到所有子节点（维度）
-        children = [r for r in results if r.parent_id == node_id and r.node_type == "dimension"]
+    # 各科室的序列价值：优先读取任务完成时生成的汇总缓存
+    dept_sequence_values = ResultRollupCacheService.get_sequence_values(db, task.task_id)
+    if dept_sequence_values is None:
+        # 查询所有计算结果（维度和序列）
+        all_results_query = db.query(CalculationResult).filter(
+            CalculationResult.task_id == task.task_id
+        )
         
-        if not children or len(children) == 0:
-            # 叶子节点，直接返回自己的值
-            return current_node.value or Decimal('0')
+        if department_id:
+            all_results_query = all_results_query.filter(CalculationResult.department_id == department_id)
         
-        # 非叶子节点，汇总子节点
-        total_value = Decimal('0')
-        for child in children:
-            child_value = calculate_sum_from_children(child.node_id, results)
-            total_value += child_value
+        all_results = all_results_query.all()
         
-        return total_value
+        # 按科室逐级汇总（与明细表算法完全相同）
+        rollup = ResultRollup(all_results, sequence_types=load_sequence_types(db, all_results))
+        dept_sequence_values = {dept.id: rollup.sequence_values(dept.id) for dept in all_active_depts}
     
     # 按核算单元分组汇总（多个科室可能属于同一个核算单元）
     accounting_units = {}  # key: (accounting_unit_code, accounting_unit_name), value: {dept_ids, values}
     
     for dept in all_active_depts:
         dept_id_val = dept.id
-        results = results_by_dept.get(dept_id_val, [])
-        
-        # 找出所有序列
-        sequences = [r for r in results if r.node_type == "sequence"]
         
         # 计算每个序列的价值（使用明细表算法）
-        doctor_value = Decimal('0')
-        nurse_value = Decimal('0')
-        tech_value = Decimal('0')
-        
-        for seq in sequences:
-            # 使用明细表相同的逐级汇总算法计算序列价值
-            seq_value = calculate_sum_from_children(seq.node_id, results)
-            
-            # 根据序列名称分类
-            node_name_lower = seq.node_name.lower()
-            if "医生" in seq.node_name or "医疗" in seq.node_name or "医师" in seq.node_name or \
-               "doctor" in node_name_lower or "physician" in node_name_lower:
-                doctor_value += seq_value
-            elif "护理" in seq.node_name or "护士" in seq.node_name or \
-                 "nurse" in node_name_lower or "nursing" in node_name_lower:
-                nurse_value += seq_value
-            elif "医技" in seq.node_name or "技师" in seq.node_name or \
-                 "tech" in node_name_lower or "technician" in node_name_lower:
-                tech_value += seq_value
+        doctor_value, nurse_value, tech_value = dept_sequence_values.get(
+            dept_id_val, (Decimal('0'), Decimal('0'), Decimal('0'))
+        )
         
         # 确定核算单元标识（使用accounting_unit_code和accounting_unit_name，如果没有则使用科室自己的信息）
         unit_code = dept.accounting_unit_code or dept.his_code
@@ -539,13 +579,20 @@ def get_results_detail(
     if not department:
         raise HTTPException(status_code=404, detail="科室不存在")
     
-    # 查询该科室的所有计算结果（按模型节点排序）
-    results = db.query(CalculationResult).join(
-        ModelNode, CalculationResult.node_id == ModelNode.id
-    ).filter(
-        CalculationResult.task_id == task_id,
-        CalculationResult.department_id == dept_id
-    ).order_by(ModelNode.sort_order).all()
+    # 优先读取任务完成时生成的汇总缓存，没有缓存时查询该科室的所有计算结果（按模型节点排序）
+    rollup = ResultRollupCacheService.get_rollup(db, task_id, dept_id)
+    if rollup is None:
+        results = db.query(CalculationResult).join(
+            ModelNode, CalculationResult.node_id == ModelNode.id
+        ).filter(
+            CalculationResult.task_id == task_id,
+            CalculationResult.department_id == dept_id
+        ).order_by(ModelNode.sort_order).all()
+        
+        # 建立子节点索引并逐级汇总
+        rollup = ResultRollup(results, sequence_types=load_sequence_types(db, results))
+    else:
+        results = rollup.rows(dept_id)
     
     # 查询模型节点信息以获取业务导向等额外信息
     node_ids = [r.node_id for r in results]
@@ -571,41 +618,42 @@ def get_results_detail(
     def build_dimension_tree(parent_id, level):
         """递归构建维度树"""
         children = []
-        for result in results:
-            if result.parent_id == parent_id and result.node_type == "dimension":
-                node_info = node_info_map.get(result.node_id)
-                
-                # 获取导向规则名称
-                orientation_names = []
-                if node_info and node_info.orientation_rule_ids:
-                    orientation_names = [
-                        orientation_rules.get(rule_id, f"规则{rule_id}")
-                        for rule_id in node_info.orientation_rule_ids
-                    ]
-                business_guide = "、".join(orientation_names) if orientation_names else (node_info.business_guide if node_info else None)
-                
-                dim = DimensionDetail(
-                    node_id=result.node_id,
-                    parent_id=result.parent_id,
-                    dimension_name=result.node_name,
-                    dimension_code=result.node_code,
-                    level=level,
-                    value=result.value or 0,
-                    ratio=result.ratio or 0,
-                    workload=result.workload,
-                    weight=result.weight,
-                    hospital_value=result.original_weight or result.weight,
-                    dept_value=result.weight,
-                    business_guide=business_guide,
-                    children=build_dimension_tree(result.node_id, level + 1)
-                )
-                children.append(dim)
+        for result in rollup.children(dept_id, parent_id):
+            node_info = node_info_map.get(result.node_id)
+            
+            # 获取导向规则名称
+            orientation_names = []
+            if node_info and node_info.orientation_rule_ids:
+                orientation_names = [
+                    orientation_rules.get(rule_id, f"规则{rule_id}")
+                    for rule_id in node_info.orientation_rule_ids
+                ]
+            business_guide = "、".join(orientation_names) if orientation_names else (node_info.business_guide if node_info else None)
+            
+            dim = DimensionDetail(
+                node_id=result.node_id,
+                parent_id=result.parent_id,
+                dimension_name=result.node_name,
+                dimension_code=result.node_code,
+                level=level,
+                value=result.value or 0,
+                ratio=result.ratio or 0,
+                workload=result.workload,
+                weight=result.weight,
+                hospital_value=result.original_weight or result.weight,
+                dept_value=result.weight,
+                business_guide=business_guide,
+                children=build_dimension_tree(result.node_id, level + 1)
+            )
+            children.append(dim)
         return children
     
     # 组织序列数据
     sequences = []
+    sequence_types = []
     for result in results:
         if result.node_type == "sequence":
+            sequence_types.append(rollup.sequence_type(result.node_id))
             sequence = SequenceDetail(
                 sequence_type=result.node_name,
                 sequence_name=result.node_name,
@@ -619,22 +667,6 @@ def get_results_detail(
         """将维度树转换为表格树形数据"""
         rows = []
         
-        def calculate_sum_from_children(node):
-            """计算节点的工作量和金额（从子节点汇总）"""
-            if not node.children or len(node.children) == 0:
-                # 叶子节点，直接返回自己的值
-                return node.workload or 0, node.value or 0
-            
-            # 非叶子节点，汇总子节点
-            total_workload = 0
-            total_amount = 0
-            for child in node.children:
-                child_workload, child_amount = calculate_sum_from_children(child)
-                total_workload += child_workload
-                total_amount += child_amount
-            
-            return total_workload, total_amount
-        
         def build_tree_node(node, siblings_total=None):
             """构建树形节点数据
             
@@ -643,12 +675,8 @@ def get_results_detail(
             # 判断是否为末级维度
             is_leaf = not node.children or len(node.children) == 0
             
-            # 计算当前节点的金额
-            if is_leaf:
-                current_amount = node.value or 0
-                current_workload = node.workload or 0
-            else:
-                current_workload, current_amount = calculate_sum_from_children(node)
+            # 计算当前节点的金额（叶子节点为自身的值，非叶子节点为子节点汇总）
+            current_workload, current_amount = rollup.totals(dept_id, node.node_id)
             
             # 计算占比
             if siblings_total and siblings_total > 0:
@@ -698,10 +726,7 @@ def get_results_detail(
             # 递归处理子节点
             if node.children:
                 # 计算子节点的金额总和
-                children_total = sum(
-                    (calculate_sum_from_children(child)[1] if child.children else (child.value or 0))
-                    for child in node.children
-                )
+                children_total = sum(rollup.value(dept_id, child.node_id) for child in node.children)
                 
                 for child in node.children:
                     child_node = build_tree_node(child, children_total)
@@ -710,10 +735,7 @@ def get_results_detail(
             return tree_node
         
         # 计算一级维度的金额总和
-        first_level_total = sum(
-            (calculate_sum_from_children(dim)[1] if dim.children else (dim.value or 0))
-            for dim in dimensions
-        )
+        first_level_total = sum(rollup.value(dept_id, dim.node_id) for dim in dimensions)
         
         # 处理每个一级维度
         for dim in dimensions:
@@ -722,27 +744,20 @@ def get_results_detail(
         
         return rows
     
-    # 为每个序列生成树形表格数据
-    doctor_rows = []
-    nurse_rows = []
-    tech_rows = []
-    
-    for seq in sequences:
-        if "医生" in seq.sequence_name:
-            doctor_rows = build_tree_rows(seq.sequence_name, seq.dimensions)
-        elif "护理" in seq.sequence_name:
-            nurse_rows = build_tree_rows(seq.sequence_name, seq.dimensions)
-        elif "医技" in seq.sequence_name:
-            tech_rows = build_tree_rows(seq.sequence_name, seq.dimensions)
+    # 为每个序列生成树形表格数据（按模型节点的序列类别归类）
+    sequence_rows = {}
+    for seq, sequence_type in zip(sequences, sequence_types):
+        if sequence_type in SEQUENCE_TYPES:
+            sequence_rows[sequence_type] = build_tree_rows(seq.sequence_name, seq.dimensions)
     
     return {
         "department_id": dept_id,
         "department_name": department.accounting_unit_name or department.his_name,
         "period": task.period,
         "sequences": sequences,
-        "doctor": doctor_rows,
-        "nurse": nurse_rows,
-        "tech": tech_rows
+        "doctor": sequence_rows.get(SEQUENCE_TYPE_DOCTOR, []),
+        "nurse": sequence_rows.get(SEQUENCE_TYPE_NURSE, []),
+        "tech": sequence_rows.get(SEQUENCE_TYPE_TECH, [])
     }
 
 
@@ -754,85 +769,37 @@ def get_hospital_detail(
 ):
     """获取全院汇总的详细业务价值数据 - 各维度汇总所有科室的数据"""
     from decimal import Decimal
-    from collections import defaultdict
     
     # 验证任务是否存在且属于当前医疗机构
     task = _get_task_with_hospital_check(db, task_id)
     
-    # 查询所有科室的所有计算结果（按模型节点排序）
-    all_results = db.query(CalculationResult).join(
-        ModelNode, CalculationResult.node_id == ModelNode.id
-    ).filter(
-        CalculationResult.task_id == task_id
-    ).order_by(
-        CalculationResult.department_id,
-        ModelNode.sort_order
-    ).all()
+    # 优先读取任务完成时生成的全院汇总缓存，没有缓存时按节点合并所有科室的计算结果
+    rollup = ResultRollupCacheService.get_rollup(db, task_id)
+    if rollup is None:
+        # 查询所有科室的所有计算结果（按模型节点排序）
+        all_results = db.query(CalculationResult).join(
+            ModelNode, CalculationResult.node_id == ModelNode.id
+        ).filter(
+            CalculationResult.task_id == task_id
+        ).order_by(
+            CalculationResult.department_id,
+            ModelNode.sort_order
+        ).all()
+        
+        # 同一节点的工作量和价值在所有科室间累加，其余信息取第一次遇到的
+        rollup = ResultRollup(
+            all_results, group_key=lambda r: None, sequence_types=load_sequence_types(db, all_results)
+        )
     
-    if not all_results:
+    results = rollup.rows(None)
+    if not results:
         raise HTTPException(status_code=404, detail="未找到计算结果")
     
     # 查询模型节点信息
-    node_ids = list(set([r.node_id for r in all_results]))
+    node_ids = [r.node_id for r in results]
     model_nodes = db.query(ModelNode).filter(ModelNode.id.in_(node_ids)).all()
     node_info_map = {node.id: node for node in model_nodes}
     
-    # 按节点ID汇总所有科室的数据
-    node_aggregated = defaultdict(lambda: {
-        'node_id': 0,
-        'node_name': '',
-        'node_code': '',
-        'node_type': '',
-        'parent_id': None,
-        'workload': Decimal('0'),
-        'value': Decimal('0'),
-        'weight': None,  # 权重不汇总，取第一个
-        'business_guide': None
-    })
-    
-    for result in all_results:
-        node_id = result.node_id
-        agg = node_aggregated[node_id]
-        
-        # 基本信息（取第一次遇到的）
-        if agg['node_id'] == 0:
-            agg['node_id'] = result.node_id
-            agg['node_name'] = result.node_name
-            agg['node_code'] = result.node_code
-            agg['node_type'] = result.node_type
-            agg['parent_id'] = result.parent_id
-            agg['weight'] = result.weight
-            node_info = node_info_map.get(result.node_id)
-            if node_info:
-                agg['business_guide'] = node_info.business_guide
-        
-        # 汇总工作量和价值
-        if result.workload:
-            agg['workload'] += result.workload
-        if result.value:
-            agg['value'] += result.value
-    
-    # 构建汇总后的结果列表（模拟单个科室的结果结构）
-    aggregated_results = []
-    for node_id, agg in node_aggregated.items():
-        # 创建一个模拟的CalculationResult对象
-        class AggregatedResult:
-            def __init__(self, data):
-                self.node_id = data['node_id']
-                self.node_name = data['node_name']
-                self.node_code = data['node_code']
-                self.node_type = data['node_type']
-                self.parent_id = data['parent_id']
-                self.workload = data['workload']
-                self.value = data['value']
-                self.weight = data['weight']
-                self.ratio = Decimal('0')  # 稍后计算
-        
-        aggregated_results.append(AggregatedResult(agg))
-    
-    # 使用与单科室明细相同的逻辑构建树形结构
-    results = aggregated_results  # 重命名以复用下面的代码
-    
     # 构建节点映射
     result_map = {r.node_id: r for r in results}
     
@@ -840,37 +807,38 @@ def get_hospital_detail(
     def build_dimension_tree(parent_id, level):
         """递归构建维度树"""
         children = []
-        for result in results:
-            if result.parent_id == parent_id and result.node_type == "dimension":
-                node_info = node_info_map.get(result.node_id)
-                agg_data = node_aggregated[result.node_id]
-                
-                dim = DimensionDetail(
-                    node_id=result.node_id,
-                    parent_id=result.parent_id,
-                    dimension_name=result.node_name,
-                    dimension_code=result.node_code,
-                    level=level,
-                    value=result.value or 0,
-                    ratio=0,  # 稍后计算
-                    workload=result.workload,
-                    weight=result.weight,
-                    hospital_value=result.weight,  # 全院汇总时，两个值相同
-                    dept_value=result.weight,
-                    business_guide=agg_data['business_guide'],
-                    children=build_dimension_tree(result.node_id, level + 1)
-                )
-                children.append(dim)
+        for result in rollup.children(None, parent_id):
+            node_info = node_info_map.get(result.node_id)
+            workload, value = rollup.own(None, result.node_id)
+            
+            dim = DimensionDetail(
+                node_id=result.node_id,
+                parent_id=result.parent_id,
+                dimension_name=result.node_name,
+                dimension_code=result.node_code,
+                level=level,
+                value=value,
+                ratio=0,  # 稍后计算
+                workload=workload,
+                weight=result.weight,
+                hospital_value=result.weight,  # 全院汇总时，两个值相同
+                dept_value=result.weight,
+                business_guide=node_info.business_guide if node_info else None,
+                children=build_dimension_tree(result.node_id, level + 1)
+            )
+            children.append(dim)
         return children
     
     # 组织序列数据
     sequences = []
+    sequence_types = []
     for result in results:
         if result.node_type == "sequence":
+            sequence_types.append(rollup.sequence_type(result.node_id))
             sequence = SequenceDetail(
                 sequence_type=result.node_name,
                 sequence_name=result.node_name,
-                total_value=result.value or 0,
+                total_value=rollup.own(None, result.node_id)[1],
                 dimensions=build_dimension_tree(result.node_id, 1)
             )
             sequences.append(sequence)
@@ -880,33 +848,13 @@ def get_hospital_detail(
         """将维度树转换为表格树形数据"""
         rows = []
         
-        def calculate_sum_from_children(node):
-            """计算节点的工作量和金额（从子节点汇总）"""
-            if not node.children or len(node.children) == 0:
-                # 叶子节点，直接返回自己的值
-                return node.workload or 0, node.value or 0
-            
-            # 非叶子节点，汇总子节点
-            total_workload = 0
-            total_amount = 0
-            for child in node.children:
-                child_workload, child_amount = calculate_sum_from_children(child)
-                total_workload += child_workload
-                total_amount += child_amount
-            
-            return total_workload, total_amount
-        
         def build_tree_node(node, siblings_total=None):
             """构建树形节点数据"""
             # 判断是否为末级维度
             is_leaf = not node.children or len(node.children) == 0
             
-            # 计算当前节点的金额
-            if is_leaf:
-                current_amount = node.value or 0
-                current_workload = node.workload or 0
-            else:
-                current_workload, current_amount = calculate_sum_from_children(node)
+            # 计算当前节点的金额（叶子节点为自身的值，非叶子节点为子节点汇总）
+            current_workload, current_amount = rollup.totals(None, node.node_id)
             
             # 计算占比
             if siblings_total and siblings_total > 0:
@@ -951,10 +899,7 @@ def get_hospital_detail(
             # 递归处理子节点
             if node.children:
                 # 计算子节点的金额总和
-                children_total = sum(
-                    (calculate_sum_from_children(child)[1] if child.children else (child.value or 0))
-                    for child in node.children
-                )
+                children_total = sum(rollup.value(None, child.node_id) for child in node.children)
                 
                 for child in node.children:
                     child_node = build_tree_node(child, children_total)
@@ -963,10 +908,7 @@ def get_hospital_detail(
             return tree_node
         
         # 计算一级维度的金额总和
-        first_level_total = sum(
-            (calculate_sum_from_children(dim)[1] if dim.children else (dim.value or 0))
-            for dim in dimensions
-        )
+        first_level_total = sum(rollup.value(None, dim.node_id) for dim in dimensions)
         
         # 处理每个一级维度
         for dim in dimensions:
@@ -975,27 +917,20 @@ def get_hospital_detail(
         
         return rows
     
-    # 为每个序列生成树形表格数据
-    doctor_rows = []
-    nurse_rows = []
-    tech_rows = []
-    
-    for seq in sequences:
-        if "医生" in seq.sequence_name:
-            doctor_rows = build_tree_rows(seq.sequence_name, seq.dimensions)
-        elif "护理" in seq.sequence_name:
-            nurse_rows = build_tree_rows(seq.sequence_name, seq.dimensions)
-        elif "医技" in seq.sequence_name:
-            tech_rows = build_tree_rows(seq.sequence_name, seq.dimensions)
+    # 为每个序列生成树形表格数据（按模型节点的序列类别归类）
+    sequence_rows = {}
+    for seq, sequence_type in zip(sequences, sequence_types):
+        if sequence_type in SEQUENCE_TYPES:
+            sequence_rows[sequence_type] = build_tree_rows(seq.sequence_name, seq.dimensions)
     
     return {
         "department_id": 0,
         "department_name": "全院汇总",
         "period": task.period,
         "sequences": sequences,
-        "doctor": doctor_rows,
-        "nurse": nurse_rows,
-        "tech": tech_rows
+        "doctor": sequence_rows.get(SEQUENCE_TYPE_DOCTOR, []),
+        "nurse": sequence_rows.get(SEQUENCE_TYPE_NURSE, []),
+        "tech": sequence_rows.get(SEQUENCE_TYPE_TECH, [])
     }
 
 
@@ -1051,6 +986,7 @@ def get_orientation_summary(
                 id,
                 name,
                 node_type,
+                sequence_type,
                 parent_id,
                 CAST(name AS TEXT) as path,
                 1 as level
@@ -1065,6 +1001,7 @@ def get_orientation_summary(
                 p.id,
                 p.name,
                 p.node_type,
+                p.sequence_type,
                 p.parent_id,
                 CAST(p.name || '-' || np.path AS TEXT),
                 np.level + 1
@@ -1074,7 +1011,8 @@ def get_orientation_summary(
         SELECT 
             original_id,
             path,
-            node_type
+            node_type,
+            sequence_type
         FROM node_path
         WHERE parent_id IS NULL OR node_type = 'sequence'
         ORDER BY original_id, level DESC
@@ -1086,8 +1024,10 @@ def get_orientation_summary(
         if row[0] not in node_data:  # 只取第一条（最长路径）
             node_data[row[0]] = {
                 'path': row[1],
-                'sequence': row[1].split('-')[0] if row[1] else ''
+                'sequence_type': None
             }
+        if row[2] == 'sequence':
+            node_data[row[0]]['sequence_type'] = row[3]
     
     # 按序列分组
     doctor_details = []
@@ -1096,7 +1036,7 @@ def get_orientation_summary(
     
     for detail in details:
         # 获取节点的完整路径和序列
-        node_info = node_data.get(detail.node_id, {'path': detail.node_name, 'sequence': ''})
+        node_info = node_data.get(detail.node_id, {'path': detail.node_name, 'sequence_type': None})
         
         # 创建响应对象并设置完整路径
         detail_dict = {
@@ -1120,14 +1060,14 @@ def get_orientation_summary(
         
         detail_response = OrientationAdjustmentDetailResponse(**detail_dict)
         
-        # 根据节点所属序列判断
-        sequence_name = node_info['sequence']
+        # 根据节点所属序列的类别判断
+        sequence_type = node_info['sequence_type']
         
-        if "医生" in sequence_name or "医疗" in sequence_name or "医师" in sequence_name:
+        if sequence_type == SEQUENCE_TYPE_DOCTOR:
             doctor_details.append(detail_response)
-        elif "护理" in sequence_name or "护士" in sequence_name:
+        elif sequence_type == SEQUENCE_TYPE_NURSE:
             nurse_details.append(detail_response)
-        elif "医技" in sequence_name or "技师" in sequence_name:
+        elif sequence_type == SEQUENCE_TYPE_TECH:
             tech_details.append(detail_response)
         else:
             # 如果没有找到序列，打印日志
@@ -1165,8 +1105,13 @@ def get_task_logs(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取任务执行日志"""
+    """获取任务执行日志
+    
+    每条日志包含语句级耗时（statement_profile），breakdown 按 任务 → 步骤 → 语句
+    汇总耗时（火焰图结构 name/value/children），用于定位慢步骤和慢语句。
+    """
     from app.models.calculation_step_log import CalculationStepLog
+    from app.services.step_profile_service import StepProfileService
     
     # 验证任务是否存在且属于当前医疗机构
     task = _get_task_with_hospital_check(db, task_id)
@@ -1178,8 +1123,15 @@ def get_task_logs(
         CalculationStepLog.start_time.desc()
     ).all()
     
+    step_names = dict(
+        db.query(CalculationStep.id, CalculationStep.name).filter(
+            CalculationStep.id.in_({log.step_id for log in logs})
+        ).all()
+    ) if logs else {}
+    
     return {
         "task_id": task_id,
+        "breakdown": StepProfileService.build_breakdown(task_id, reversed(logs), step_names),
         "logs": [
             {
                 "id": log.id,
@@ -1190,6 +1142,7 @@ def get_task_logs(
                 "end_time": log.end_time,
                 "duration_ms": log.duration_ms,
                 "result_data": log.result_data,
+                "statement_profile": log.statement_profile,
                 "execution_info": log.execution_info
             }
             for log in logs
@@ -1212,11 +1165,12 @@ def export_summary(
     from app.services.export_service import ExportService
     from app.utils.hospital_filter import get_current_hospital_id_or_raise
     from app.models.reference_value import ReferenceValue
+    from app.services.period_result_loader import PeriodResultLoader
     from decimal import Decimal
-    from collections import defaultdict
     
     # 获取当前医疗机构ID
     hospital_id = get_current_hospital_id_or_raise()
+    loader = PeriodResultLoader(db, hospital_id)
     
     # 优先使用task_id，否则按period和model_version_id查找
     if task_id:
@@ -1234,77 +1188,10 @@ def export_summary(
         task = _get_latest_completed_task(db, period, model_version_id)
     
     # 获取所有参与核算的科室（is_active=True）
-    all_active_depts = db.query(Department).filter(
-        Department.hospital_id == hospital_id,
-        Department.is_active == True
-    ).order_by(Department.sort_order, Department.id).all()
-    
-    # 查询所有计算结果
-    all_results = db.query(CalculationResult).filter(
-        CalculationResult.task_id == task.task_id
-    ).all()
-    
-    # 按科室分组
-    results_by_dept = defaultdict(list)
-    for result in all_results:
-        results_by_dept[result.department_id].append(result)
-    
-    # 计算汇总数据
-    def calculate_sum_from_children(node_id, results):
-        """递归计算节点的价值"""
-        current_node = next((r for r in results if r.node_id == node_id), None)
-        if not current_node:
-            return Decimal('0')
-        
-        children = [r for r in results if r.parent_id == node_id and r.node_type == "dimension"]
-        
-        if not children or len(children) == 0:
-            return current_node.value or Decimal('0')
-        
-        total_value = Decimal('0')
-        for child in children:
-            child_value = calculate_sum_from_children(child.node_id, results)
-            total_value += child_value
-        
-        return total_value
+    all_active_depts = loader.active_departments()
     
-    # 辅助函数：获取任务的汇总数据（按科室代码索引）
-    def get_task_summary_by_dept_code(task_id_param):
-        """获取指定任务的汇总数据，返回按科室代码索引的字典"""
-        if not task_id_param:
-            return {}
-        
-        compare_results = db.query(CalculationResult).filter(
-            CalculationResult.task_id == task_id_param
-        ).all()
-        
-        if not compare_results:
-            return {}
-        
-        # 按科室分组
-        compare_by_dept = defaultdict(list)
-        for result in compare_results:
-            compare_by_dept[result.department_id].append(result)
-        
-        # 按核算单元汇总
-        compare_units = {}
-        for dept in all_active_depts:
-            dept_id_val = dept.id
-            results = compare_by_dept.get(dept_id_val, [])
-            
-            sequences = [r for r in results if r.node_type == "sequence"]
-            total_val = Decimal('0')
-            
-            for seq in sequences:
-                seq_value = calculate_sum_from_children(seq.node_id, results)
-                total_val += seq_value
-            
-            unit_code = dept.accounting_unit_code or dept.his_code
-            if unit_code not in compare_units:
-                compare_units[unit_code] = Decimal('0')
-            compare_units[unit_code] += total_val
-        
-        return compare_units
+    # 查询所有计算结果，按科室逐级汇总
+    all_results, rollup = loader.load(task.task_id)
     
     # 获取参考值数据（按科室代码索引）
     reference_values = {}
@@ -1316,37 +1203,18 @@ def export_summary(
         reference_values[ref.department_code] = ref.reference_value
     
     # 获取环比数据
-    mom_summary = get_task_summary_by_dept_code(mom_task_id)
+    mom_summary = loader.unit_totals(mom_task_id)
     
     # 获取同比数据
-    yoy_summary = get_task_summary_by_dept_code(yoy_task_id)
+    yoy_summary = loader.unit_totals(yoy_task_id)
     
     # 按核算单元分组汇总（与页面显示逻辑一致）
     accounting_units = {}  # key: (accounting_unit_code, accounting_unit_name), value: {dept_ids, values}
     
     for dept in all_active_depts:
         dept_id_val = dept.id
-        results = results_by_dept.get(dept_id_val, [])
-        
-        sequences = [r for r in results if r.node_type == "sequence"]
         
-        doctor_value = Decimal('0')
-        nurse_value = Decimal('0')
-        tech_value = Decimal('0')
-        
-        for seq in sequences:
-            seq_value = calculate_sum_from_children(seq.node_id, results)
-            
-            node_name_lower = seq.node_name.lower()
-            if "医生" in seq.node_name or "医疗" in seq.node_name or "医师" in seq.node_name or \
-               "doctor" in node_name_lower or "physician" in node_name_lower:
-                doctor_value += seq_value
-            elif "护理" in seq.node_name or "护士" in seq.node_name or \
-                 "nurse" in node_name_lower or "nursing" in node_name_lower:
-                nurse_value += seq_value
-            elif "医技" in seq.node_name or "技师" in seq.node_name or \
-                 "tech" in node_name_lower or "technician" in node_name_lower:
-                tech_value += seq_value
+        doctor_value, nurse_value, tech_value = rollup.sequence_values(dept_id_val)
         
         # 确定核算单元标识（使用accounting_unit_code和accounting_unit_name，如果没有则使用科室自己的信息）
         unit_code = dept.accounting_unit_code or dept.his_code
@@ -1537,10 +1405,12 @@ def export_detail(
     from app.utils.hospital_filter import get_current_hospital_id_or_raise
     from app.models.orientation_rule import OrientationRule
     from app.models.reference_value import ReferenceValue
+    from app.services.period_result_loader import PeriodResultLoader
     
     # 验证任务是否存在且属于当前医疗机构
     task = _get_task_with_hospital_check(db, task_id)
     hospital_id = get_current_hospital_id_or_raise()
+    loader = PeriodResultLoader(db, hospital_id)
     
     # 查询所有科室的计算结果（按模型节点排序）
     all_results = db.query(CalculationResult).join(
@@ -1577,10 +1447,7 @@ def export_detail(
         results_by_dept[result.department_id].append(result)
     
     # 获取所有参与核算的科室（is_active=True）
-    all_active_depts = db.query(Department).filter(
-        Department.hospital_id == hospital_id,
-        Department.is_active == True
-    ).order_by(Department.sort_order, Department.id).all()
+    all_active_depts = loader.active_departments()
     
     # 按核算单元分组（与页面显示逻辑一致）
     accounting_units = {}  # key: (unit_code, unit_name), value: {dept_ids, sort_order}
@@ -1597,54 +1464,63 @@ def export_detail(
             }
         accounting_units[unit_key]['dept_ids'].append(dept.id)
     
+    # 按核算单元逐级汇总（同一核算单元下各科室的同一节点合并）
+    unit_key_by_dept = {
+        dept_id: unit_key
+        for unit_key, unit_data in accounting_units.items()
+        for dept_id in unit_data['dept_ids']
+    }
+    sequence_types = load_sequence_types(db, all_results)
+    unit_rollup = ResultRollup(
+        all_results,
+        group_key=lambda r: unit_key_by_dept.get(r.department_id),
+        sequence_types=sequence_types
+    )
+    
     # 为每个核算单元生成明细数据
     departments_data = []
     
     # 按sort_order排序
     sorted_units = sorted(accounting_units.items(), key=lambda x: x[1]['sort_order'])
     
-    for (unit_code, unit_name), unit_data in sorted_units:
-        # 合并该核算单元下所有科室的计算结果
-        combined_results = []
-        for dept_id in unit_data['dept_ids']:
-            combined_results.extend(results_by_dept.get(dept_id, []))
-        
-        if not combined_results:
+    for unit_key, unit_data in sorted_units:
+        unit_code, unit_name = unit_key
+        if not any(dept_id in results_by_dept for dept_id in unit_data['dept_ids']):
             continue
         
         # 构建树形结构（复用现有逻辑）
-        def build_dimension_tree(parent_id, level, results):
+        def build_dimension_tree(parent_id, level):
             """递归构建维度树"""
             children = []
-            for result in results:
-                if result.parent_id == parent_id and result.node_type == "dimension":
-                    node_info = node_info_map.get(result.node_id)
-                    
-                    # 获取导向规则名称（与页面显示一致）
-                    orientation_names = []
-                    if node_info and node_info.orientation_rule_ids:
-                        orientation_names = [
-                            orientation_rules.get(rule_id, f"规则{rule_id}")
-                            for rule_id in node_info.orientation_rule_ids
-                        ]
-                    business_guide = "、".join(orientation_names) if orientation_names else (node_info.business_guide if node_info else None)
-                    
-                    dim = {
-                        'node_id': result.node_id,
-                        'parent_id': result.parent_id,
-                        'dimension_name': result.node_name,
-                        'dimension_code': result.node_code,
-                        'level': level,
-                        'value': result.value or 0,
-                        'ratio': result.ratio or 0,
-                        'workload': result.workload,
-                        'weight': result.weight,
-                        'original_weight': result.original_weight,
-                        'business_guide': business_guide,
-                        'sort_order': node_info.sort_order if node_info else 999,
-                        'children': build_dimension_tree(result.node_id, level + 1, results)
-                    }
-                    children.append(dim)
+            for result in unit_rollup.children(unit_key, parent_id):
+                own_workload, own_value = unit_rollup.own(unit_key, result.node_id)
+                node_info = node_info_map.get(result.node_id)
+                
+                # 获取导向规则名称（与页面显示一致）
+                orientation_names = []
+                if node_info and node_info.orientation_rule_ids:
+                    orientation_names = [
+                        orientation_rules.get(rule_id, f"规则{rule_id}")
+                        for rule_id in node_info.orientation_rule_ids
+                    ]
+                business_guide = "、".join(orientation_names) if orientation_names else (node_info.business_guide if node_info else None)
+                
+                dim = {
+                    'node_id': result.node_id,
+                    'parent_id': result.parent_id,
+                    'dimension_name': result.node_name,
+                    'dimension_code': result.node_code,
+                    'level': level,
+                    'value': own_value,
+                    'ratio': result.ratio or 0,
+                    'workload': own_workload,
+                    'weight': result.weight,
+                    'original_weight': result.original_weight,
+                    'business_guide': business_guide,
+                    'sort_order': node_info.sort_order if node_info else 999,
+                    'children': build_dimension_tree(result.node_id, level + 1)
+                }
+                children.append(dim)
             # 按sort_order排序（同一父节点下的兄弟节点排序）
             children.sort(key=lambda x: x['sort_order'])
             return children
@@ -1654,29 +1530,11 @@ def export_detail(
             """将维度树转换为表格树形数据"""
             rows = []
             
-            def calculate_sum_from_children(node):
-                """计算节点的工作量和金额"""
-                if not node.get('children') or len(node['children']) == 0:
-                    return node.get('workload') or 0, node.get('value') or 0
-                
-                total_workload = 0
-                total_amount = 0
-                for child in node['children']:
-                    child_workload, child_amount = calculate_sum_from_children(child)
-                    total_workload += child_workload
-                    total_amount += child_amount
-                
-                return total_workload, total_amount
-            
             def build_tree_node(node, siblings_total=None):
                 """构建树形节点数据"""
                 is_leaf = not node.get('children') or len(node['children']) == 0
                 
-                if is_leaf:
-                    current_amount = node.get('value') or 0
-                    current_workload = node.get('workload') or 0
-                else:
-                    current_workload, current_amount = calculate_sum_from_children(node)
+                current_workload, current_amount = unit_rollup.totals(unit_key, node['node_id'])
                 
                 if siblings_total and siblings_total > 0:
                     ratio = (current_amount / siblings_total * 100)
@@ -1712,10 +1570,7 @@ def export_detail(
                     }
                 
                 if node.get('children'):
-                    children_total = sum(
-                        (calculate_sum_from_children(child)[1] if child.get('children') else (child.get('value') or 0))
-                        for child in node['children']
-                    )
+                    children_total = sum(unit_rollup.value(unit_key, child['node_id']) for child in node['children'])
                     
                     for child in node['children']:
                         child_node = build_tree_node(child, children_total)
@@ -1723,10 +1578,7 @@ def export_detail(
                 
                 return tree_node
             
-            first_level_total = sum(
-                (calculate_sum_from_children(dim)[1] if dim.get('children') else (dim.get('value') or 0))
-                for dim in dimensions
-            )
+            first_level_total = sum(unit_rollup.value(unit_key, dim['node_id']) for dim in dimensions)
             
             for dim in dimensions:
                 tree_node = build_tree_node(dim, first_level_total)
@@ -1734,29 +1586,18 @@ def export_detail(
             
             return rows
         
-        # 为每个序列生成数据
-        doctor_rows = []
-        nurse_rows = []
-        tech_rows = []
-        
-        sequences = [r for r in combined_results if r.node_type == "sequence"]
-        
-        for seq in sequences:
-            dimensions = build_dimension_tree(seq.node_id, 1, combined_results)
-            rows = build_tree_rows(dimensions)
-            
-            if "医生" in seq.node_name:
-                doctor_rows = rows
-            elif "护理" in seq.node_name:
-                nurse_rows = rows
-            elif "医技" in seq.node_name:
-                tech_rows = rows
+        # 为每个序列生成数据（按模型节点的序列类别归类）
+        sequence_rows = {}
+        for seq in unit_rollup.sequences(unit_key):
+            sequence_type = unit_rollup.sequence_type(seq.node_id)
+            if sequence_type in SEQUENCE_TYPES:
+                sequence_rows[sequence_type] = build_tree_rows(build_dimension_tree(seq.node_id, 1))
         
         departments_data.append({
             'dept_name': unit_name,
-            'doctor': doctor_rows,
-            'nurse': nurse_rows,
-            'tech': tech_rows
+            'doctor': sequence_rows.get(SEQUENCE_TYPE_DOCTOR, []),
+            'nurse': sequence_rows.get(SEQUENCE_TYPE_NURSE, []),
+            'tech': sequence_rows.get(SEQUENCE_TYPE_TECH, [])
         })
     
     # 获取医院名称
@@ -1804,52 +1645,38 @@ def export_detail(
         if result.value:
             agg['value'] += result.value
     
+    # 全院逐级汇总（所有科室的同一节点合并）
+    hospital_rollup = ResultRollup(all_results, group_key=lambda r: None, sequence_types=sequence_types)
+    
     # 构建全院汇总的树形结构
     def build_hospital_dimension_tree(parent_id, level):
         children = []
-        for node_id, agg in node_aggregated.items():
-            if agg['parent_id'] == parent_id and agg['node_type'] == "dimension":
-                node_info = node_info_map.get(agg['node_id'])
-                dim = {
-                    'node_id': agg['node_id'],
-                    'parent_id': agg['parent_id'],
-                    'dimension_name': agg['node_name'],
-                    'dimension_code': agg['node_code'],
-                    'level': level,
-                    'value': agg['value'] or 0,
-                    'ratio': 0,
-                    'workload': agg['workload'],
-                    'weight': agg['weight'],
-                    'business_guide': agg['business_guide'],
-                    'sort_order': node_info.sort_order if node_info else 999,
-                    'children': build_hospital_dimension_tree(agg['node_id'], level + 1)
-                }
-                children.append(dim)
+        for child in hospital_rollup.children(None, parent_id):
+            agg = node_aggregated[child.node_id]
+            node_info = node_info_map.get(agg['node_id'])
+            dim = {
+                'node_id': agg['node_id'],
+                'parent_id': agg['parent_id'],
+                'dimension_name': agg['node_name'],
+                'dimension_code': agg['node_code'],
+                'level': level,
+                'value': agg['value'] or 0,
+                'ratio': 0,
+                'workload': agg['workload'],
+                'weight': agg['weight'],
+                'business_guide': agg['business_guide'],
+                'sort_order': node_info.sort_order if node_info else 999,
+                'children': build_hospital_dimension_tree(agg['node_id'], level + 1)
+            }
+            children.append(dim)
         children.sort(key=lambda x: x['sort_order'])
         return children
     
     def build_hospital_tree_rows(dimensions):
         rows = []
         
-        def calculate_sum_from_children(node):
-            if not node.get('children') or len(node['children']) == 0:
-                return node.get('workload') or 0, node.get('value') or 0
-            total_workload = 0
-            total_amount = 0
-            for child in node['children']:
-                child_workload, child_amount = calculate_sum_from_children(child)
-                total_workload += child_workload
-                total_amount += child_amount
-            return total_workload, total_amount
-        
         def build_tree_node(node, siblings_total=None):
-            is_leaf = not node.get('children') or len(node['children']) == 0
-            
-            if is_leaf:
-                current_amount = node.get('value') or 0
-                current_workload = node.get('workload') or 0
-            else:
-                current_workload, current_amount = calculate_sum_from_children(node)
+            current_workload, current_amount = hospital_rollup.totals(None, node['node_id'])
             
             if siblings_total and siblings_total > 0:
                 ratio = (float(current_amount) / float(siblings_total) * 100)
@@ -1869,20 +1696,14 @@ def export_detail(
             
             if node.get('children'):
                 tree_node["children"] = []
-                children_total = sum(
-                    (calculate_sum_from_children(child)[1] if child.get('children') else (child.get('value') or 0))
-                    for child in node['children']
-                )
+                children_total = sum(hospital_rollup.value(None, child['node_id']) for child in node['children'])
                 for child in node['children']:
                     child_node = build_tree_node(child, children_total)
                     tree_node["children"].append(child_node)
             
             return tree_node
         
-        first_level_total = sum(
-            (calculate_sum_from_children(dim)[1] if dim.get('children') else (dim.get('value') or 0))
-            for dim in dimensions
-        )
+        first_level_total = sum(hospital_rollup.value(None, dim['node_id']) for dim in dimensions)
         
         for dim in dimensions:
             tree_node = build_tree_node(dim, first_level_total)
@@ -1892,70 +1713,12 @@ def export_detail(
     
     # 生成全院汇总的各序列数据
     hospital_detail_data = {'doctor': [], 'nurse': [], 'tech': []}
-    for node_id, agg in node_aggregated.items():
-        if agg['node_type'] == "sequence":
-            dimensions = build_hospital_dimension_tree(agg['node_id'], 1)
-            rows = build_hospital_tree_rows(dimensions)
-            
-            if "医生" in agg['node_name']:
-                hospital_detail_data['doctor'] = rows
-            elif "护理" in agg['node_name']:
-                hospital_detail_data['nurse'] = rows
-            elif "医技" in agg['node_name']:
-                hospital_detail_data['tech'] = rows
-    
-    # 生成汇总表数据（复用汇总API的逻辑）
-    def calculate_sum_from_children_for_summary(node_id, results):
-        """递归计算节点的价值（从子节点汇总）"""
-        current_node = next((r for r in results if r.node_id == node_id), None)
-        if not current_node:
-            return Decimal('0')
-        children = [r for r in results if r.parent_id == node_id and r.node_type == "dimension"]
-        if not children:
-            return current_node.value or Decimal('0')
-        total_value = Decimal('0')
-        for child in children:
-            child_value = calculate_sum_from_children_for_summary(child.node_id, results)
-            total_value += child_value
-        return total_value
-    
-    # 辅助函数：获取任务的汇总数据（按科室代码索引）
-    def get_task_summary_by_dept_code(task_id_param):
-        """获取指定任务的汇总数据，返回按科室代码索引的字典"""
-        if not task_id_param:
-            return {}
-        
-        compare_results = db.query(CalculationResult).filter(
-            CalculationResult.task_id == task_id_param
-        ).all()
-        
-        if not compare_results:
-            return {}
-        
-        # 按科室分组
-        compare_by_dept = defaultdict(list)
-        for result in compare_results:
-            compare_by_dept[result.department_id].append(result)
-        
-        # 按核算单元汇总
-        compare_units = {}
-        for dept in all_active_depts:
-            dept_id_val = dept.id
-            results = compare_by_dept.get(dept_id_val, [])
-            
-            sequences = [r for r in results if r.node_type == "sequence"]
-            total_val = Decimal('0')
-            
-            for seq in sequences:
-                seq_value = calculate_sum_from_children_for_summary(seq.node_id, results)
-                total_val += seq_value
-            
-            unit_code = dept.accounting_unit_code or dept.his_code
-            if unit_code not in compare_units:
-                compare_units[unit_code] = Decimal('0')
-            compare_units[unit_code] += total_val
-        
-        return compare_units
+    for seq in hospital_rollup.sequences(None):
+        sequence_type = hospital_rollup.sequence_type(seq.node_id)
+        if sequence_type in SEQUENCE_TYPES:
+            hospital_detail_data[sequence_type] = build_hospital_tree_rows(
+                build_hospital_dimension_tree(seq.node_id, 1)
+            )
     
     # 获取参考值数据（按科室代码索引）
     reference_values = {}
@@ -1967,32 +1730,15 @@ def export_detail(
         reference_values[ref.department_code] = ref.reference_value
     
     # 获取环比数据
-    mom_summary = get_task_summary_by_dept_code(mom_task_id)
+    mom_summary = loader.unit_totals(mom_task_id)
     
     # 获取同比数据
-    yoy_summary = get_task_summary_by_dept_code(yoy_task_id)
+    yoy_summary = loader.unit_totals(yoy_task_id)
     
     # 按核算单元计算汇总
     summary_by_unit = {}
     for (unit_code, unit_name), unit_data in sorted_units:
-        combined_results = []
-        for dept_id in unit_data['dept_ids']:
-            combined_results.extend(results_by_dept.get(dept_id, []))
-        
-        sequences = [r for r in combined_results if r.node_type == "sequence"]
-        doctor_value = Decimal('0')
-        nurse_value = Decimal('0')
-        tech_value = Decimal('0')
-        
-        for seq in sequences:
-            seq_value = calculate_sum_from_children_for_summary(seq.node_id, combined_results)
-            if "医生" in seq.node_name:
-                doctor_value += seq_value
-            elif "护理" in seq.node_name:
-                nurse_value += seq_value
-            elif "医技" in seq.node_name:
-                tech_value += seq_value
-        
+        doctor_value, nurse_value, tech_value = unit_rollup.sequence_values((unit_code, unit_name))
         total_val = doctor_value + nurse_value + tech_value
         
         # 获取参考值
@@ -2211,76 +1957,69 @@ def export_hospital_detail(
             }
         accounting_units[unit_key]['dept_ids'].append(dept.id)
     
+    # 按核算单元逐级汇总（同一核算单元下各科室的同一节点合并）
+    unit_key_by_dept = {
+        dept_id: unit_key
+        for unit_key, unit_data in accounting_units.items()
+        for dept_id in unit_data['dept_ids']
+    }
+    sequence_types = load_sequence_types(db, all_results)
+    unit_rollup = ResultRollup(
+        all_results,
+        group_key=lambda r: unit_key_by_dept.get(r.department_id),
+        sequence_types=sequence_types
+    )
+    
     # 为每个核算单元生成明细数据（复用export_detail的逻辑）
     departments_data = []
     sorted_units = sorted(accounting_units.items(), key=lambda x: x[1]['sort_order'])
     
-    for (unit_code, unit_name), unit_data in sorted_units:
-        combined_results = []
-        for dept_id in unit_data['dept_ids']:
-            combined_results.extend(results_by_dept.get(dept_id, []))
-        
-        if not combined_results:
+    for unit_key, unit_data in sorted_units:
+        unit_code, unit_name = unit_key
+        if not any(dept_id in results_by_dept for dept_id in unit_data['dept_ids']):
             continue
         
         # 构建树形结构
-        def build_dimension_tree(parent_id, level, results):
+        def build_dimension_tree(parent_id, level):
             children = []
-            for result in results:
-                if result.parent_id == parent_id and result.node_type == "dimension":
-                    node_info = node_info_map.get(result.node_id)
-                    
-                    orientation_names = []
-                    if node_info and node_info.orientation_rule_ids:
-                        orientation_names = [
-                            orientation_rules.get(rule_id, f"规则{rule_id}")
-                            for rule_id in node_info.orientation_rule_ids
-                        ]
-                    business_guide = "、".join(orientation_names) if orientation_names else (node_info.business_guide if node_info else None)
-                    
-                    dim = {
-                        'node_id': result.node_id,
-                        'parent_id': result.parent_id,
-                        'dimension_name': result.node_name,
-                        'dimension_code': result.node_code,
-                        'level': level,
-                        'value': result.value or 0,
-                        'ratio': result.ratio or 0,
-                        'workload': result.workload,
-                        'weight': result.weight,
-                        'original_weight': result.original_weight,
-                        'business_guide': business_guide,
-                        'sort_order': node_info.sort_order if node_info else 999,
-                        'children': build_dimension_tree(result.node_id, level + 1, results)
-                    }
-                    children.append(dim)
-            children.sort(key=lambda x: x['sort_order'])
-            return children
-        
-        def build_tree_rows(dimensions):
-            rows = []
-            
-            def calculate_sum_from_children(node):
-                if not node.get('children') or len(node['children']) == 0:
-                    return node.get('workload') or 0, node.get('value') or 0
+            for result in unit_rollup.children(unit_key, parent_id):
+                own_workload, own_value = unit_rollup.own(unit_key, result.node_id)
+                node_info = node_info_map.get(result.node_id)
                 
-                total_workload = 0
-                total_amount = 0
-                for child in node['children']:
-                    child_workload, child_amount = calculate_sum_from_children(child)
-                    total_workload += child_workload
-                    total_amount += child_amount
+                orientation_names = []
+                if node_info and node_info.orientation_rule_ids:
+                    orientation_names = [
+                        orientation_rules.get(rule_id, f"规则{rule_id}")
+                        for rule_id in node_info.orientation_rule_ids
+                    ]
+                business_guide = "、".join(orientation_names) if orientation_names else (node_info.business_guide if node_info else None)
                 
-                return total_workload, total_amount
-            
-            def build_tree_node(node, siblings_total=None):
-                is_leaf = not node.get('children') or len(node['children']) == 0
+                dim = {
+                    'node_id': result.node_id,
+                    'parent_id': result.parent_id,
+                    'dimension_name': result.node_name,
+                    'dimension_code': result.node_code,
+                    'level': level,
+                    'value': own_value,
+                    'ratio': result.ratio or 0,
+                    'workload': own_workload,
+                    'weight': result.weight,
+                    'original_weight': result.original_weight,
+                    'business_guide': business_guide,
+                    'sort_order': node_info.sort_order if node_info else 999,
+                    'children': build_dimension_tree(result.node_id, level + 1)
+                }
+                children.append(dim)
+            children.sort(key=lambda x: x['sort_order'])
+            return children
+        
+        def build_tree_rows(dimensions):
+            rows = []
+            
+            def build_tree_node(node, siblings_total=None):
+                is_leaf = not node.get('children') or len(node['children']) == 0
                 
-                if is_leaf:
-                    current_amount = node.get('value') or 0
-                    current_workload = node.get('workload') or 0
-                else:
-                    current_workload, current_amount = calculate_sum_from_children(node)
+                current_workload, current_amount = unit_rollup.totals(unit_key, node['node_id'])
                 
                 if siblings_total and siblings_total > 0:
                     ratio = (current_amount / siblings_total * 100)
@@ -2315,10 +2054,7 @@ def export_hospital_detail(
                     }
                 
                 if node.get('children'):
-                    children_total = sum(
-                        (calculate_sum_from_children(child)[1] if child.get('children') else (child.get('value') or 0))
-                        for child in node['children']
-                    )
+                    children_total = sum(unit_rollup.value(unit_key, child['node_id']) for child in node['children'])
                     
                     for child in node['children']:
                         child_node = build_tree_node(child, children_total)
@@ -2326,10 +2062,7 @@ def export_hospital_detail(
                 
                 return tree_node
             
-            first_level_total = sum(
-                (calculate_sum_from_children(dim)[1] if dim.get('children') else (dim.get('value') or 0))
-                for dim in dimensions
-            )
+            first_level_total = sum(unit_rollup.value(unit_key, dim['node_id']) for dim in dimensions)
             
             for dim in dimensions:
                 tree_node = build_tree_node(dim, first_level_total)
@@ -2337,28 +2070,17 @@ def export_hospital_detail(
             
             return rows
         
-        doctor_rows = []
-        nurse_rows = []
-        tech_rows = []
-        
-        sequences = [r for r in combined_results if r.node_type == "sequence"]
-        
-        for seq in sequences:
-            dimensions = build_dimension_tree(seq.node_id, 1, combined_results)
-            rows = build_tree_rows(dimensions)
-            
-            if "医生" in seq.node_name:
-                doctor_rows = rows
-            elif "护理" in seq.node_name:
-                nurse_rows = rows
-            elif "医技" in seq.node_name:
-                tech_rows = rows
+        sequence_rows = {}
+        for seq in unit_rollup.sequences(unit_key):
+            sequence_type = unit_rollup.sequence_type(seq.node_id)
+            if sequence_type in SEQUENCE_TYPES:
+                sequence_rows[sequence_type] = build_tree_rows(build_dimension_tree(seq.node_id, 1))
         
         departments_data.append({
             'dept_name': unit_name,
-            'doctor': doctor_rows,
-            'nurse': nurse_rows,
-            'tech': tech_rows
+            'doctor': sequence_rows.get(SEQUENCE_TYPE_DOCTOR, []),
+            'nurse': sequence_rows.get(SEQUENCE_TYPE_NURSE, []),
+            'tech': sequence_rows.get(SEQUENCE_TYPE_TECH, [])
         })
     
     # 获取医院名称
@@ -2393,9 +2115,61 @@ def download_export(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """下载报表文件"""
-    # TODO: 实现文件下载
-    raise HTTPException(status_code=501, detail="功能开发中")
+    """下载后台生成的报表文件
+    
+    文件尚未生成时返回 202 和后台任务状态；导出ID未登记、属于其他医疗机构
+    或已超过保留期限被清理时返回 404。
+    """
+    from datetime import timedelta
+    from fastapi.responses import FileResponse, JSONResponse
+    from urllib.parse import quote
+    from app.celery_app import celery_app
+    from app.tasks.calculation_tasks import export_batch_reports_task
+    from app.utils.hospital_filter import get_current_hospital_id_or_raise
+    from app.services.batch_report_service import BatchReportService
+    import os
+    
+    try:
+        export_id = str(uuid.UUID(task_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的导出任务ID")
+    
+    hospital_id = get_current_hospital_id_or_raise()
+    
+    # 只能下载当前医疗机构发起的导出
+    export = BatchReportService.get_export(db, hospital_id, export_id)
+    if not export:
+        raise HTTPException(status_code=404, detail="导出任务不存在或已过期")
+    if export.status == "failed":
+        raise HTTPException(status_code=500, detail=f"报表生成失败: {export.error_message}")
+    
+    file_path = BatchReportService.find_export_file(hospital_id, export_id)
+    if file_path:
+        encoded_filename = quote(os.path.basename(file_path))
+        return FileResponse(
+            file_path,
+            media_type="application/zip",
+            headers={
+                "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
+                "Access-Control-Expose-Headers": "Content-Disposition"
+            }
+        )
+    
+    if export.status == "completed":
+        raise HTTPException(status_code=404, detail="导出文件已被清理")
+    
+    # 后台任务超过时限仍未记录结果（如工作进程被终止），不再让客户端继续轮询
+    if utc_now() - export.created_at > timedelta(seconds=export_batch_reports_task.time_limit):
+        raise HTTPException(status_code=500, detail="报表生成超时")
+    
+    result = celery_app.AsyncResult(export_id)
+    if result.state == "FAILURE":
+        raise HTTPException(status_code=500, detail=f"报表生成失败: {result.info}")
+    
+    return JSONResponse(
+        status_code=202,
+        content={"task_id": export_id, "status": result.state.lower(), "detail": "报表生成中"}
+    )
 
 
 @router.get("/batches", response_model=BatchListResponse)
@@ -2474,6 +2248,7 @@ def get_batch_list(
 @router.get("/results/export/batch/{batch_id}")
 def export_batch_reports(
     batch_id: str,
+    async_job: bool = Query(False, description="是否在后台生成，完成后通过下载接口获取"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -2481,18 +2256,14 @@ def export_batch_reports(
     
     将批次中每个任务的报表打包到一个ZIP文件中，每个任务一个子目录。
     对于同比/环比，如果缺少对应月份的数据，则汇总表中不计算同比/环比。
+    报表逐个生成并流式写出；async_job=true 时由后台任务生成，返回下载地址。
     """
     from fastapi.responses import StreamingResponse
-    from app.services.export_service import ExportService
     from urllib.parse import quote
-    from collections import defaultdict
-    from decimal import Decimal
     from app.utils.hospital_filter import get_current_hospital_id_or_raise
-    from app.models.hospital import Hospital
-    from app.models.orientation_rule import OrientationRule
-    from app.models.reference_value import ReferenceValue
-    from io import BytesIO
-    import zipfile
+    from app.services.batch_report_service import BatchReportService
+    from app.utils.zip_stream import iter_zip_stream
+    from app.tasks.calculation_tasks import export_batch_reports_task
     
     hospital_id = get_current_hospital_id_or_raise()
     
@@ -2509,544 +2280,35 @@ def export_batch_reports(
     if not tasks:
         raise HTTPException(status_code=404, detail="批次不存在或没有已完成的任务")
     
-    # 获取医院名称
-    hospital = db.query(Hospital).filter(Hospital.id == hospital_id).first()
-    hospital_name = hospital.name if hospital else "未知医院"
-    
-    # 获取版本号
-    version = tasks[0].model_version.version if tasks[0].model_version else None
-    
-    # 按月份组织任务，找出当期、环比、同比
-    tasks_by_period = {task.period: task for task in tasks}
-    periods = sorted(tasks_by_period.keys())
-    
-    # 确定当期任务（最新月份）
-    current_period = periods[-1] if periods else None
-    if not current_period:
-        raise HTTPException(status_code=404, detail="批次中没有有效任务")
-    
-    current_task = tasks_by_period[current_period]
-    
-    # 计算环比和同比月份
-    def get_mom_period(period: str) -> str:
-        """获取环比月份（上月）"""
-        year, month = map(int, period.split('-'))
-        if month == 1:
-            return f"{year - 1}-12"
-        return f"{year}-{str(month - 1).zfill(2)}"
-    
-    def get_yoy_period(period: str) -> str:
-        """获取同比月份（去年同月）"""
-        year, month = map(int, period.split('-'))
-        return f"{year - 1}-{str(month).zfill(2)}"
-    
-    mom_period = get_mom_period(current_period)
-    yoy_period = get_yoy_period(current_period)
-    
-    mom_task = tasks_by_period.get(mom_period)
-    yoy_task = tasks_by_period.get(yoy_period)
-    
-    # 创建主ZIP文件
-    main_zip_buffer = BytesIO()
-    
-    with zipfile.ZipFile(main_zip_buffer, 'w', zipfile.ZIP_DEFLATED) as main_zip:
-        # 为每个任务生成报表
-        for task in tasks:
-            task_period = task.period
-            
-            # 确定该任务的环比和同比任务
-            task_mom_period = get_mom_period(task_period)
-            task_yoy_period = get_yoy_period(task_period)
-            task_mom_task = tasks_by_period.get(task_mom_period)
-            task_yoy_task = tasks_by_period.get(task_yoy_period)
-            
-            # 生成该任务的报表数据
-            task_reports = _generate_task_reports(
-                db, task, hospital_id, hospital_name, version,
-                task_mom_task, task_yoy_task
-            )
-            
-            # 将报表添加到ZIP中，使用月份作为子目录
-            folder_name = f"{task_period}"
-            
-            for filename, file_content in task_reports.items():
-                main_zip.writestr(f"{folder_name}/{filename}", file_content)
-    
-    main_zip_buffer.seek(0)
+    if async_job:
+        export_id = str(uuid.uuid4())
+        BatchReportService.create_export(db, export_id, hospital_id, batch_id)
+        export_batch_reports_task.apply_async(
+            kwargs={
+                "export_id": export_id,
+                "batch_id": batch_id,
+                "hospital_id": hospital_id,
+                "task_ids": [task.task_id for task in tasks],
+            },
+            task_id=export_id
+        )
+        return ExportTaskResponse(
+            task_id=export_id,
+            download_url=f"/api/v1/calculation/results/export/{export_id}/download"
+        )
     
-    # 返回文件流
-    version_suffix = f"_{version}" if version else ""
-    filename = f"{hospital_name}_批次报表_{batch_id[-8:]}{version_suffix}.zip"
+    hospital_name = BatchReportService.get_hospital_name(db, hospital_id)
+    filename = BatchReportService.get_archive_filename(hospital_name, batch_id, tasks)
     encoded_filename = quote(filename)
     
+    # 报表在响应写出时逐个生成，会话在响应结束后才关闭
     return StreamingResponse(
-        main_zip_buffer,
+        iter_zip_stream(
+            BatchReportService.iter_batch_reports(db, tasks, hospital_id, hospital_name)
+        ),
         media_type="application/zip",
         headers={
             "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
             "Access-Control-Expose-Headers": "Content-Disposition"
         }
     )
-
-
-def _generate_task_reports(
-    db: Session,
-    task: CalculationTask,
-    hospital_id: int,
-    hospital_name: str,
-    version: str,
-    mom_task: Optional[CalculationTask],
-    yoy_task: Optional[CalculationTask]
-) -> dict:
-    """生成单个任务的所有报表
-    
-    返回字典：{文件名: 文件内容(bytes)}
-    """
-    from app.services.export_service import ExportService
-    from collections import defaultdict
-    from decimal import Decimal
-    from app.models.reference_value import ReferenceValue
-    from app.models.orientation_rule import OrientationRule
-    
-    reports = {}
-    version_suffix = ExportService._format_version(version)
-    
-    # 获取所有参与核算的科室
-    all_active_depts = db.query(Department).filter(
-        Department.hospital_id == hospital_id,
-        Department.is_active == True
-    ).order_by(Department.sort_order, Department.id).all()
-    
-    dept_map = {d.id: d for d in all_active_depts}
-    
-    # 查询当期计算结果
-    all_results = db.query(CalculationResult).filter(
-        CalculationResult.task_id == task.task_id
-    ).all()
-    
-    results_by_dept = defaultdict(list)
-    for result in all_results:
-        results_by_dept[result.department_id].append(result)
-    
-    # 查询模型节点信息
-    node_ids = list(set([r.node_id for r in all_results]))
-    model_nodes = db.query(ModelNode).filter(ModelNode.id.in_(node_ids)).all() if node_ids else []
-    node_info_map = {node.id: node for node in model_nodes}
-    
-    # 查询导向规则名称映射
-    orientation_rule_ids = set()
-    for node in model_nodes:
-        if node.orientation_rule_ids:
-            orientation_rule_ids.update(node.orientation_rule_ids)
-    
-    orientation_rules = {}
-    if orientation_rule_ids:
-        rules = db.query(OrientationRule).filter(OrientationRule.id.in_(orientation_rule_ids)).all()
-        orientation_rules = {rule.id: rule.name for rule in rules}
-    
-    # 查询参考价值
-    ref_values = db.query(ReferenceValue).filter(
-        ReferenceValue.hospital_id == hospital_id,
-        ReferenceValue.period == task.period
-    ).all()
-    ref_value_map = {rv.department_code: rv.reference_value for rv in ref_values}
-    
-    # 查询环比数据
-    mom_summary = {}
-    if mom_task:
-        mom_results = db.query(CalculationResult).filter(
-            CalculationResult.task_id == mom_task.task_id
-        ).all()
-        mom_by_dept = defaultdict(list)
-        for r in mom_results:
-            mom_by_dept[r.department_id].append(r)
-        
-        for dept in all_active_depts:
-            unit_code = dept.accounting_unit_code or dept.his_code
-            dept_results = mom_by_dept.get(dept.id, [])
-            total_value = _calculate_dept_total_value(dept_results)
-            if unit_code not in mom_summary:
-                mom_summary[unit_code] = Decimal('0')
-            mom_summary[unit_code] += total_value
-    
-    # 查询同比数据
-    yoy_summary = {}
-    if yoy_task:
-        yoy_results = db.query(CalculationResult).filter(
-            CalculationResult.task_id == yoy_task.task_id
-        ).all()
-        yoy_by_dept = defaultdict(list)
-        for r in yoy_results:
-            yoy_by_dept[r.department_id].append(r)
-        
-        for dept in all_active_depts:
-            unit_code = dept.accounting_unit_code or dept.his_code
-            dept_results = yoy_by_dept.get(dept.id, [])
-            total_value = _calculate_dept_total_value(dept_results)
-            if unit_code not in yoy_summary:
-                yoy_summary[unit_code] = Decimal('0')
-            yoy_summary[unit_code] += total_value
-    
-    # 按核算单元分组
-    accounting_units = {}
-    for dept in all_active_depts:
-        unit_code = dept.accounting_unit_code or dept.his_code
-        unit_name = dept.accounting_unit_name or dept.his_name
-        unit_key = (unit_code, unit_name)
-        
-        if unit_key not in accounting_units:
-            accounting_units[unit_key] = {
-                'dept_ids': [],
-                'sort_order': dept.sort_order
-            }
-        accounting_units[unit_key]['dept_ids'].append(dept.id)
-    
-    sorted_units = sorted(accounting_units.items(), key=lambda x: x[1]['sort_order'])
-    
-    # 计算汇总数据
-    summary_by_unit = {}
-    for (unit_code, unit_name), unit_data in sorted_units:
-        combined_results = []
-        for dept_id in unit_data['dept_ids']:
-            combined_results.extend(results_by_dept.get(dept_id, []))
-        
-        doctor_value, nurse_value, tech_value = _calculate_sequence_values(combined_results)
-        total_val = doctor_value + nurse_value + tech_value
-        
-        # 参考价值
-        ref_value = ref_value_map.get(unit_code)
-        actual_ref_ratio = None
-        if ref_value is not None and ref_value != 0:
-            actual_ref_ratio = float(total_val / ref_value)
-        
-        # 环比
-        mom_value = mom_summary.get(unit_code)
-        mom_ratio = None
-        if mom_value is not None and mom_value != 0:
-            mom_ratio = float(total_val / mom_value)
-        
-        # 同比
-        yoy_value = yoy_summary.get(unit_code)
-        yoy_ratio = None
-        if yoy_value is not None and yoy_value != 0:
-            yoy_ratio = float(total_val / yoy_value)
-        
-        summary_by_unit[(unit_code, unit_name)] = {
-            'doctor_value': doctor_value,
-            'nurse_value': nurse_value,
-            'tech_value': tech_value,
-            'total_value': total_val,
-            'doctor_ratio': float(doctor_value / total_val * 100) if total_val > 0 else 0,
-            'nurse_ratio': float(nurse_value / total_val * 100) if total_val > 0 else 0,
-            'tech_ratio': float(tech_value / total_val * 100) if total_val > 0 else 0,
-            'reference_value': float(ref_value) if ref_value is not None else None,
-            'actual_reference_ratio': actual_ref_ratio,
-            'mom_value': float(mom_value) if mom_value is not None else None,
-            'mom_ratio': mom_ratio,
-            'yoy_value': float(yoy_value) if yoy_value is not None else None,
-            'yoy_ratio': yoy_ratio
-        }
-    
-    # 构建汇总表数据
-    total_doctor = sum(v['doctor_value'] for v in summary_by_unit.values())
-    total_nurse = sum(v['nurse_value'] for v in summary_by_unit.values())
-    total_tech = sum(v['tech_value'] for v in summary_by_unit.values())
-    total_all = total_doctor + total_nurse + total_tech
-    
-    # 计算全院汇总的参考值、环比、同比
-    total_reference_value = Decimal('0')
-    total_mom_value = Decimal('0')
-    total_yoy_value = Decimal('0')
-    has_reference = False
-    has_mom = bool(mom_task)
-    has_yoy = bool(yoy_task)
-    
-    for v in summary_by_unit.values():
-        if v['reference_value'] is not None:
-            has_reference = True
-            total_reference_value += Decimal(str(v['reference_value']))
-        if v['mom_value'] is not None:
-            total_mom_value += Decimal(str(v['mom_value']))
-        if v['yoy_value'] is not None:
-            total_yoy_value += Decimal(str(v['yoy_value']))
-    
-    summary_actual_ref_ratio = None
-    if has_reference and total_reference_value != 0:
-        summary_actual_ref_ratio = float(total_all / total_reference_value)
-    
-    summary_mom_ratio = None
-    if has_mom and total_mom_value != 0:
-        summary_mom_ratio = float(total_all / total_mom_value)
-    
-    summary_yoy_ratio = None
-    if has_yoy and total_yoy_value != 0:
-        summary_yoy_ratio = float(total_all / total_yoy_value)
-    
-    summary_data = {
-        'summary': {
-            'department_id': 0,
-            'department_code': None,
-            'department_name': '全院汇总',
-            'doctor_value': total_doctor,
-            'doctor_ratio': float(total_doctor / total_all * 100) if total_all > 0 else 0,
-            'nurse_value': total_nurse,
-            'nurse_ratio': float(total_nurse / total_all * 100) if total_all > 0 else 0,
-            'tech_value': total_tech,
-            'tech_ratio': float(total_tech / total_all * 100) if total_all > 0 else 0,
-            'total_value': total_all,
-            'reference_value': float(total_reference_value) if has_reference else None,
-            'actual_reference_ratio': summary_actual_ref_ratio,
-            'mom_value': float(total_mom_value) if has_mom else None,
-            'mom_ratio': summary_mom_ratio,
-            'yoy_value': float(total_yoy_value) if has_yoy else None,
-            'yoy_ratio': summary_yoy_ratio
-        },
-        'departments': [
-            {
-                'department_id': accounting_units[(unit_code, unit_name)]['dept_ids'][0] if accounting_units[(unit_code, unit_name)]['dept_ids'] else 0,
-                'department_code': unit_code,
-                'department_name': unit_name,
-                **summary_by_unit[(unit_code, unit_name)]
-            }
-            for (unit_code, unit_name), _ in sorted_units
-            if (unit_code, unit_name) in summary_by_unit
-        ]
-    }
-    
-    # 生成汇总表Excel
-    summary_excel = ExportService.export_summary_to_excel(summary_data, task.period, hospital_name, version)
-    summary_filename = f"{hospital_name}_科室业务价值汇总_{task.period}{version_suffix}.xlsx"
-    reports[summary_filename] = summary_excel.getvalue()
-    
-    # 生成全院明细表
-    hospital_detail_data = _build_hospital_detail_data(all_results, node_info_map, orientation_rules)
-    if hospital_detail_data:
-        hospital_excel = ExportService.export_hospital_detail_to_excel(task.period, hospital_detail_data, hospital_name, version)
-        hospital_filename = f"{hospital_name}_全院业务价值明细_{task.period}{version_suffix}.xlsx"
-        reports[hospital_filename] = hospital_excel.getvalue()
-    
-    # 生成各科室明细表
-    for (unit_code, unit_name), unit_data in sorted_units:
-        combined_results = []
-        for dept_id in unit_data['dept_ids']:
-            combined_results.extend(results_by_dept.get(dept_id, []))
-        
-        if not combined_results:
-            continue
-        
-        detail_data = _build_dept_detail_data(combined_results, node_info_map, orientation_rules)
-        
-        detail_excel = ExportService.export_detail_to_excel(unit_name, task.period, detail_data, hospital_name, version)
-        detail_filename = f"{hospital_name}_{unit_name}_业务价值明细_{task.period}{version_suffix}.xlsx"
-        reports[detail_filename] = detail_excel.getvalue()
-    
-    return reports
-
-
-def _calculate_dept_total_value(results: list) -> Decimal:
-    """计算科室总价值"""
-    from decimal import Decimal
-    
-    def calculate_sum_from_children(node_id, results):
-        current_node = next((r for r in results if r.node_id == node_id), None)
-        if not current_node:
-            return Decimal('0')
-        
-        children = [r for r in results if r.parent_id == node_id and r.node_type == "dimension"]
-        
-        if not children:
-            return current_node.value or Decimal('0')
-        
-        total_value = Decimal('0')
-        for child in children:
-            child_value = calculate_sum_from_children(child.node_id, results)
-            total_value += child_value
-        
-        return total_value
-    
-    sequences = [r for r in results if r.node_type == "sequence"]
-    total = Decimal('0')
-    for seq in sequences:
-        total += calculate_sum_from_children(seq.node_id, results)
-    
-    return total
-
-
-def _calculate_sequence_values(results: list) -> tuple:
-    """计算各序列价值，返回(doctor, nurse, tech)"""
-    from decimal import Decimal
-    
-    def calculate_sum_from_children(node_id, results):
-        current_node = next((r for r in results if r.node_id == node_id), None)
-        if not current_node:
-            return Decimal('0')
-        
-        children = [r for r in results if r.parent_id == node_id and r.node_type == "dimension"]
-        
-        if not children:
-            return current_node.value or Decimal('0')
-        
-        total_value = Decimal('0')
-        for child in children:
-            child_value = calculate_sum_from_children(child.node_id, results)
-            total_value += child_value
-        
-        return total_value
-    
-    sequences = [r for r in results if r.node_type == "sequence"]
-    doctor_value = Decimal('0')
-    nurse_value = Decimal('0')
-    tech_value = Decimal('0')
-    
-    for seq in sequences:
-        seq_value = calculate_sum_from_children(seq.node_id, results)
-        node_name_lower = seq.node_name.lower()
-        
-        if "医生" in seq.node_name or "医疗" in seq.node_name or "医师" in seq.node_name or \
-           "doctor" in node_name_lower or "physician" in node_name_lower:
-            doctor_value += seq_value
-        elif "护理" in seq.node_name or "护士" in seq.node_name or \
-             "nurse" in node_name_lower or "nursing" in node_name_lower:
-            nurse_value += seq_value
-        elif "医技" in seq.node_name or "技师" in seq.node_name or \
-             "tech" in node_name_lower or "technician" in node_name_lower:
-            tech_value += seq_value
-    
-    return doctor_value, nurse_value, tech_value
-
-
-def _build_hospital_detail_data(results: list, node_info_map: dict, orientation_rules: dict) -> dict:
-    """构建全院明细数据"""
-    from collections import defaultdict
-    from decimal import Decimal
-    
-    # 按节点ID汇总所有科室的数据
-    node_aggregated = defaultdict(lambda: {
-        'node_id': 0,
-        'node_name': '',
-        'node_code': '',
-        'node_type': '',
-        'parent_id': None,
-        'workload': Decimal('0'),
-        'value': Decimal('0'),
-        'weight': None,
-        'business_guide': None,
-        'sort_order': 999
-    })
-    
-    for result in results:
-        node_id = result.node_id
-        agg = node_aggregated[node_id]
-        
-        if agg['node_id'] == 0:
-            agg['node_id'] = result.node_id
-            agg['node_name'] = result.node_name
-            agg['node_code'] = result.node_code
-            agg['node_type'] = result.node_type
-            agg['parent_id'] = result.parent_id
-            agg['weight'] = result.weight
-            node_info = node_info_map.get(result.node_id)
-            if node_info:
-                agg['business_guide'] = node_info.business_guide
-                agg['sort_order'] = node_info.sort_order
-        
-        if result.workload:
-            agg['workload'] += result.workload
-        if result.value:
-            agg['value'] += result.value
-    
-    # 构建树形结构
-    def build_dimension_tree(parent_id, level):
-        children = []
-        for node_id, agg in node_aggregated.items():
-            if agg['parent_id'] == parent_id and agg['node_type'] == "dimension":
-                node_info = node_info_map.get(agg['node_id'])
-                
-                orientation_names = []
-                if node_info and node_info.orientation_rule_ids:
-                    orientation_names = [
-                        orientation_rules.get(rule_id, f"规则{rule_id}")
-                        for rule_id in node_info.orientation_rule_ids
-                    ]
-                business_guide = "、".join(orientation_names) if orientation_names else agg.get('business_guide')
-                
-                dim = {
-                    'node_id': agg['node_id'],
-                    'dimension_name': agg['node_name'],
-                    'workload': agg['workload'],
-                    'hospital_value': str(agg['weight']) if agg['weight'] is not None else "-",
-                    'business_guide': business_guide or "-",
-                    'amount': agg['value'],
-                    'ratio': 0,
-                    'sort_order': agg['sort_order'],
-                    'children': build_dimension_tree(agg['node_id'], level + 1)
-                }
-                children.append(dim)
-        
-        children.sort(key=lambda x: x['sort_order'])
-        return children
-    
-    # 按序列组织数据
-    hospital_detail_data = {}
-    for node_id, agg in node_aggregated.items():
-        if agg['node_type'] == "sequence":
-            dimensions = build_dimension_tree(agg['node_id'], 1)
-            
-            if "医生" in agg['node_name']:
-                hospital_detail_data['doctor'] = dimensions
-            elif "护理" in agg['node_name']:
-                hospital_detail_data['nurse'] = dimensions
-            elif "医技" in agg['node_name']:
-                hospital_detail_data['tech'] = dimensions
-    
-    return hospital_detail_data
-
-
-def _build_dept_detail_data(results: list, node_info_map: dict, orientation_rules: dict) -> dict:
-    """构建科室明细数据"""
-    
-    def build_dimension_tree(parent_id, level):
-        children = []
-        for result in results:
-            if result.parent_id == parent_id and result.node_type == "dimension":
-                node_info = node_info_map.get(result.node_id)
-                
-                orientation_names = []
-                if node_info and node_info.orientation_rule_ids:
-                    orientation_names = [
-                        orientation_rules.get(rule_id, f"规则{rule_id}")
-                        for rule_id in node_info.orientation_rule_ids
-                    ]
-                business_guide = "、".join(orientation_names) if orientation_names else (node_info.business_guide if node_info else None)
-                
-                dim = {
-                    'node_id': result.node_id,
-                    'dimension_name': result.node_name,
-                    'workload': result.workload,
-                    'hospital_value': str(result.original_weight or result.weight) if (result.original_weight or result.weight) is not None else "-",
-                    'business_guide': business_guide or "-",
-                    'dept_value': str(result.weight) if result.weight is not None else "-",
-                    'amount': result.value or 0,
-                    'ratio': result.ratio or 0,
-                    'sort_order': node_info.sort_order if node_info else 999,
-                    'children': build_dimension_tree(result.node_id, level + 1)
-                }
-                children.append(dim)
-        
-        children.sort(key=lambda x: x['sort_order'])
-        return children
-    
-    detail_data = {}
-    sequences = [r for r in results if r.node_type == "sequence"]
-    
-    for seq in sequences:
-        dimensions = build_dimension_tree(seq.node_id, 1)
-        
-        if "医生" in seq.node_name:
-            detail_data['doctor'] = dimensions
-        elif "护理" in seq.node_name:
-            detail_data['nurse'] = dimensions
-        elif "医技" in seq.node_name:
-            detail_data['tech'] = dimensions
-    
-    return detail_data
@@ -23,6 +23,7 @@ from app.utils.hospital_filter import (
     apply_hospital_filter,
     validate_hospital_access,
 )
+from app.utils.step_dag import remap_step_dependencies
 
 router = APIRouter()
 
@@ -279,6 +280,7 @@ def copy_calculation_workflow(
     ).order_by(CalculationStep.sort_order).all()
     
     step_count = 0
+    step_pairs = []
     for source_step in source_steps:
         new_step = CalculationStep(
             workflow_id=new_workflow.id,
@@ -291,8 +293,13 @@ def copy_calculation_workflow(
             is_enabled=source_step.is_enabled
         )
         db.add(new_step)
+        step_pairs.append((source_step, new_step))
         step_count += 1
     
+    # 获取新步骤ID后重映射步骤依赖
+    db.flush()
+    remap_step_dependencies(step_pairs)
+    
     db.commit()
     
     return {
@@ -250,10 +250,10 @@ async def parse_excel(
     from app.config.import_configs import CHARGE_ITEM_IMPORT_CONFIG
     
     # 验证文件格式
-    if not file.filename or not file.filename.lower().endswith('.xlsx'):
+    if not file.filename or not file.filename.lower().endswith(('.xlsx', '.csv')):
         raise HTTPException(
             status_code=400, 
-            detail="仅支持 .xlsx 格式文件，请使用 Excel 2007 及以上版本保存"
+            detail="仅支持 .xlsx 或 .csv 格式文件，请使用 Excel 2007 及以上版本保存"
         )
     
     # 读取文件内容
@@ -286,10 +286,10 @@ async def import_excel(
     hospital_id = get_user_hospital_id(current_user)
     
     # 验证文件格式
-    if not file.filename or not file.filename.lower().endswith('.xlsx'):
+    if not file.filename or not file.filename.lower().endswith(('.xlsx', '.csv')):
         raise HTTPException(
             status_code=400, 
-            detail="仅支持 .xlsx 格式文件，请使用 Excel 2007 及以上版本保存"
+            detail="仅支持 .xlsx 或 .csv 格式文件，请使用 Excel 2007 及以上版本保存"
         )
     
     # 解析映射关系
@@ -27,6 +27,7 @@ from app.schemas.dimension_item import (
     SmartImportExecuteResponse,
 )
 from app.services.dimension_import_service import DimensionImportService
+from app.services.model_tree_service import ModelTreeService
 
 router = APIRouter()
 
@@ -122,28 +123,19 @@ def get_dimension_items(
     # 分页
     results = query.offset((page - 1) * size).limit(size).all()
     
-    # 构建完整的维度路径
+    # 构建完整的维度路径（当前激活版本的路径索引）
+    path_index = ModelTreeService.get_path_index(db, active_version.id) if active_version else None
+    
     def build_dimension_path(dimension_code: str) -> str:
         """通过code构建维度的完整路径"""
-        if not dimension_code:
+        if not dimension_code or path_index is None:
             return ""
         
-        node = db.query(ModelNode).filter(ModelNode.code == dimension_code).first()
+        node = path_index.get_by_code(dimension_code)
         if not node:
             return ""
         
-        path_parts = [node.name]
-        current = node
-        
-        while current.parent_id:
-            parent = db.query(ModelNode).filter(ModelNode.id == current.parent_id).first()
-            if parent:
-                path_parts.insert(0, parent.name)
-                current = parent
-            else:
-                break
-        
-        return " - ".join(path_parts)
+        return path_index.path(node["id"], " - ")
     
     # 转换为Schema
     items = [
@@ -513,29 +505,17 @@ def get_duplicate_items(
     results = query.offset((page - 1) * size).limit(size).all()
     
     # 构建完整的维度路径
+    path_index = ModelTreeService.get_path_index(db, active_version.id)
+    
     def build_dimension_path(dimension_code: str) -> str:
         if not dimension_code:
             return ""
         
-        node = db.query(ModelNode).filter(
-            ModelNode.code == dimension_code,
-            ModelNode.version_id == active_version.id
-        ).first()
+        node = path_index.get_by_code(dimension_code)
         if not node:
             return ""
         
-        path_parts = [node.name]
-        current = node
-        
-        while current.parent_id:
-            parent = db.query(ModelNode).filter(ModelNode.id == current.parent_id).first()
-            if parent:
-                path_parts.insert(0, parent.name)
-                current = parent
-            else:
-                break
-        
-        return " - ".join(path_parts)
+        return path_index.path(node["id"], " - ")
     
     # 转换为Schema
     items = [
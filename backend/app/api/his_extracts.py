@@ -0,0 +1,99 @@
+"""
+HIS源表增量抽取API路由
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_db
+from app.models.data_source import DataSource
+from app.models.his_extract_table import HisExtractTable
+from app.schemas.his_extract import (
+    HisExtractTableCreate,
+    HisExtractTableResponse,
+    HisExtractWatermarkReset,
+)
+from app.services.his_extract_service import HisExtractService
+
+router = APIRouter()
+
+
+def _get_extract_or_404(db: Session, extract_id: int) -> HisExtractTable:
+    config = db.query(HisExtractTable).filter(HisExtractTable.id == extract_id).first()
+    if not config:
+        raise HTTPException(status_code=404, detail="抽取配置不存在")
+    return config
+
+
+@router.get("", response_model=dict)
+def get_extract_tables(db: Session = Depends(get_db)):
+    """获取抽取配置列表（含当前水位）"""
+    configs = db.query(HisExtractTable).order_by(HisExtractTable.id).all()
+    return {
+        "code": 200,
+        "message": "success",
+        "data": [HisExtractTableResponse.model_validate(c) for c in configs],
+    }
+
+
+@router.post("", response_model=dict)
+def create_extract_table(extract_in: HisExtractTableCreate, db: Session = Depends(get_db)):
+    """创建抽取配置"""
+    target = db.query(DataSource).filter(DataSource.id == extract_in.target_data_source_id).first()
+    source = db.query(DataSource).filter(DataSource.id == extract_in.source_data_source_id).first()
+    if not source or not target:
+        raise HTTPException(status_code=404, detail="数据源不存在")
+    if target.db_type != "postgresql":
+        raise HTTPException(status_code=400, detail="暂存库必须是 PostgreSQL 数据源")
+
+    target_table = extract_in.target_table or extract_in.source_table
+    exists = db.query(HisExtractTable).filter(
+        HisExtractTable.target_data_source_id == extract_in.target_data_source_id,
+        HisExtractTable.target_table == target_table
+    ).first()
+    if exists:
+        raise HTTPException(status_code=400, detail=f"暂存表 {target_table} 已配置抽取")
+
+    config = HisExtractTable(**extract_in.model_dump(exclude={"target_table"}), target_table=target_table)
+    db.add(config)
+    db.commit()
+    db.refresh(config)
+    return {
+        "code": 200,
+        "message": "创建成功",
+        "data": HisExtractTableResponse.model_validate(config),
+    }
+
+
+@router.delete("/{extract_id}", response_model=dict)
+def delete_extract_table(extract_id: int, db: Session = Depends(get_db)):
+    """删除抽取配置（暂存库中的镜像表保留）"""
+    config = _get_extract_or_404(db, extract_id)
+    db.delete(config)
+    db.commit()
+    return {"code": 200, "message": "删除成功", "data": None}
+
+
+@router.post("/{extract_id}/run", response_model=dict)
+def run_extract_table(extract_id: int, db: Session = Depends(get_db)):
+    """在后台执行一次增量抽取"""
+    from app.tasks.extract_tasks import run_his_extract_task
+
+    _get_extract_or_404(db, extract_id)
+    job = run_his_extract_task.delay(extract_ids=[extract_id])
+    return {"code": 200, "message": "抽取任务已提交", "data": {"task_id": job.id}}
+
+
+@router.put("/{extract_id}/watermark", response_model=dict)
+def reset_extract_watermark(
+    extract_id: int,
+    reset_in: HisExtractWatermarkReset,
+    db: Session = Depends(get_db),
+):
+    """重置水位，下次抽取从新水位之后重新加载"""
+    _get_extract_or_404(db, extract_id)
+    config = HisExtractService.reset_watermark(db, extract_id, reset_in.watermark_value)
+    return {
+        "code": 200,
+        "message": "水位已重置",
+        "data": HisExtractTableResponse.model_validate(config),
+    }
@@ -18,10 +18,12 @@ from app.schemas.model_node import (
     TestCodeRequest,
     TestCodeResponse,
 )
+from app.services.model_tree_service import ModelTreeService, NodePathIndex
 from app.utils.hospital_filter import (
     apply_hospital_filter,
     validate_hospital_access,
 )
+from app.utils.sequence_type import SEQUENCE_TYPES, infer_sequence_type
 
 router = APIRouter()
 
@@ -44,27 +46,11 @@ def get_model_nodes(
             detail="模型版本不存在"
         )
     
-    # 查询节点，预加载导向规则
-    query = db.query(ModelNode).options(joinedload(ModelNode.orientation_rule)).filter(ModelNode.version_id == version_id)
+    # 一次查询加载整棵节点树（按版本缓存）
+    tree = ModelTreeService.get_tree(db, version_id)
     
-    # 如果指定了parent_id，只返回该父节点的子节点
-    if parent_id is not None:
-        query = query.filter(ModelNode.parent_id == parent_id)
-    else:
-        # 否则返回根节点
-        query = query.filter(ModelNode.parent_id.is_(None))
-    
-    # 按sort_order排序
-    query = query.order_by(ModelNode.sort_order)
-    
-    items = query.all()
-    
-    # 递归加载子节点并设置导向规则名称
-    for item in items:
-        _load_children(db, item)
-        item.has_children = len(item.children) > 0
-        # 设置导向规则名称列表
-        _load_orientation_rule_names(db, item)
+    # 如果指定了parent_id，只返回该父节点的子节点，否则返回根节点
+    items = tree.children_of(parent_id)
     
     return {"total": len(items), "items": items}
 
@@ -119,6 +105,15 @@ def create_model_node(
             detail="节点编码已存在"
         )
     
+    # 序列类别：未指定时按名称推断
+    if node_in.sequence_type and node_in.sequence_type not in SEQUENCE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"序列类别必须是 {'/'.join(SEQUENCE_TYPES)} 之一"
+        )
+    if node_in.node_type == "sequence" and not node_in.sequence_type:
+        node_in.sequence_type = infer_sequence_type(node_in.name)
+    
     # 如果是末级维度，验证必填字段（script不再必填）
     if node_in.is_leaf:
         if not node_in.calc_type:
@@ -177,17 +172,8 @@ def create_model_node(
     db.commit()
     db.refresh(db_node)
     
-    # 重新查询以预加载导向规则
-    db_node = db.query(ModelNode).options(joinedload(ModelNode.orientation_rule)).filter(ModelNode.id == db_node.id).first()
-    
-    # 加载子节点信息
-    _load_children(db, db_node)
-    db_node.has_children = len(db_node.children) > 0
-    
-    # 设置导向规则名称列表
-    _load_orientation_rule_names(db, db_node)
-    
-    return db_node
+    # 从节点树中取出节点（含子节点和导向规则名称）
+    return ModelTreeService.get_tree(db, db_node.version_id).get(db_node.id)
 
 
 @router.get("/{node_id}", response_model=ModelNodeResponse)
@@ -197,7 +183,7 @@ def get_model_node(
     current_user: User = Depends(get_current_user),
 ):
     """获取模型节点详情"""
-    node = db.query(ModelNode).options(joinedload(ModelNode.orientation_rule)).filter(ModelNode.id == node_id).first()
+    node = db.query(ModelNode).filter(ModelNode.id == node_id).first()
     if not node:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -207,13 +193,8 @@ def get_model_node(
     # 验证节点所属的版本是否属于当前医疗机构
     validate_hospital_access(db, node.version)
     
-    # 加载子节点
-    _load_children(db, node)
-    
-    # 设置导向规则名称列表
-    _load_orientation_rule_names(db, node)
-    
-    return node
+    # 从节点树中取出节点（含子节点和导向规则名称）
+    return ModelTreeService.get_tree(db, node.version_id).get(node.id)
 
 
 @router.put("/{node_id}", response_model=ModelNodeResponse)
@@ -286,11 +267,26 @@ def update_model_node(
                     )
         # 空列表表示清空导向规则，允许任何节点执行此操作
     
+    if node_in.sequence_type and node_in.sequence_type not in SEQUENCE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"序列类别必须是 {'/'.join(SEQUENCE_TYPES)} 之一"
+        )
+    
     # 更新字段
+    old_name, old_node_type = node.name, node.node_type
     update_data = node_in.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(node, field, value)
     
+    # 序列类别：未指定时按名称重新推断（显式传 null 或类型变化时无法推断则清空，仅改名时保留原类别）
+    if node.node_type != "sequence":
+        node.sequence_type = None
+    elif not node_in.sequence_type:
+        reset = "sequence_type" in update_data or node.node_type != old_node_type
+        if reset or node.name != old_name:
+            node.sequence_type = infer_sequence_type(node.name) or (None if reset else node.sequence_type)
+    
     # 如果更新后是末级维度，验证必填字段
     if node.is_leaf:
         if not node.calc_type:
@@ -312,14 +308,8 @@ def update_model_node(
     db.commit()
     db.refresh(node)
     
-    # 加载子节点信息
-    _load_children(db, node)
-    node.has_children = len(node.children) > 0
-    
-    # 设置导向规则名称列表
-    _load_orientation_rule_names(db, node)
-    
-    return node
+    # 从节点树中取出节点（含子节点和导向规则名称）
+    return ModelTreeService.get_tree(db, node.version_id).get(node.id)
 
 
 @router.delete("/{node_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -377,28 +367,6 @@ def test_node_code(
         }
 
 
-def _load_orientation_rule_names(db: Session, node: ModelNode):
-    """加载节点的导向规则名称列表"""
-    if node.orientation_rule_ids:
-        rules = db.query(OrientationRule).filter(
-            OrientationRule.id.in_(node.orientation_rule_ids)
-        ).all()
-        node.orientation_rule_names = [rule.name for rule in rules]
-    else:
-        node.orientation_rule_names = []
-
-
-def _load_children(db: Session, node: ModelNode):
-    """递归加载子节点"""
-    children = db.query(ModelNode).options(joinedload(ModelNode.orientation_rule)).filter(ModelNode.parent_id == node.id).order_by(ModelNode.sort_order).all()
-    node.children = children
-    for child in children:
-        _load_children(db, child)
-        child.has_children = len(child.children) > 0
-        # 设置导向规则名称列表
-        _load_orientation_rule_names(db, child)
-
-
 @router.get("/version/{version_id}/leaf")
 def get_leaf_nodes(
     version_id: int,
@@ -421,9 +389,10 @@ def get_leaf_nodes(
     ).order_by(ModelNode.sort_order).all()
     
     # 构建完整路径
+    path_index = ModelTreeService.get_path_index(db, version_id)
     result = []
     for node in leaf_nodes:
-        full_path = _build_node_path(node, db)
+        full_path = path_index.path(node.id, " > ")
         result.append({
             "id": node.id,
             "name": node.name,
@@ -451,11 +420,10 @@ def get_cost_dimensions(
             detail="模型版本不存在或不属于当前医疗机构"
         )
     
+    path_index = ModelTreeService.get_path_index(db, version_id)
+    
     # 查找所有序列节点（node_type='sequence'）
-    sequences = db.query(ModelNode).filter(
-        ModelNode.version_id == version_id,
-        ModelNode.node_type == 'sequence'
-    ).all()
+    sequences = [node for node in path_index.nodes.values() if node["node_type"] == 'sequence']
     
     if not sequences:
         return {"total": 0, "items": []}
@@ -464,82 +432,31 @@ def get_cost_dimensions(
     all_leaf_nodes = []
     for sequence in sequences:
         # 查找该序列下名为"成本"的一级维度
-        cost_dimension = db.query(ModelNode).filter(
-            ModelNode.version_id == version_id,
-            ModelNode.parent_id == sequence.id,
-            ModelNode.name == '成本'
-        ).first()
+        cost_dimension = next(
+            (child for child in path_index.children(sequence["id"]) if child["name"] == '成本'),
+            None
+        )
         
         if cost_dimension:
-            # 递归查找成本维度下的所有末级维度
-            leaf_nodes = _find_leaf_nodes_recursive(db, cost_dimension.id, version_id)
-            all_leaf_nodes.extend(leaf_nodes)
+            # 查找成本维度下的所有末级维度
+            all_leaf_nodes.extend(path_index.leaves_under(cost_dimension["id"]))
     
     # 构建返回结果，包含序列信息以便区分
     result = []
     for node in all_leaf_nodes:
         # 获取节点所属的序列信息
-        sequence_name = _get_sequence_name(db, node, version_id)
+        sequence = path_index.sequence_of(node["id"])
+        sequence_name = sequence["name"] if sequence else "未知序列"
         result.append({
-            "id": node.id,
-            "name": f"{node.name}（{sequence_name}）",  # 在名称中显示所属序列
-            "code": node.code
+            "id": node["id"],
+            "name": f"{node['name']}（{sequence_name}）",  # 在名称中显示所属序列
+            "code": node["code"]
         })
     
     return {"total": len(result), "items": result}
 
 
-def _build_node_path(node: ModelNode, db: Session) -> str:
-    """构建节点的完整路径"""
-    path_parts = [node.name]
-    current = node
-    
-    while current.parent_id:
-        parent = db.query(ModelNode).filter(ModelNode.id == current.parent_id).first()
-        if parent:
-            path_parts.insert(0, parent.name)
-            current = parent
-        else:
-            break
-    
-    return " > ".join(path_parts)
-
-
-def _find_leaf_nodes_recursive(db: Session, parent_id: int, version_id: int) -> list:
-    """递归查找指定父节点下的所有末级维度"""
-    # 查找直接子节点
-    children = db.query(ModelNode).filter(
-        ModelNode.version_id == version_id,
-        ModelNode.parent_id == parent_id
-    ).order_by(ModelNode.sort_order).all()
-    
-    leaf_nodes = []
-    for child in children:
-        if child.is_leaf:
-            # 如果是末级维度，直接添加
-            leaf_nodes.append(child)
-        else:
-            # 如果不是末级维度，递归查找其子节点
-            leaf_nodes.extend(_find_leaf_nodes_recursive(db, child.id, version_id))
-    
-    return leaf_nodes
-
-
-def _get_sequence_name(db: Session, node: ModelNode, version_id: int) -> str:
-    """获取节点所属的序列名称"""
-    current = node
-    # 向上查找直到找到序列节点
-    while current.parent_id:
-        parent = db.query(ModelNode).filter(ModelNode.id == current.parent_id).first()
-        if not parent:
-            break
-        if parent.node_type == 'sequence':
-            return parent.name
-        current = parent
-    return "未知序列"
-
-
-def _get_full_hierarchy_path_with_sort_key(db: Session, node: ModelNode) -> tuple:
+def _get_full_hierarchy_path_with_sort_key(path_index: NodePathIndex, node: ModelNode) -> tuple:
     """获取节点的完整层级路径和排序键（序列-一级维度-二级维度...）
     
     返回: (层级路径字符串, 排序键列表)
@@ -548,25 +465,11 @@ def _get_full_hierarchy_path_with_sort_key(db: Session, node: ModelNode) -> tupl
     树结构示例：全院业务价值(根) → 医生业务价值(序列) → 门诊(一级) → 挂号(二级/叶子)
     期望输出：医生业务价值 - 门诊 - 挂号
     """
-    path_parts = []
-    node_types = []
-    sort_keys = []
-    current = node
-    
-    # 向上遍历收集所有祖先节点名称、类型和排序键
-    while current:
-        path_parts.append(current.name)
-        node_types.append(current.node_type)
-        sort_keys.append(current.sort_order or 0)
-        if current.parent_id:
-            current = db.query(ModelNode).filter(ModelNode.id == current.parent_id).first()
-        else:
-            break
-    
-    # 反转路径、类型和排序键，从根到叶子
-    path_parts.reverse()
-    node_types.reverse()
-    sort_keys.reverse()
+    # 从根到叶子收集所有祖先节点名称、类型和排序键
+    ancestors = path_index.ancestors(node.id)
+    path_parts = [item["name"] for item in ancestors]
+    node_types = [item["node_type"] for item in ancestors]
+    sort_keys = [item["sort_order"] or 0 for item in ancestors]
     
     # 找到第一个序列节点的位置，从序列开始构建路径
     # 跳过根节点（通常是node_type为None或第一个非序列节点）
@@ -613,9 +516,10 @@ def get_leaf_dimensions(
     ).all()
     
     # 构建返回结果，包含完整层级路径和排序键
+    path_index = ModelTreeService.get_path_index(db, version_id)
     result_with_sort = []
     for node in leaf_nodes:
-        hierarchy_path, sort_keys = _get_full_hierarchy_path_with_sort_key(db, node)
+        hierarchy_path, sort_keys = _get_full_hierarchy_path_with_sort_key(path_index, node)
         result_with_sort.append({
             "id": node.id,
             "name": hierarchy_path,
@@ -12,7 +12,6 @@ from app.api.deps import get_db, get_current_user
 from app.models.user import User
 from app.models.model_version import ModelVersion
 from app.models.model_node import ModelNode
-from app.models.discipline_rule import DisciplineRule
 from app.schemas.model_version import (
     ModelVersionCreate,
     ModelVersionUpdate,
@@ -25,6 +24,7 @@ from app.utils.hospital_filter import (
     validate_hospital_access,
     set_hospital_id_for_create,
 )
+from app.services.model_version_copy_service import ModelVersionCopyService
 from app.services.model_version_export_service import ModelVersionExportService
 
 router = APIRouter()
@@ -116,6 +116,35 @@ def import_version(
     # 创建导入服务并执行导入
     import_service = ModelVersionImportService(db)
     
+    # 后台模式：先创建并提交新版本，内容由 Celery 任务复制
+    if request.async_mode:
+        try:
+            source_version, new_version = import_service.create_target_version(request, current_hospital_id)
+            # 复制完成前不能激活或创建计算任务
+            new_version.copy_status = "copying"
+            db.commit()
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        
+        from app.tasks.model_version_tasks import copy_model_version_task
+        task = copy_model_version_task.delay(
+            source_version.id,
+            new_version.id,
+            import_type=request.import_type,
+            user_id=current_user.id
+        )
+        return ModelVersionImportResponse(
+            id=new_version.id,
+            version=new_version.version,
+            name=new_version.name,
+            statistics={},
+            task_id=task.id
+        )
+    
     try:
         result = import_service.import_model_version(
             request=request,
@@ -137,6 +166,32 @@ def import_version(
         )
 
 
+@router.get("/copy-status/{task_id}")
+def get_copy_status(
+    task_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """查询后台复制/导入任务状态"""
+    from app.celery_app import celery_app
+    
+    task = celery_app.AsyncResult(task_id)
+    
+    if task.state == 'PENDING':
+        return {'state': task.state, 'status': '任务等待中...', 'current': 0, 'total': 0}
+    if task.state == 'PROCESSING':
+        return {
+            'state': task.state,
+            'status': task.info.get('status', ''),
+            'current': task.info.get('current', 0),
+            'total': task.info.get('total', 0)
+        }
+    if task.state == 'SUCCESS':
+        return {'state': task.state, 'status': '复制完成', 'result': task.info}
+    if task.state == 'FAILURE':
+        return {'state': task.state, 'status': '复制失败', 'error': str(task.info)}
+    return {'state': task.state, 'status': str(task.info)}
+
+
 # ==================== 模型版本导出API ====================
 
 @router.get("/export/{version_id}")
@@ -228,18 +283,8 @@ def create_model_version(
             detail="版本号已存在"
         )
     
-    # 创建新版本
-    db_version = ModelVersion(
-        version=version_in.version,
-        name=version_in.name,
-        description=version_in.description,
-        hospital_id=hospital_id,
-    )
-    db.add(db_version)
-    db.commit()
-    db.refresh(db_version)
-    
-    # 如果指定了基础版本，复制其结构
+    # 如果指定了基础版本，先验证基础版本
+    base_version = None
     if version_in.base_version_id:
         query = db.query(ModelVersion).filter(ModelVersion.id == version_in.base_version_id)
         query = apply_hospital_filter(query, ModelVersion, required=True)
@@ -253,11 +298,42 @@ def create_model_version(
         # 验证基础版本属于当前医疗机构
         validate_hospital_access(db, base_version, hospital_id)
         
-        # 复制节点结构
-        _copy_nodes(db, base_version.id, db_version.id)
-        
-        # 复制学科规则
-        _copy_discipline_rules(db, base_version.id, db_version.id, hospital_id)
+        if base_version.copy_status:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="基础版本仍在复制中，请稍后再试"
+            )
+    
+    # 创建新版本
+    db_version = ModelVersion(
+        version=version_in.version,
+        name=version_in.name,
+        description=version_in.description,
+        hospital_id=hospital_id,
+    )
+    db.add(db_version)
+    db.flush()
+    
+    if base_version is None:
+        db.commit()
+        db.refresh(db_version)
+        return db_version
+    
+    # 后台复制：返回复制任务ID，通过 /copy-status/{task_id} 查询进度；复制完成前不能激活或创建计算任务
+    if version_in.async_copy:
+        db_version.copy_status = "copying"
+        db.commit()
+        db.refresh(db_version)
+        from app.tasks.model_version_tasks import copy_model_version_task
+        task = copy_model_version_task.delay(base_version.id, db_version.id)
+        response = ModelVersionResponse.model_validate(db_version)
+        response.copy_task_id = task.id
+        return response
+    
+    # 复制节点结构和学科规则（与新版本在同一事务中提交）
+    ModelVersionCopyService(db).copy_version(base_version.id, db_version.id, copy_discipline_rules=True)
+    db.commit()
+    db.refresh(db_version)
     
     return db_version
 
@@ -360,6 +436,12 @@ def activate_model_version(
     # 验证数据所属医疗机构
     validate_hospital_access(db, version)
     
+    if version.copy_status:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="模型版本仍在复制中，复制完成后才能激活"
+        )
+    
     # 取消当前医疗机构其他版本的激活状态
     query = db.query(ModelVersion)
     query = apply_hospital_filter(query, ModelVersion, required=True)
@@ -373,73 +455,6 @@ def activate_model_version(
     return version
 
 
-def _copy_nodes(db: Session, source_version_id: int, target_version_id: int):
-    """复制节点结构"""
-    # 获取源版本的所有根节点
-    source_nodes = db.query(ModelNode).filter(
-        ModelNode.version_id == source_version_id,
-        ModelNode.parent_id.is_(None)
-    ).all()
-    
-    # 递归复制节点
-    for node in source_nodes:
-        _copy_node_recursive(db, node, target_version_id, None)
-    
-    db.commit()
-
-
-def _copy_node_recursive(db: Session, source_node: ModelNode, target_version_id: int, target_parent_id: Optional[int]):
-    """递归复制节点"""
-    # 创建新节点
-    new_node = ModelNode(
-        version_id=target_version_id,
-        parent_id=target_parent_id,
-        sort_order=source_node.sort_order,
-        name=source_node.name,
-        code=source_node.code,
-        node_type=source_node.node_type,
-        is_leaf=source_node.is_leaf,
-        calc_type=source_node.calc_type,
-        weight=source_node.weight,
-        unit=source_node.unit,
-        business_guide=source_node.business_guide,
-        script=source_node.script,
-        rule=source_node.rule,
-        orientation_rule_ids=source_node.orientation_rule_ids,  # 复制导向规则ID列表
-    )
-    db.add(new_node)
-    db.flush()  # 获取新节点的ID
-    
-    # 递归复制子节点
-    for child in source_node.children:
-        _copy_node_recursive(db, child, target_version_id, new_node.id)
-
-
-def _copy_discipline_rules(db: Session, source_version_id: int, target_version_id: int, hospital_id: int):
-    """复制学科规则"""
-    # 获取源版本的所有学科规则
-    source_rules = db.query(DisciplineRule).filter(
-        DisciplineRule.version_id == source_version_id,
-        DisciplineRule.hospital_id == hospital_id
-    ).all()
-    
-    # 复制每条规则
-    for rule in source_rules:
-        new_rule = DisciplineRule(
-            hospital_id=hospital_id,
-            version_id=target_version_id,
-            department_code=rule.department_code,
-            department_name=rule.department_name,
-            dimension_code=rule.dimension_code,
-            dimension_name=rule.dimension_name,
-            rule_description=rule.rule_description,
-            rule_coefficient=rule.rule_coefficient,
-        )
-        db.add(new_rule)
-    
-    db.commit()
-
-
 # ==================== 版本详情相关API（带路径参数）====================
 
 @router.get("/{version_id}/preview", response_model=VersionPreviewResponse)
@@ -36,3 +36,5 @@ celery_app.conf.update(
 from app.tasks import import_tasks  # noqa: F401
 from app.tasks import calculation_tasks  # noqa: F401
 from app.tasks import classification_tasks  # noqa: F401
+from app.tasks import extract_tasks  # noqa: F401
+from app.tasks import model_version_tasks  # noqa: F401
@@ -28,6 +28,28 @@ class Settings(BaseSettings):
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
     
+    # 计算引擎配置
+    CALCULATION_STEP_MAX_WORKERS: int = 4  # 按依赖图并发执行步骤时的最大并发数
+    STEP_RESULT_SAMPLE_ROWS: int = 100  # 步骤日志中保留的结果样本行数
+    STEP_RESULT_FETCH_SIZE: int = 5000  # 按批读取步骤结果集的行数
+    STEP_RESULT_SPILL_ENABLED: bool = False  # 是否将完整结果集写入压缩文件
+    STEP_RESULT_SPILL_DIR: str = "uploads/step_results"  # 结果文件目录
+    STEP_PROFILE_EXPLAIN_MS: int = 0  # 语句耗时超过该值（毫秒）时采集 EXPLAIN (ANALYZE, BUFFERS)，0 表示不采集
+    DRILLDOWN_CUBE_TOP_N: int = 1000  # 下钻汇总表中每个科室维度保留的收费项目数
+    REPORT_EXPORT_RETENTION_HOURS: int = 24  # 后台导出文件的保留时长，过期后删除文件和导出记录
+    
+    # AI分类缓存配置
+    CLASSIFICATION_CACHE_ENABLED: bool = True  # 是否复用相同项目名称和维度列表的分类结果
+    CLASSIFICATION_CACHE_TTL_DAYS: int = 90  # 分类结果的有效天数
+    CLASSIFICATION_CACHE_MAX_ENTRIES: int = 200000  # 每个医疗机构保留的缓存条数，超出时淘汰最久未使用的
+    
+    # 智能导入会话配置
+    IMPORT_SESSION_BACKEND: str = "redis"  # redis 或 memory，Redis 不可用时使用进程内存储
+    IMPORT_SESSION_TTL_SECONDS: int = 3600  # 会话闲置多久后过期
+    IMPORT_SESSION_MAX_BYTES: int = 64 * 1024 * 1024  # 单个会话压缩后的大小上限
+    IMPORT_SESSION_MEMORY_MAX_ENTRIES: int = 32  # 进程内存储保留的会话数
+    IMPORT_SESSION_MEMORY_MAX_BYTES: int = 256 * 1024 * 1024  # 进程内存储的总大小上限
+    
     # 加密配置
     ENCRYPTION_KEY: Optional[str] = None
     
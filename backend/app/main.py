@@ -124,7 +124,7 @@ async def health_check():
 
 
 # 导入路由
-from app.api import auth, users, roles, departments, dimension_items, charge_items, model_versions, model_nodes, calculation_workflows, calculation_steps, data_sources, system_settings, calculation_tasks, hospitals, data_templates, data_issues, orientation_rules, orientation_benchmarks, orientation_ladders, ai_config, ai_prompt_config, classification_tasks, classification_plans, cost_benchmarks, reference_values, analysis_reports, cost_reports, discipline_rules, ai_interfaces, ai_prompt_modules, metric_projects, metric_topics, metrics, conversation_groups, conversations, dimension_analyses, dim_inclusive_fees
+from app.api import auth, users, roles, departments, dimension_items, charge_items, model_versions, model_nodes, calculation_workflows, calculation_steps, data_sources, system_settings, calculation_tasks, hospitals, data_templates, data_issues, orientation_rules, orientation_benchmarks, orientation_ladders, ai_config, ai_prompt_config, classification_tasks, classification_plans, cost_benchmarks, reference_values, analysis_reports, cost_reports, discipline_rules, ai_interfaces, ai_prompt_modules, metric_projects, metric_topics, metrics, conversation_groups, conversations, dimension_analyses, dim_inclusive_fees, his_extracts
 
 # 注册路由
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["认证"])
@@ -139,6 +139,7 @@ app.include_router(model_nodes.router, prefix="/api/v1/model-nodes", tags=["模
 app.include_router(calculation_workflows.router, prefix="/api/v1/calculation-workflows", tags=["计算流程管理"])
 app.include_router(calculation_steps.router, prefix="/api/v1/calculation-steps", tags=["计算步骤管理"])
 app.include_router(data_sources.router, prefix="/api/v1/data-sources", tags=["数据源管理"])
+app.include_router(his_extracts.router, prefix="/api/v1/his-extracts", tags=["HIS增量抽取"])
 app.include_router(data_templates.router, prefix="/api/v1/data-templates", tags=["数据模板管理"])
 app.include_router(data_issues.router, prefix="/api/v1/data-issues", tags=["数据问题记录"])
 app.include_router(system_settings.router, prefix="/api/v1/system/settings", tags=["系统设置"])
@@ -22,8 +22,9 @@ from .calculation_step_log import CalculationStepLog
 from .calculation_step import CalculationStep
 from .calculation_workflow import CalculationWorkflow
 from .calculation_task import CalculationTask
-from .calculation_detail import CalculationDetail
+from .calculation_detail import CalculationDetail, CalculationDrilldownItem
 from .data_source import DataSource
+from .his_extract_table import HisExtractTable
 from .data_template import DataTemplate
 from .data_issue import DataIssue, ProcessingStage
 # AI智能分类模型 - 注意导入顺序
@@ -33,6 +34,8 @@ from .classification_plan import ClassificationPlan, PlanStatus
 from .plan_item import PlanItem, ProcessingStatus
 from .task_progress import TaskProgress, ProgressStatus
 from .api_usage_log import APIUsageLog
+from .classification_cache import ClassificationCacheEntry
+from .report_export import ReportExport
 from .cost_benchmark import CostBenchmark
 from .cost_value import CostValue
 from .orientation_adjustment_detail import OrientationAdjustmentDetail
@@ -80,7 +83,9 @@ __all__ = [
     "CalculationStepLog",
     "CalculationTask",
     "CalculationDetail",
+    "CalculationDrilldownItem",
     "DataSource",
+    "HisExtractTable",
     "DataTemplate",
     "DataIssue",
     "ProcessingStage",
@@ -94,6 +99,8 @@ __all__ = [
     "TaskProgress",
     "ProgressStatus",
     "APIUsageLog",
+    "ClassificationCacheEntry",
+    "ReportExport",
     "CostBenchmark",
     "CostValue",
     "OrientationAdjustmentDetail",
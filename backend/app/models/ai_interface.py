@@ -20,6 +20,7 @@ class AIInterface(Base):
     api_key_encrypted = Column(Text, nullable=False, comment="加密的API密钥")
     call_delay = Column(Float, default=1.0, nullable=False, comment="调用延迟（秒）")
     daily_limit = Column(Integer, default=10000, nullable=False, comment="每日调用限额")
+    max_concurrency = Column(Integer, default=3, nullable=False, comment="最大并发请求数")
     is_active = Column(Boolean, default=True, nullable=False, comment="是否启用")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="创建时间")
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, comment="更新时间")
@@ -2,7 +2,7 @@
 核算明细模型
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, DECIMAL
+from sqlalchemy import Column, Integer, String, DateTime, DECIMAL, ForeignKey, Index
 from app.database import Base
 
 
@@ -43,3 +43,43 @@ class CalculationDetail(Base):
     # 时间
     period = Column(String(7), nullable=False, comment="统计月份(YYYY-MM)")
     created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+
+class CalculationDrilldownItem(Base):
+    """维度下钻汇总表（下钻立方）
+
+    任务完成时由 calculation_details 一次生成，按 (task_id, department_id, node_id) 存放
+    金额最高的前 N 个收费项目（已补齐收费项目名称和单价），下钻接口直接按索引读取：
+    - department_id 为 0 表示全院汇总
+    - rank 为 0 的行是合计行：amount/quantity 为该维度全部项目的合计，item_count 为项目总数
+    - rank 从 1 开始为按金额降序排列的收费项目
+
+    覆盖索引包含接口需要的全部列，下钻查询可以只扫描索引。
+    任务重新计算时清除，任务删除时级联删除
+    """
+    __tablename__ = "calculation_drilldown_items"
+    __table_args__ = (
+        Index(
+            'uq_calculation_drilldown_items_lookup',
+            'task_id', 'department_id', 'node_id', 'rank',
+            unique=True,
+            postgresql_include=['item_code', 'item_name', 'item_category', 'unit_price', 'amount', 'quantity', 'item_count'],
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(String(100), ForeignKey("calculation_tasks.task_id", ondelete="CASCADE"), nullable=False, comment="计算任务ID")
+    department_id = Column(Integer, nullable=False, default=0, comment="科室ID（全院汇总为0）")
+    node_id = Column(Integer, nullable=False, comment="维度节点ID")
+    rank = Column(Integer, nullable=False, comment="金额排名（0为合计行）")
+
+    item_code = Column(String(100), comment="收费项目编码")
+    item_name = Column(String(200), comment="收费项目名称")
+    item_category = Column(String(100), comment="项目类别")
+    unit_price = Column(String(50), comment="单价")
+
+    amount = Column(DECIMAL(20, 4), nullable=False, default=0, comment="金额")
+    quantity = Column(DECIMAL(20, 4), nullable=False, default=0, comment="数量")
+    item_count = Column(Integer, comment="收费项目总数（仅合计行）")
+
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
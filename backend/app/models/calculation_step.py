@@ -2,7 +2,7 @@
 计算步骤模型
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Numeric, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Numeric, Boolean, ARRAY
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -21,6 +21,7 @@ class CalculationStep(Base):
     python_env = Column(String(200), nullable=True, comment="Python虚拟环境路径（Python步骤使用）")
     sort_order = Column(Numeric(10, 2), nullable=False, index=True, comment="执行顺序")
     is_enabled = Column(Boolean, default=True, nullable=False, comment="是否启用")
+    depends_on = Column(ARRAY(Integer), nullable=True, comment="依赖的步骤ID列表（为空则依赖所有排序在前的步骤）")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
@@ -2,7 +2,7 @@
 计算步骤执行日志模型
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -11,16 +11,21 @@ from app.database import Base
 class CalculationStepLog(Base):
     """计算步骤执行日志模型"""
     __tablename__ = "calculation_step_logs"
+    __table_args__ = (
+        Index("ix_calculation_step_logs_task_step_dept", "task_id", "step_id", "department_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     task_id = Column(String(100), ForeignKey("calculation_tasks.task_id", ondelete="CASCADE"), nullable=False, index=True, comment="计算任务ID")
     step_id = Column(Integer, ForeignKey("calculation_steps.id", ondelete="CASCADE"), nullable=False, index=True, comment="计算步骤ID")
     department_id = Column(Integer, comment="科室ID")
-    status = Column(String(20), nullable=False, comment="执行状态(success/failed)")
+    status = Column(String(20), nullable=False, comment="执行状态(success/failed/reused)")
+    fingerprint = Column(String(64), comment="步骤输入指纹(渲染后代码+参数+源表版本)")
     start_time = Column(DateTime, nullable=False, comment="开始时间")
     end_time = Column(DateTime, comment="结束时间")
     duration_ms = Column(Integer, comment="执行耗时(毫秒)")
     result_data = Column(JSONB, comment="执行结果数据")
+    statement_profile = Column(JSONB, comment="语句级耗时、影响行数和执行计划")
     execution_info = Column(Text, comment="执行信息")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
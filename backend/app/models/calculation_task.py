@@ -3,6 +3,7 @@
 """
 import sqlalchemy as sa
 from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, DECIMAL
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -82,3 +83,25 @@ class CalculationSummary(Base):
     tech_ratio = Column(DECIMAL(10, 4), default=0, comment="医技占比")
     total_value = Column(DECIMAL(20, 4), default=0, comment="科室总价值")
     created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+
+class CalculationResultRollup(Base):
+    """计算结果汇总缓存表
+    
+    任务完成时根据计算结果一次生成，报表接口直接读取，不再重新汇总：
+    - summary：各科室的医生/护理/医技序列价值（department_id 为 0）
+    - department：单个科室各节点的结果及逐级小计
+    - hospital：全院按节点合并后的结果及逐级小计（department_id 为 0）
+    任务重新计算时清除，任务删除时级联删除
+    """
+    __tablename__ = "calculation_result_rollups"
+    __table_args__ = (
+        sa.UniqueConstraint('task_id', 'scope', 'department_id', name='uq_calculation_result_rollups_task_scope_dept'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(String(100), ForeignKey("calculation_tasks.task_id", ondelete="CASCADE"), nullable=False, comment="任务ID")
+    scope = Column(String(20), nullable=False, comment="汇总范围(summary/department/hospital)")
+    department_id = Column(Integer, nullable=False, default=0, comment="科室ID（全院范围为0）")
+    payload = Column(JSONB, nullable=False, comment="汇总数据")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
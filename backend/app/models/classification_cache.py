@@ -0,0 +1,32 @@
+"""
+AI分类结果缓存模型
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Numeric, UniqueConstraint, Index
+from app.database import Base
+
+
+class ClassificationCacheEntry(Base):
+    """AI分类结果缓存
+
+    按 (医疗机构, 分类上下文, 规范化项目名称) 保存AI分类结果。分类上下文是末级维度列表
+    （编码+路径）与模型、提示词的哈希，复制的模型版本维度相同时可以直接复用；
+    维度以编码和路径保存，命中时映射为当前版本的维度ID
+    """
+    __tablename__ = "classification_cache"
+    __table_args__ = (
+        UniqueConstraint('hospital_id', 'context_hash', 'name_key', name='uq_classification_cache_key'),
+        Index('ix_classification_cache_hospital_last_used', 'hospital_id', 'last_used_at'),
+    )
+
+    id = Column(Integer, primary_key=True, comment="主键")
+    hospital_id = Column(Integer, ForeignKey("hospitals.id", ondelete="CASCADE"), nullable=False, comment="医疗机构ID")
+    context_hash = Column(String(64), nullable=False, comment="分类上下文哈希（末级维度列表、模型、提示词）")
+    name_key = Column(String(200), nullable=False, comment="规范化后的收费项目名称")
+    item_name = Column(String(200), nullable=False, comment="收费项目名称")
+    dimension_code = Column(String(50), nullable=False, comment="维度编码")
+    dimension_path = Column(String(500), nullable=False, comment="维度路径")
+    confidence = Column(Numeric(5, 4), nullable=True, comment="AI确信度（0-1）")
+    hit_count = Column(Integer, default=0, nullable=False, comment="命中次数")
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="分类时间")
+    last_used_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="最近使用时间")
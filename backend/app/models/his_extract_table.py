@@ -0,0 +1,33 @@
+"""
+HIS源表增量抽取配置模型
+"""
+from sqlalchemy import Column, Integer, String, Boolean, Text, TIMESTAMP, BigInteger, JSON, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class HisExtractTable(Base):
+    """HIS源表增量抽取配置表
+
+    按水位列（如收费时间 FYFSSJ 或变更时间列）记录每个源表已抽取到的位置，
+    每次只把水位之后新增或变化的数据从HIS数据源搬到暂存库。
+    """
+    __tablename__ = "his_extract_tables"
+    __table_args__ = (
+        UniqueConstraint("target_data_source_id", "target_table", name="uq_his_extract_target"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, comment="主键")
+    source_data_source_id = Column(Integer, ForeignKey("data_sources.id", ondelete="CASCADE"), nullable=False, comment="HIS数据源ID")
+    source_table = Column(String(100), nullable=False, comment="源表名")
+    target_data_source_id = Column(Integer, ForeignKey("data_sources.id", ondelete="CASCADE"), nullable=False, comment="暂存库数据源ID（PostgreSQL）")
+    target_table = Column(String(100), nullable=False, comment="暂存表名")
+    watermark_column = Column(String(100), nullable=False, default="FYFSSJ", comment="水位列（收费时间或变更时间列）")
+    key_columns = Column(JSON, nullable=True, comment="主键列，配置后按主键合并变化的行")
+    batch_size = Column(Integer, nullable=False, default=10000, comment="每批抽取行数")
+    is_enabled = Column(Boolean, nullable=False, default=True, comment="是否启用")
+    watermark_value = Column(Text, nullable=True, comment="已抽取到的水位值")
+    last_extracted_at = Column(TIMESTAMP, nullable=True, comment="最近抽取时间")
+    last_row_count = Column(BigInteger, nullable=True, comment="最近一次抽取行数")
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False, comment="创建时间")
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False, comment="更新时间")
@@ -18,6 +18,7 @@ class ModelNode(Base):
     name = Column(String(100), nullable=False, comment="节点名称")
     code = Column(String(50), nullable=False, comment="节点编码")
     node_type = Column(String(20), nullable=False, comment="节点类型(sequence/dimension)")
+    sequence_type = Column(String(20), nullable=True, comment="序列类别(doctor/nurse/tech，仅序列节点)")
     is_leaf = Column(Boolean, default=False, nullable=False, comment="是否为末级维度")
     calc_type = Column(String(20), comment="算法类型(statistical=指标/calculational=目录)")
     weight = Column(Numeric(10, 4), comment="权重/单价")
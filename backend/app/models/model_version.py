@@ -21,6 +21,7 @@ class ModelVersion(Base):
     name = Column(String(100), nullable=False, comment="版本名称")
     description = Column(Text, comment="版本描述")
     is_active = Column(Boolean, default=False, nullable=False, comment="是否激活")
+    copy_status = Column(String(20), nullable=True, comment="后台复制状态：copying 表示节点等内容仍在复制，为空表示可用")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
@@ -0,0 +1,27 @@
+"""
+后台报表导出记录模型
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
+from app.database import Base
+
+
+class ReportExport(Base):
+    """后台报表导出记录
+
+    发起后台导出时登记导出ID及所属医疗机构，下载接口据此区分"生成中"与"不存在"，
+    超过保留期限的记录和导出文件由清理任务一并删除
+    """
+    __tablename__ = "report_exports"
+    __table_args__ = (
+        Index('ix_report_exports_created_at', 'created_at'),
+    )
+
+    id = Column(String(36), primary_key=True, comment="导出ID（同后台任务ID）")
+    hospital_id = Column(Integer, ForeignKey("hospitals.id", ondelete="CASCADE"), nullable=False, comment="医疗机构ID")
+    batch_id = Column(String(100), nullable=False, comment="批次ID")
+    status = Column(String(20), default="pending", nullable=False, comment="状态：pending/completed/failed")
+    file_path = Column(String(500), nullable=True, comment="导出文件路径")
+    error_message = Column(Text, nullable=True, comment="错误信息")
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="发起时间")
+    completed_at = Column(DateTime, nullable=True, comment="完成时间")
@@ -16,6 +16,7 @@ class AIInterfaceCreate(BaseModel):
     api_key: str = Field(..., description="API密钥（明文）", min_length=1)
     call_delay: float = Field(1.0, description="调用延迟（秒）", ge=0.1, le=10.0)
     daily_limit: int = Field(10000, description="每日调用限额", ge=1, le=100000)
+    max_concurrency: int = Field(3, description="最大并发请求数", ge=1, le=20)
     is_active: bool = Field(True, description="是否启用")
 
     @field_validator('api_endpoint')
@@ -42,6 +43,7 @@ class AIInterfaceUpdate(BaseModel):
     api_key: Optional[str] = Field(None, description="API密钥（明文），留空表示不修改")
     call_delay: Optional[float] = Field(None, description="调用延迟（秒）", ge=0.1, le=10.0)
     daily_limit: Optional[int] = Field(None, description="每日调用限额", ge=1, le=100000)
+    max_concurrency: Optional[int] = Field(None, description="最大并发请求数", ge=1, le=20)
     is_active: Optional[bool] = Field(None, description="是否启用")
 
     @field_validator('api_endpoint')
@@ -73,6 +75,7 @@ class AIInterfaceResponse(BaseModel):
     api_key_masked: str = Field(..., description="掩码后的API密钥")
     call_delay: float = Field(..., description="调用延迟（秒）")
     daily_limit: int = Field(..., description="每日调用限额")
+    max_concurrency: int = Field(..., description="最大并发请求数")
     is_active: bool = Field(..., description="是否启用")
     created_at: datetime = Field(..., description="创建时间")
     updated_at: datetime = Field(..., description="更新时间")
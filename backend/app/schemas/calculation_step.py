@@ -2,7 +2,7 @@
 计算步骤Schema
 """
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 from decimal import Decimal
 from pydantic import BaseModel, Field
 
@@ -16,6 +16,7 @@ class CalculationStepBase(BaseModel):
     data_source_id: Optional[int] = Field(None, description="数据源ID（SQL步骤使用）")
     python_env: Optional[str] = Field(None, description="Python虚拟环境路径（Python步骤使用）", max_length=200)
     is_enabled: bool = Field(True, description="是否启用")
+    depends_on: Optional[List[int]] = Field(None, description="依赖的步骤ID列表，为空则依赖所有排序在前的步骤，[]表示无依赖可并发执行")
 
 
 class CalculationStepCreate(CalculationStepBase):
@@ -33,6 +34,7 @@ class CalculationStepUpdate(BaseModel):
     data_source_id: Optional[int] = Field(None, description="数据源ID（SQL步骤使用）")
     python_env: Optional[str] = Field(None, description="Python虚拟环境路径（Python步骤使用）", max_length=200)
     is_enabled: Optional[bool] = Field(None, description="是否启用")
+    depends_on: Optional[List[int]] = Field(None, description="依赖的步骤ID列表，为空则依赖所有排序在前的步骤，[]表示无依赖可并发执行")
 
 
 class CalculationStepResponse(CalculationStepBase):
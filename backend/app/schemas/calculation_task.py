@@ -16,6 +16,14 @@ class CalculationTaskCreate(BaseModel):
     period: str = Field(..., description="计算周期(YYYY-MM)")
     description: Optional[str] = Field(None, description="任务描述")
     batch_id: Optional[str] = Field(None, description="批次ID，同一次创建的多个任务共享同一批次ID")
+    chunk_size: Optional[int] = Field(None, ge=1, description="并行模式：每个子任务处理的科室数，为空则串行执行（仅指定科室时生效）")
+
+
+class CalculationTaskRecalculate(BaseModel):
+    """重新计算任务"""
+    department_ids: Optional[List[int]] = Field(None, description="科室ID列表，为空则沿用任务上次计算的科室")
+    incremental: bool = Field(True, description="增量重算：只重新执行输入发生变化的步骤及其下游步骤")
+    chunk_size: Optional[int] = Field(None, ge=1, description="并行模式：每个子任务处理的科室数，为空则串行执行（仅指定科室时生效）")
 
 
 class CalculationTaskResponse(BaseModel):
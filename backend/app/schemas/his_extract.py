@@ -0,0 +1,44 @@
+"""
+HIS源表增量抽取相关的Pydantic模型
+"""
+from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+
+class HisExtractTableCreate(BaseModel):
+    """创建抽取配置"""
+    source_data_source_id: int = Field(..., description="HIS数据源ID")
+    source_table: str = Field(..., max_length=100, description="源表名")
+    target_data_source_id: int = Field(..., description="暂存库数据源ID（PostgreSQL）")
+    target_table: Optional[str] = Field(None, max_length=100, description="暂存表名，默认与源表同名")
+    watermark_column: str = Field("FYFSSJ", max_length=100, description="水位列（收费时间或变更时间列）")
+    key_columns: Optional[List[str]] = Field(None, description="主键列，配置后按主键合并变化的行")
+    batch_size: int = Field(10000, ge=100, le=1000000, description="每批抽取行数")
+    is_enabled: bool = Field(True, description="是否启用")
+
+
+class HisExtractWatermarkReset(BaseModel):
+    """重置水位"""
+    watermark_value: Optional[str] = Field(None, description="新水位，为空时下次抽取全量重新加载")
+
+
+class HisExtractTableResponse(BaseModel):
+    """抽取配置响应"""
+    id: int
+    source_data_source_id: int
+    source_table: str
+    target_data_source_id: int
+    target_table: str
+    watermark_column: str
+    key_columns: Optional[List[str]] = None
+    batch_size: int
+    is_enabled: bool
+    watermark_value: Optional[str] = None
+    last_extracted_at: Optional[datetime] = None
+    last_row_count: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
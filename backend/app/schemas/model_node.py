@@ -12,6 +12,7 @@ class ModelNodeBase(BaseModel):
     name: str = Field(..., description="节点名称")
     code: str = Field(..., description="节点编码")
     node_type: str = Field(..., description="节点类型(sequence/dimension)")
+    sequence_type: Optional[str] = Field(None, description="序列类别(doctor/nurse/tech)，序列节点未指定时按名称推断")
     sort_order: Optional[Decimal] = Field(0, description="排序序号")
     is_leaf: bool = Field(False, description="是否为末级维度")
     calc_type: Optional[str] = Field(None, description="算法类型(statistical=指标/calculational=目录)")
@@ -33,6 +34,7 @@ class ModelNodeUpdate(BaseModel):
     name: Optional[str] = Field(None, description="节点名称")
     code: Optional[str] = Field(None, description="节点编码")
     node_type: Optional[str] = Field(None, description="节点类型")
+    sequence_type: Optional[str] = Field(None, description="序列类别(doctor/nurse/tech)")
     sort_order: Optional[Decimal] = Field(None, description="排序序号")
     is_leaf: Optional[bool] = Field(None, description="是否为末级维度")
     calc_type: Optional[str] = Field(None, description="算法类型")
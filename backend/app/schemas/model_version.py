@@ -16,6 +16,7 @@ class ModelVersionBase(BaseModel):
 class ModelVersionCreate(ModelVersionBase):
     """创建模型版本Schema"""
     base_version_id: Optional[int] = Field(None, description="基础版本ID（用于复制）")
+    async_copy: bool = Field(False, description="是否在后台复制基础版本（返回 copy_task_id 查询进度）")
 
 
 class ModelVersionUpdate(BaseModel):
@@ -30,6 +31,8 @@ class ModelVersionResponse(ModelVersionBase):
     is_active: bool
     created_at: datetime
     updated_at: datetime
+    copy_status: Optional[str] = Field(None, description="后台复制状态（copying 表示内容仍在复制）")
+    copy_task_id: Optional[str] = Field(None, description="后台复制任务ID")
 
     class Config:
         from_attributes = True
@@ -84,6 +87,7 @@ class ModelVersionImportRequest(BaseModel):
     version: str = Field(..., description="新版本号")
     name: str = Field(..., description="新版本名称")
     description: Optional[str] = Field(None, description="新版本描述")
+    async_mode: bool = Field(False, description="是否在后台导入（返回 task_id 查询进度）")
 
 
 class ModelVersionImportResponse(BaseModel):
@@ -93,6 +97,7 @@ class ModelVersionImportResponse(BaseModel):
     name: str = Field(..., description="新版本名称")
     statistics: dict = Field(..., description="导入统计信息")
     warnings: list[str] = Field(default_factory=list, description="警告信息")
+    task_id: Optional[str] = Field(None, description="后台导入任务ID")
 
     class Config:
         from_attributes = True
@@ -683,7 +683,7 @@ class AIReportService:
                                         SUM(quantity) as total_quantity
                                     FROM charge_details
                                     WHERE prescribing_dept_code = :dept_code
-                                    AND TO_CHAR(charge_time, 'YYYY-MM') = :period
+                                    AND year_month = :period
                                     AND item_code = ANY(:item_codes)
                                     GROUP BY item_code, item_name
                                     ORDER BY total_amount DESC
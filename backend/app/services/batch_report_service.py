@@ -0,0 +1,549 @@
+"""
+批次报表服务
+
+为批次中的每个任务生成汇总表、全院明细表和科室明细表，
+报表逐个生成并写入流式ZIP，内存占用只与单个工作簿有关。
+可直接作为下载流返回，也可由后台任务写入导出目录后下载。
+"""
+import os
+import shutil
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.calculation_task import CalculationTask
+from app.models.hospital import Hospital
+from app.models.model_node import ModelNode
+from app.models.orientation_rule import OrientationRule
+from app.models.reference_value import ReferenceValue
+from app.models.report_export import ReportExport
+from app.services.export_service import ExportService
+from app.services.period_result_loader import PeriodResultLoader
+from app.services.result_rollup_service import ResultRollup
+from app.utils.sequence_type import SEQUENCE_TYPES
+from app.utils.zip_stream import write_zip_file
+
+
+class BatchReportService:
+    """批次报表服务"""
+
+    # 后台导出文件目录：{EXPORT_DIR}/{医疗机构ID}/{导出ID}/{文件名}
+    EXPORT_DIR = "uploads/exports"
+
+    @staticmethod
+    def get_mom_period(period: str) -> str:
+        """获取环比月份（上月）"""
+        year, month = map(int, period.split('-'))
+        if month == 1:
+            return f"{year - 1}-12"
+        return f"{year}-{str(month - 1).zfill(2)}"
+
+    @staticmethod
+    def get_yoy_period(period: str) -> str:
+        """获取同比月份（去年同月）"""
+        year, month = map(int, period.split('-'))
+        return f"{year - 1}-{str(month).zfill(2)}"
+
+    @staticmethod
+    def get_hospital_name(db: Session, hospital_id: int) -> str:
+        hospital = db.query(Hospital).filter(Hospital.id == hospital_id).first()
+        return hospital.name if hospital else "未知医院"
+
+    @staticmethod
+    def get_archive_filename(hospital_name: str, batch_id: str, tasks: List[CalculationTask]) -> str:
+        """批次报表压缩包文件名"""
+        version = tasks[0].model_version.version if tasks[0].model_version else None
+        version_suffix = f"_{version}" if version else ""
+        return f"{hospital_name}_批次报表_{batch_id[-8:]}{version_suffix}.zip"
+
+    @staticmethod
+    def iter_batch_reports(
+        db: Session,
+        tasks: List[CalculationTask],
+        hospital_id: int,
+        hospital_name: str
+    ) -> Iterator[Tuple[str, bytes]]:
+        """
+        逐个生成批次中所有任务的报表
+
+        每个任务一个子目录（月份）。对于同比/环比，如果缺少对应月份的数据，
+        则汇总表中不计算同比/环比。
+
+        Yields:
+            (压缩包内路径, 文件内容)
+        """
+        version = tasks[0].model_version.version if tasks[0].model_version else None
+        tasks_by_period: Dict[str, CalculationTask] = {task.period: task for task in tasks}
+
+        # 按月份升序生成，环比、同比月份的结果在其作为当期任务时已加载汇总
+        loader = PeriodResultLoader(db, hospital_id)
+
+        for task in tasks:
+            mom_task = tasks_by_period.get(BatchReportService.get_mom_period(task.period))
+            yoy_task = tasks_by_period.get(BatchReportService.get_yoy_period(task.period))
+
+            for filename, content in BatchReportService.iter_task_reports(
+                loader, task, hospital_name, version, mom_task, yoy_task
+            ):
+                yield f"{task.period}/{filename}", content
+
+    @staticmethod
+    def write_batch_archive(
+        db: Session,
+        tasks: List[CalculationTask],
+        hospital_id: int,
+        export_id: str,
+        batch_id: str
+    ) -> str:
+        """
+        生成批次报表压缩包并写入导出目录
+
+        先写入临时文件，完成后再重命名，下载接口不会读到未写完的文件。
+
+        Returns:
+            压缩包路径
+        """
+        hospital_name = BatchReportService.get_hospital_name(db, hospital_id)
+        filename = BatchReportService.get_archive_filename(hospital_name, batch_id, tasks)
+
+        export_dir = os.path.join(BatchReportService.EXPORT_DIR, str(hospital_id), export_id)
+        os.makedirs(export_dir, exist_ok=True)
+        file_path = os.path.join(export_dir, filename)
+        temp_path = f"{file_path}.part"
+
+        try:
+            with open(temp_path, "wb") as f:
+                write_zip_file(
+                    BatchReportService.iter_batch_reports(db, tasks, hospital_id, hospital_name), f
+                )
+            os.replace(temp_path, file_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return file_path
+
+    @staticmethod
+    def find_export_file(hospital_id: int, export_id: str) -> Optional[str]:
+        """查找已生成的导出文件，未生成（或仍在写入）时返回 None"""
+        export_dir = os.path.join(BatchReportService.EXPORT_DIR, str(hospital_id), export_id)
+        if not os.path.isdir(export_dir):
+            return None
+        for name in sorted(os.listdir(export_dir)):
+            if not name.endswith(".part"):
+                return os.path.join(export_dir, name)
+        return None
+
+    @staticmethod
+    def create_export(db: Session, export_id: str, hospital_id: int, batch_id: str) -> ReportExport:
+        """登记后台导出，下载接口据此区分生成中与未知的导出ID"""
+        export = ReportExport(id=export_id, hospital_id=hospital_id, batch_id=batch_id, status="pending")
+        db.add(export)
+        db.commit()
+        return export
+
+    @staticmethod
+    def get_export(db: Session, hospital_id: int, export_id: str) -> Optional[ReportExport]:
+        """查询当前医疗机构的导出记录，其他医疗机构的导出视为不存在"""
+        return db.query(ReportExport).filter(
+            ReportExport.id == export_id,
+            ReportExport.hospital_id == hospital_id
+        ).first()
+
+    @staticmethod
+    def finish_export(db: Session, export_id: str, file_path: Optional[str] = None, error: Optional[str] = None):
+        """记录导出结果：有错误信息时标记失败，否则标记完成"""
+        export = db.query(ReportExport).filter(ReportExport.id == export_id).first()
+        if not export:
+            return
+        export.status = "failed" if error else "completed"
+        export.file_path = file_path
+        export.error_message = error
+        export.completed_at = datetime.utcnow()
+        db.commit()
+
+    @staticmethod
+    def cleanup_expired_exports(db: Session, now: Optional[datetime] = None) -> int:
+        """
+        删除超过保留期限的导出记录和导出目录
+
+        没有导出记录的目录（如记录已被删除）按修改时间判断是否过期。
+
+        Returns:
+            删除的导出目录数
+        """
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(hours=settings.REPORT_EXPORT_RETENTION_HOURS)
+
+        expired = db.query(ReportExport.id, ReportExport.hospital_id).filter(
+            ReportExport.created_at < cutoff
+        ).all()
+        removed = 0
+        for export_id, hospital_id in expired:
+            export_dir = os.path.join(BatchReportService.EXPORT_DIR, str(hospital_id), export_id)
+            if os.path.isdir(export_dir):
+                shutil.rmtree(export_dir, ignore_errors=True)
+                removed += 1
+        if expired:
+            db.query(ReportExport).filter(
+                ReportExport.id.in_([export_id for export_id, _ in expired])
+            ).delete(synchronize_session=False)
+            db.commit()
+
+        if not os.path.isdir(BatchReportService.EXPORT_DIR):
+            return removed
+        cutoff_ts = cutoff.replace(tzinfo=timezone.utc).timestamp()
+        for hospital_dir in os.scandir(BatchReportService.EXPORT_DIR):
+            if not hospital_dir.is_dir():
+                continue
+            for export_dir in os.scandir(hospital_dir.path):
+                if export_dir.is_dir() and export_dir.stat().st_mtime < cutoff_ts:
+                    shutil.rmtree(export_dir.path, ignore_errors=True)
+                    removed += 1
+        return removed
+
+    @staticmethod
+    def iter_task_reports(
+        loader: PeriodResultLoader,
+        task: CalculationTask,
+        hospital_name: str,
+        version: str,
+        mom_task: Optional[CalculationTask],
+        yoy_task: Optional[CalculationTask]
+    ) -> Iterator[Tuple[str, bytes]]:
+        """逐个生成单个任务的所有报表
+    
+        每生成一个工作簿即产出 (文件名, 文件内容)，调用方写出后即可释放。
+        计算结果和环比、同比数据由批次共享的加载器提供。
+        """
+        db = loader.db
+        hospital_id = loader.hospital_id
+        version_suffix = ExportService._format_version(version)
+    
+        # 获取所有参与核算的科室
+        all_active_depts = loader.active_departments()
+    
+        # 查询当期计算结果（按科室的逐级汇总带有序列类别，按核算单元、全院汇总时复用）
+        all_results, dept_rollup = loader.load(task.task_id)
+        sequence_types = dept_rollup.sequence_types
+    
+        results_by_dept = defaultdict(list)
+        for result in all_results:
+            results_by_dept[result.department_id].append(result)
+    
+        # 查询模型节点信息
+        node_ids = list(set([r.node_id for r in all_results]))
+        model_nodes = db.query(ModelNode).filter(ModelNode.id.in_(node_ids)).all() if node_ids else []
+        node_info_map = {node.id: node for node in model_nodes}
+    
+        # 查询导向规则名称映射
+        orientation_rule_ids = set()
+        for node in model_nodes:
+            if node.orientation_rule_ids:
+                orientation_rule_ids.update(node.orientation_rule_ids)
+    
+        orientation_rules = {}
+        if orientation_rule_ids:
+            rules = db.query(OrientationRule).filter(OrientationRule.id.in_(orientation_rule_ids)).all()
+            orientation_rules = {rule.id: rule.name for rule in rules}
+    
+        # 查询参考价值
+        ref_values = db.query(ReferenceValue).filter(
+            ReferenceValue.hospital_id == hospital_id,
+            ReferenceValue.period == task.period
+        ).all()
+        ref_value_map = {rv.department_code: rv.reference_value for rv in ref_values}
+    
+        # 环比、同比数据（按核算单元编码汇总）
+        mom_summary = loader.unit_totals(mom_task.task_id if mom_task else None)
+        yoy_summary = loader.unit_totals(yoy_task.task_id if yoy_task else None)
+    
+        # 按核算单元分组
+        accounting_units = {}
+        for dept in all_active_depts:
+            unit_code = dept.accounting_unit_code or dept.his_code
+            unit_name = dept.accounting_unit_name or dept.his_name
+            unit_key = (unit_code, unit_name)
+        
+            if unit_key not in accounting_units:
+                accounting_units[unit_key] = {
+                    'dept_ids': [],
+                    'sort_order': dept.sort_order
+                }
+            accounting_units[unit_key]['dept_ids'].append(dept.id)
+    
+        sorted_units = sorted(accounting_units.items(), key=lambda x: x[1]['sort_order'])
+    
+        # 按核算单元逐级汇总（同一核算单元下各科室的同一节点合并）
+        unit_key_by_dept = {
+            dept_id: unit_key
+            for unit_key, unit_data in accounting_units.items()
+            for dept_id in unit_data['dept_ids']
+        }
+        unit_rollup = ResultRollup(
+            all_results,
+            group_key=lambda r: unit_key_by_dept.get(r.department_id),
+            sequence_types=sequence_types
+        )
+    
+        # 计算汇总数据
+        summary_by_unit = {}
+        for (unit_code, unit_name), unit_data in sorted_units:
+            doctor_value, nurse_value, tech_value = unit_rollup.sequence_values((unit_code, unit_name))
+            total_val = doctor_value + nurse_value + tech_value
+        
+            # 参考价值
+            ref_value = ref_value_map.get(unit_code)
+            actual_ref_ratio = None
+            if ref_value is not None and ref_value != 0:
+                actual_ref_ratio = float(total_val / ref_value)
+        
+            # 环比
+            mom_value = mom_summary.get(unit_code)
+            mom_ratio = None
+            if mom_value is not None and mom_value != 0:
+                mom_ratio = float(total_val / mom_value)
+        
+            # 同比
+            yoy_value = yoy_summary.get(unit_code)
+            yoy_ratio = None
+            if yoy_value is not None and yoy_value != 0:
+                yoy_ratio = float(total_val / yoy_value)
+        
+            summary_by_unit[(unit_code, unit_name)] = {
+                'doctor_value': doctor_value,
+                'nurse_value': nurse_value,
+                'tech_value': tech_value,
+                'total_value': total_val,
+                'doctor_ratio': float(doctor_value / total_val * 100) if total_val > 0 else 0,
+                'nurse_ratio': float(nurse_value / total_val * 100) if total_val > 0 else 0,
+                'tech_ratio': float(tech_value / total_val * 100) if total_val > 0 else 0,
+                'reference_value': float(ref_value) if ref_value is not None else None,
+                'actual_reference_ratio': actual_ref_ratio,
+                'mom_value': float(mom_value) if mom_value is not None else None,
+                'mom_ratio': mom_ratio,
+                'yoy_value': float(yoy_value) if yoy_value is not None else None,
+                'yoy_ratio': yoy_ratio
+            }
+    
+        # 构建汇总表数据
+        total_doctor = sum(v['doctor_value'] for v in summary_by_unit.values())
+        total_nurse = sum(v['nurse_value'] for v in summary_by_unit.values())
+        total_tech = sum(v['tech_value'] for v in summary_by_unit.values())
+        total_all = total_doctor + total_nurse + total_tech
+    
+        # 计算全院汇总的参考值、环比、同比
+        total_reference_value = Decimal('0')
+        total_mom_value = Decimal('0')
+        total_yoy_value = Decimal('0')
+        has_reference = False
+        has_mom = bool(mom_task)
+        has_yoy = bool(yoy_task)
+    
+        for v in summary_by_unit.values():
+            if v['reference_value'] is not None:
+                has_reference = True
+                total_reference_value += Decimal(str(v['reference_value']))
+            if v['mom_value'] is not None:
+                total_mom_value += Decimal(str(v['mom_value']))
+            if v['yoy_value'] is not None:
+                total_yoy_value += Decimal(str(v['yoy_value']))
+    
+        summary_actual_ref_ratio = None
+        if has_reference and total_reference_value != 0:
+            summary_actual_ref_ratio = float(total_all / total_reference_value)
+    
+        summary_mom_ratio = None
+        if has_mom and total_mom_value != 0:
+            summary_mom_ratio = float(total_all / total_mom_value)
+    
+        summary_yoy_ratio = None
+        if has_yoy and total_yoy_value != 0:
+            summary_yoy_ratio = float(total_all / total_yoy_value)
+    
+        summary_data = {
+            'summary': {
+                'department_id': 0,
+                'department_code': None,
+                'department_name': '全院汇总',
+                'doctor_value': total_doctor,
+                'doctor_ratio': float(total_doctor / total_all * 100) if total_all > 0 else 0,
+                'nurse_value': total_nurse,
+                'nurse_ratio': float(total_nurse / total_all * 100) if total_all > 0 else 0,
+                'tech_value': total_tech,
+                'tech_ratio': float(total_tech / total_all * 100) if total_all > 0 else 0,
+                'total_value': total_all,
+                'reference_value': float(total_reference_value) if has_reference else None,
+                'actual_reference_ratio': summary_actual_ref_ratio,
+                'mom_value': float(total_mom_value) if has_mom else None,
+                'mom_ratio': summary_mom_ratio,
+                'yoy_value': float(total_yoy_value) if has_yoy else None,
+                'yoy_ratio': summary_yoy_ratio
+            },
+            'departments': [
+                {
+                    'department_id': accounting_units[(unit_code, unit_name)]['dept_ids'][0] if accounting_units[(unit_code, unit_name)]['dept_ids'] else 0,
+                    'department_code': unit_code,
+                    'department_name': unit_name,
+                    **summary_by_unit[(unit_code, unit_name)]
+                }
+                for (unit_code, unit_name), _ in sorted_units
+                if (unit_code, unit_name) in summary_by_unit
+            ]
+        }
+    
+        # 生成汇总表Excel
+        summary_excel = ExportService.export_summary_to_excel(summary_data, task.period, hospital_name, version)
+        summary_filename = f"{hospital_name}_科室业务价值汇总_{task.period}{version_suffix}.xlsx"
+        yield summary_filename, summary_excel.getvalue()
+    
+        # 生成全院明细表
+        hospital_detail_data = BatchReportService._build_hospital_detail_data(
+            all_results, node_info_map, orientation_rules, sequence_types
+        )
+        if hospital_detail_data:
+            hospital_excel = ExportService.export_hospital_detail_to_excel(task.period, hospital_detail_data, hospital_name, version)
+            hospital_filename = f"{hospital_name}_全院业务价值明细_{task.period}{version_suffix}.xlsx"
+            yield hospital_filename, hospital_excel.getvalue()
+    
+        # 生成各科室明细表
+        for (unit_code, unit_name), unit_data in sorted_units:
+            if not any(dept_id in results_by_dept for dept_id in unit_data['dept_ids']):
+                continue
+        
+            detail_data = BatchReportService._build_dept_detail_data(unit_rollup, (unit_code, unit_name), node_info_map, orientation_rules)
+        
+            detail_excel = ExportService.export_detail_to_excel(unit_name, task.period, detail_data, hospital_name, version)
+            detail_filename = f"{hospital_name}_{unit_name}_业务价值明细_{task.period}{version_suffix}.xlsx"
+            yield detail_filename, detail_excel.getvalue()
+
+    @staticmethod
+    def _build_hospital_detail_data(
+        results: list, node_info_map: dict, orientation_rules: dict, sequence_types: dict
+    ) -> dict:
+        """构建全院明细数据"""
+        # 按节点ID汇总所有科室的数据
+        node_aggregated = defaultdict(lambda: {
+            'node_id': 0,
+            'node_name': '',
+            'node_code': '',
+            'node_type': '',
+            'parent_id': None,
+            'workload': Decimal('0'),
+            'value': Decimal('0'),
+            'weight': None,
+            'business_guide': None,
+            'sort_order': 999
+        })
+    
+        for result in results:
+            node_id = result.node_id
+            agg = node_aggregated[node_id]
+        
+            if agg['node_id'] == 0:
+                agg['node_id'] = result.node_id
+                agg['node_name'] = result.node_name
+                agg['node_code'] = result.node_code
+                agg['node_type'] = result.node_type
+                agg['parent_id'] = result.parent_id
+                agg['weight'] = result.weight
+                node_info = node_info_map.get(result.node_id)
+                if node_info:
+                    agg['business_guide'] = node_info.business_guide
+                    agg['sort_order'] = node_info.sort_order
+        
+            if result.workload:
+                agg['workload'] += result.workload
+            if result.value:
+                agg['value'] += result.value
+    
+        # 子节点索引（所有科室的同一节点合并）
+        rollup = ResultRollup(results, group_key=lambda r: None, sequence_types=sequence_types)
+    
+        # 构建树形结构
+        def build_dimension_tree(parent_id, level):
+            children = []
+            for child in rollup.children(None, parent_id):
+                agg = node_aggregated[child.node_id]
+                node_info = node_info_map.get(agg['node_id'])
+            
+                orientation_names = []
+                if node_info and node_info.orientation_rule_ids:
+                    orientation_names = [
+                        orientation_rules.get(rule_id, f"规则{rule_id}")
+                        for rule_id in node_info.orientation_rule_ids
+                    ]
+                business_guide = "、".join(orientation_names) if orientation_names else agg.get('business_guide')
+            
+                dim = {
+                    'node_id': agg['node_id'],
+                    'dimension_name': agg['node_name'],
+                    'workload': agg['workload'],
+                    'hospital_value': str(agg['weight']) if agg['weight'] is not None else "-",
+                    'business_guide': business_guide or "-",
+                    'amount': agg['value'],
+                    'ratio': 0,
+                    'sort_order': agg['sort_order'],
+                    'children': build_dimension_tree(agg['node_id'], level + 1)
+                }
+                children.append(dim)
+        
+            children.sort(key=lambda x: x['sort_order'])
+            return children
+    
+        # 按序列组织数据
+        hospital_detail_data = {}
+        for seq in rollup.sequences(None):
+            sequence_type = rollup.sequence_type(seq.node_id)
+            if sequence_type in SEQUENCE_TYPES:
+                hospital_detail_data[sequence_type] = build_dimension_tree(seq.node_id, 1)
+    
+        return hospital_detail_data
+
+    @staticmethod
+    def _build_dept_detail_data(rollup: ResultRollup, group, node_info_map: dict, orientation_rules: dict) -> dict:
+        """构建科室（或核算单元）明细数据"""
+    
+        def build_dimension_tree(parent_id, level):
+            children = []
+            for result in rollup.children(group, parent_id):
+                own_workload, own_value = rollup.own(group, result.node_id)
+                node_info = node_info_map.get(result.node_id)
+            
+                orientation_names = []
+                if node_info and node_info.orientation_rule_ids:
+                    orientation_names = [
+                        orientation_rules.get(rule_id, f"规则{rule_id}")
+                        for rule_id in node_info.orientation_rule_ids
+                    ]
+                business_guide = "、".join(orientation_names) if orientation_names else (node_info.business_guide if node_info else None)
+            
+                dim = {
+                    'node_id': result.node_id,
+                    'dimension_name': result.node_name,
+                    'workload': own_workload,
+                    'hospital_value': str(result.original_weight or result.weight) if (result.original_weight or result.weight) is not None else "-",
+                    'business_guide': business_guide or "-",
+                    'dept_value': str(result.weight) if result.weight is not None else "-",
+                    'amount': own_value,
+                    'ratio': result.ratio or 0,
+                    'sort_order': node_info.sort_order if node_info else 999,
+                    'children': build_dimension_tree(result.node_id, level + 1)
+                }
+                children.append(dim)
+        
+            children.sort(key=lambda x: x['sort_order'])
+            return children
+    
+        detail_data = {}
+    
+        for seq in rollup.sequences(group):
+            sequence_type = rollup.sequence_type(seq.node_id)
+            if sequence_type in SEQUENCE_TYPES:
+                detail_data[sequence_type] = build_dimension_tree(seq.node_id, 1)
+    
+        return detail_data
@@ -0,0 +1,134 @@
+"""
+收费明细暂存表服务
+
+charge_details 按月份（year_month）范围分区，数据准备步骤调用
+prepare_charge_details_period('YYYY-MM') 只重建本月分区。
+charge_detail_periods 记录各月份已加载数据的输入指纹和行数，
+同一月份的输入未变化时，其他任务的计算可以直接使用已加载的分区，跳过重新加载。
+"""
+import re
+from typing import Optional
+
+from sqlalchemy import text
+
+
+TABLE_NAME = "charge_details"
+REGISTRY_TABLE = "charge_detail_periods"
+
+_PREPARE_PATTERN = re.compile(
+    r"\bprepare_charge_details_period\s*\(\s*'(\d{4}-\d{2})'",
+    re.IGNORECASE
+)
+
+
+class ChargeDetailStoreService:
+    """收费明细暂存表服务"""
+
+    @staticmethod
+    def extract_load_period(code: str) -> Optional[str]:
+        """
+        识别加载收费明细的步骤
+
+        Args:
+            code: 渲染后的步骤代码
+
+        Returns:
+            步骤加载的月份；不是加载步骤时返回 None
+        """
+        match = _PREPARE_PATTERN.search(code or "")
+        return match.group(1) if match else None
+
+    @staticmethod
+    def get_loaded_fingerprint(connection, year_month: str) -> Optional[str]:
+        """
+        查询月份已加载数据的输入指纹
+
+        登记的行数与分区当前行数不一致（数据被手工修改或清除）时视为未加载。
+
+        Returns:
+            已加载时返回指纹，否则返回 None（数据源没有登记表时也返回 None）
+        """
+        exists = connection.execute(
+            text("SELECT to_regclass(:table_name) IS NOT NULL"),
+            {"table_name": REGISTRY_TABLE}
+        ).scalar()
+        if not exists:
+            return None
+
+        row = connection.execute(
+            text(f"SELECT fingerprint, row_count FROM {REGISTRY_TABLE} WHERE year_month = :year_month"),
+            {"year_month": year_month}
+        ).first()
+        if row is None:
+            return None
+
+        current_count = connection.execute(
+            text(f"SELECT count(*) FROM {TABLE_NAME} WHERE year_month = :year_month"),
+            {"year_month": year_month}
+        ).scalar()
+        return row.fingerprint if current_count == row.row_count else None
+
+    @staticmethod
+    def mark_loaded(connection, year_month: str, fingerprint: str, task_id: Optional[str] = None) -> int:
+        """
+        登记月份已加载（调用方负责提交）
+
+        Returns:
+            该月份的行数
+        """
+        row_count = connection.execute(
+            text(f"SELECT count(*) FROM {TABLE_NAME} WHERE year_month = :year_month"),
+            {"year_month": year_month}
+        ).scalar()
+        connection.execute(
+            text(f"""
+                INSERT INTO {REGISTRY_TABLE} (year_month, fingerprint, row_count, task_id, loaded_at)
+                VALUES (:year_month, :fingerprint, :row_count, :task_id, now())
+                ON CONFLICT (year_month) DO UPDATE SET
+                    fingerprint = EXCLUDED.fingerprint,
+                    row_count = EXCLUDED.row_count,
+                    task_id = EXCLUDED.task_id,
+                    loaded_at = EXCLUDED.loaded_at
+            """),
+            {
+                "year_month": year_month,
+                "fingerprint": fingerprint,
+                "row_count": row_count,
+                "task_id": task_id,
+            }
+        )
+        return row_count
+
+    @staticmethod
+    def detach_period(connection, year_month: str, drop: bool = False) -> bool:
+        """
+        卸载月份分区（调用方负责提交）
+
+        分离后的表保留为 charge_details_YYYY_MM，可用于归档；drop=True 时直接删除。
+
+        Returns:
+            分区存在并已卸载时返回 True
+        """
+        if not re.fullmatch(r"\d{4}-\d{2}", year_month or ""):
+            raise ValueError(f"无效的月份: {year_month}")
+
+        partition_name = f"{TABLE_NAME}_{year_month.replace('-', '_')}"
+        exists = connection.execute(
+            text("""
+                SELECT 1 FROM pg_inherits
+                WHERE inhparent = to_regclass(:parent) AND inhrelid = to_regclass(:partition)
+            """),
+            {"parent": TABLE_NAME, "partition": partition_name}
+        ).first()
+
+        connection.execute(
+            text(f"DELETE FROM {REGISTRY_TABLE} WHERE year_month = :year_month"),
+            {"year_month": year_month}
+        )
+        if not exists:
+            return False
+
+        connection.execute(text(f"ALTER TABLE {TABLE_NAME} DETACH PARTITION {partition_name}"))
+        if drop:
+            connection.execute(text(f"DROP TABLE {partition_name}"))
+        return True
@@ -0,0 +1,221 @@
+"""
+AI分类结果缓存服务
+
+分类任务在分批调用AI接口前先查缓存：同一医疗机构下，项目名称规范化后相同、
+分类上下文（末级维度编码和路径、模型、提示词）相同的项目直接复用上次的分类结果，
+不再发送给AI接口。复制的模型版本维度编码和路径不变，缓存同样有效；
+维度或提示词调整后上下文哈希变化，自然不再命中。
+
+缓存超过 CLASSIFICATION_CACHE_TTL_DAYS 天失效；每个医疗机构最多保留
+CLASSIFICATION_CACHE_MAX_ENTRIES 条，超出时淘汰最久未使用的条目。
+"""
+import hashlib
+import json
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.classification_cache import ClassificationCacheEntry
+from app.models.plan_item import ProcessingStatus
+
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class ClassificationCacheService:
+    """AI分类结果缓存服务"""
+
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        """规范化项目名称：全角转半角（NFKC）、忽略大小写和空白"""
+        normalized = unicodedata.normalize("NFKC", name or "").lower()
+        return _WHITESPACE_PATTERN.sub("", normalized)[:200]
+
+    @staticmethod
+    def context_hash(
+        dimensions: List[dict],
+        model_name: str,
+        system_prompt: Optional[str],
+        prompt_template: str
+    ) -> str:
+        """
+        计算分类上下文哈希
+
+        Args:
+            dimensions: 末级维度列表，每个维度包含 code、path 字段（与维度ID无关）
+        """
+        payload = json.dumps(
+            {
+                "dimensions": sorted([dim["code"], dim["path"]] for dim in dimensions),
+                "model": model_name,
+                "system_prompt": system_prompt or "",
+                "prompt": prompt_template,
+            },
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def lookup(
+        db: Session,
+        hospital_id: int,
+        context_hash: str,
+        names: Iterable[str]
+    ) -> Dict[str, ClassificationCacheEntry]:
+        """
+        查询未过期的缓存，命中的条目更新使用时间和命中次数（由调用方提交事务）
+
+        Returns:
+            {规范化名称: 缓存条目}
+        """
+        name_keys = sorted({ClassificationCacheService.normalize_name(name) for name in names} - {""})
+        if not name_keys:
+            return {}
+
+        cutoff = datetime.utcnow() - timedelta(days=settings.CLASSIFICATION_CACHE_TTL_DAYS)
+        entries = {}
+        for start in range(0, len(name_keys), 1000):
+            for entry in db.query(ClassificationCacheEntry).filter(
+                ClassificationCacheEntry.hospital_id == hospital_id,
+                ClassificationCacheEntry.context_hash == context_hash,
+                ClassificationCacheEntry.name_key.in_(name_keys[start:start + 1000]),
+                ClassificationCacheEntry.created_at >= cutoff
+            ):
+                entries[entry.name_key] = entry
+
+        if entries:
+            db.query(ClassificationCacheEntry).filter(
+                ClassificationCacheEntry.id.in_([entry.id for entry in entries.values()])
+            ).update(
+                {
+                    ClassificationCacheEntry.last_used_at: datetime.utcnow(),
+                    ClassificationCacheEntry.hit_count: ClassificationCacheEntry.hit_count + 1,
+                },
+                synchronize_session=False
+            )
+        return entries
+
+    @staticmethod
+    def store(
+        db: Session,
+        hospital_id: int,
+        context_hash: str,
+        results: List[dict]
+    ) -> int:
+        """
+        写入分类结果，已有条目覆盖为最新结果（由调用方提交事务）
+
+        Args:
+            results: 每项包含 item_name、dimension_code、dimension_path、confidence
+
+        Returns:
+            写入的条目数
+        """
+        now = datetime.utcnow()
+        rows = {}
+        for result in results:
+            name_key = ClassificationCacheService.normalize_name(result["item_name"])
+            if not name_key:
+                continue
+            rows[name_key] = {
+                "hospital_id": hospital_id,
+                "context_hash": context_hash,
+                "name_key": name_key,
+                "item_name": result["item_name"][:200],
+                "dimension_code": result["dimension_code"],
+                "dimension_path": result["dimension_path"][:500],
+                "confidence": result["confidence"],
+                "hit_count": 0,
+                "created_at": now,
+                "last_used_at": now,
+            }
+        if not rows:
+            return 0
+
+        stmt = postgresql.insert(ClassificationCacheEntry).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_classification_cache_key",
+            set_={
+                "item_name": stmt.excluded.item_name,
+                "dimension_code": stmt.excluded.dimension_code,
+                "dimension_path": stmt.excluded.dimension_path,
+                "confidence": stmt.excluded.confidence,
+                "created_at": stmt.excluded.created_at,
+                "last_used_at": stmt.excluded.last_used_at,
+            }
+        )
+        db.execute(stmt)
+        return len(rows)
+
+    @staticmethod
+    def apply_cached(
+        db: Session,
+        hospital_id: int,
+        context_hash: str,
+        items: list,
+        dimensions: List[dict]
+    ) -> list:
+        """
+        用缓存结果完成预案项目（由调用方提交事务）
+
+        Args:
+            items: 待处理的预案项目
+            dimensions: 当前版本的末级维度列表（id、code、path）
+
+        Returns:
+            命中缓存的预案项目
+        """
+        entries = ClassificationCacheService.lookup(
+            db, hospital_id, context_hash, [item.charge_item_name for item in items]
+        )
+        if not entries:
+            return []
+
+        dimension_ids = {}
+        for dim in dimensions:
+            dimension_ids.setdefault((dim["code"], dim["path"]), dim["id"])
+
+        hits = []
+        for item in items:
+            entry = entries.get(ClassificationCacheService.normalize_name(item.charge_item_name))
+            if entry is None:
+                continue
+            dimension_id = dimension_ids.get((entry.dimension_code, entry.dimension_path))
+            if dimension_id is None:
+                continue
+            item.ai_suggested_dimension_id = dimension_id
+            item.ai_confidence = entry.confidence
+            item.processing_status = ProcessingStatus.completed
+            item.error_message = None
+            hits.append(item)
+        return hits
+
+    @staticmethod
+    def evict(db: Session, hospital_id: int) -> int:
+        """
+        清除过期条目，并按最近使用时间淘汰超出上限的条目（由调用方提交事务）
+
+        Returns:
+            删除的条目数
+        """
+        cutoff = datetime.utcnow() - timedelta(days=settings.CLASSIFICATION_CACHE_TTL_DAYS)
+        deleted = db.query(ClassificationCacheEntry).filter(
+            ClassificationCacheEntry.hospital_id == hospital_id,
+            ClassificationCacheEntry.created_at < cutoff
+        ).delete(synchronize_session=False)
+
+        overflow = db.query(ClassificationCacheEntry.id).filter(
+            ClassificationCacheEntry.hospital_id == hospital_id
+        ).order_by(
+            ClassificationCacheEntry.last_used_at.desc(),
+            ClassificationCacheEntry.id.desc()
+        ).offset(settings.CLASSIFICATION_CACHE_MAX_ENTRIES).subquery()
+        deleted += db.query(ClassificationCacheEntry).filter(
+            ClassificationCacheEntry.id.in_(db.query(overflow.c.id))
+        ).delete(synchronize_session=False)
+        return deleted
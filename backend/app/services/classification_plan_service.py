@@ -5,7 +5,7 @@ import logging
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, asc, and_, or_
+from sqlalchemy import desc, asc, and_, or_, func, text
 
 from app.models.classification_plan import ClassificationPlan, PlanStatus
 from app.models.plan_item import PlanItem, ProcessingStatus
@@ -13,6 +13,8 @@ from app.models.classification_task import ClassificationTask
 from app.models.model_node import ModelNode
 from app.models.dimension_item_mapping import DimensionItemMapping
 from app.models.charge_item import ChargeItem
+from app.models.model_version import ModelVersion
+from app.services.model_tree_service import ModelTreeService
 from app.schemas.classification_plan import (
     ClassificationPlanResponse,
     ClassificationPlanListResponse,
@@ -31,6 +33,49 @@ from app.schemas.classification_plan import (
 logger = logging.getLogger(__name__)
 
 
+# 提交预案：一条语句更新已有映射并插入新映射
+# 同一收费项目的已有映射（charge_item_id 相同）只更新最早的一条，与逐项提交时一致
+_SUBMIT_MAPPINGS_SQL = text("""
+    WITH resolved AS (
+        SELECT pi.charge_item_id, ci.item_code, mn.code AS dimension_code
+        FROM plan_items pi
+        JOIN model_nodes mn
+            ON mn.id = COALESCE(pi.user_set_dimension_id, pi.ai_suggested_dimension_id)
+        JOIN charge_items ci ON ci.id = pi.charge_item_id
+        WHERE pi.plan_id = :plan_id
+          AND pi.hospital_id = :hospital_id
+    ),
+    existing AS (
+        SELECT DISTINCT ON (m.charge_item_id) m.id, m.charge_item_id
+        FROM dimension_item_mappings m
+        JOIN resolved r ON r.charge_item_id = m.charge_item_id
+        WHERE m.hospital_id = :hospital_id
+        ORDER BY m.charge_item_id, m.id
+    ),
+    updated AS (
+        UPDATE dimension_item_mappings m
+        SET dimension_code = r.dimension_code,
+            created_at = :now
+        FROM existing e
+        JOIN resolved r ON r.charge_item_id = e.charge_item_id
+        WHERE m.id = e.id
+        RETURNING m.id
+    ),
+    inserted AS (
+        INSERT INTO dimension_item_mappings (hospital_id, dimension_code, item_code, charge_item_id, created_at)
+        SELECT :hospital_id, r.dimension_code, r.item_code, r.charge_item_id, :now
+        FROM resolved r
+        WHERE NOT EXISTS (SELECT 1 FROM existing e WHERE e.charge_item_id = r.charge_item_id)
+        RETURNING id
+    )
+    SELECT
+        (SELECT count(*) FROM plan_items WHERE plan_id = :plan_id AND hospital_id = :hospital_id),
+        (SELECT count(*) FROM resolved),
+        (SELECT count(*) FROM updated),
+        (SELECT count(*) FROM inserted)
+""")
+
+
 class ClassificationPlanService:
     """分类预案管理服务"""
     
@@ -284,9 +329,10 @@ class ClassificationPlanService:
         skip = (query_params.page - 1) * query_params.size
         items = query.offset(skip).limit(query_params.size).all()
         
-        # 构建响应
+        # 构建响应（同一版本的路径索引只取一次）
+        path_indexes = {}
         item_responses = [
-            ClassificationPlanService._build_plan_item_response(db, item) 
+            ClassificationPlanService._build_plan_item_response(db, item, path_indexes) 
             for item in items
         ]
         
@@ -405,55 +451,65 @@ class ClassificationPlanService:
         if not plan:
             raise ValueError(f"预案 {plan_id} 不存在或不属于当前医疗机构")
         
-        # 查询所有预案项目
-        items = db.query(PlanItem).filter(
+        # 查询所有预案项目及最终维度（用户设置 ?? AI建议）
+        rows = db.query(PlanItem, ModelNode).outerjoin(
+            ModelNode,
+            ModelNode.id == func.coalesce(PlanItem.user_set_dimension_id, PlanItem.ai_suggested_dimension_id)
+        ).filter(
             PlanItem.plan_id == plan_id,
             PlanItem.hospital_id == hospital_id
-        ).all()
+        ).order_by(PlanItem.id).all()
+        
+        # 一次查询已存在的映射（每个收费项目取最早的一条）
+        existing_codes = {}
+        for charge_item_id, dimension_code in db.query(
+            DimensionItemMapping.charge_item_id,
+            DimensionItemMapping.dimension_code
+        ).filter(
+            DimensionItemMapping.hospital_id == hospital_id,
+            DimensionItemMapping.charge_item_id.in_(
+                db.query(PlanItem.charge_item_id).filter(PlanItem.plan_id == plan_id)
+            )
+        ).order_by(DimensionItemMapping.id):
+            existing_codes.setdefault(charge_item_id, dimension_code)
+        
+        # 一次查询原维度信息（通过ModelVersion验证hospital_id）
+        old_dimensions = {}
+        if existing_codes:
+            for node in db.query(ModelNode).join(
+                ModelVersion, ModelNode.version_id == ModelVersion.id
+            ).filter(
+                ModelNode.code.in_(set(existing_codes.values())),
+                ModelVersion.hospital_id == hospital_id
+            ).order_by(ModelNode.id):
+                old_dimensions.setdefault(node.code, node)
         
         new_items = []
         overwrite_items = []
         warnings = []
+        path_indexes = {}
         
-        for item in items:
-            # 确定最终维度（用户设置 ?? AI建议）
+        for item, dimension in rows:
             final_dimension_id = item.user_set_dimension_id or item.ai_suggested_dimension_id
             
             if not final_dimension_id:
                 warnings.append(f"项目 {item.charge_item_name} 没有维度分配，将被跳过")
                 continue
             
-            # 获取维度信息
-            dimension = db.query(ModelNode).filter(
-                ModelNode.id == final_dimension_id
-            ).first()
-            
             if not dimension:
                 warnings.append(f"项目 {item.charge_item_name} 的维度 {final_dimension_id} 不存在")
                 continue
             
-            # 检查是否已存在映射
-            existing = db.query(DimensionItemMapping).filter(
-                DimensionItemMapping.hospital_id == hospital_id,
-                DimensionItemMapping.charge_item_id == item.charge_item_id
-            ).first()
-            
             # 构建维度路径
-            dimension_path = ClassificationPlanService._get_dimension_path(db, dimension)
+            dimension_path = ClassificationPlanService._get_dimension_path(db, dimension, path_indexes)
             
-            if existing:
-                # 覆盖：查询原维度信息（通过ModelVersion验证hospital_id）
-                from app.models.model_version import ModelVersion
-                
-                old_dimension = db.query(ModelNode).join(
-                    ModelVersion, ModelNode.version_id == ModelVersion.id
-                ).filter(
-                    ModelNode.code == existing.dimension_code,
-                    ModelVersion.hospital_id == hospital_id
-                ).first()
+            if item.charge_item_id in existing_codes:
+                # 覆盖
+                old_code = existing_codes[item.charge_item_id]
+                old_dimension = old_dimensions.get(old_code)
                 
-                old_dimension_name = old_dimension.name if old_dimension else existing.dimension_code
-                old_dimension_path = ClassificationPlanService._get_dimension_path(db, old_dimension) if old_dimension else ""
+                old_dimension_name = old_dimension.name if old_dimension else old_code
+                old_dimension_path = ClassificationPlanService._get_dimension_path(db, old_dimension, path_indexes) if old_dimension else ""
                 
                 overwrite_items.append(SubmitPreviewOverwriteItem(
                     item_id=item.id,
@@ -482,7 +538,7 @@ class ClassificationPlanService:
         return SubmitPreviewResponse(
             plan_id=plan.id,
             plan_name=plan.plan_name,
-            total_items=len(items),
+            total_items=len(rows),
             new_count=len(new_items),
             overwrite_count=len(overwrite_items),
             new_items=new_items,
@@ -500,6 +556,9 @@ class ClassificationPlanService:
         """
         提交预案（批量提交到维度目录）
         
+        一条语句完成：按最终维度（用户设置 ?? AI建议）关联维度节点和收费项目，
+        已有映射（同一收费项目最早的一条）更新维度编码，其余插入新映射。
+        
         Args:
             db: 数据库会话
             hospital_id: 医疗机构ID
@@ -514,11 +573,11 @@ class ClassificationPlanService:
         """
         logger.info(f"[分类预案服务] 提交预案: plan_id={plan_id}, hospital_id={hospital_id}")
         
-        # 查询预案
+        # 查询预案（锁定预案行，避免并发重复提交）
         plan = db.query(ClassificationPlan).filter(
             ClassificationPlan.id == plan_id,
             ClassificationPlan.hospital_id == hospital_id
-        ).first()
+        ).with_for_update().first()
         
         if not plan:
             raise ValueError(f"预案 {plan_id} 不存在或不属于当前医疗机构")
@@ -526,75 +585,20 @@ class ClassificationPlanService:
         if plan.status == PlanStatus.submitted:
             raise ValueError("预案已提交，不可重复提交")
         
-        # 查询所有预案项目
-        items = db.query(PlanItem).filter(
-            PlanItem.plan_id == plan_id,
-            PlanItem.hospital_id == hospital_id
-        ).all()
-        
-        new_count = 0
-        overwrite_count = 0
-        
         try:
-            for item in items:
-                # 确定最终维度（用户设置 ?? AI建议）
-                final_dimension_id = item.user_set_dimension_id or item.ai_suggested_dimension_id
-                
-                if not final_dimension_id:
-                    logger.warning(f"[分类预案服务] 项目 {item.charge_item_name} 没有维度分配，跳过")
-                    continue
-                
-                # 获取维度信息
-                dimension = db.query(ModelNode).filter(
-                    ModelNode.id == final_dimension_id
-                ).first()
-                
-                if not dimension:
-                    logger.warning(f"[分类预案服务] 维度 {final_dimension_id} 不存在，跳过")
-                    continue
-                
-                # 检查是否已存在映射
-                existing = db.query(DimensionItemMapping).filter(
-                    DimensionItemMapping.hospital_id == hospital_id,
-                    DimensionItemMapping.charge_item_id == item.charge_item_id
-                ).first()
-                
-                if existing:
-                    # 更新维度归属
-                    existing.dimension_code = dimension.code
-                    existing.created_at = datetime.utcnow()  # 更新时间戳
-                    overwrite_count += 1
-                    logger.debug(
-                        f"[分类预案服务] 更新映射: charge_item_id={item.charge_item_id}, "
-                        f"dimension_code={dimension.code}"
-                    )
-                else:
-                    # 创建新映射
-                    # 获取收费项目编码
-                    charge_item = db.query(ChargeItem).filter(
-                        ChargeItem.id == item.charge_item_id
-                    ).first()
-                    
-                    if not charge_item:
-                        logger.warning(f"[分类预案服务] 收费项目 {item.charge_item_id} 不存在，跳过")
-                        continue
-                    
-                    new_mapping = DimensionItemMapping(
-                        hospital_id=hospital_id,
-                        dimension_code=dimension.code,
-                        item_code=charge_item.item_code,
-                        charge_item_id=item.charge_item_id
-                    )
-                    db.add(new_mapping)
-                    new_count += 1
-                    logger.debug(
-                        f"[分类预案服务] 创建映射: charge_item_id={item.charge_item_id}, "
-                        f"dimension_code={dimension.code}"
-                    )
+            submitted_at = datetime.utcnow()
+            total_count, resolved_count, overwrite_count, new_count = db.execute(
+                _SUBMIT_MAPPINGS_SQL,
+                {"plan_id": plan_id, "hospital_id": hospital_id, "now": submitted_at}
+            ).one()
+            
+            skipped_count = total_count - resolved_count
+            if skipped_count:
+                logger.warning(f"[分类预案服务] {skipped_count} 个项目没有维度分配或维度不存在，跳过")
             
             # 更新预案状态
             plan.status = PlanStatus.submitted
-            plan.submitted_at = datetime.utcnow()
+            plan.submitted_at = submitted_at
             
             # 提交事务
             db.commit()
@@ -675,13 +679,18 @@ class ClassificationPlanService:
         )
     
     @staticmethod
-    def _build_plan_item_response(db: Session, item: PlanItem) -> PlanItemResponse:
+    def _build_plan_item_response(
+        db: Session,
+        item: PlanItem,
+        path_indexes: Optional[Dict[int, Any]] = None
+    ) -> PlanItemResponse:
         """
         构建预案项目响应对象
         
         Args:
             db: 数据库会话
             item: 预案项目模型
+            path_indexes: 批量构建时共享的 {版本ID: 路径索引}
             
         Returns:
             预案项目响应对象
@@ -695,7 +704,7 @@ class ClassificationPlanService:
             ).first()
             if ai_dimension:
                 ai_suggested_dimension_name = ai_dimension.name
-                ai_suggested_dimension_path = ClassificationPlanService._get_dimension_path(db, ai_dimension)
+                ai_suggested_dimension_path = ClassificationPlanService._get_dimension_path(db, ai_dimension, path_indexes)
         
         # 用户设置维度信息
         user_set_dimension_name = None
@@ -706,7 +715,7 @@ class ClassificationPlanService:
             ).first()
             if user_dimension:
                 user_set_dimension_name = user_dimension.name
-                user_set_dimension_path = ClassificationPlanService._get_dimension_path(db, user_dimension)
+                user_set_dimension_path = ClassificationPlanService._get_dimension_path(db, user_dimension, path_indexes)
         
         # 最终维度（用户设置 ?? AI建议）
         final_dimension_id = item.user_set_dimension_id or item.ai_suggested_dimension_id
@@ -748,13 +757,18 @@ class ClassificationPlanService:
         )
     
     @staticmethod
-    def _get_dimension_path(db: Session, dimension: Optional[ModelNode]) -> str:
+    def _get_dimension_path(
+        db: Session,
+        dimension: Optional[ModelNode],
+        path_indexes: Optional[Dict[int, Any]] = None
+    ) -> str:
         """
         获取维度的完整路径
         
         Args:
             db: 数据库会话
             dimension: 维度节点
+            path_indexes: 批量构建时共享的 {版本ID: 路径索引}
             
         Returns:
             维度路径字符串（如："序列A / 一级维度 / 二级维度"）
@@ -762,19 +776,4 @@ class ClassificationPlanService:
         if not dimension:
             return ""
         
-        path_parts = [dimension.name]
-        current = dimension
-        
-        # 向上遍历父节点
-        while current.parent_id:
-            parent = db.query(ModelNode).filter(
-                ModelNode.id == current.parent_id
-            ).first()
-            
-            if not parent:
-                break
-            
-            path_parts.insert(0, parent.name)
-            current = parent
-        
-        return " / ".join(path_parts)
+        return ModelTreeService.get_node_path(db, dimension, " / ", path_indexes)
@@ -2,66 +2,50 @@
 成本报表智能导入服务
 """
 from typing import Dict, List, Any, Optional
-from io import BytesIO
 from decimal import Decimal
-import openpyxl
 from sqlalchemy.orm import Session
-from difflib import SequenceMatcher
 import uuid
 import re
 
 from app.models.cost_report import CostReport
 from app.models.department import Department
+from app.services.import_session_store import ImportSessionStore
+from app.services.staged_import_service import StagedImportService
+from app.utils.ngram_index import NgramSuggestionIndex
+from app.utils.spreadsheet_reader import SpreadsheetReader, iter_sheet_rows, scan_rows
 
 
 class CostReportImportService:
     """成本报表智能导入服务"""
     
-    # 会话存储（生产环境应使用Redis）
-    _sessions: Dict[str, Dict[str, Any]] = {}
+    # 会话存储（Redis 或进程内 LRU，按 TTL 过期）
+    _sessions = ImportSessionStore("cost_report")
     
     @classmethod
     def parse_excel(cls, file_content: bytes, sheet_name: Optional[str] = None, skip_rows: int = 0, header_row: int = 1) -> Dict[str, Any]:
         """
-        第一步：解析Excel文件，返回列名和预览数据
+        第一步：解析Excel或CSV文件，返回列名和预览数据（流式读取，一次遍历）
         
         Args:
-            file_content: Excel文件内容
+            file_content: Excel（.xlsx）或CSV文件内容
             sheet_name: 工作表名称
             skip_rows: 跳过前N行
             header_row: 标题行位置（从1开始，相对于跳过行数后的位置）
         """
-        if not file_content or len(file_content) == 0:
-            raise ValueError("文件内容为空")
-        
-        try:
-            wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-        except Exception as e:
-            error_msg = str(e)
-            if "zip" in error_msg.lower():
-                raise ValueError("文件格式错误，请上传有效的 Excel 文件（.xlsx 格式）")
-            else:
-                raise ValueError(f"无法读取 Excel 文件: {error_msg}")
-        
-        sheet_names = wb.sheetnames
-        
-        if sheet_name and sheet_name in sheet_names:
-            ws = wb[sheet_name]
-            current_sheet = sheet_name
-        else:
-            ws = wb.active
-            current_sheet = ws.title
-        
-        all_rows = list(ws.iter_rows(values_only=True))
-        if not all_rows:
-            raise ValueError("Excel文件为空")
-        
         # 计算标题行的实际索引（0-based）
         # header_row 是从1开始的行号，表示Excel中的实际行号
         header_row_index = header_row - 1
         
-        if header_row_index >= len(all_rows):
-            raise ValueError(f"标题行位置({header_row})超过总行数({len(all_rows)})")
+        with SpreadsheetReader(file_content, sheet_name) as reader:
+            sheet_names = reader.sheet_names
+            current_sheet = reader.sheet_name
+            scan = scan_rows(reader.iter_rows(), header_index=header_row_index)
+        
+        if scan["total_rows"] == 0:
+            raise ValueError("Excel文件为空")
+        
+        if header_row_index >= scan["total_rows"]:
+            raise ValueError(f"标题行位置({header_row})超过总行数({scan['total_rows']})")
         
         def get_excel_column_name(col_index):
             result = ""
@@ -72,7 +56,7 @@ class CostReportImportService:
         
         # 从标题行读取表头
         headers = []
-        for i, cell in enumerate(all_rows[header_row_index]):
+        for i, cell in enumerate(scan["header"]):
             col_name = get_excel_column_name(i)
             if cell is not None and str(cell).strip():
                 headers.append(f"{str(cell).strip()} ({col_name})")
@@ -80,27 +64,26 @@ class CostReportImportService:
                 headers.append(f"(空列-{col_name})")
         
         # 数据行从标题行之后开始
-        data_rows = all_rows[header_row_index + 1:]
-        total_rows = len(data_rows)
+        total_rows = scan["data_rows"]
         
         if total_rows == 0:
             raise ValueError("Excel文件没有数据行")
         
         preview_data = []
-        for row in data_rows[:10]:
+        for row in scan["preview_rows"]:
             preview_data.append([str(cell).strip() if cell is not None else "" for cell in row])
         
         suggested_mapping = cls._suggest_field_mapping(headers)
         
         session_id = str(uuid.uuid4())
-        cls._sessions[session_id] = {
+        cls._sessions.set(session_id, {
             "file_content": file_content,
             "sheet_name": current_sheet,
             "skip_rows": skip_rows,
             "header_row": header_row,
             "headers": headers,
             "total_rows": total_rows
-        }
+        })
         
         return {
             "session_id": session_id,
@@ -163,16 +146,8 @@ class CostReportImportService:
         sheet_name = session_data.get("sheet_name")
         header_row = session_data.get("header_row", 1)
         
-        wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-        if sheet_name:
-            ws = wb[sheet_name]
-        else:
-            ws = wb.active
-        
-        all_rows = list(ws.iter_rows(values_only=True))
-        # 数据行从标题行之后开始
-        header_row_index = header_row - 1
-        data_rows = all_rows[header_row_index + 1:]
+        # 流式读取数据行（从标题行之后开始）
+        data_rows = iter_sheet_rows(file_content, sheet_name, header_row)
         
         # 获取科室名称列索引
         dept_col_name = field_mapping.get("department_name", "")
@@ -197,10 +172,11 @@ class CostReportImportService:
         # 获取系统科室列表
         system_departments = cls._get_system_departments(db, hospital_id)
         
-        # 为每个唯一值提供智能匹配建议
+        # 为每个唯一值提供智能匹配建议（科室索引只构建一次）
+        department_index = NgramSuggestionIndex(system_departments, fields=("name", "code"))
         unique_values = []
         for value, count in unique_values_dict.items():
-            suggested_depts = cls._suggest_departments(value, system_departments)
+            suggested_depts = cls._suggest_departments(value, department_index)
             unique_values.append({
                 "value": value,
                 "count": count,
@@ -209,8 +185,7 @@ class CostReportImportService:
         
         unique_values.sort(key=lambda x: -x["count"])
         
-        cls._sessions[session_id]["field_mapping"] = field_mapping
-        cls._sessions[session_id]["match_by"] = match_by
+        cls._sessions.update(session_id, field_mapping=field_mapping, match_by=match_by)
         
         return {
             "unique_values": unique_values,
@@ -241,32 +216,33 @@ class CostReportImportService:
         
         return result
     
-    @classmethod
-    def _suggest_departments(cls, value: str, system_departments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """为给定值建议匹配的科室"""
-        suggestions = []
-        value_lower = value.lower().strip()
-        
-        for dept in system_departments:
-            name_similarity = SequenceMatcher(None, value_lower, dept["name"].lower()).ratio()
-            code_similarity = SequenceMatcher(None, value_lower, dept["code"].lower()).ratio()
-            
-            contains_in_name = value_lower in dept["name"].lower() or dept["name"].lower() in value_lower
-            
-            score = max(name_similarity, code_similarity)
-            if contains_in_name:
-                score += 0.3
-            
-            if score > 0.3:
-                suggestions.append({
-                    "id": dept["id"],
-                    "code": dept["code"],
-                    "name": dept["name"],
-                    "score": min(score, 1.0)
-                })
+    @staticmethod
+    def _department_score(value: str, department: Dict[str, Any], similarity: float) -> float:
+        """
+        科室推荐得分
         
-        suggestions.sort(key=lambda x: x["score"], reverse=True)
-        return suggestions[:5]
+        名称、编码的 n-gram TF-IDF 余弦相似度（取最大值），
+        导入值与科室名称互相包含时加 0.3，最高为 1.0
+        """
+        value_lower = value.lower().strip()
+        name_lower = (department["name"] or "").lower()
+        score = similarity
+        if name_lower and (value_lower in name_lower or name_lower in value_lower):
+            score += 0.3
+        return min(score, 1.0)
+    
+    @classmethod
+    def _suggest_departments(cls, value: str, department_index: NgramSuggestionIndex) -> List[Dict[str, Any]]:
+        """为给定值建议匹配的科室（使用预先构建的科室 n-gram 索引，返回前5个）"""
+        return [
+            {
+                "id": dept["id"],
+                "code": dept["code"],
+                "name": dept["name"],
+                "score": score
+            }
+            for dept, score in department_index.suggest(value.strip(), limit=5, threshold=0.3, score=cls._department_score)
+        ]
     
     @classmethod
     def generate_preview(
@@ -303,16 +279,8 @@ class CostReportImportService:
         sheet_name = session_data.get("sheet_name")
         header_row = session_data.get("header_row", 1)
         
-        wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-        if sheet_name:
-            ws = wb[sheet_name]
-        else:
-            ws = wb.active
-        
-        all_rows = list(ws.iter_rows(values_only=True))
-        # 数据行从标题行之后开始
-        header_row_index = header_row - 1
-        data_rows = all_rows[header_row_index + 1:]
+        # 流式读取数据行（从标题行之后开始）
+        data_rows = iter_sheet_rows(file_content, sheet_name, header_row)
         
         # 获取列索引
         def get_col_idx(field_name):
@@ -459,7 +427,7 @@ class CostReportImportService:
                 "message": message
             })
         
-        cls._sessions[session_id]["preview_items"] = preview_items
+        cls._sessions.update(session_id, preview_items=preview_items)
         
         return {
             "preview_items": preview_items,
@@ -504,94 +472,82 @@ class CostReportImportService:
                 return item.get(field_name, default)
             return default
         
-        for item in items_to_import:
+        def to_decimal(val):
+            if val is None:
+                return Decimal("0")
+            if isinstance(val, Decimal):
+                return val
             try:
-                item_status = get_field(item, "status")
-                
-                # 跳过用户选择不导入的记录
-                if item_status == "skip":
-                    skip_count += 1
-                    continue
-                
-                if item_status == "error":
-                    error_count += 1
-                    errors.append({
-                        "period": get_field(item, "period", ""),
-                        "department_code": get_field(item, "department_code", ""),
-                        "reason": get_field(item, "message", "未知错误")
-                    })
-                    continue
-                
-                period = get_field(item, "period")
-                dept_code = get_field(item, "department_code")
-                
-                if not period or not dept_code:
-                    error_count += 1
-                    errors.append({
-                        "period": period or "",
-                        "department_code": dept_code or "",
-                        "reason": "缺少必要字段"
-                    })
-                    continue
-                
-                existing = db.query(CostReport).filter(
-                    CostReport.hospital_id == hospital_id,
-                    CostReport.period == period,
-                    CostReport.department_code == dept_code
-                ).first()
-                
-                def to_decimal(val):
-                    if val is None:
-                        return Decimal("0")
-                    if isinstance(val, Decimal):
-                        return val
-                    try:
-                        return Decimal(str(val))
-                    except:
-                        return Decimal("0")
-                
-                if existing:
-                    existing.department_name = get_field(item, "department_name", existing.department_name)
-                    existing.personnel_cost = to_decimal(get_field(item, "personnel_cost"))
-                    existing.material_cost = to_decimal(get_field(item, "material_cost"))
-                    existing.medicine_cost = to_decimal(get_field(item, "medicine_cost"))
-                    existing.depreciation_cost = to_decimal(get_field(item, "depreciation_cost"))
-                    existing.other_cost = to_decimal(get_field(item, "other_cost"))
-                    update_count += 1
-                else:
-                    record = CostReport(
-                        hospital_id=hospital_id,
-                        period=period,
-                        department_code=dept_code,
-                        department_name=get_field(item, "department_name", ""),
-                        personnel_cost=to_decimal(get_field(item, "personnel_cost")),
-                        material_cost=to_decimal(get_field(item, "material_cost")),
-                        medicine_cost=to_decimal(get_field(item, "medicine_cost")),
-                        depreciation_cost=to_decimal(get_field(item, "depreciation_cost")),
-                        other_cost=to_decimal(get_field(item, "other_cost"))
-                    )
-                    db.add(record)
-                    success_count += 1
-                
-                db.flush()
-                
-            except Exception as e:
-                db.rollback()
+                return Decimal(str(val))
+            except:
+                return Decimal("0")
+        
+        cost_fields = ["personnel_cost", "material_cost", "medicine_cost", "depreciation_cost", "other_cost"]
+        
+        rows = []
+        for item in items_to_import:
+            rows.append(None)
+            item_status = get_field(item, "status")
+            
+            # 跳过用户选择不导入的记录
+            if item_status == "skip":
+                skip_count += 1
+                continue
+            
+            if item_status == "error":
                 error_count += 1
                 errors.append({
                     "period": get_field(item, "period", ""),
                     "department_code": get_field(item, "department_code", ""),
-                    "reason": str(e)
+                    "reason": get_field(item, "message", "未知错误")
                 })
+                continue
+            
+            period = get_field(item, "period")
+            dept_code = get_field(item, "department_code")
+            
+            if not period or not dept_code:
+                error_count += 1
+                errors.append({
+                    "period": period or "",
+                    "department_code": dept_code or "",
+                    "reason": "缺少必要字段"
+                })
+                continue
+            
+            row = {
+                "period": period,
+                "department_code": dept_code,
+                "department_name": get_field(item, "department_name")
+            }
+            for field in cost_fields:
+                row[field] = to_decimal(get_field(item, field))
+            rows[-1] = row
         
+        # 批量导入：已存在的记录更新，科室名称为空时保留原值
         try:
+            result = StagedImportService.execute(
+                db, CostReport, hospital_id, rows,
+                key_columns=["period", "department_code"],
+                value_columns=["department_name"] + cost_fields,
+                defaults={"department_name": ""}
+            )
             db.commit()
         except Exception as e:
             db.rollback()
             raise ValueError(f"提交事务失败: {str(e)}")
         
-        if session_id and session_id in cls._sessions:
-            del cls._sessions[session_id]
+        success_count = result["inserted"]
+        update_count = result["updated"]
+        for index, reason in result["errors"]:
+            error_count += 1
+            errors.append({
+                "period": get_field(items_to_import[index], "period", ""),
+                "department_code": get_field(items_to_import[index], "department_code", ""),
+                "reason": reason
+            })
+        
+        cls._sessions.delete(session_id)
         
         return {
             "success": True,
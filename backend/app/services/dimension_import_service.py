@@ -2,31 +2,35 @@
 维度目录智能导入服务
 """
 from typing import Dict, List, Any, Optional, Tuple
-from io import BytesIO
-import openpyxl
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
-from difflib import SequenceMatcher
 import uuid
 
 from app.models.charge_item import ChargeItem
 from app.models.model_node import ModelNode
 from app.models.dimension_item_mapping import DimensionItemMapping
+from app.services.model_tree_service import ModelTreeService
+from app.services.import_session_store import ImportSessionStore
+from app.services.staged_import_service import StagedImportService
+from app.utils.ngram_index import NgramSuggestionIndex
+from app.utils.spreadsheet_reader import SpreadsheetReader, iter_sheet_rows, scan_rows
 
 
 class DimensionImportService:
     """维度目录智能导入服务"""
     
-    # 会话存储（生产环境应使用Redis）
-    _sessions: Dict[str, Dict[str, Any]] = {}
+    # 会话存储（Redis 或进程内 LRU，按 TTL 过期）
+    _sessions = ImportSessionStore("dimension")
     
     @classmethod
     def parse_excel(cls, file_content: bytes, sheet_name: Optional[str] = None, skip_rows: int = 0) -> Dict[str, Any]:
         """
-        第一步：解析Excel文件，返回列名和预览数据
+        第一步：解析Excel或CSV文件，返回列名和预览数据
+        
+        流式读取，一次遍历得到表头、预览数据和行数。
         
         Args:
-            file_content: Excel文件内容
+            file_content: Excel（.xlsx）或CSV文件内容
             sheet_name: 工作表名称（可选，默认使用第一个sheet）
             skip_rows: 跳过前N行（默认0）
         
@@ -46,44 +50,18 @@ class DimensionImportService:
                 }
             }
         """
-        # 验证文件内容
-        if not file_content or len(file_content) == 0:
-            raise ValueError("文件内容为空")
-        
-        # 读取Excel
-        try:
-            wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-        except Exception as e:
-            error_msg = str(e)
-            if "zip" in error_msg.lower():
-                raise ValueError("文件格式错误，请上传有效的 Excel 文件（.xlsx 格式）")
-            else:
-                raise ValueError(f"无法读取 Excel 文件: {error_msg}")
-        
-        # 获取所有sheet名称
-        sheet_names = wb.sheetnames
-        
-        # 选择工作表
-        if sheet_name and sheet_name in sheet_names:
-            ws = wb[sheet_name]
-            current_sheet = sheet_name
-        else:
-            ws = wb.active
-            current_sheet = ws.title
+        # 读取文件（跳过前N行后的第一行作为表头，保留前10行数据作为预览）
+        with SpreadsheetReader(file_content, sheet_name) as reader:
+            sheet_names = reader.sheet_names
+            current_sheet = reader.sheet_name
+            scan = scan_rows(reader.iter_rows(), header_index=skip_rows)
         
-        # 获取所有行
-        rows = list(ws.iter_rows(values_only=True))
-        if not rows:
+        if scan["total_rows"] == 0:
             raise ValueError("Excel文件为空")
         
         # 跳过前N行
-        if skip_rows > 0:
-            if skip_rows >= len(rows):
-                raise ValueError(f"跳过行数({skip_rows})超过总行数({len(rows)})")
-            rows = rows[skip_rows:]
-        
-        if not rows:
-            raise ValueError("跳过指定行数后没有剩余数据")
+        if skip_rows > 0 and skip_rows >= scan["total_rows"]:
+            raise ValueError(f"跳过行数({skip_rows})超过总行数({scan['total_rows']})")
         
         # 第一行作为表头
         def get_excel_column_name(col_index):
@@ -95,7 +73,7 @@ class DimensionImportService:
             return result
         
         headers = []
-        for i, cell in enumerate(rows[0]):
+        for i, cell in enumerate(scan["header"]):
             col_name = get_excel_column_name(i)
             if cell is not None and str(cell).strip():
                 # 格式：列名 (Excel列)，例如：收费编码 (A)
@@ -105,15 +83,14 @@ class DimensionImportService:
                 headers.append(f"(空列-{col_name})")
         
         # 数据行（跳过表头）
-        data_rows = rows[1:]
-        total_rows = len(data_rows)
+        total_rows = scan["data_rows"]
         
         if total_rows == 0:
             raise ValueError("Excel文件没有数据行")
         
         # 预览数据（前10行）
         preview_data = []
-        for row in data_rows[:10]:
+        for row in scan["preview_rows"]:
             preview_data.append([str(cell).strip() if cell is not None else "" 
                                for cell in row])
         
@@ -122,13 +99,13 @@ class DimensionImportService:
         
         # 生成会话ID并存储数据
         session_id = str(uuid.uuid4())
-        cls._sessions[session_id] = {
+        cls._sessions.set(session_id, {
             "file_content": file_content,
             "sheet_name": current_sheet,
             "skip_rows": skip_rows,
             "headers": headers,
             "total_rows": total_rows
-        }
+        })
         
         return {
             "session_id": session_id,
@@ -223,23 +200,8 @@ class DimensionImportService:
         sheet_name = session_data.get("sheet_name")
         skip_rows = session_data.get("skip_rows", 0)
         
-        wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-        if sheet_name:
-            ws = wb[sheet_name]
-        else:
-            ws = wb.active
-        
-        rows = list(ws.iter_rows(values_only=True))
-        
-        # 跳过前N行
-        if skip_rows > 0:
-            rows = rows[skip_rows:]
-        
-        data_rows = rows[1:]  # 跳过表头
-        
-        # 提取唯一值
-        unique_values_dict = {}
-        
+        # 需要提取唯一值的列
+        source_columns = []
         for source_field in ["dimension_plan", "expert_opinion"]:
             if source_field not in field_mapping:
                 continue
@@ -248,24 +210,30 @@ class DimensionImportService:
             if col_name not in headers:
                 continue
             
-            col_idx = headers.index(col_name)
-            
-            for row in data_rows:
-                if col_idx < len(row) and row[col_idx]:
-                    value = str(row[col_idx]).strip()
-                    if value:
-                        key = (value, source_field)
-                        if key not in unique_values_dict:
-                            unique_values_dict[key] = 0
-                        unique_values_dict[key] += 1
+            source_columns.append((source_field, headers.index(col_name)))
+        
+        # 提取唯一值（流式读取，一次遍历处理所有列，跳过前N行和表头）
+        unique_values_dict = {}
+        
+        with SpreadsheetReader(file_content, sheet_name) as reader:
+            for row in reader.iter_rows(skip_rows + 1):
+                for source_field, col_idx in source_columns:
+                    if col_idx < len(row) and row[col_idx]:
+                        value = str(row[col_idx]).strip()
+                        if value:
+                            key = (value, source_field)
+                            if key not in unique_values_dict:
+                                unique_values_dict[key] = 0
+                            unique_values_dict[key] += 1
         
         # 获取系统维度列表（只获取叶子节点）
         system_dimensions = cls._get_system_dimensions(model_version_id, db)
         
-        # 为每个唯一值提供智能匹配建议
+        # 为每个唯一值提供智能匹配建议（维度索引只构建一次）
+        dimension_index = NgramSuggestionIndex(system_dimensions, fields=("name", "code"))
         unique_values = []
         for (value, source), count in unique_values_dict.items():
-            suggested_dims = cls._suggest_dimensions(value, system_dimensions)
+            suggested_dims = cls._suggest_dimensions(value, dimension_index)
             unique_values.append({
                 "value": value,
                 "source": source,
@@ -278,9 +246,12 @@ class DimensionImportService:
         unique_values.sort(key=lambda x: (0 if x["source"] == "expert_opinion" else 1, -x["count"]))
         
         # 保存到会话
-        cls._sessions[session_id]["field_mapping"] = field_mapping
-        cls._sessions[session_id]["unique_values"] = unique_values
-        cls._sessions[session_id]["match_by"] = match_by  # 保存匹配方式
+        cls._sessions.update(
+            session_id,
+            field_mapping=field_mapping,
+            unique_values=unique_values,
+            match_by=match_by  # 保存匹配方式
+        )
         
         return {
             "unique_values": unique_values,
@@ -295,10 +266,11 @@ class DimensionImportService:
             ModelNode.is_leaf == True
         ).all()
         
+        path_index = ModelTreeService.get_path_index(db, model_version_id)
         dimensions = []
         for node in nodes:
             # 构建完整路径
-            full_path = cls._build_node_path(node, db)
+            full_path = path_index.path(node.id, " > ")
             dimensions.append({
                 "id": node.id,
                 "name": node.name,
@@ -308,66 +280,43 @@ class DimensionImportService:
         
         return dimensions
     
-    @classmethod
-    def _build_node_path(cls, node: ModelNode, db: Session) -> str:
-        """构建节点的完整路径"""
-        path_parts = [node.name]
-        current = node
-        
-        while current.parent_id:
-            parent = db.query(ModelNode).filter(ModelNode.id == current.parent_id).first()
-            if parent:
-                path_parts.insert(0, parent.name)
-                current = parent
-            else:
-                break
+    @staticmethod
+    def _dimension_score(value: str, dimension: Dict[str, Any], similarity: float) -> float:
+        """
+        维度推荐得分
         
-        return " > ".join(path_parts)
+        名称、编码的 n-gram TF-IDF 余弦相似度（取最大值），
+        导入值包含在维度名称中加 0.3，包含在完整路径中加 0.2
+        """
+        value_lower = value.lower()
+        score = similarity
+        if value_lower in dimension["name"].lower():
+            score += 0.3
+        if value_lower in dimension["full_path"].lower():
+            score += 0.2
+        return score
     
     @classmethod
     def _suggest_dimensions(
         cls,
         value: str,
-        system_dimensions: List[Dict[str, Any]]
+        dimension_index: NgramSuggestionIndex
     ) -> List[Dict[str, Any]]:
         """
         为给定值建议匹配的维度
         
-        使用模糊匹配算法
+        使用预先构建的维度 n-gram 索引，得分超过 0.3 的按得分返回前5个
         """
-        suggestions = []
-        value_lower = value.lower()
-        
-        for dim in system_dimensions:
-            # 计算相似度
-            name_similarity = SequenceMatcher(None, value_lower, dim["name"].lower()).ratio()
-            code_similarity = SequenceMatcher(None, value_lower, dim["code"].lower()).ratio()
-            
-            # 检查是否包含
-            contains_in_name = value_lower in dim["name"].lower()
-            contains_in_path = value_lower in dim["full_path"].lower()
-            
-            # 计算综合得分
-            score = max(name_similarity, code_similarity)
-            if contains_in_name:
-                score += 0.3
-            if contains_in_path:
-                score += 0.2
-            
-            if score > 0.3:  # 阈值
-                suggestions.append({
-                    "id": dim["id"],
-                    "name": dim["name"],
-                    "code": dim["code"],
-                    "full_path": dim["full_path"],
-                    "score": score
-                })
-        
-        # 按得分排序
-        suggestions.sort(key=lambda x: x["score"], reverse=True)
-        
-        # 返回前5个建议
-        return suggestions[:5]
+        return [
+            {
+                "id": dim["id"],
+                "name": dim["name"],
+                "code": dim["code"],
+                "full_path": dim["full_path"],
+                "score": score
+            }
+            for dim, score in dimension_index.suggest(value, limit=5, threshold=0.3, score=cls._dimension_score)
+        ]
     
     @classmethod
     def generate_preview(
@@ -429,19 +378,8 @@ class DimensionImportService:
         sheet_name = session_data.get("sheet_name")
         skip_rows = session_data.get("skip_rows", 0)
         
-        wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-        if sheet_name:
-            ws = wb[sheet_name]
-        else:
-            ws = wb.active
-        
-        rows = list(ws.iter_rows(values_only=True))
-        
-        # 跳过前N行
-        if skip_rows > 0:
-            rows = rows[skip_rows:]
-        
-        data_rows = rows[1:]  # 跳过表头
+        # 流式读取数据行（跳过前N行和表头）
+        data_rows = iter_sheet_rows(file_content, sheet_name, skip_rows + 1)
         
         # 获取列索引
         try:
@@ -472,6 +410,7 @@ class DimensionImportService:
         
         # 获取所有维度（用于验证）
         all_dimensions = {node.code: node for node in db.query(ModelNode).all()}
+        path_indexes = {}
         
         # 获取已存在的映射关系（限定当前医疗机构）
         existing_mappings = set()
@@ -557,7 +496,7 @@ class DimensionImportService:
                     statistics["error"] += 1
                     continue
                 
-                dimension_path = cls._build_node_path(dimension, db)
+                dimension_path = ModelTreeService.get_node_path(db, dimension, " > ", path_indexes)
                 
                 # 检查状态
                 status = "ok"
@@ -590,7 +529,7 @@ class DimensionImportService:
                 })
         
         # 保存到会话
-        cls._sessions[session_id]["preview_items"] = preview_items
+        cls._sessions.update(session_id, preview_items=preview_items)
         
         return {
             "preview_items": preview_items,
@@ -634,11 +573,10 @@ class DimensionImportService:
         else:
             # 否则从会话中获取预览数据
             logger.info(f"Looking for session: {session_id}")
-            logger.info(f"Available sessions: {list(cls._sessions.keys())}")
             
             session_data = cls._sessions.get(session_id)
             if not session_data:
-                raise ValueError(f"会话已过期或不存在。Session ID: {session_id}, 可用会话: {list(cls._sessions.keys())}")
+                raise ValueError(f"会话已过期或不存在。Session ID: {session_id}")
             
             preview_items = session_data.get("preview_items")
             if not preview_items:
@@ -661,62 +599,48 @@ class DimensionImportService:
                 return item.get(field_name, default)
             return default
         
+        # 预览中为错误状态的项直接计入错误，其余交给批量导入
+        rows = []
         for item in items_to_import:
-            try:
-                # 跳过错误状态的项
-                if get_field(item, "status") == "error":
-                    error_count += 1
-                    errors.append({
-                        "item_code": get_field(item, "item_code", "unknown"),
-                        "dimension_code": get_field(item, "dimension_code", ""),
-                        "reason": get_field(item, "message", "未知错误")
-                    })
-                    continue
-                
-                # 检查是否已存在映射（在当前医疗机构内）
-                item_code = get_field(item, "item_code")
-                dimension_code = get_field(item, "dimension_code")
-                
-                existing = db.query(DimensionItemMapping).filter(
-                    DimensionItemMapping.hospital_id == hospital_id,
-                    DimensionItemMapping.dimension_code == dimension_code,
-                    DimensionItemMapping.item_code == item_code
-                ).first()
-                
-                if existing:
-                    # 删除旧记录，实现覆盖效果
-                    db.delete(existing)
-                    db.flush()
-                
-                # 创建新映射（即使收费项目不存在也允许创建）
-                mapping = DimensionItemMapping(
-                    hospital_id=hospital_id,
-                    dimension_code=dimension_code,
-                    item_code=item_code
-                )
-                db.add(mapping)
-                db.flush()  # 立即执行以检测错误
-                success_count += 1
-                
-            except Exception as e:
-                db.rollback()  # 回滚当前记录
+            if get_field(item, "status") == "error":
                 error_count += 1
                 errors.append({
                     "item_code": get_field(item, "item_code", "unknown"),
                     "dimension_code": get_field(item, "dimension_code", ""),
-                    "reason": str(e)
+                    "reason": get_field(item, "message", "未知错误")
                 })
+                rows.append(None)
+                continue
+            
+            # 即使收费项目不存在也允许创建
+            rows.append({
+                "item_code": get_field(item, "item_code"),
+                "dimension_code": get_field(item, "dimension_code")
+            })
         
-        # 提交所有成功的记录
+        # 批量导入：已存在的映射删除后重新插入，实现覆盖效果
         try:
+            result = StagedImportService.execute(
+                db, DimensionItemMapping, hospital_id, rows,
+                key_columns=["dimension_code", "item_code"],
+                mode="replace"
+            )
             db.commit()
         except Exception as e:
             db.rollback()
             raise ValueError(f"提交事务失败: {str(e)}")
         
+        success_count = result["inserted"] + result["updated"]
+        for index, reason in result["errors"]:
+            error_count += 1
+            errors.append({
+                "item_code": get_field(items_to_import[index], "item_code", "unknown"),
+                "dimension_code": get_field(items_to_import[index], "dimension_code", ""),
+                "reason": reason
+            })
+        
         # 清理会话（如果存在）
-        if session_id and session_id in cls._sessions:
-            del cls._sessions[session_id]
+        cls._sessions.delete(session_id)
         
         return {
             "success": True,
@@ -0,0 +1,169 @@
+"""
+维度下钻汇总服务（下钻立方）
+
+任务完成时用一条 INSERT ... SELECT 将 calculation_details 按
+(科室, 维度节点, 收费项目) 和 (维度节点, 收费项目) 两组分组集合聚合，
+每个科室/全院维度保留金额最高的 DRILLDOWN_CUBE_TOP_N 个收费项目，
+并补齐收费项目名称和单价，另写一条合计行（rank 为 0）保存全部项目的合计和项目数。
+
+下钻接口按 (task_id, department_id, node_id) 读取覆盖索引，不再实时分组聚合；
+没有汇总数据（如历史任务）时回退为实时查询。
+任务重新执行时清除，任务删除时由外键级联删除。
+"""
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.calculation_detail import CalculationDrilldownItem
+from app.models.calculation_task import CalculationTask
+from app.models.model_version import ModelVersion
+
+
+_BUILD_SQL = text("""
+    INSERT INTO calculation_drilldown_items (
+        task_id, department_id, node_id, rank,
+        item_code, item_name, item_category, unit_price,
+        amount, quantity, item_count, created_at
+    )
+    WITH grouped AS (
+        SELECT
+            COALESCE(department_id, 0) AS department_id,
+            node_id,
+            item_code,
+            item_name,
+            item_category,
+            SUM(amount) AS amount,
+            SUM(quantity) AS quantity
+        FROM calculation_details
+        WHERE task_id = :task_id
+        GROUP BY GROUPING SETS (
+            (department_id, node_id, item_code, item_name, item_category),
+            (node_id, item_code, item_name, item_category)
+        )
+    ),
+    ranked AS (
+        SELECT
+            g.*,
+            row_number() OVER (
+                PARTITION BY department_id, node_id
+                ORDER BY amount DESC, item_code, item_name, item_category
+            ) AS rank,
+            SUM(amount) OVER (PARTITION BY department_id, node_id) AS total_amount,
+            SUM(quantity) OVER (PARTITION BY department_id, node_id) AS total_quantity,
+            count(*) OVER (PARTITION BY department_id, node_id) AS total_count
+        FROM grouped g
+    )
+    SELECT
+        :task_id, r.department_id, r.node_id, r.rank,
+        r.item_code,
+        COALESCE(NULLIF(r.item_name, ''), ci.item_name, r.item_code),
+        r.item_category,
+        ci.unit_price,
+        COALESCE(r.amount, 0), COALESCE(r.quantity, 0), NULL, now()
+    FROM ranked r
+    LEFT JOIN charge_items ci
+        ON ci.hospital_id = :hospital_id AND ci.item_code = r.item_code
+    WHERE r.rank <= :top_n
+    UNION ALL
+    SELECT
+        :task_id, r.department_id, r.node_id, 0,
+        NULL, NULL, NULL, NULL,
+        COALESCE(r.total_amount, 0), COALESCE(r.total_quantity, 0), r.total_count, now()
+    FROM ranked r
+    WHERE r.rank = 1
+""")
+
+
+class DrilldownCubeService:
+    """维度下钻汇总服务"""
+
+    @staticmethod
+    def build(db: Session, task_id: str, top_n: Optional[int] = None) -> int:
+        """
+        生成任务的下钻汇总（覆盖已有数据，由调用方提交事务）
+
+        Args:
+            top_n: 每个科室/全院维度保留的收费项目数，默认取 DRILLDOWN_CUBE_TOP_N
+
+        Returns:
+            写入的行数（含合计行）
+        """
+        DrilldownCubeService.invalidate(db, task_id)
+
+        hospital_id = db.query(ModelVersion.hospital_id).join(
+            CalculationTask, CalculationTask.model_version_id == ModelVersion.id
+        ).filter(
+            CalculationTask.task_id == task_id
+        ).scalar()
+
+        result = db.execute(_BUILD_SQL, {
+            "task_id": task_id,
+            "hospital_id": hospital_id,
+            "top_n": top_n or settings.DRILLDOWN_CUBE_TOP_N,
+        })
+        return result.rowcount
+
+    @staticmethod
+    def invalidate(db: Session, task_id: str) -> int:
+        """清除任务的下钻汇总（由调用方提交事务）"""
+        return db.query(CalculationDrilldownItem).filter(
+            CalculationDrilldownItem.task_id == task_id
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def get_node(
+        db: Session,
+        task_id: str,
+        department_id: int,
+        node_id: int
+    ) -> Optional[Tuple[List[dict], dict]]:
+        """
+        读取科室（department_id 为 0 时为全院）维度的下钻数据
+
+        只查询覆盖索引中的列，按排名顺序返回。
+
+        Returns:
+            (收费项目列表, 合计)，合计包含 total_amount/total_quantity/item_count；
+            没有汇总数据时返回 None
+        """
+        rows = db.query(
+            CalculationDrilldownItem.rank,
+            CalculationDrilldownItem.item_code,
+            CalculationDrilldownItem.item_name,
+            CalculationDrilldownItem.item_category,
+            CalculationDrilldownItem.unit_price,
+            CalculationDrilldownItem.amount,
+            CalculationDrilldownItem.quantity,
+            CalculationDrilldownItem.item_count,
+        ).filter(
+            CalculationDrilldownItem.task_id == task_id,
+            CalculationDrilldownItem.department_id == department_id,
+            CalculationDrilldownItem.node_id == node_id
+        ).order_by(
+            CalculationDrilldownItem.rank
+        ).all()
+
+        if not rows or rows[0].rank != 0:
+            return None
+
+        totals_row = rows[0]
+        totals = {
+            "total_amount": Decimal(totals_row.amount or 0),
+            "total_quantity": Decimal(totals_row.quantity or 0),
+            "item_count": totals_row.item_count or 0,
+        }
+        items = [
+            {
+                "item_code": row.item_code,
+                "item_name": row.item_name,
+                "item_category": row.item_category,
+                "unit_price": row.unit_price,
+                "amount": Decimal(row.amount or 0),
+                "quantity": Decimal(row.quantity or 0),
+            }
+            for row in rows[1:]
+        ]
+        return items, totals
@@ -2,10 +2,10 @@
 通用Excel导入服务
 """
 from typing import Dict, List, Any, Optional
-from io import BytesIO
-import openpyxl
 from sqlalchemy.orm import Session
 
+from app.utils.spreadsheet_reader import SpreadsheetReader, scan_rows
+
 
 class ExcelImportService:
     """通用Excel导入服务"""
@@ -35,10 +35,12 @@ class ExcelImportService:
     
     def parse_excel(self, file_content: bytes) -> Dict[str, Any]:
         """
-        解析Excel文件
+        解析Excel或CSV文件
+        
+        流式读取，一次遍历得到表头、预览数据和行数。
         
         Args:
-            file_content: Excel文件内容
+            file_content: Excel（.xlsx）或CSV文件内容
         
         Returns:
             {
@@ -48,37 +50,19 @@ class ExcelImportService:
                 "suggested_mapping": {"列1": "field1", ...}
             }
         """
-        # 验证文件内容
-        if not file_content or len(file_content) == 0:
-            raise ValueError("文件内容为空")
-        
-        # 读取Excel
-        try:
-            wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-            ws = wb.active
-        except Exception as e:
-            error_msg = str(e)
-            if "zip" in error_msg.lower():
-                raise ValueError("文件格式错误，请上传有效的 Excel 文件（.xlsx 格式）")
-            else:
-                raise ValueError(f"无法读取 Excel 文件: {error_msg}")
-        
-        # 获取所有行
-        rows = list(ws.iter_rows(values_only=True))
-        if not rows:
+        # 读取文件（第一行作为表头，保留前10行数据作为预览）
+        with SpreadsheetReader(file_content) as reader:
+            scan = scan_rows(reader.iter_rows())
+        if scan["header"] is None:
             raise ValueError("Excel文件为空")
         
-        # 第一行作为表头
         headers = [str(cell) if cell is not None else f"列{i+1}" 
-                  for i, cell in enumerate(rows[0])]
-        
-        # 数据行（跳过表头）
-        data_rows = rows[1:]
-        total_rows = len(data_rows)
+                  for i, cell in enumerate(scan["header"])]
+        total_rows = scan["data_rows"]
         
         # 预览数据（前10行）
         preview_data = []
-        for row in data_rows[:10]:
+        for row in scan["preview_rows"]:
             preview_data.append([str(cell) if cell is not None else "" 
                                for cell in row])
         
@@ -182,33 +166,41 @@ class ExcelImportService:
                 "failed_items": [...]
             }
         """
-        # 验证文件内容
-        if not file_content or len(file_content) == 0:
-            raise ValueError("文件内容为空")
-        
-        # 读取Excel
+        # 读取文件：先遍历一次统计行数（用于进度），导入时再逐行读取
+        reader = SpreadsheetReader(file_content)
         try:
-            wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-            ws = wb.active
-            rows = list(ws.iter_rows(values_only=True))
-        except Exception as e:
-            error_msg = str(e)
-            if "zip" in error_msg.lower():
-                raise ValueError("文件格式错误，请上传有效的 Excel 文件（.xlsx 格式）")
-            else:
-                raise ValueError(f"无法读取 Excel 文件: {error_msg}")
-        
-        if not rows:
-            raise ValueError("Excel文件为空")
-        
-        headers = [str(cell) if cell is not None else f"列{i+1}" 
-                  for i, cell in enumerate(rows[0])]
-        data_rows = rows[1:]
-        
+            rows = reader.iter_rows()
+            header = next(rows, None)
+            if header is None:
+                raise ValueError("Excel文件为空")
+            
+            headers = [str(cell) if cell is not None else f"列{i+1}" 
+                      for i, cell in enumerate(header)]
+            total_rows = reader.count_rows(skip_rows=1) if progress_callback else 0
+            
+            return self._import_rows(
+                rows, headers, total_rows, mapping, db, model_class,
+                validate_func, progress_callback, preprocess_func
+            )
+        finally:
+            reader.close()
+    
+    def _import_rows(
+        self,
+        data_rows,
+        headers: List[str],
+        total_rows: int,
+        mapping: Dict[str, str],
+        db: Session,
+        model_class: Any,
+        validate_func: Optional[callable],
+        progress_callback: Optional[callable],
+        preprocess_func: Optional[callable]
+    ) -> Dict[str, Any]:
+        """逐行导入数据行"""
         success_count = 0
         failed_count = 0
         failed_items = []
-        total_rows = len(data_rows)
         
         # 逐行导入
         for row_idx, row in enumerate(data_rows, start=2):  # 从第2行开始（第1行是表头）
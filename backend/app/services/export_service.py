@@ -1,15 +1,161 @@
 """
 报表导出服务
+
+工作簿默认使用只写模式（write_only）：逐行写入，单元格样式引用工作簿内共享的命名样式，
+不为每个单元格创建字体、边框对象，大型明细表的耗时和内存占用明显降低。
+write_only=False 时使用标准工作簿，布局完全相同，用于对比测试。
 """
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, Border, Side, PatternFill, NamedStyle
 from io import BytesIO
-from typing import List, Dict, Any
-from decimal import Decimal
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import zipfile
 
 
+# 共享命名样式
+STYLE_TITLE = "报表标题"
+STYLE_HEADER = "报表表头"
+STYLE_TEXT = "报表文本"
+STYLE_VALUE = "报表数值"
+STYLE_CENTER = "报表居中"
+STYLE_PERCENT = "报表百分比"
+STYLE_TOTAL_TEXT = "报表合计文本"
+STYLE_TOTAL_VALUE = "报表合计数值"
+STYLE_TOTAL_PERCENT = "报表合计百分比"
+
+
+def _build_named_styles() -> List[NamedStyle]:
+    """创建报表使用的命名样式"""
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    data_font = Font(name='微软雅黑', size=10)
+    total_font = Font(name='微软雅黑', size=11, bold=True)
+    total_fill = PatternFill(start_color='E7E6E6', end_color='E7E6E6', fill_type='solid')
+    left = Alignment(horizontal='left', vertical='center')
+    right = Alignment(horizontal='right', vertical='center')
+    center = Alignment(horizontal='center', vertical='center')
+
+    return [
+        NamedStyle(
+            name=STYLE_TITLE,
+            font=Font(name='微软雅黑', size=14, bold=True),
+            alignment=center
+        ),
+        NamedStyle(
+            name=STYLE_HEADER,
+            font=Font(name='微软雅黑', size=11, bold=True, color='FFFFFF'),
+            fill=PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid'),
+            alignment=Alignment(horizontal='center', vertical='center', wrap_text=True),
+            border=border
+        ),
+        NamedStyle(name=STYLE_TEXT, font=data_font, alignment=left, border=border),
+        NamedStyle(name=STYLE_VALUE, font=data_font, alignment=right, border=border, number_format='#,##0.00'),
+        NamedStyle(name=STYLE_CENTER, font=data_font, alignment=center, border=border),
+        NamedStyle(name=STYLE_PERCENT, font=data_font, alignment=center, border=border, number_format='0.00%'),
+        NamedStyle(name=STYLE_TOTAL_TEXT, font=total_font, fill=total_fill, alignment=left, border=border),
+        NamedStyle(
+            name=STYLE_TOTAL_VALUE, font=total_font, fill=total_fill, alignment=right, border=border,
+            number_format='#,##0.00'
+        ),
+        NamedStyle(
+            name=STYLE_TOTAL_PERCENT, font=total_font, fill=total_fill, alignment=center, border=border,
+            number_format='0.00%'
+        ),
+    ]
+
+
+def _new_workbook(write_only: bool) -> Workbook:
+    """创建注册了命名样式、不含默认Sheet的工作簿"""
+    wb = Workbook(write_only=write_only)
+    if not write_only:
+        wb.remove(wb.active)
+    for style in _build_named_styles():
+        wb.add_named_style(style)
+    return wb
+
+
+def _save_workbook(wb: Workbook) -> BytesIO:
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
+class _SheetWriter:
+    """
+    逐行写入工作表
+
+    列宽、行高、合并单元格必须在写入对应行之前设置（只写模式的要求）。
+    """
+
+    def __init__(self, wb: Workbook, title: str, widths: Dict[str, float]):
+        self.write_only = wb.write_only
+        self.ws = wb.create_sheet(title=title)
+        self.row = 0
+        for column, width in widths.items():
+            self.ws.column_dimensions[column].width = width
+
+    def merge(self, cell_range: str):
+        # 只写模式不能调用 merge_cells，直接登记合并区域，保存时写出
+        self.ws.merged_cells.add(cell_range)
+
+    def append(self, cells: List[Tuple[Any, Optional[str]]], height: Optional[float] = None):
+        """写入一行：cells 为 (值, 命名样式) 列表"""
+        self.row += 1
+        if height:
+            self.ws.row_dimensions[self.row].height = height
+
+        if self.write_only:
+            row = []
+            for value, style in cells:
+                cell = WriteOnlyCell(self.ws, value=value)
+                if style:
+                    cell.style = style
+                row.append(cell)
+            self.ws.append(row)
+        else:
+            self.ws.append([value for value, _ in cells])
+            for column, (_, style) in enumerate(cells, start=1):
+                if style:
+                    self.ws.cell(row=self.row, column=column).style = style
+
+
+def _iter_tree(nodes: List[Dict]) -> Iterator[Tuple[Dict, int]]:
+    """按先序遍历树形数据，返回 (节点, 层级)"""
+    stack = [(node, 0) for node in reversed(nodes)]
+    while stack:
+        node, level = stack.pop()
+        yield node, level
+        children = node.get('children')
+        if children:
+            stack.extend((child, level + 1) for child in reversed(children))
+
+
+def _tree_dimension_name(node: Dict, level: int) -> str:
+    """维度名称（每级缩进4个空格，带占比）"""
+    dim_name = '    ' * level + node['dimension_name']
+    if node.get('ratio') is not None and node['ratio'] != 0:
+        dim_name += f"（{float(node['ratio']):.2f}%）"
+    return dim_name
+
+
+def _number_or_none(value):
+    return float(value) if value else None
+
+
+# 明细表各序列的Sheet
+_SEQUENCE_NAMES = {
+    'doctor': '医生序列',
+    'nurse': '护理序列',
+    'tech': '医技序列'
+}
+
+
 class ExportService:
     """报表导出服务"""
     
@@ -23,128 +169,64 @@ class ExportService:
         return f"_{v}"
     
     @staticmethod
-    def export_summary_to_excel(summary_data: dict, period: str, hospital_name: str = None, version: str = None) -> BytesIO:
+    def export_summary_to_excel(
+        summary_data: dict,
+        period: str,
+        hospital_name: str = None,
+        version: str = None,
+        write_only: bool = True
+    ) -> BytesIO:
         """
         导出汇总表到Excel
         
         Args:
             summary_data: 汇总数据，包含summary和departments
             period: 评估月份
+            write_only: 是否使用只写模式
             
         Returns:
             BytesIO: Excel文件的字节流
         """
-        wb = Workbook()
-        ws = wb.active
-        # Sheet名称不加版本号
-        ws.title = "汇总表"
-        
-        # 设置列宽（与页面列一致）
-        ws.column_dimensions['A'].width = 15  # 科室代码
-        ws.column_dimensions['B'].width = 22  # 科室名称
-        ws.column_dimensions['C'].width = 16.5  # 医生价值
-        ws.column_dimensions['D'].width = 13  # 医生占比
-        ws.column_dimensions['E'].width = 16.5  # 护理价值
-        ws.column_dimensions['F'].width = 13  # 护理占比
-        ws.column_dimensions['G'].width = 16.5  # 医技价值
-        ws.column_dimensions['H'].width = 13  # 医技占比
-        ws.column_dimensions['I'].width = 18  # 科室总价值
-        ws.column_dimensions['J'].width = 18  # 参考总价值
-        ws.column_dimensions['K'].width = 14  # 核算/实发
-        ws.column_dimensions['L'].width = 16  # 环期价值
-        ws.column_dimensions['M'].width = 14  # 当期/环期
-        ws.column_dimensions['N'].width = 16  # 同期价值
-        ws.column_dimensions['O'].width = 14  # 当期/同期
+        wb = _new_workbook(write_only)
+        # Sheet名称不加版本号，列宽与页面列一致
+        sheet = _SheetWriter(wb, "汇总表", {
+            'A': 15,  # 科室代码
+            'B': 22,  # 科室名称
+            'C': 16.5,  # 医生价值
+            'D': 13,  # 医生占比
+            'E': 16.5,  # 护理价值
+            'F': 13,  # 护理占比
+            'G': 16.5,  # 医技价值
+            'H': 13,  # 医技占比
+            'I': 18,  # 科室总价值
+            'J': 18,  # 参考总价值
+            'K': 14,  # 核算/实发
+            'L': 16,  # 环期价值
+            'M': 14,  # 当期/环期
+            'N': 16,  # 同期价值
+            'O': 14,  # 当期/同期
+        })
         
         # 标题行（表头加版本号）
         version_suffix = ExportService._format_version(version)
-        title_cell = ws.cell(row=1, column=1, value=f"科室业务价值汇总（{period}）{version_suffix}")
-        title_cell.font = Font(name='微软雅黑', size=14, bold=True)
-        title_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ws.merge_cells('A1:O1')
-        ws.row_dimensions[1].height = 30
-        
-        # 表头样式
-        header_font = Font(name='微软雅黑', size=11, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        sheet.merge('A1:O1')
+        sheet.append([(f"科室业务价值汇总（{period}）{version_suffix}", STYLE_TITLE)], height=30)
         
-        # 第一层表头（序列分组）
-        row = 2
-        ws.merge_cells(f'A{row}:A{row+1}')  # 科室代码
-        ws.cell(row=row, column=1, value='科室代码')
+        # 第一层表头（序列分组），单列表头纵向合并两行，序列表头横向合并价值、占比两列
+        for column in 'ABIJKLMNO':
+            sheet.merge(f'{column}2:{column}3')
+        for cell_range in ('C2:D2', 'E2:F2', 'G2:H2'):
+            sheet.merge(cell_range)
         
-        ws.merge_cells(f'B{row}:B{row+1}')  # 科室名称
-        ws.cell(row=row, column=2, value='科室名称')
-        
-        ws.merge_cells(f'C{row}:D{row}')  # 医生序列
-        ws.cell(row=row, column=3, value='医生序列')
-        
-        ws.merge_cells(f'E{row}:F{row}')  # 护理序列
-        ws.cell(row=row, column=5, value='护理序列')
-        
-        ws.merge_cells(f'G{row}:H{row}')  # 医技序列
-        ws.cell(row=row, column=7, value='医技序列')
-        
-        ws.merge_cells(f'I{row}:I{row+1}')  # 科室总价值
-        ws.cell(row=row, column=9, value='科室总价值')
-        
-        ws.merge_cells(f'J{row}:J{row+1}')  # 参考总价值
-        ws.cell(row=row, column=10, value='参考总价值')
-        
-        ws.merge_cells(f'K{row}:K{row+1}')  # 核算/实发
-        ws.cell(row=row, column=11, value='核算/实发')
-        
-        ws.merge_cells(f'L{row}:L{row+1}')  # 环期价值
-        ws.cell(row=row, column=12, value='环期价值')
-        
-        ws.merge_cells(f'M{row}:M{row+1}')  # 当期/环期
-        ws.cell(row=row, column=13, value='当期/环期')
-        
-        ws.merge_cells(f'N{row}:N{row+1}')  # 同期价值
-        ws.cell(row=row, column=14, value='同期价值')
-        
-        ws.merge_cells(f'O{row}:O{row+1}')  # 当期/同期
-        ws.cell(row=row, column=15, value='当期/同期')
+        first_header = [
+            '科室代码', '科室名称', '医生序列', None, '护理序列', None, '医技序列', None,
+            '科室总价值', '参考总价值', '核算/实发', '环期价值', '当期/环期', '同期价值', '当期/同期'
+        ]
+        sheet.append([(value, STYLE_HEADER) for value in first_header], height=25)
         
         # 第二层表头（价值/占比）
-        row = 3
-        ws.cell(row=row, column=3, value='价值')
-        ws.cell(row=row, column=4, value='占比')
-        ws.cell(row=row, column=5, value='价值')
-        ws.cell(row=row, column=6, value='占比')
-        ws.cell(row=row, column=7, value='价值')
-        ws.cell(row=row, column=8, value='占比')
-        
-        # 应用表头样式
-        for r in [2, 3]:
-            for c in range(1, 16):
-                cell = ws.cell(row=r, column=c)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-                cell.border = border
-        
-        ws.row_dimensions[2].height = 25
-        ws.row_dimensions[3].height = 25
-        
-        # 数据行样式
-        data_alignment_left = Alignment(horizontal='left', vertical='center')
-        data_alignment_right = Alignment(horizontal='right', vertical='center')
-        data_alignment_center = Alignment(horizontal='center', vertical='center')
-        
-        # 全院汇总样式（高亮）
-        summary_font = Font(name='微软雅黑', size=11, bold=True)
-        summary_fill = PatternFill(start_color='E7E6E6', end_color='E7E6E6', fill_type='solid')
-        
-        # 普通数据样式
-        normal_font = Font(name='微软雅黑', size=10)
+        second_header = [None, None, '价值', '占比', '价值', '占比', '价值', '占比'] + [None] * 7
+        sheet.append([(value, STYLE_HEADER) for value in second_header], height=25)
         
         def format_ratio_value(value):
             """格式化比值（大于1或小于1的比例）"""
@@ -152,231 +234,132 @@ class ExportService:
                 return None
             return float(value)
         
-        def write_data_row(ws, row, data, font, fill=None):
+        def optional_float(value):
+            return float(value) if value is not None else None
+        
+        def write_data_row(data, is_total=False, height=20):
             """写入数据行"""
-            ws.cell(row=row, column=1, value=data.get('department_code') or '')
-            ws.cell(row=row, column=2, value=data['department_name'])
-            ws.cell(row=row, column=3, value=float(data['doctor_value']))
-            ws.cell(row=row, column=4, value=float(data['doctor_ratio']) / 100)
-            ws.cell(row=row, column=5, value=float(data['nurse_value']))
-            ws.cell(row=row, column=6, value=float(data['nurse_ratio']) / 100)
-            ws.cell(row=row, column=7, value=float(data['tech_value']))
-            ws.cell(row=row, column=8, value=float(data['tech_ratio']) / 100)
-            ws.cell(row=row, column=9, value=float(data['total_value']))
+            text_style = STYLE_TOTAL_TEXT if is_total else STYLE_TEXT
+            value_style = STYLE_TOTAL_VALUE if is_total else STYLE_VALUE
+            percent_style = STYLE_TOTAL_PERCENT if is_total else STYLE_PERCENT
             
-            # 参考总价值
-            ref_value = data.get('reference_value')
-            ws.cell(row=row, column=10, value=float(ref_value) if ref_value is not None else None)
-            
-            # 核算/实发比例
-            actual_ref_ratio = data.get('actual_reference_ratio')
-            ws.cell(row=row, column=11, value=format_ratio_value(actual_ref_ratio))
-            
-            # 环期价值
-            mom_value = data.get('mom_value')
-            ws.cell(row=row, column=12, value=float(mom_value) if mom_value is not None else None)
-            
-            # 当期/环期比例
-            mom_ratio = data.get('mom_ratio')
-            ws.cell(row=row, column=13, value=format_ratio_value(mom_ratio))
-            
-            # 同期价值
-            yoy_value = data.get('yoy_value')
-            ws.cell(row=row, column=14, value=float(yoy_value) if yoy_value is not None else None)
-            
-            # 当期/同期比例
-            yoy_ratio = data.get('yoy_ratio')
-            ws.cell(row=row, column=15, value=format_ratio_value(yoy_ratio))
-            
-            # 应用样式
-            for c in range(1, 16):
-                cell = ws.cell(row=row, column=c)
-                cell.font = font
-                if fill:
-                    cell.fill = fill
-                cell.border = border
-                
-                if c in [1, 2]:
-                    cell.alignment = data_alignment_left
-                elif c in [4, 6, 8]:  # 序列占比列
-                    cell.alignment = data_alignment_center
-                    cell.number_format = '0.00%'
-                elif c in [11, 13, 15]:  # 比值列（核算/实发、当期/环期、当期/同期）
-                    cell.alignment = data_alignment_center
-                    if cell.value is not None:
-                        cell.number_format = '0.00%'
-                else:  # 价值列
-                    cell.alignment = data_alignment_right
-                    if cell.value is not None:
-                        cell.number_format = '#,##0.00'
-        
-        # 写入数据
-        row = 4
-        
-        # 全院汇总行
-        summary = summary_data['summary']
-        write_data_row(ws, row, summary, summary_font, summary_fill)
-        ws.row_dimensions[row].height = 22
-        row += 1
+            sheet.append([
+                (data.get('department_code') or '', text_style),
+                (data['department_name'], text_style),
+                (float(data['doctor_value']), value_style),
+                (float(data['doctor_ratio']) / 100, percent_style),
+                (float(data['nurse_value']), value_style),
+                (float(data['nurse_ratio']) / 100, percent_style),
+                (float(data['tech_value']), value_style),
+                (float(data['tech_ratio']) / 100, percent_style),
+                (float(data['total_value']), value_style),
+                (optional_float(data.get('reference_value')), value_style),  # 参考总价值
+                (format_ratio_value(data.get('actual_reference_ratio')), percent_style),  # 核算/实发
+                (optional_float(data.get('mom_value')), value_style),  # 环期价值
+                (format_ratio_value(data.get('mom_ratio')), percent_style),  # 当期/环期
+                (optional_float(data.get('yoy_value')), value_style),  # 同期价值
+                (format_ratio_value(data.get('yoy_ratio')), percent_style),  # 当期/同期
+            ], height=height)
+        
+        # 全院汇总行（高亮）
+        write_data_row(summary_data['summary'], is_total=True, height=22)
         
         # 各科室数据行
         for dept in summary_data['departments']:
-            write_data_row(ws, row, dept, normal_font)
-            ws.row_dimensions[row].height = 20
-            row += 1
-        
-        # 保存到BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+            write_data_row(dept)
         
-        return output
+        return _save_workbook(wb)
     
     @staticmethod
-    def export_detail_to_excel(dept_name: str, period: str, detail_data: Dict[str, List[Dict]], hospital_name: str = None, version: str = None) -> BytesIO:
+    def _write_tree_sheets(
+        wb: Workbook,
+        detail_data: Dict[str, List[Dict]],
+        title_prefix: str,
+        title_suffix: str,
+        with_dept_value: bool
+    ) -> bool:
         """
-        导出单个科室的明细表到Excel
+        为每个序列写入一个树形明细Sheet
         
         Args:
-            dept_name: 科室名称
-            period: 评估月份
-            detail_data: 明细数据，包含doctor、nurse、tech三个序列的树形数据
+            with_dept_value: 是否包含“科室业务价值”列（全院明细表不包含）
             
         Returns:
-            BytesIO: Excel文件的字节流
+            是否写入了至少一个Sheet
         """
-        wb = Workbook()
-        
-        # 样式定义
-        title_font = Font(name='微软雅黑', size=14, bold=True)
-        title_alignment = Alignment(horizontal='center', vertical='center')
-        
-        header_font = Font(name='微软雅黑', size=11, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        data_font = Font(name='微软雅黑', size=10)
-        data_alignment_left = Alignment(horizontal='left', vertical='center')
-        data_alignment_right = Alignment(horizontal='right', vertical='center')
-        data_alignment_center = Alignment(horizontal='center', vertical='center')
-        
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # 为每个序列创建一个Sheet
-        sequence_names = {
-            'doctor': '医生序列',
-            'nurse': '护理序列',
-            'tech': '医技序列'
-        }
+        if with_dept_value:
+            widths = {'A': 33, 'B': 13, 'C': 16, 'D': 27, 'E': 16, 'F': 16}
+            headers = ['维度名称（业务价值占比）', '工作量', '全院业务价值', '业务导向', '科室业务价值', '业务价值金额']
+        else:
+            widths = {'A': 33, 'B': 13, 'C': 16, 'D': 27, 'E': 16}
+            headers = ['维度名称（业务价值占比）', '工作量', '全院业务价值', '业务导向', '业务价值金额']
+        last_column = 'F' if with_dept_value else 'E'
         
-        first_sheet = True
-        for seq_key, seq_name in sequence_names.items():
-            if seq_key not in detail_data or not detail_data[seq_key]:
+        has_sheet = False
+        for seq_key, seq_name in _SEQUENCE_NAMES.items():
+            if not detail_data.get(seq_key):
                 continue
+            has_sheet = True
             
             # Sheet名称不加版本号
-            sheet_title = seq_name
-            
-            if first_sheet:
-                ws = wb.active
-                ws.title = sheet_title
-                first_sheet = False
-            else:
-                ws = wb.create_sheet(title=sheet_title)
-            
-            # 设置列宽
-            ws.column_dimensions['A'].width = 33  # 维度名称
-            ws.column_dimensions['B'].width = 13  # 工作量
-            ws.column_dimensions['C'].width = 16  # 全院业务价值
-            ws.column_dimensions['D'].width = 27  # 业务导向（增加50%：18 * 1.5）
-            ws.column_dimensions['E'].width = 16  # 科室业务价值
-            ws.column_dimensions['F'].width = 16  # 业务价值金额
+            sheet = _SheetWriter(wb, seq_name, widths)
             
             # 标题行（表头加版本号）
-            version_suffix = ExportService._format_version(version)
-            title_text = f"{dept_name} - {seq_name}业务价值明细（{period}）{version_suffix}"
-            title_cell = ws.cell(row=1, column=1, value=title_text)
-            title_cell.font = title_font
-            title_cell.alignment = title_alignment
-            ws.merge_cells('A1:F1')  # 改为F1（去掉占比列）
-            ws.row_dimensions[1].height = 30
-            
-            # 表头（去掉占比列）
-            headers = ['维度名称（业务价值占比）', '工作量', '全院业务价值', '业务导向', '科室业务价值', '业务价值金额']
-            for col_idx, header in enumerate(headers, start=1):
-                cell = ws.cell(row=2, column=col_idx, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-                cell.border = border
-            ws.row_dimensions[2].height = 25
-            
-            # 写入树形数据
-            row = 3
+            sheet.merge(f'A1:{last_column}1')
+            sheet.append([(f"{title_prefix}{seq_name}{title_suffix}", STYLE_TITLE)], height=30)
+            sheet.append([(header, STYLE_HEADER) for header in headers], height=25)
             
-            def write_tree_node(node: Dict, level: int, current_row: int) -> int:
-                """递归写入树形节点"""
-                # 计算缩进（每级缩进4个空格，让层级更明显）
-                indent = '    ' * level
-                
-                # 维度名称（带占比）
-                dim_name = indent + node['dimension_name']
-                if node.get('ratio') is not None and node['ratio'] != 0:
-                    dim_name += f"（{float(node['ratio']):.2f}%）"
-                
-                ws.cell(row=current_row, column=1, value=dim_name)
-                ws.cell(row=current_row, column=2, value=float(node.get('workload', 0)) if node.get('workload') else None)
-                ws.cell(row=current_row, column=3, value=node.get('hospital_value', '-'))
-                ws.cell(row=current_row, column=4, value=node.get('business_guide', '-'))
-                ws.cell(row=current_row, column=5, value=node.get('dept_value', '-'))
-                ws.cell(row=current_row, column=6, value=float(node.get('amount', 0)) if node.get('amount') else None)
-                
-                # 应用样式（去掉占比列）
-                for col in range(1, 7):
-                    cell = ws.cell(row=current_row, column=col)
-                    cell.font = data_font
-                    cell.border = border
-                    
-                    if col == 1:  # 维度名称
-                        cell.alignment = data_alignment_left
-                    elif col in [2, 6]:  # 工作量、金额
-                        cell.alignment = data_alignment_right
-                        if cell.value and isinstance(cell.value, (int, float)):
-                            cell.number_format = '#,##0.00'
-                    else:  # 其他
-                        cell.alignment = data_alignment_center
-                
-                ws.row_dimensions[current_row].height = 20
-                current_row += 1
-                
-                # 递归处理子节点
-                if 'children' in node and node['children']:
-                    for child in node['children']:
-                        current_row = write_tree_node(child, level + 1, current_row)
-                
-                return current_row
+            # 逐行写入树形数据
+            for node, level in _iter_tree(detail_data[seq_key]):
+                cells = [
+                    (_tree_dimension_name(node, level), STYLE_TEXT),
+                    (_number_or_none(node.get('workload')), STYLE_VALUE),
+                    (node.get('hospital_value', '-'), STYLE_CENTER),
+                    (node.get('business_guide', '-'), STYLE_CENTER),
+                ]
+                if with_dept_value:
+                    cells.append((node.get('dept_value', '-'), STYLE_CENTER))
+                cells.append((_number_or_none(node.get('amount')), STYLE_VALUE))
+                sheet.append(cells, height=20)
+        
+        return has_sheet
+    
+    @staticmethod
+    def export_detail_to_excel(
+        dept_name: str,
+        period: str,
+        detail_data: Dict[str, List[Dict]],
+        hospital_name: str = None,
+        version: str = None,
+        write_only: bool = True
+    ) -> BytesIO:
+        """
+        导出单个科室的明细表到Excel
+        
+        Args:
+            dept_name: 科室名称
+            period: 评估月份
+            detail_data: 明细数据，包含doctor、nurse、tech三个序列的树形数据
+            write_only: 是否使用只写模式
             
-            # 写入所有一级维度
-            for node in detail_data[seq_key]:
-                row = write_tree_node(node, 0, row)
+        Returns:
+            BytesIO: Excel文件的字节流
+        """
+        wb = _new_workbook(write_only)
+        version_suffix = ExportService._format_version(version)
         
-        # 如果没有任何数据，删除默认Sheet
-        if first_sheet:
-            ws = wb.active
-            ws.title = "无数据"
-            ws.cell(row=1, column=1, value="该科室暂无业务价值数据")
+        has_sheet = ExportService._write_tree_sheets(
+            wb, detail_data,
+            title_prefix=f"{dept_name} - ",
+            title_suffix=f"业务价值明细（{period}）{version_suffix}",
+            with_dept_value=True
+        )
         
-        # 保存到BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+        # 如果没有任何数据，写入提示Sheet
+        if not has_sheet:
+            _SheetWriter(wb, "无数据", {}).append([("该科室暂无业务价值数据", None)])
         
-        return output
+        return _save_workbook(wb)
     
     @staticmethod
     def export_all_reports_to_zip(
@@ -448,7 +431,13 @@ class ExportService:
         return zip_buffer
 
     @staticmethod
-    def export_hospital_detail_to_excel(period: str, hospital_detail_data: Dict[str, List[Dict]], hospital_name: str = None, version: str = None) -> BytesIO:
+    def export_hospital_detail_to_excel(
+        period: str,
+        hospital_detail_data: Dict[str, List[Dict]],
+        hospital_name: str = None,
+        version: str = None,
+        write_only: bool = True
+    ) -> BytesIO:
         """
         导出全院汇总明细表到单个Excel文件（所有科室数据按维度累加汇总）
         
@@ -457,138 +446,24 @@ class ExportService:
             hospital_detail_data: 全院汇总的明细数据，包含doctor、nurse、tech三个序列的树形数据
             hospital_name: 医院名称
             version: 模型版本号
+            write_only: 是否使用只写模式
             
         Returns:
             BytesIO: Excel文件的字节流
         """
-        wb = Workbook()
-        
-        # 样式定义
-        title_font = Font(name='微软雅黑', size=14, bold=True)
-        title_alignment = Alignment(horizontal='center', vertical='center')
-        
-        header_font = Font(name='微软雅黑', size=11, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        data_font = Font(name='微软雅黑', size=10)
-        data_alignment_left = Alignment(horizontal='left', vertical='center')
-        data_alignment_right = Alignment(horizontal='right', vertical='center')
-        data_alignment_center = Alignment(horizontal='center', vertical='center')
+        wb = _new_workbook(write_only)
+        version_suffix = ExportService._format_version(version)
         
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+        # 全院汇总不需要科室业务价值列，因为是汇总值
+        has_sheet = ExportService._write_tree_sheets(
+            wb, hospital_detail_data,
+            title_prefix=f"{hospital_name} - " if hospital_name else "",
+            title_suffix=f"全院业务价值明细（{period}）{version_suffix}",
+            with_dept_value=False
         )
         
-        # 为每个序列创建一个Sheet
-        sequence_names = {
-            'doctor': '医生序列',
-            'nurse': '护理序列',
-            'tech': '医技序列'
-        }
-        
-        first_sheet = True
-        for seq_key, seq_name in sequence_names.items():
-            if seq_key not in hospital_detail_data or not hospital_detail_data[seq_key]:
-                continue
-            
-            # Sheet名称不加版本号
-            sheet_title = seq_name
-            
-            if first_sheet:
-                ws = wb.active
-                ws.title = sheet_title
-                first_sheet = False
-            else:
-                ws = wb.create_sheet(title=sheet_title)
-            
-            # 设置列宽（与单科室明细表一致，但没有科室列）
-            ws.column_dimensions['A'].width = 33  # 维度名称
-            ws.column_dimensions['B'].width = 13  # 工作量
-            ws.column_dimensions['C'].width = 16  # 全院业务价值
-            ws.column_dimensions['D'].width = 27  # 业务导向
-            ws.column_dimensions['E'].width = 16  # 业务价值金额
-            
-            # 标题行（表头加版本号）
-            version_suffix = ExportService._format_version(version)
-            title_prefix = f"{hospital_name} - " if hospital_name else ""
-            title_text = f"{title_prefix}{seq_name}全院业务价值明细（{period}）{version_suffix}"
-            title_cell = ws.cell(row=1, column=1, value=title_text)
-            title_cell.font = title_font
-            title_cell.alignment = title_alignment
-            ws.merge_cells('A1:E1')
-            ws.row_dimensions[1].height = 30
-            
-            # 表头（全院汇总不需要科室业务价值列，因为是汇总值）
-            headers = ['维度名称（业务价值占比）', '工作量', '全院业务价值', '业务导向', '业务价值金额']
-            for col_idx, header in enumerate(headers, start=1):
-                cell = ws.cell(row=2, column=col_idx, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-                cell.border = border
-            ws.row_dimensions[2].height = 25
-            
-            # 写入数据
-            row = 3
-            
-            def write_tree_node(node: Dict, level: int, current_row: int) -> int:
-                """递归写入树形节点"""
-                # 计算缩进
-                indent = '    ' * level
-                
-                # 维度名称（带占比）
-                dim_name = indent + node['dimension_name']
-                if node.get('ratio') is not None and node['ratio'] != 0:
-                    dim_name += f"（{float(node['ratio']):.2f}%）"
-                
-                ws.cell(row=current_row, column=1, value=dim_name)
-                ws.cell(row=current_row, column=2, value=float(node.get('workload', 0)) if node.get('workload') else None)
-                ws.cell(row=current_row, column=3, value=node.get('hospital_value', '-'))
-                ws.cell(row=current_row, column=4, value=node.get('business_guide', '-'))
-                ws.cell(row=current_row, column=5, value=float(node.get('amount', 0)) if node.get('amount') else None)
-                
-                # 应用样式
-                for col in range(1, 6):
-                    cell = ws.cell(row=current_row, column=col)
-                    cell.font = data_font
-                    cell.border = border
-                    
-                    if col == 1:  # 维度名称
-                        cell.alignment = data_alignment_left
-                    elif col in [2, 5]:  # 工作量、金额
-                        cell.alignment = data_alignment_right
-                        if cell.value and isinstance(cell.value, (int, float)):
-                            cell.number_format = '#,##0.00'
-                    else:  # 其他
-                        cell.alignment = data_alignment_center
-                
-                ws.row_dimensions[current_row].height = 20
-                current_row += 1
-                
-                # 递归处理子节点
-                if 'children' in node and node['children']:
-                    for child in node['children']:
-                        current_row = write_tree_node(child, level + 1, current_row)
-                
-                return current_row
-            
-            # 写入所有一级维度
-            for node in hospital_detail_data[seq_key]:
-                row = write_tree_node(node, 0, row)
-        
-        # 如果没有任何数据，删除默认Sheet
-        if first_sheet:
-            ws = wb.active
-            ws.title = "无数据"
-            ws.cell(row=1, column=1, value="暂无业务价值数据")
-        
-        # 保存到BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+        # 如果没有任何数据，写入提示Sheet
+        if not has_sheet:
+            _SheetWriter(wb, "无数据", {}).append([("暂无业务价值数据", None)])
         
-        return output
+        return _save_workbook(wb)
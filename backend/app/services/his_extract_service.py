@@ -0,0 +1,237 @@
+"""
+HIS源表增量抽取服务
+
+按水位列（收费时间 FYFSSJ 或变更时间列）记录每个源表已抽取到的位置，
+每次只把水位之后的数据从HIS数据源搬到暂存库（PostgreSQL）中的同名镜像表，
+数据准备步骤从镜像表加载收费明细，重新计算某个月或计算下个月只在医院网络上传输增量。
+
+- 源表查询使用服务端游标（stream_results）按批读取，内存占用与批大小相关
+- 水位列不唯一，上次抽取后才提交的同一水位的行需要补抽，因此从水位（含）开始读取
+- 配置了主键列时按主键合并（INSERT ... ON CONFLICT DO UPDATE），水位列为变更时间列时
+  可以捕获修改过的行；未配置主键时先删除镜像表中水位及之后的数据再追加，重复执行结果不变
+- 水位在全部批次写入后才前移，抽取中断时下次从原水位重新抽取
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import Column, Index, MetaData, Table, delete, inspect, select
+from sqlalchemy import Text as TextType
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.models.data_source import DataSource
+from app.models.his_extract_table import HisExtractTable
+
+
+def _get_pool(db: Session, data_source_id: int):
+    from app.services.data_source_service import connection_manager
+
+    data_source = db.query(DataSource).filter(DataSource.id == data_source_id).first()
+    if not data_source:
+        raise ValueError(f"数据源不存在: {data_source_id}")
+    return data_source, connection_manager.get_pool(data_source.id) or connection_manager.create_pool(data_source)
+
+
+def _generic_type(column_type):
+    """源库列类型转换为通用类型，用于在暂存库创建镜像表"""
+    try:
+        return column_type.as_generic()
+    except NotImplementedError:
+        return TextType()
+
+
+def format_watermark(value: Any) -> Optional[str]:
+    """水位值转换为文本保存"""
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def parse_watermark(value: Optional[str], column_type) -> Any:
+    """按水位列类型还原水位值，作为查询条件的绑定参数"""
+    if value is None:
+        return None
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return value
+
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type in (int, Decimal, float):
+        return python_type(value)
+    return value
+
+
+class HisExtractService:
+    """HIS源表增量抽取服务"""
+
+    @staticmethod
+    def run_for_targets(db: Session, target_data_source_ids: Iterable[int]) -> Dict[str, int]:
+        """
+        抽取写入指定暂存库的所有启用的源表
+
+        Args:
+            db: 数据库会话
+            target_data_source_ids: 暂存库数据源ID（计算步骤使用的数据源）
+
+        Returns:
+            {暂存表名: 本次抽取行数}
+        """
+        ids = sorted(set(target_data_source_ids))
+        if not ids:
+            return {}
+
+        extract_ids = [
+            row.id for row in db.query(HisExtractTable.id).filter(
+                HisExtractTable.target_data_source_id.in_(ids),
+                HisExtractTable.is_enabled == True
+            ).order_by(HisExtractTable.id).all()
+        ]
+        results = {}
+        for extract_id in extract_ids:
+            config = db.get(HisExtractTable, extract_id)
+            results[config.target_table] = HisExtractService.extract_table(db, extract_id)
+        return results
+
+    @staticmethod
+    def extract_table(db: Session, extract_id: int) -> int:
+        """
+        抽取一个源表水位之后的数据
+
+        抽取期间锁定配置行，同一源表的抽取串行执行。
+
+        Returns:
+            本次抽取行数
+        """
+        config = db.query(HisExtractTable).filter(
+            HisExtractTable.id == extract_id
+        ).with_for_update().first()
+        if not config:
+            raise ValueError(f"抽取配置不存在: {extract_id}")
+
+        try:
+            _, source_pool = _get_pool(db, config.source_data_source_id)
+            target_source, target_pool = _get_pool(db, config.target_data_source_id)
+            if target_source.db_type != "postgresql":
+                raise ValueError(f"暂存库必须是 PostgreSQL 数据源: {target_source.name}")
+
+            key_columns = list(config.key_columns or [])
+            with source_pool.connect() as source_conn, target_pool.connect() as target_conn:
+                source = Table(config.source_table, MetaData(), autoload_with=source_conn)
+                if config.watermark_column not in source.c:
+                    raise ValueError(f"源表 {config.source_table} 不存在水位列: {config.watermark_column}")
+                watermark_col = source.c[config.watermark_column]
+                watermark = parse_watermark(config.watermark_value, watermark_col.type)
+
+                target = HisExtractService._ensure_target_table(
+                    target_conn, source, config.target_table, config.watermark_column, key_columns
+                )
+                if not key_columns:
+                    # 等于水位的行和上次中断时已写入的部分数据会重新抽取，先删除
+                    stmt = delete(target)
+                    if watermark is not None:
+                        stmt = stmt.where(target.c[config.watermark_column] >= watermark)
+                    target_conn.execute(stmt)
+                    target_conn.commit()
+
+                query = select(source).where(watermark_col.isnot(None)).order_by(watermark_col)
+                if watermark is not None:
+                    # 包含水位本身：同一水位值上次抽取之后才提交的行不会遗漏
+                    query = query.where(watermark_col >= watermark)
+                insert_stmt = HisExtractService._build_merge(target, key_columns)
+
+                result = source_conn.execution_options(
+                    stream_results=True, yield_per=config.batch_size
+                ).execute(query)
+                total = 0
+                # 显式指定批大小，否则 partitions() 会一次读入全部结果
+                for rows in result.partitions(config.batch_size):
+                    records = [dict(row._mapping) for row in rows]
+                    target_conn.execute(insert_stmt, records)
+                    target_conn.commit()
+                    total += len(records)
+                    # 按水位列排序，批内最后一行即最大值
+                    watermark = records[-1][config.watermark_column]
+                source_conn.rollback()
+
+            config.watermark_value = format_watermark(watermark)
+            config.last_extracted_at = datetime.now()
+            config.last_row_count = total
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        print(f"[INFO] 抽取 {config.source_table} -> {config.target_table}: {total} 行，水位 {config.watermark_value}")
+        return total
+
+    @staticmethod
+    def reset_watermark(db: Session, extract_id: int, value: Optional[str] = None) -> HisExtractTable:
+        """
+        重置水位（HIS补录或更正了历史数据时使用）
+
+        Args:
+            value: 新水位，为空时下次抽取全量重新加载
+        """
+        config = db.query(HisExtractTable).filter(
+            HisExtractTable.id == extract_id
+        ).with_for_update().first()
+        if not config:
+            raise ValueError(f"抽取配置不存在: {extract_id}")
+        config.watermark_value = value
+        db.commit()
+        db.refresh(config)
+        return config
+
+    @staticmethod
+    def _ensure_target_table(
+        connection,
+        source: Table,
+        table_name: str,
+        watermark_column: str,
+        key_columns: List[str]
+    ) -> Table:
+        """获取暂存库中的镜像表，不存在时按源表结构创建"""
+        if inspect(connection).has_table(table_name):
+            table = Table(table_name, MetaData(), autoload_with=connection)
+        else:
+            table = Table(
+                table_name,
+                MetaData(),
+                *[Column(column.name, _generic_type(column.type)) for column in source.columns]
+            )
+            table.create(connection)
+            Index(f"ix_{table_name}_{watermark_column}".lower(), table.c[watermark_column]).create(connection)
+
+        missing = [name for name in [watermark_column, *key_columns] if name not in table.c]
+        if missing:
+            raise ValueError(f"暂存表 {table_name} 缺少列: {', '.join(missing)}")
+        if key_columns:
+            Index(
+                f"uq_{table_name}_extract_key".lower(),
+                *[table.c[name] for name in key_columns],
+                unique=True
+            ).create(connection, checkfirst=True)
+        connection.commit()
+        return table
+
+    @staticmethod
+    def _build_merge(target: Table, key_columns: List[str]):
+        """构建写入语句：有主键时按主键合并，否则直接追加"""
+        stmt = postgresql.insert(target)
+        if not key_columns:
+            return stmt
+        return stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={
+                column.name: stmt.excluded[column.name]
+                for column in target.columns
+                if column.name not in key_columns
+            }
+        )
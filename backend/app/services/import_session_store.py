@@ -0,0 +1,212 @@
+"""
+导入会话存储
+
+智能导入（维度目录、成本报表、参考价值）在解析、映射、预览、执行之间保存的会话数据
+（Excel 文件内容、字段映射、预览结果等）序列化为 JSON 并压缩后存储：
+- Redis（默认，与 Celery 共用 REDIS_URL）：多个 uvicorn 进程共享，按 TTL 过期
+- 进程内 LRU（Redis 不可用或配置为 memory 时）：按 TTL、条数和总字节数淘汰
+
+每次读取会话时刷新过期时间；单个会话压缩后超过 IMPORT_SESSION_MAX_BYTES 时拒绝保存。
+存储与 Celery 共用，读取时不反序列化任意对象：bytes、Decimal、日期时间以带类型标记的
+JSON 对象保存，无法解析的数据视为会话不存在。
+"""
+import base64
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value: Any) -> Dict[str, str]:
+    """JSON 不支持的类型转换为带类型标记的对象"""
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"导入会话不支持保存 {type(value).__name__} 类型的数据")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        key, value = next(iter(obj.items()))
+        if key == "__bytes__":
+            return base64.b64decode(value)
+        if key == "__decimal__":
+            return Decimal(value)
+        if key == "__datetime__":
+            return datetime.fromisoformat(value)
+        if key == "__date__":
+            return date.fromisoformat(value)
+    return obj
+
+
+def _dumps(data: Dict[str, Any]) -> bytes:
+    content = json.dumps(data, default=_encode, ensure_ascii=False, separators=(",", ":"))
+    payload = zlib.compress(content.encode("utf-8"), 6)
+    if len(payload) > settings.IMPORT_SESSION_MAX_BYTES:
+        raise ValueError(
+            f"导入数据过大（压缩后 {len(payload) // 1024} KB），"
+            f"超过上限 {settings.IMPORT_SESSION_MAX_BYTES // 1024} KB"
+        )
+    return payload
+
+
+def _loads(payload: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(payload).decode("utf-8"), object_hook=_decode)
+
+
+class MemorySessionBackend:
+    """进程内 LRU 存储"""
+
+    def __init__(self, ttl: int, max_entries: int, max_bytes: int, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # {键: (过期时间, 数据)}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, key: str) -> None:
+        _, payload = self._entries.pop(key)
+        self._size -= len(payload)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self._clock():
+                self._remove(key)
+                return None
+            self._entries[key] = (self._clock() + self.ttl, entry[1])
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, payload: bytes) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._clock() + self.ttl, payload)
+            self._size += len(payload)
+
+            # 先淘汰已过期的，再按最久未使用淘汰，保留刚写入的会话
+            now = self._clock()
+            for expired in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                self._remove(expired)
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+
+class RedisSessionBackend:
+    """Redis 存储"""
+
+    def __init__(self, client, ttl: int):
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        pipeline = self.client.pipeline()
+        pipeline.get(key)
+        pipeline.expire(key, self.ttl)
+        payload, _ = pipeline.execute()
+        return payload
+
+    def set(self, key: str, payload: bytes) -> None:
+        self.client.set(key, payload, ex=self.ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _create_backend():
+    ttl = settings.IMPORT_SESSION_TTL_SECONDS
+    if settings.IMPORT_SESSION_BACKEND == "redis":
+        try:
+            import redis
+
+            client = redis.Redis.from_url(settings.REDIS_URL, socket_connect_timeout=2, socket_timeout=5)
+            client.ping()
+            return RedisSessionBackend(client, ttl)
+        except Exception as e:
+            logger.warning(f"[导入会话] Redis 不可用，使用进程内存储（多进程部署时会话不共享）: {e}")
+    return MemorySessionBackend(
+        ttl,
+        settings.IMPORT_SESSION_MEMORY_MAX_ENTRIES,
+        settings.IMPORT_SESSION_MEMORY_MAX_BYTES
+    )
+
+
+def get_session_backend():
+    """获取会话存储后端（首次使用时创建）"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+
+class ImportSessionStore:
+    """导入会话存储（按导入类型区分命名空间）"""
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+
+    def _key(self, session_id: str) -> str:
+        return f"import_session:{self.namespace}:{session_id}"
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """读取会话，不存在或已过期时返回 None"""
+        if not session_id:
+            return None
+        payload = get_session_backend().get(self._key(session_id))
+        if payload is None:
+            return None
+        try:
+            return _loads(payload)
+        except (zlib.error, UnicodeDecodeError, ValueError) as e:
+            logger.warning(f"[导入会话] 会话 {session_id} 的数据无法解析，视为已过期: {e}")
+            return None
+
+    def set(self, session_id: str, data: Dict[str, Any]) -> None:
+        """保存会话（整体覆盖）"""
+        get_session_backend().set(self._key(session_id), _dumps(data))
+
+    def update(self, session_id: str, **fields) -> None:
+        """更新会话中的字段"""
+        data = self.get(session_id)
+        if data is None:
+            raise ValueError("会话已过期或不存在")
+        data.update(fields)
+        self.set(session_id, data)
+
+    def delete(self, session_id: str) -> None:
+        """删除会话"""
+        if session_id:
+            get_session_backend().delete(self._key(session_id))
@@ -0,0 +1,301 @@
+"""
+增量计算服务
+
+为计算步骤生成输入指纹（渲染后的SQL、参数值、源表版本戳），
+重新计算任务时只重新执行输入发生变化的步骤及其下游步骤。
+
+源表版本戳取自 PostgreSQL 的 pg_stat_user_tables（累计插入/更新/删除行数），
+小表另加行数和最大 xmin；非 PostgreSQL 数据源或读取视图/外部表的步骤无法
+获得可靠的版本戳，指纹为空，始终重新执行。
+"""
+import hashlib
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+
+# 读取/写入表引用的识别规则（表名可带schema前缀，可加双引号）
+_IDENTIFIER = r'(?:"[^"]+"|[A-Za-z_][\w$]*)(?:\.(?:"[^"]+"|[A-Za-z_][\w$]*))?'
+_READ_PATTERN = re.compile(rf'\b(?:FROM|JOIN)\s+({_IDENTIFIER})(?!\s*\()', re.IGNORECASE)
+_WRITE_PATTERNS = [
+    re.compile(rf'\bINSERT\s+INTO\s+({_IDENTIFIER})', re.IGNORECASE),
+    re.compile(rf'\bUPDATE\s+({_IDENTIFIER})', re.IGNORECASE),
+    re.compile(rf'\bDELETE\s+FROM\s+({_IDENTIFIER})', re.IGNORECASE),
+    re.compile(rf'\bTRUNCATE\s+(?:TABLE\s+)?({_IDENTIFIER})', re.IGNORECASE),
+    re.compile(rf'\bMERGE\s+INTO\s+({_IDENTIFIER})', re.IGNORECASE),
+    re.compile(rf'\bCREATE\s+(?:TEMP\s+|TEMPORARY\s+|UNLOGGED\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?({_IDENTIFIER})', re.IGNORECASE),
+]
+_CTE_PATTERN = re.compile(r'(?:\bWITH(?:\s+RECURSIVE)?|,)\s*("?[A-Za-z_][\w$]*"?)\s+AS\s*(?:MATERIALIZED\s+|NOT\s+MATERIALIZED\s+)?\(', re.IGNORECASE)
+_COMMENT_PATTERN = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+_STRING_PATTERN = re.compile(r"'(?:[^']|'')*'")
+
+# 不超过该大小的表额外读取 count(*)/max(xmin) 作为精确版本戳
+EXACT_STAMP_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _normalize_table_name(name: str) -> str:
+    """去掉schema前缀；带引号的名称保留大小写，否则转为小写（与PostgreSQL一致）"""
+    last = name.split('.')[-1]
+    if last.startswith('"') and last.endswith('"'):
+        return last[1:-1]
+    return last.lower()
+
+
+class IncrementalCalculationService:
+    """增量计算服务"""
+
+    @staticmethod
+    def extract_table_references(code: str) -> Tuple[Set[str], Set[str]]:
+        """
+        从SQL中提取读取和写入的表
+
+        Args:
+            code: SQL代码
+
+        Returns:
+            (读取的表, 写入的表)，CTE名称不计入
+        """
+        stripped = _STRING_PATTERN.sub("''", _COMMENT_PATTERN.sub(' ', code))
+
+        ctes = {_normalize_table_name(m) for m in _CTE_PATTERN.findall(stripped)}
+        writes = set()
+        for pattern in _WRITE_PATTERNS:
+            writes.update(_normalize_table_name(m) for m in pattern.findall(stripped))
+        reads = {_normalize_table_name(m) for m in _READ_PATTERN.findall(stripped)}
+
+        return reads - ctes, writes - ctes
+
+    @staticmethod
+    def get_table_stamps(
+        connection,
+        table_names: Iterable[str],
+        exact: bool = False
+    ) -> Dict[str, Optional[str]]:
+        """
+        查询表的版本戳（仅 PostgreSQL）
+
+        - 所有表：累计插入+更新+删除行数（pg_stat_user_tables，含所有分区）
+        - 小表（如模型节点、维度映射等配置表）：另加 count(*) 和 max(xmin)。
+          统计计数由其他会话异步上报，刚提交的修改可能尚未计入，小表直接读取行版本保证及时
+        - 视图、物化视图、外部表无法反映底层数据变化，版本戳为 None
+
+        不是关系的名称（如 EXTRACT(... FROM 列名) 误识别的列名）不出现在结果中。
+
+        Args:
+            connection: 数据源连接
+            table_names: 表名列表
+            exact: 不论表大小都读取 count(*)/max(xmin)
+
+        Returns:
+            {表名: 版本戳}
+        """
+        names = sorted(set(table_names))
+        if not names:
+            return {}
+
+        rows = connection.execute(
+            text("""
+                SELECT
+                    c.relname,
+                    c.relkind,
+                    c.oid::regclass::text AS qualified_name,
+                    stats.changes,
+                    stats.size_bytes
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                CROSS JOIN LATERAL (
+                    SELECT
+                        COALESCE(SUM(s.n_tup_ins + s.n_tup_upd + s.n_tup_del), 0) AS changes,
+                        COALESCE(SUM(pg_relation_size(pt.relid)), 0) AS size_bytes
+                    FROM pg_partition_tree(c.oid) pt
+                    LEFT JOIN pg_stat_user_tables s ON s.relid = pt.relid
+                ) stats
+                WHERE c.relname = ANY(:names)
+                  AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+                  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+                ORDER BY qualified_name
+            """),
+            {"names": names}
+        ).fetchall()
+
+        stamps: Dict[str, Optional[str]] = {}
+        for relname, relkind, qualified_name, changes, size_bytes in rows:
+            if relkind in ('v', 'm', 'f'):
+                stamps[relname] = None
+                continue
+            if relname in stamps and stamps[relname] is None:
+                continue
+
+            stamp = f"{qualified_name}:{int(changes or 0)}"
+            if exact or int(size_bytes or 0) <= EXACT_STAMP_MAX_BYTES:
+                count, max_xmin = connection.execute(
+                    text(f"SELECT count(*), COALESCE(max(xmin::text::bigint), 0) FROM {qualified_name}")
+                ).one()
+                stamp += f":{count}:{max_xmin}"
+
+            # 同名表存在于多个schema时合并
+            stamps[relname] = f"{stamps[relname]}|{stamp}" if relname in stamps else stamp
+        return stamps
+
+    @staticmethod
+    def compute_fingerprint(
+        code_type: str,
+        data_source_id: Optional[int],
+        rendered_code: str,
+        params: dict,
+        read_tables: Set[str],
+        stamps: Optional[Dict[str, Optional[str]]]
+    ) -> Optional[str]:
+        """
+        计算步骤输入指纹
+
+        Args:
+            code_type: 代码类型
+            data_source_id: 数据源ID
+            rendered_code: 渲染后的代码
+            params: 参数值
+            read_tables: 需要纳入版本戳的输入表
+            stamps: 表版本戳，None 表示数据源不支持版本戳
+
+        Returns:
+            SHA-256 指纹；输入表版本不可确定时返回 None
+        """
+        if stamps is None:
+            return None
+
+        table_versions = {}
+        for table in sorted(read_tables):
+            if table not in stamps:
+                continue
+            if stamps[table] is None:
+                return None
+            table_versions[table] = stamps[table]
+
+        payload = json.dumps(
+            {
+                "code_type": code_type,
+                "data_source_id": data_source_id,
+                "code": rendered_code,
+                "params": params,
+                "tables": table_versions,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def combine_output_stamps(
+        fingerprint: Optional[str],
+        output_stamps: Dict[str, Optional[str]]
+    ) -> Optional[str]:
+        """
+        将共享输出表的版本并入指纹
+
+        写入非任务隔离表（如收费明细暂存表）的步骤，其结果可能被其他任务覆盖。
+        执行后记录输出表版本，重新计算时输出表版本一致才说明结果仍然有效。
+        """
+        if fingerprint is None or not output_stamps:
+            return fingerprint
+        if any(stamp is None for stamp in output_stamps.values()):
+            return None
+
+        payload = json.dumps({"input": fingerprint, "outputs": output_stamps}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_task_scoped_tables(connection, table_names: Iterable[str]) -> Dict[str, bool]:
+        """
+        查询包含 task_id 列（按任务隔离）的表
+
+        Returns:
+            {表名: 是否包含 department_id 列}
+        """
+        names = sorted(set(table_names))
+        if not names:
+            return {}
+
+        rows = connection.execute(
+            text("""
+                SELECT table_name, bool_or(column_name = 'department_id') AS has_department
+                FROM information_schema.columns
+                WHERE table_name = ANY(:names)
+                  AND column_name IN ('task_id', 'department_id')
+                GROUP BY table_name
+                HAVING bool_or(column_name = 'task_id')
+            """),
+            {"names": names}
+        ).fetchall()
+        return {table_name: bool(has_department) for table_name, has_department in rows}
+
+    @staticmethod
+    def plan_rerun(
+        step_ids: List[int],
+        dependencies: Dict[int, Set[int]],
+        fingerprints: Dict[int, Optional[str]],
+        previous_fingerprints: Dict[int, Optional[str]],
+        step_writes: Dict[int, Set[str]]
+    ) -> Set[int]:
+        """
+        确定需要重新执行的步骤
+
+        1. 指纹变化（或无法确定）的步骤需要重新执行
+        2. 依赖了重新执行步骤的下游步骤需要重新执行
+        3. 重新执行前会清除输出表中该任务的数据，因此写入同一输出表的其他步骤
+           也必须重新执行（及其下游），直到集合不再变化
+
+        Returns:
+            需要重新执行的步骤ID集合
+        """
+        rerun = {
+            step_id for step_id in step_ids
+            if fingerprints.get(step_id) is None
+            or fingerprints.get(step_id) != previous_fingerprints.get(step_id)
+        }
+
+        changed = True
+        while changed:
+            changed = False
+            cleared_tables = set()
+            for step_id in rerun:
+                cleared_tables |= step_writes.get(step_id, set())
+            for step_id in step_ids:
+                if step_id in rerun:
+                    continue
+                if dependencies.get(step_id, set()) & rerun or step_writes.get(step_id, set()) & cleared_tables:
+                    rerun.add(step_id)
+                    changed = True
+
+        return rerun
+
+    @staticmethod
+    def clear_task_outputs(
+        connection,
+        table_names: Iterable[str],
+        task_id: str,
+        department_id: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        清除输出表中该任务（及科室）的数据
+
+        只处理包含 task_id 列的表；未按任务区分的表（如收费明细暂存表）由步骤自行处理。
+
+        Returns:
+            {表名: 删除行数}
+        """
+        scoped_tables = IncrementalCalculationService.get_task_scoped_tables(connection, table_names)
+
+        deleted = {}
+        for table_name, has_department in scoped_tables.items():
+            quoted = '"' + table_name.replace('"', '""') + '"'
+            sql = f"DELETE FROM {quoted} WHERE task_id = :task_id"
+            params = {"task_id": task_id}
+            if has_department and department_id is not None:
+                sql += " AND department_id = :department_id"
+                params["department_id"] = department_id
+            result = connection.execute(text(sql), params)
+            deleted[table_name] = result.rowcount
+        return deleted
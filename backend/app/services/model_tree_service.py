@@ -0,0 +1,266 @@
+"""
+模型节点树服务
+
+一次查询取出模型版本的全部节点，在内存中组装层级，导向规则名称批量查询，
+组装结果按（版本ID，节点集和导向规则的版本戳）缓存：
+节点或导向规则的新增、修改、删除都会改变版本戳，下次请求重新组装。
+
+节点路径索引（"序列 > 一级维度 > 末级维度"）同样按版本缓存，只取构建路径所需的列，
+替代逐级查询父节点的路径拼接，取路径不再访问数据库。
+
+缓存的节点是只读的字典，可直接作为 ModelNodeResponse 返回，调用方不能修改。
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models.model_node import ModelNode
+from app.models.model_version import ModelVersion
+from app.models.orientation_rule import OrientationRule
+
+
+_NODE_COLUMNS = [column.name for column in ModelNode.__table__.columns]
+_PATH_COLUMNS = [
+    ModelNode.id, ModelNode.parent_id, ModelNode.name, ModelNode.code,
+    ModelNode.node_type, ModelNode.is_leaf, ModelNode.sort_order,
+]
+
+# 组装结果缓存：{(类别, 版本ID): (版本戳, ModelTree 或 NodePathIndex)}
+_CACHE_SIZE = 64
+_cache: "OrderedDict[tuple, Tuple[tuple, object]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class ModelTree:
+    """模型版本的节点树"""
+
+    def __init__(self, nodes: Dict[int, dict], roots: List[dict]):
+        self.nodes = nodes
+        self.roots = roots
+
+    def children_of(self, parent_id: Optional[int]) -> List[dict]:
+        """子节点列表（含完整子树），parent_id 为 None 时返回根节点"""
+        if parent_id is None:
+            return self.roots
+        node = self.nodes.get(parent_id)
+        return node["children"] if node else []
+
+    def get(self, node_id: int) -> Optional[dict]:
+        """节点（含完整子树）"""
+        return self.nodes.get(node_id)
+
+
+class NodePathIndex:
+    """模型版本的节点路径索引
+
+    节点为 {id, parent_id, name, code, node_type, is_leaf, sort_order} 字典，
+    每个节点的祖先链（根到自身）在构建时一次算好。
+    """
+
+    def __init__(self, rows):
+        self.nodes: Dict[int, dict] = {}
+        self._children: Dict[Optional[int], List[int]] = {}
+        self._by_code: Dict[str, int] = {}
+        for row in rows:
+            node = dict(row)
+            self.nodes[node["id"]] = node
+            self._children.setdefault(node["parent_id"], []).append(node["id"])
+            self._by_code.setdefault(node["code"], node["id"])
+
+        self._lineage: Dict[int, Tuple[int, ...]] = {}
+        for node_id in self.nodes:
+            self._resolve_lineage(node_id)
+
+    def _resolve_lineage(self, node_id: int) -> Tuple[int, ...]:
+        # 向上找到第一个已算好（或不在版本内）的祖先，再向下依次补齐
+        chain = []
+        current = node_id
+        while current in self.nodes and current not in self._lineage and current not in chain:
+            chain.append(current)
+            current = self.nodes[current]["parent_id"]
+        lineage = self._lineage.get(current, ())
+        for item in reversed(chain):
+            lineage = lineage + (item,)
+            self._lineage[item] = lineage
+        return self._lineage.get(node_id, ())
+
+    def get(self, node_id: int) -> Optional[dict]:
+        return self.nodes.get(node_id)
+
+    def get_by_code(self, code: str) -> Optional[dict]:
+        """按编码取节点（编码重复时取排序在前的节点）"""
+        node_id = self._by_code.get(code)
+        return self.nodes[node_id] if node_id is not None else None
+
+    def ancestors(self, node_id: int) -> List[dict]:
+        """从根到节点自身的节点列表"""
+        return [self.nodes[item] for item in self._lineage.get(node_id, ())]
+
+    def path(self, node_id: int, separator: str = " > ") -> str:
+        """节点完整路径，节点不在版本内时返回空字符串"""
+        return separator.join(node["name"] for node in self.ancestors(node_id))
+
+    def children(self, parent_id: Optional[int]) -> List[dict]:
+        """直接子节点（按 sort_order、id 排序）"""
+        return [self.nodes[item] for item in self._children.get(parent_id, [])]
+
+    def leaves_under(self, node_id: int) -> List[dict]:
+        """节点下的所有末级维度（深度优先，末级维度不再向下查找）"""
+        leaves = []
+        stack = list(reversed(self._children.get(node_id, [])))
+        while stack:
+            node = self.nodes[stack.pop()]
+            if node["is_leaf"]:
+                leaves.append(node)
+            else:
+                stack.extend(reversed(self._children.get(node["id"], [])))
+        return leaves
+
+    def sequence_of(self, node_id: int) -> Optional[dict]:
+        """节点所属的序列节点（最近的序列类型祖先，不含自身）"""
+        for node in reversed(self.ancestors(node_id)[:-1]):
+            if node["node_type"] == "sequence":
+                return node
+        return None
+
+
+class ModelTreeService:
+    """模型节点树服务"""
+
+    @staticmethod
+    def get_tree(db: Session, version_id: int) -> ModelTree:
+        """获取模型版本的节点树（按版本戳缓存）"""
+        stamp = ModelTreeService._get_node_stamp(db, version_id) + ModelTreeService._get_rule_stamp(db, version_id)
+        return _get_cached(("tree", version_id), stamp, lambda: ModelTreeService.build_tree(db, version_id))
+
+    @staticmethod
+    def get_path_index(db: Session, version_id: int) -> NodePathIndex:
+        """获取模型版本的节点路径索引（按节点版本戳缓存）"""
+        stamp = ModelTreeService._get_node_stamp(db, version_id)
+        return _get_cached(("path", version_id), stamp, lambda: ModelTreeService.build_path_index(db, version_id))
+
+    @staticmethod
+    def get_node_path(
+        db: Session,
+        node: ModelNode,
+        separator: str = " > ",
+        indexes: Optional[Dict[int, NodePathIndex]] = None
+    ) -> str:
+        """
+        获取节点的完整路径
+
+        Args:
+            node: 节点（可属于任意版本）
+            separator: 路径分隔符
+            indexes: 调用方持有的 {版本ID: 路径索引}，逐行取路径时传入，同一版本只取一次索引
+        """
+        if indexes is None:
+            indexes = {}
+        index = indexes.get(node.version_id)
+        if index is None:
+            index = indexes[node.version_id] = ModelTreeService.get_path_index(db, node.version_id)
+        return index.path(node.id, separator) or node.name
+
+    @staticmethod
+    def build_path_index(db: Session, version_id: int) -> NodePathIndex:
+        """一次查询取出构建路径所需的列"""
+        rows = db.execute(
+            select(*_PATH_COLUMNS)
+            .where(ModelNode.version_id == version_id)
+            .order_by(ModelNode.sort_order, ModelNode.id)
+        ).mappings().all()
+        return NodePathIndex(rows)
+
+    @staticmethod
+    def build_tree(db: Session, version_id: int) -> ModelTree:
+        """一次查询取出全部节点并组装层级（同级按 sort_order、id 排序）"""
+        rows = db.execute(
+            select(ModelNode.__table__)
+            .where(ModelNode.version_id == version_id)
+            .order_by(ModelNode.sort_order, ModelNode.id)
+        ).mappings().all()
+
+        rule_ids = {rule_id for row in rows for rule_id in (row["orientation_rule_ids"] or [])}
+        rule_names = dict(
+            db.query(OrientationRule.id, OrientationRule.name).filter(OrientationRule.id.in_(rule_ids)).all()
+        ) if rule_ids else {}
+
+        return ModelTreeService.assemble(rows, rule_names)
+
+    @staticmethod
+    def assemble(rows, rule_names: Dict[int, str]) -> ModelTree:
+        """
+        在内存中组装层级
+
+        Args:
+            rows: 节点行（按 sort_order、id 排序），父节点不在结果中的节点不挂到树上
+            rule_names: {导向规则ID: 名称}
+        """
+        nodes: Dict[int, dict] = {}
+        for row in rows:
+            node = {name: row.get(name) for name in _NODE_COLUMNS}
+            node["orientation_rule_names"] = [
+                rule_names[rule_id] for rule_id in (row.get("orientation_rule_ids") or []) if rule_id in rule_names
+            ]
+            node["children"] = []
+            node["has_children"] = False
+            nodes[node["id"]] = node
+
+        roots = []
+        for node in nodes.values():
+            parent = nodes.get(node["parent_id"]) if node["parent_id"] is not None else None
+            if parent is None:
+                if node["parent_id"] is None:
+                    roots.append(node)
+                continue
+            parent["children"].append(node)
+            parent["has_children"] = True
+
+        return ModelTree(nodes, roots)
+
+    @staticmethod
+    def _get_node_stamp(db: Session, version_id: int) -> tuple:
+        """节点版本戳：节点数、节点最近修改时间"""
+        return tuple(db.execute(
+            select(func.count(ModelNode.id), func.max(ModelNode.updated_at))
+            .where(ModelNode.version_id == version_id)
+        ).one())
+
+    @staticmethod
+    def _get_rule_stamp(db: Session, version_id: int) -> tuple:
+        """导向规则版本戳：所属机构导向规则数和最近修改时间"""
+        hospital_id = select(ModelVersion.hospital_id).where(ModelVersion.id == version_id).scalar_subquery()
+        return tuple(db.execute(
+            select(func.count(OrientationRule.id), func.max(OrientationRule.updated_at))
+            .where(OrientationRule.hospital_id == hospital_id)
+        ).one())
+
+    @staticmethod
+    def invalidate(version_id: Optional[int] = None):
+        """清除缓存（不传版本ID时清除全部）"""
+        with _cache_lock:
+            if version_id is None:
+                _cache.clear()
+            else:
+                _cache.pop(("tree", version_id), None)
+                _cache.pop(("path", version_id), None)
+
+
+def _get_cached(key: tuple, stamp: tuple, build):
+    """版本戳一致时返回缓存，否则重新构建"""
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    value = build()
+    with _cache_lock:
+        _cache[key] = (stamp, value)
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return value
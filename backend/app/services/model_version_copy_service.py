@@ -0,0 +1,272 @@
+"""
+模型版本复制服务
+
+以集合方式复制模型版本的节点、计算流程和学科规则，不逐行 add/flush：
+- 新记录ID按源记录ID顺序预先从序列中取得，父节点、流程、步骤依赖在同一条
+  INSERT ... SELECT 中通过源ID到新ID的映射换算，任意层级的节点树只需一条语句
+- 跨医疗机构导入时，导向规则ID按名称映射为目标医疗机构的规则，找不到的规则移除并给出警告
+- 数据源是全局配置，步骤保留原数据源
+"""
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.model_version import ModelVersion
+
+
+# 跨医疗机构的导向规则ID映射：按名称匹配（重名时取ID最小的规则），同一医疗机构内复制时不使用
+_RULE_MAP_SQL = """
+    rule_map AS (
+        SELECT DISTINCT ON (source_rule.id) source_rule.id AS source_id, target_rule.id AS target_id
+        FROM orientation_rules source_rule
+        JOIN orientation_rules target_rule
+          ON target_rule.hospital_id = :target_hospital_id
+         AND target_rule.name = source_rule.name
+        WHERE source_rule.hospital_id = :source_hospital_id
+        ORDER BY source_rule.id, target_rule.id
+    )
+"""
+
+_MAPPED_RULE_IDS_SQL = """
+    CASE
+        WHEN s.orientation_rule_ids IS NULL OR NOT :cross_hospital THEN s.orientation_rule_ids
+        ELSE ARRAY(
+            SELECT m.target_id
+            FROM unnest(s.orientation_rule_ids) WITH ORDINALITY AS u(rule_id, ord)
+            JOIN rule_map m ON m.source_id = u.rule_id
+            ORDER BY u.ord
+        )
+    END
+"""
+
+
+class ModelVersionCopyService:
+    """模型版本复制服务"""
+
+    def __init__(self, db: Session, progress_callback: Optional[Callable[[int, int, str], None]] = None):
+        """
+        Args:
+            db: 数据库会话（调用方负责提交）
+            progress_callback: 进度回调 (当前阶段, 阶段总数, 状态说明)
+        """
+        self.db = db
+        self.progress_callback = progress_callback
+        self.warnings: List[str] = []
+
+    def copy_version(
+        self,
+        source_version_id: int,
+        target_version_id: int,
+        copy_workflows: bool = False,
+        copy_discipline_rules: bool = False
+    ) -> Dict[str, int]:
+        """
+        复制模型版本内容到目标版本
+
+        Returns:
+            统计信息 {node_count, workflow_count, step_count, discipline_rule_count}
+        """
+        source_version = self.db.query(ModelVersion).filter(ModelVersion.id == source_version_id).first()
+        target_version = self.db.query(ModelVersion).filter(ModelVersion.id == target_version_id).first()
+        if not source_version or not target_version:
+            raise ValueError("源版本或目标版本不存在")
+
+        phases = [("nodes", "正在复制模型节点...")]
+        if copy_workflows:
+            phases.append(("workflows", "正在复制计算流程..."))
+        if copy_discipline_rules:
+            phases.append(("discipline_rules", "正在复制学科规则..."))
+
+        statistics = {"node_count": 0, "workflow_count": 0, "step_count": 0, "discipline_rule_count": 0}
+        for index, (phase, status) in enumerate(phases):
+            self._report(index, len(phases), status)
+            if phase == "nodes":
+                statistics["node_count"] = self.copy_nodes(source_version, target_version)
+            elif phase == "workflows":
+                statistics["workflow_count"], statistics["step_count"] = self.copy_workflows(
+                    source_version, target_version
+                )
+            else:
+                statistics["discipline_rule_count"] = self.copy_discipline_rules(source_version, target_version)
+        self._report(len(phases), len(phases), "复制完成")
+
+        return statistics
+
+    def copy_nodes(self, source_version: ModelVersion, target_version: ModelVersion) -> int:
+        """
+        复制模型节点（一条语句复制整棵树）
+
+        Returns:
+            复制的节点数量
+        """
+        params = self._hospital_params(source_version, target_version)
+        params.update({
+            "source_version_id": source_version.id,
+            "target_version_id": target_version.id,
+            "now": datetime.utcnow(),
+        })
+
+        if params["cross_hospital"]:
+            self._warn_unmapped_rules(params)
+
+        return self.db.execute(
+            text(f"""
+                WITH src AS MATERIALIZED (
+                    SELECT n.*, nextval(pg_get_serial_sequence('model_nodes', 'id')) AS new_id
+                    FROM model_nodes n
+                    WHERE n.version_id = :source_version_id
+                    ORDER BY n.id
+                ),
+                {_RULE_MAP_SQL},
+                inserted AS (
+                    INSERT INTO model_nodes (
+                        id, version_id, parent_id, sort_order, name, code, node_type, sequence_type,
+                        is_leaf, calc_type, weight, unit, business_guide, script, rule,
+                        orientation_rule_ids, created_at, updated_at
+                    )
+                    SELECT
+                        s.new_id, :target_version_id, p.new_id, s.sort_order, s.name, s.code, s.node_type,
+                        s.sequence_type, s.is_leaf, s.calc_type, s.weight, s.unit, s.business_guide,
+                        s.script, s.rule, {_MAPPED_RULE_IDS_SQL}, :now, :now
+                    FROM src s
+                    LEFT JOIN src p ON p.id = s.parent_id
+                    ORDER BY s.new_id
+                    RETURNING 1
+                )
+                SELECT count(*) FROM inserted
+            """),
+            params
+        ).scalar()
+
+    def copy_workflows(self, source_version: ModelVersion, target_version: ModelVersion) -> Tuple[int, int]:
+        """
+        复制计算流程和步骤（一条语句），步骤依赖换算为同一流程内的新步骤ID
+
+        Returns:
+            (流程数量, 步骤数量)
+        """
+        params = {
+            "source_version_id": source_version.id,
+            "target_version_id": target_version.id,
+            "now": datetime.utcnow(),
+        }
+
+        workflow_count, step_count = self.db.execute(
+            text("""
+                WITH wf AS MATERIALIZED (
+                    SELECT w.*, nextval(pg_get_serial_sequence('calculation_workflows', 'id')) AS new_id
+                    FROM calculation_workflows w
+                    WHERE w.version_id = :source_version_id
+                    ORDER BY w.id
+                ),
+                st AS MATERIALIZED (
+                    SELECT s.*, wf.new_id AS new_workflow_id,
+                           nextval(pg_get_serial_sequence('calculation_steps', 'id')) AS new_id
+                    FROM calculation_steps s
+                    JOIN wf ON wf.id = s.workflow_id
+                    ORDER BY s.id
+                ),
+                inserted_workflows AS (
+                    INSERT INTO calculation_workflows (id, version_id, name, description, is_active, created_at, updated_at)
+                    SELECT new_id, :target_version_id, name, description, is_active, :now, :now
+                    FROM wf
+                    RETURNING 1
+                ),
+                inserted_steps AS (
+                    INSERT INTO calculation_steps (
+                        id, workflow_id, name, description, code_type, code_content, data_source_id,
+                        sort_order, is_enabled, depends_on, created_at, updated_at
+                    )
+                    SELECT
+                        s.new_id, s.new_workflow_id, s.name, s.description, s.code_type, s.code_content,
+                        s.data_source_id, s.sort_order, s.is_enabled,
+                        CASE
+                            WHEN s.depends_on IS NULL THEN NULL
+                            ELSE ARRAY(
+                                SELECT d.new_id
+                                FROM unnest(s.depends_on) WITH ORDINALITY AS u(step_id, ord)
+                                JOIN st d ON d.id = u.step_id AND d.workflow_id = s.workflow_id
+                                ORDER BY u.ord
+                            )
+                        END,
+                        :now, :now
+                    FROM st s
+                    ORDER BY s.new_id
+                    RETURNING 1
+                )
+                SELECT (SELECT count(*) FROM inserted_workflows), (SELECT count(*) FROM inserted_steps)
+            """),
+            params
+        ).one()
+        return workflow_count, step_count
+
+    def copy_discipline_rules(self, source_version: ModelVersion, target_version: ModelVersion) -> int:
+        """
+        复制学科规则
+
+        Returns:
+            复制的规则数量
+        """
+        return self.db.execute(
+            text("""
+                WITH inserted AS (
+                    INSERT INTO discipline_rules (
+                        hospital_id, version_id, department_code, department_name, dimension_code,
+                        dimension_name, rule_description, rule_coefficient, created_at, updated_at
+                    )
+                    SELECT
+                        :target_hospital_id, :target_version_id, department_code, department_name,
+                        dimension_code, dimension_name, rule_description, rule_coefficient, :now, :now
+                    FROM discipline_rules
+                    WHERE version_id = :source_version_id
+                      AND hospital_id = :source_hospital_id
+                    ORDER BY id
+                    RETURNING 1
+                )
+                SELECT count(*) FROM inserted
+            """),
+            {
+                "source_version_id": source_version.id,
+                "source_hospital_id": source_version.hospital_id,
+                "target_version_id": target_version.id,
+                "target_hospital_id": target_version.hospital_id,
+                "now": datetime.utcnow(),
+            }
+        ).scalar()
+
+    def _warn_unmapped_rules(self, params: dict):
+        """跨医疗机构导入时，按规则列出在目标医疗机构找不到同名规则的导向规则"""
+        rows = self.db.execute(
+            text(f"""
+                WITH {_RULE_MAP_SQL}
+                SELECT u.rule_id, r.name, count(DISTINCT s.id)
+                FROM model_nodes s
+                CROSS JOIN LATERAL unnest(s.orientation_rule_ids) AS u(rule_id)
+                LEFT JOIN rule_map m ON m.source_id = u.rule_id
+                LEFT JOIN orientation_rules r ON r.id = u.rule_id
+                WHERE s.version_id = :source_version_id
+                  AND m.target_id IS NULL
+                GROUP BY u.rule_id, r.name
+                ORDER BY u.rule_id
+            """),
+            params
+        ).all()
+        for rule_id, rule_name, node_count in rows:
+            label = f"'{rule_name}'" if rule_name else f"ID {rule_id}（已删除）"
+            self.warnings.append(
+                f"导向规则 {label} 在目标医疗机构不存在，已移除 {node_count} 个模型节点的关联"
+            )
+
+    @staticmethod
+    def _hospital_params(source_version: ModelVersion, target_version: ModelVersion) -> dict:
+        return {
+            "source_hospital_id": source_version.hospital_id,
+            "target_hospital_id": target_version.hospital_id,
+            "cross_hospital": source_version.hospital_id != target_version.hospital_id,
+        }
+
+    def _report(self, current: int, total: int, status: str):
+        if self.progress_callback:
+            self.progress_callback(current, total, status)
@@ -0,0 +1,75 @@
+"""
+批次范围内的计算结果加载器
+
+导出批次报表时，每个月份的任务既是当期任务，又是后续月份的环比、同比任务。
+加载器在一次导出内共享：每个任务的计算结果只查询、汇总一次，各科室总价值按任务缓存；
+结果行本身不缓存，内存占用只与当前任务有关。
+"""
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.calculation_task import CalculationResult
+from app.models.department import Department
+from app.services.result_rollup_service import ResultRollup, load_sequence_types
+
+
+class PeriodResultLoader:
+    """批次范围内的计算结果加载器"""
+
+    def __init__(self, db: Session, hospital_id: int):
+        self.db = db
+        self.hospital_id = hospital_id
+        self._departments: Optional[List[Department]] = None
+        self._department_totals: Dict[str, Dict[int, Decimal]] = {}
+
+    def active_departments(self) -> List[Department]:
+        """参与核算的科室（按排序号）"""
+        if self._departments is None:
+            self._departments = self.db.query(Department).filter(
+                Department.hospital_id == self.hospital_id,
+                Department.is_active == True
+            ).order_by(Department.sort_order, Department.id).all()
+        return self._departments
+
+    def load(self, task_id: str) -> Tuple[List[CalculationResult], ResultRollup]:
+        """
+        查询任务的计算结果并按科室逐级汇总，同时缓存各科室总价值
+
+        Returns:
+            (计算结果, 按科室分组的逐级汇总)
+        """
+        results = self.db.query(CalculationResult).filter(
+            CalculationResult.task_id == task_id
+        ).all()
+        rollup = ResultRollup(results, sequence_types=load_sequence_types(self.db, results))
+        self._department_totals[task_id] = {
+            department_id: rollup.total_value(department_id)
+            for department_id in dict.fromkeys(r.department_id for r in results)
+        }
+        return results, rollup
+
+    def department_totals(self, task_id: str) -> Dict[int, Decimal]:
+        """各科室总价值：{科室ID: 总价值}，没有计算结果时为空"""
+        if task_id not in self._department_totals:
+            self.load(task_id)
+        return self._department_totals[task_id]
+
+    def unit_totals(self, task_id: Optional[str]) -> Dict[str, Decimal]:
+        """
+        按核算单元编码汇总的总价值（用于环比、同比）
+
+        任务为空或没有计算结果时返回空字典
+        """
+        if not task_id:
+            return {}
+        totals = self.department_totals(task_id)
+        if not totals:
+            return {}
+
+        unit_totals: Dict[str, Decimal] = {}
+        for dept in self.active_departments():
+            unit_code = dept.accounting_unit_code or dept.his_code
+            unit_totals[unit_code] = unit_totals.get(unit_code, Decimal('0')) + totals.get(dept.id, Decimal('0'))
+        return unit_totals
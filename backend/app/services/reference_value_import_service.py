@@ -2,60 +2,39 @@
 参考价值智能导入服务
 """
 from typing import Dict, List, Any, Optional
-from io import BytesIO
 from decimal import Decimal, InvalidOperation
-import openpyxl
 from sqlalchemy.orm import Session
-from difflib import SequenceMatcher
 import uuid
 
 from app.models.department import Department
 from app.models.reference_value import ReferenceValue
+from app.services.import_session_store import ImportSessionStore
+from app.services.staged_import_service import StagedImportService
+from app.utils.ngram_index import NgramSuggestionIndex
+from app.utils.spreadsheet_reader import SpreadsheetReader, iter_sheet_rows, scan_rows
 
 
 class ReferenceValueImportService:
     """参考价值智能导入服务"""
     
-    # 会话存储（生产环境应使用Redis）
-    _sessions: Dict[str, Dict[str, Any]] = {}
+    # 会话存储（Redis 或进程内 LRU，按 TTL 过期）
+    _sessions = ImportSessionStore("reference_value")
     
     @classmethod
     def parse_excel(cls, file_content: bytes, sheet_name: Optional[str] = None, skip_rows: int = 0) -> Dict[str, Any]:
         """
-        第一步：解析Excel文件，返回列名和预览数据
+        第一步：解析Excel或CSV文件，返回列名和预览数据（流式读取，一次遍历）
         """
-        if not file_content or len(file_content) == 0:
-            raise ValueError("文件内容为空")
+        with SpreadsheetReader(file_content, sheet_name) as reader:
+            sheet_names = reader.sheet_names
+            current_sheet = reader.sheet_name
+            scan = scan_rows(reader.iter_rows(), header_index=skip_rows)
         
-        try:
-            wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-        except Exception as e:
-            error_msg = str(e)
-            if "zip" in error_msg.lower():
-                raise ValueError("文件格式错误，请上传有效的 Excel 文件（.xlsx 格式）")
-            else:
-                raise ValueError(f"无法读取 Excel 文件: {error_msg}")
-        
-        sheet_names = wb.sheetnames
-        
-        if sheet_name and sheet_name in sheet_names:
-            ws = wb[sheet_name]
-            current_sheet = sheet_name
-        else:
-            ws = wb.active
-            current_sheet = ws.title
-        
-        rows = list(ws.iter_rows(values_only=True))
-        if not rows:
+        if scan["total_rows"] == 0:
             raise ValueError("Excel文件为空")
         
-        if skip_rows > 0:
-            if skip_rows >= len(rows):
-                raise ValueError(f"跳过行数({skip_rows})超过总行数({len(rows)})")
-            rows = rows[skip_rows:]
-        
-        if not rows:
-            raise ValueError("跳过指定行数后没有剩余数据")
+        if skip_rows > 0 and skip_rows >= scan["total_rows"]:
+            raise ValueError(f"跳过行数({skip_rows})超过总行数({scan['total_rows']})")
         
         def get_excel_column_name(col_index):
             result = ""
@@ -65,33 +44,32 @@ class ReferenceValueImportService:
             return result
         
         headers = []
-        for i, cell in enumerate(rows[0]):
+        for i, cell in enumerate(scan["header"]):
             col_name = get_excel_column_name(i)
             if cell is not None and str(cell).strip():
                 headers.append(f"{str(cell).strip()} ({col_name})")
             else:
                 headers.append(f"(空列-{col_name})")
         
-        data_rows = rows[1:]
-        total_rows = len(data_rows)
+        total_rows = scan["data_rows"]
         
         if total_rows == 0:
             raise ValueError("Excel文件没有数据行")
         
         preview_data = []
-        for row in data_rows[:10]:
+        for row in scan["preview_rows"]:
             preview_data.append([str(cell).strip() if cell is not None else "" for cell in row])
         
         suggested_mapping = cls._suggest_field_mapping(headers)
         
         session_id = str(uuid.uuid4())
-        cls._sessions[session_id] = {
+        cls._sessions.set(session_id, {
             "file_content": file_content,
             "sheet_name": current_sheet,
             "skip_rows": skip_rows,
             "headers": headers,
             "total_rows": total_rows
-        }
+        })
         
         return {
             "session_id": session_id,
@@ -158,20 +136,14 @@ class ReferenceValueImportService:
         sheet_name = session_data.get("sheet_name")
         skip_rows = session_data.get("skip_rows", 0)
         
-        wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-        ws = wb[sheet_name] if sheet_name else wb.active
-        
-        rows = list(ws.iter_rows(values_only=True))
-        if skip_rows > 0:
-            rows = rows[skip_rows:]
-        data_rows = rows[1:]
+        # 流式读取数据行（跳过前N行和表头）
+        data_rows = iter_sheet_rows(file_content, sheet_name, skip_rows + 1)
         
         # 获取系统科室列表
         system_departments = cls._get_system_departments(db, hospital_id)
         
         # 保存到会话
-        cls._sessions[session_id]["field_mapping"] = field_mapping
-        cls._sessions[session_id]["match_by"] = match_by
+        cls._sessions.update(session_id, field_mapping=field_mapping, match_by=match_by)
         
         # 如果是按代码匹配，直接返回空的唯一值列表（跳过第二步）
         if match_by == "code":
@@ -196,10 +168,11 @@ class ReferenceValueImportService:
                         unique_values_dict[value] = 0
                     unique_values_dict[value] += 1
         
-        # 为每个唯一值提供智能匹配建议
+        # 为每个唯一值提供智能匹配建议（科室索引只构建一次）
+        department_index = NgramSuggestionIndex(system_departments, fields=("name", "code"))
         unique_values = []
         for value, count in unique_values_dict.items():
-            suggested_depts = cls._suggest_departments(value, system_departments)
+            suggested_depts = cls._suggest_departments(value, department_index)
             unique_values.append({
                 "value": value,
                 "count": count,
@@ -208,7 +181,7 @@ class ReferenceValueImportService:
         
         unique_values.sort(key=lambda x: -x["count"])
         
-        cls._sessions[session_id]["unique_values"] = unique_values
+        cls._sessions.update(session_id, unique_values=unique_values)
         
         return {
             "unique_values": unique_values,
@@ -239,40 +212,39 @@ class ReferenceValueImportService:
         
         return result
     
+    @staticmethod
+    def _department_score(value: str, department: Dict[str, Any], similarity: float) -> float:
+        """
+        科室推荐得分
+        
+        名称、编码的 n-gram TF-IDF 余弦相似度（取最大值），
+        导入值与科室名称互相包含时加 0.3，与名称或编码完全相同时为 1.0
+        """
+        if value == department["name"] or value == department["code"]:
+            return 1.0
+        value_lower = value.lower()
+        name_lower = (department["name"] or "").lower()
+        score = similarity
+        if name_lower and (value_lower in name_lower or name_lower in value_lower):
+            score += 0.3
+        return score
+    
     @classmethod
     def _suggest_departments(
         cls,
         value: str,
-        system_departments: List[Dict[str, Any]]
+        department_index: NgramSuggestionIndex
     ) -> List[Dict[str, Any]]:
-        """为给定值建议匹配的科室"""
-        suggestions = []
-        value_lower = value.lower()
-        
-        for dept in system_departments:
-            name_similarity = SequenceMatcher(None, value_lower, dept["name"].lower()).ratio()
-            code_similarity = SequenceMatcher(None, value_lower, dept["code"].lower()).ratio()
-            
-            contains_in_name = value_lower in dept["name"].lower() or dept["name"].lower() in value_lower
-            
-            score = max(name_similarity, code_similarity)
-            if contains_in_name:
-                score += 0.3
-            
-            # 完全匹配
-            if value == dept["name"] or value == dept["code"]:
-                score = 1.0
-            
-            if score > 0.3:
-                suggestions.append({
-                    "id": dept["id"],
-                    "code": dept["code"],
-                    "name": dept["name"],
-                    "score": score
-                })
-        
-        suggestions.sort(key=lambda x: x["score"], reverse=True)
-        return suggestions[:5]
+        """为给定值建议匹配的科室（使用预先构建的科室 n-gram 索引，返回前5个）"""
+        return [
+            {
+                "id": dept["id"],
+                "code": dept["code"],
+                "name": dept["name"],
+                "score": score
+            }
+            for dept, score in department_index.suggest(value, limit=5, threshold=0.3, score=cls._department_score)
+        ]
     
     @classmethod
     def generate_preview(
@@ -308,13 +280,8 @@ class ReferenceValueImportService:
         sheet_name = session_data.get("sheet_name")
         skip_rows = session_data.get("skip_rows", 0)
         
-        wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
-        ws = wb[sheet_name] if sheet_name else wb.active
-        
-        rows = list(ws.iter_rows(values_only=True))
-        if skip_rows > 0:
-            rows = rows[skip_rows:]
-        data_rows = rows[1:]
+        # 流式读取数据行（跳过前N行和表头）
+        data_rows = iter_sheet_rows(file_content, sheet_name, skip_rows + 1)
         
         # 获取列索引
         def get_col_idx(field_name):
@@ -483,7 +450,7 @@ class ReferenceValueImportService:
             elif item["status"] == "error":
                 final_statistics["error_count"] += 1
         
-        cls._sessions[session_id]["preview_items"] = final_items
+        cls._sessions.update(session_id, preview_items=final_items)
         
         return {
             "preview_items": final_items,
@@ -554,75 +521,54 @@ class ReferenceValueImportService:
                 return item.get(field_name, default)
             return default
         
+        value_fields = [
+            "department_name", "reference_value",
+            "doctor_reference_value", "nurse_reference_value", "tech_reference_value"
+        ]
+        
+        rows = []
         for item in items_to_import:
-            try:
-                status = get_field(item, "status")
-                if status == "error":
-                    error_count += 1
-                    errors.append({
-                        "period": get_field(item, "period", ""),
-                        "department_code": get_field(item, "department_code", ""),
-                        "reason": get_field(item, "message", "未知错误")
-                    })
-                    continue
-                
-                period = get_field(item, "period")
-                dept_code = get_field(item, "department_code")
-                dept_name = get_field(item, "department_name")
-                ref_value = get_field(item, "reference_value")
-                doctor_value = get_field(item, "doctor_reference_value")
-                nurse_value = get_field(item, "nurse_reference_value")
-                tech_value = get_field(item, "tech_reference_value")
-                
-                # 检查是否已存在
-                existing = db.query(ReferenceValue).filter(
-                    ReferenceValue.hospital_id == hospital_id,
-                    ReferenceValue.period == period,
-                    ReferenceValue.department_code == dept_code
-                ).first()
-                
-                if existing:
-                    # 更新
-                    existing.department_name = dept_name
-                    existing.reference_value = ref_value
-                    existing.doctor_reference_value = doctor_value
-                    existing.nurse_reference_value = nurse_value
-                    existing.tech_reference_value = tech_value
-                    update_count += 1
-                else:
-                    # 新增
-                    new_ref = ReferenceValue(
-                        hospital_id=hospital_id,
-                        period=period,
-                        department_code=dept_code,
-                        department_name=dept_name,
-                        reference_value=ref_value,
-                        doctor_reference_value=doctor_value,
-                        nurse_reference_value=nurse_value,
-                        tech_reference_value=tech_value
-                    )
-                    db.add(new_ref)
-                    success_count += 1
-                
-                db.flush()
-                
-            except Exception as e:
-                db.rollback()
+            if get_field(item, "status") == "error":
                 error_count += 1
                 errors.append({
                     "period": get_field(item, "period", ""),
                     "department_code": get_field(item, "department_code", ""),
-                    "reason": str(e)
+                    "reason": get_field(item, "message", "未知错误")
                 })
+                rows.append(None)
+                continue
+            
+            row = {
+                "period": get_field(item, "period"),
+                "department_code": get_field(item, "department_code")
+            }
+            for field in value_fields:
+                row[field] = get_field(item, field)
+            rows.append(row)
         
+        # 批量导入：已存在的记录更新，不存在的新增
         try:
+            result = StagedImportService.execute(
+                db, ReferenceValue, hospital_id, rows,
+                key_columns=["period", "department_code"],
+                value_columns=value_fields
+            )
             db.commit()
         except Exception as e:
             db.rollback()
             raise ValueError(f"提交事务失败: {str(e)}")
         
-        if session_id and session_id in cls._sessions:
-            del cls._sessions[session_id]
+        success_count = result["inserted"]
+        update_count = result["updated"]
+        for index, reason in result["errors"]:
+            error_count += 1
+            errors.append({
+                "period": get_field(items_to_import[index], "period", ""),
+                "department_code": get_field(items_to_import[index], "department_code", ""),
+                "reason": reason
+            })
+        
+        cls._sessions.delete(session_id)
         
         return {
             "success": True,
@@ -0,0 +1,138 @@
+"""
+计算结果汇总缓存服务
+
+已完成任务的计算结果不再变化，任务完成时一次性生成逐级汇总快照
+（各科室序列价值、各科室节点小计、全院节点小计），存入 calculation_result_rollups。
+汇总表、科室明细、全院明细接口优先读取快照，缓存缺失（如历史任务）时回退为实时汇总。
+
+任务重新执行时清除缓存，任务删除时由外键级联删除。
+快照格式变化时提升 PAYLOAD_VERSION，旧版本的缓存视为缺失。
+"""
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.calculation_task import CalculationResult, CalculationResultRollup
+from app.models.model_node import ModelNode
+from app.services.result_rollup_service import ResultRollup, load_sequence_types
+
+
+SCOPE_SUMMARY = "summary"
+SCOPE_DEPARTMENT = "department"
+SCOPE_HOSPITAL = "hospital"
+
+# 2：序列按模型节点的 sequence_type 归类，快照中记录序列类别
+PAYLOAD_VERSION = 2
+
+
+class ResultRollupCacheService:
+    """计算结果汇总缓存服务"""
+
+    @staticmethod
+    def build(db: Session, task_id: str) -> int:
+        """
+        生成任务的汇总缓存（覆盖已有缓存，由调用方提交事务）
+
+        Returns:
+            写入的缓存行数
+        """
+        ResultRollupCacheService.invalidate(db, task_id)
+
+        # 与明细接口相同的顺序：科室、模型节点排序
+        results = db.query(CalculationResult).outerjoin(
+            ModelNode, CalculationResult.node_id == ModelNode.id
+        ).filter(
+            CalculationResult.task_id == task_id
+        ).order_by(
+            CalculationResult.department_id,
+            ModelNode.sort_order
+        ).all()
+
+        if not results:
+            return 0
+
+        sequence_types = load_sequence_types(db, results)
+        dept_rollup = ResultRollup(results, sequence_types=sequence_types)
+        hospital_rollup = ResultRollup(results, group_key=lambda r: None, sequence_types=sequence_types)
+        department_ids = list(dict.fromkeys(r.department_id for r in results))
+
+        entries = []
+        sequence_values = {}
+        for department_id in department_ids:
+            sequence_values[str(department_id)] = [
+                str(value) for value in dept_rollup.sequence_values(department_id)
+            ]
+            entries.append(CalculationResultRollup(
+                task_id=task_id,
+                scope=SCOPE_DEPARTMENT,
+                department_id=department_id,
+                payload={"version": PAYLOAD_VERSION, "nodes": dept_rollup.to_snapshot(department_id)}
+            ))
+
+        entries.append(CalculationResultRollup(
+            task_id=task_id,
+            scope=SCOPE_SUMMARY,
+            department_id=0,
+            payload={"version": PAYLOAD_VERSION, "departments": sequence_values}
+        ))
+        entries.append(CalculationResultRollup(
+            task_id=task_id,
+            scope=SCOPE_HOSPITAL,
+            department_id=0,
+            payload={"version": PAYLOAD_VERSION, "nodes": hospital_rollup.to_snapshot(None)}
+        ))
+
+        db.add_all(entries)
+        db.flush()
+        return len(entries)
+
+    @staticmethod
+    def invalidate(db: Session, task_id: str) -> int:
+        """清除任务的汇总缓存（由调用方提交事务）"""
+        return db.query(CalculationResultRollup).filter(
+            CalculationResultRollup.task_id == task_id
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def _get_payload(db: Session, task_id: str, scope: str, department_id: int = 0) -> Optional[dict]:
+        entry = db.query(CalculationResultRollup.payload).filter(
+            CalculationResultRollup.task_id == task_id,
+            CalculationResultRollup.scope == scope,
+            CalculationResultRollup.department_id == department_id
+        ).first()
+        payload = entry[0] if entry else None
+        if not payload or payload.get("version") != PAYLOAD_VERSION:
+            return None
+        return payload
+
+    @staticmethod
+    def get_sequence_values(db: Session, task_id: str) -> Optional[Dict[int, Tuple[Decimal, Decimal, Decimal]]]:
+        """
+        读取各科室的序列价值
+
+        Returns:
+            {科室ID: (医生, 护理, 医技)}；没有缓存时返回 None
+        """
+        payload = ResultRollupCacheService._get_payload(db, task_id, SCOPE_SUMMARY)
+        if payload is None:
+            return None
+        return {
+            int(department_id): tuple(Decimal(value) for value in values)
+            for department_id, values in payload["departments"].items()
+        }
+
+    @staticmethod
+    def get_rollup(db: Session, task_id: str, department_id: Optional[int] = None) -> Optional[ResultRollup]:
+        """
+        读取科室（department_id 为空时为全院）的逐级汇总
+
+        科室汇总的分组为科室ID，全院汇总的分组为 None；没有缓存时返回 None
+        """
+        if department_id is None:
+            payload = ResultRollupCacheService._get_payload(db, task_id, SCOPE_HOSPITAL)
+        else:
+            payload = ResultRollupCacheService._get_payload(db, task_id, SCOPE_DEPARTMENT, department_id)
+        if payload is None:
+            return None
+        return ResultRollup.from_snapshot(payload["nodes"], group=department_id)
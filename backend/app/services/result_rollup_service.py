@@ -0,0 +1,241 @@
+"""
+计算结果逐级汇总引擎
+
+报表（汇总表、明细表、全院明细）中节点价值的统一规则：
+- 没有维度子节点的节点取自身的工作量和价值
+- 有维度子节点的节点等于所有维度子节点汇总值之和
+
+结果行按 (分组, 父节点ID) 一次建立子节点索引，自底向上一遍计算所有节点的
+汇总值，整体复杂度 O(n)。分组默认为科室ID；按核算单元或全院分组时，
+同组内同一节点的多行结果先累加自身的工作量和价值再参与汇总。
+
+序列按模型节点的 sequence_type（医生/护理/医技）归类，与 calculation_summaries 一致；
+计算结果行不含该字段，由 load_sequence_types 一次查询序列节点后传入。
+
+汇总结果可以导出为快照（JSON 可序列化），任务完成时存入汇总缓存表，
+报表接口直接从快照恢复，无需重新加载和汇总计算结果。
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.model_node import ModelNode
+from app.utils.sequence_type import SEQUENCE_TYPE_DOCTOR, SEQUENCE_TYPE_NURSE, SEQUENCE_TYPE_TECH
+
+
+# 快照中保留的结果行字段
+_SNAPSHOT_FIELDS = ("node_id", "parent_id", "node_type", "node_name", "node_code")
+_SNAPSHOT_DECIMAL_FIELDS = ("workload", "weight", "original_weight", "value", "ratio")
+
+
+def _department_key(result) -> Optional[int]:
+    return getattr(result, 'department_id', None)
+
+
+def _dump_decimal(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _load_decimal(value):
+    return None if value is None else Decimal(value)
+
+
+def load_sequence_types(db: Session, results: Iterable[Any]) -> Dict[int, Optional[str]]:
+    """
+    查询结果行中序列节点的序列类别
+
+    Returns:
+        {节点ID: sequence_type}
+    """
+    node_ids = {result.node_id for result in results if result.node_type == "sequence"}
+    if not node_ids:
+        return {}
+    return dict(
+        db.query(ModelNode.id, ModelNode.sequence_type).filter(ModelNode.id.in_(node_ids)).all()
+    )
+
+
+class SnapshotResult:
+    """从快照恢复的结果行（与 CalculationResult 的属性一致）"""
+
+    def __init__(self, data: dict, department_id: Optional[int] = None):
+        self.department_id = department_id
+        for field in _SNAPSHOT_FIELDS:
+            setattr(self, field, data.get(field))
+        for field in _SNAPSHOT_DECIMAL_FIELDS:
+            setattr(self, field, _load_decimal(data.get(field)))
+
+
+class ResultRollup:
+    """计算结果逐级汇总"""
+
+    def __init__(
+        self,
+        results,
+        group_key: Optional[Callable[[Any], Hashable]] = None,
+        sequence_types: Optional[Dict[int, Optional[str]]] = None
+    ):
+        """
+        Args:
+            results: 计算结果行（需要 node_id、parent_id、node_type、workload、value 属性）
+            group_key: 分组函数，默认按 department_id 分组
+            sequence_types: 序列节点的类别 {节点ID: sequence_type}（见 load_sequence_types）
+        """
+        key_func = group_key or _department_key
+        self._sequence_types: Dict[int, Optional[str]] = dict(sequence_types or {})
+
+        self._rows: Dict[tuple, Any] = {}           # (分组, 节点ID) -> 首次出现的结果行
+        self._own: Dict[tuple, tuple] = {}          # (分组, 节点ID) -> 自身 (工作量, 价值)
+        self._children: Dict[tuple, List[int]] = defaultdict(list)  # (分组, 父节点ID) -> 维度子节点ID
+        self._sequences: Dict[Hashable, List[Any]] = defaultdict(list)  # 分组 -> 序列结果行
+
+        for result in results:
+            group = key_func(result)
+            key = (group, result.node_id)
+            if key in self._rows:
+                workload, value = self._own[key]
+                self._own[key] = (workload + (result.workload or 0), value + (result.value or 0))
+                continue
+
+            self._rows[key] = result
+            self._own[key] = (result.workload or 0, result.value or 0)
+            if result.node_type == "dimension":
+                self._children[(group, result.parent_id)].append(result.node_id)
+            elif result.node_type == "sequence":
+                self._sequences[group].append(result)
+
+        self._totals: Dict[tuple, tuple] = {}
+        self._compute_totals()
+
+    def _compute_totals(self):
+        """自底向上计算所有节点的汇总值（迭代后序遍历，避免深层递归）"""
+        for root in self._rows:
+            if root in self._totals:
+                continue
+
+            visiting = set()
+            stack = [(root, False)]
+            while stack:
+                key, expanded = stack.pop()
+                if key in self._totals:
+                    continue
+
+                child_ids = self._children.get(key)
+                if not child_ids:
+                    self._totals[key] = self._own[key]
+                    continue
+
+                group = key[0]
+                if expanded:
+                    total_workload = 0
+                    total_value = 0
+                    for child_id in child_ids:
+                        # 数据成环时环上的节点不重复计入
+                        child_workload, child_value = self._totals.get((group, child_id), (0, 0))
+                        total_workload += child_workload
+                        total_value += child_value
+                    self._totals[key] = (total_workload, total_value)
+                    visiting.discard(key)
+                    continue
+
+                visiting.add(key)
+                stack.append((key, True))
+                for child_id in child_ids:
+                    child_key = (group, child_id)
+                    if child_key not in self._totals and child_key not in visiting:
+                        stack.append((child_key, False))
+
+    def row(self, group: Hashable, node_id: int):
+        """节点的结果行（同组多行时为首次出现的行）"""
+        return self._rows.get((group, node_id))
+
+    def own(self, group: Hashable, node_id: int) -> Tuple[Any, Any]:
+        """节点自身的 (工作量, 价值)，不含子节点"""
+        return self._own.get((group, node_id), (0, 0))
+
+    def totals(self, group: Hashable, node_id: int) -> Tuple[Any, Any]:
+        """节点逐级汇总后的 (工作量, 价值)"""
+        return self._totals.get((group, node_id), (0, 0))
+
+    def value(self, group: Hashable, node_id: int):
+        """节点逐级汇总后的价值"""
+        return self.totals(group, node_id)[1]
+
+    def children(self, group: Hashable, node_id: int) -> List[Any]:
+        """节点的维度子节点结果行（按输入顺序）"""
+        return [self._rows[(group, child_id)] for child_id in self._children.get((group, node_id), [])]
+
+    def has_children(self, group: Hashable, node_id: int) -> bool:
+        return bool(self._children.get((group, node_id)))
+
+    def sequences(self, group: Hashable) -> List[Any]:
+        """分组内的序列结果行"""
+        return list(self._sequences.get(group, []))
+
+    def sequence_type(self, node_id: int) -> Optional[str]:
+        """序列节点的类别（doctor/nurse/tech），未指定时为 None"""
+        return self._sequence_types.get(node_id)
+
+    @property
+    def sequence_types(self) -> Dict[int, Optional[str]]:
+        """序列节点的类别 {节点ID: sequence_type}，同一批结果按其他方式分组时复用"""
+        return dict(self._sequence_types)
+
+    def rows(self, group: Hashable) -> List[Any]:
+        """分组内的全部结果行（每个节点一行，按输入顺序）"""
+        return [row for (row_group, _), row in self._rows.items() if row_group == group]
+
+    def total_value(self, group: Hashable) -> Decimal:
+        """分组内所有序列的价值之和"""
+        total = Decimal('0')
+        for seq in self.sequences(group):
+            total += self.value(group, seq.node_id)
+        return total
+
+    def sequence_values(self, group: Hashable) -> Tuple[Decimal, Decimal, Decimal]:
+        """按序列类别归类的价值，返回 (医生, 护理, 医技)"""
+        values = {
+            SEQUENCE_TYPE_DOCTOR: Decimal('0'),
+            SEQUENCE_TYPE_NURSE: Decimal('0'),
+            SEQUENCE_TYPE_TECH: Decimal('0'),
+        }
+        for seq in self.sequences(group):
+            sequence_type = self.sequence_type(seq.node_id)
+            if sequence_type in values:
+                values[sequence_type] += self.value(group, seq.node_id)
+
+        return values[SEQUENCE_TYPE_DOCTOR], values[SEQUENCE_TYPE_NURSE], values[SEQUENCE_TYPE_TECH]
+
+    def to_snapshot(self, group: Hashable) -> List[dict]:
+        """导出分组的快照：每个节点的结果行字段、自身值和汇总值"""
+        nodes = []
+        for row in self.rows(group):
+            key = (group, row.node_id)
+            data = {field: getattr(row, field, None) for field in _SNAPSHOT_FIELDS}
+            for field in _SNAPSHOT_DECIMAL_FIELDS:
+                data[field] = _dump_decimal(getattr(row, field, None))
+            data["own"] = [_dump_decimal(v) for v in self._own[key]]
+            data["total"] = [_dump_decimal(v) for v in self._totals[key]]
+            if row.node_type == "sequence":
+                data["sequence_type"] = self.sequence_type(row.node_id)
+            nodes.append(data)
+        return nodes
+
+    @classmethod
+    def from_snapshot(cls, nodes: List[dict], group: Hashable = None) -> "ResultRollup":
+        """从快照恢复（不重新计算汇总值）"""
+        rollup = cls([])
+        for data in nodes:
+            row = SnapshotResult(data, department_id=group)
+            key = (group, row.node_id)
+            rollup._rows[key] = row
+            rollup._own[key] = tuple(Decimal(v) for v in data["own"])
+            rollup._totals[key] = tuple(Decimal(v) for v in data["total"])
+            if row.node_type == "dimension":
+                rollup._children[(group, row.parent_id)].append(row.node_id)
+            elif row.node_type == "sequence":
+                rollup._sequences[group].append(row)
+                rollup._sequence_types[row.node_id] = data.get("sequence_type")
+        return rollup
@@ -0,0 +1,203 @@
+"""
+分阶段批量导入服务
+
+智能导入（维度目录、成本报表、参考价值）的执行步骤共用：
+1. 按目标表的列定义在内存中逐行校验（非空、字符串长度、数值范围），错误按行返回，不访问数据库
+2. 校验通过的行用 COPY 写入事务级临时表（驱动不支持 COPY 时改用多行 INSERT）
+3. 与目标表按业务键做集合比较：update 模式一条 UPDATE 更新已有记录，
+   replace 模式一条 DELETE 删除已有记录，再用一条 INSERT ... SELECT 写入其余记录
+
+数据库往返次数与导入行数无关；同一业务键在文件中出现多次时以最后一行为准。
+"""
+import io
+import uuid
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, Numeric, String, Table, and_, delete, exists, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+
+class StagedImportService:
+    """分阶段批量导入服务"""
+
+    @staticmethod
+    def _column_label(column) -> str:
+        return column.comment or column.name
+
+    @classmethod
+    def _validate_value(cls, column, value, required: bool) -> Tuple[Any, Optional[str]]:
+        """
+        按列定义校验并转换单个值
+
+        Returns:
+            (转换后的值, 错误信息)
+        """
+        label = cls._column_label(column)
+        if value is None or (isinstance(value, str) and not value.strip() and required):
+            if required:
+                return None, f"{label}不能为空"
+            return None, None
+
+        if isinstance(column.type, String):
+            value = str(value)
+            length = column.type.length
+            if length and len(value) > length:
+                return None, f"{label}长度超过{length}个字符"
+        elif isinstance(column.type, Numeric):
+            try:
+                value = value if isinstance(value, Decimal) else Decimal(str(value).strip())
+            except (InvalidOperation, ValueError):
+                return None, f"{label}不是有效数值"
+            if not value.is_finite():
+                return None, f"{label}不是有效数值"
+            precision, scale = column.type.precision, column.type.scale or 0
+            if precision and abs(value) >= Decimal(10) ** (precision - scale):
+                return None, f"{label}超出数值范围"
+        return value, None
+
+    @staticmethod
+    def _copy_text(value) -> str:
+        """COPY 文本格式的字段值"""
+        if value is None:
+            return "\\N"
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        return (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+
+    @classmethod
+    def _load_stage(cls, db: Session, stage: Table, rows: List[Dict[str, Any]]) -> None:
+        """将暂存行写入临时表"""
+        connection = db.connection()
+        stage.create(connection)
+        if not rows:
+            return
+
+        names = [column.name for column in stage.columns]
+        cursor = connection.connection.cursor()
+        try:
+            if hasattr(cursor, "copy_expert"):
+                buffer = io.StringIO()
+                for row in rows:
+                    buffer.write("\t".join(cls._copy_text(row.get(name)) for name in names))
+                    buffer.write("\n")
+                buffer.seek(0)
+                quoted = ", ".join(f'"{name}"' for name in names)
+                cursor.copy_expert(f'COPY "{stage.name}" ({quoted}) FROM STDIN', buffer)
+                return
+        finally:
+            cursor.close()
+
+        connection.execute(insert(stage), [{name: row.get(name) for name in names} for row in rows])
+
+    @classmethod
+    def execute(
+        cls,
+        db: Session,
+        model,
+        hospital_id: int,
+        rows: Sequence[Optional[Dict[str, Any]]],
+        key_columns: Sequence[str],
+        value_columns: Sequence[str] = (),
+        mode: str = "update",
+        defaults: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        批量导入
+
+        Args:
+            db: 数据库会话（不提交，由调用方提交）
+            model: 目标表模型（需有 hospital_id 列）
+            hospital_id: 医疗机构ID
+            rows: 导入行，为 None 的位置视为调用方已跳过
+            key_columns: 业务键列（不含 hospital_id）
+            value_columns: 其他写入列
+            mode: update - 已有记录更新 value_columns；replace - 已有记录删除后重新插入
+            defaults: 值为空时的处理：新增使用默认值，更新保留原值
+
+        Returns:
+            {
+                "inserted": 新增行数,
+                "updated": 更新（覆盖）行数，包括文件内重复的行,
+                "errors": [(行序号, 错误信息), ...]
+            }
+        """
+        if mode not in ("update", "replace"):
+            raise ValueError(f"不支持的导入模式: {mode}")
+
+        defaults = defaults or {}
+        table = model.__table__
+        names = list(key_columns) + [name for name in value_columns if name not in key_columns]
+
+        # 第一步：逐行校验，同一业务键保留最后一行
+        errors = []
+        staged: Dict[tuple, Dict[str, Any]] = {}
+        valid_count = 0
+        for index, row in enumerate(rows):
+            if row is None:
+                continue
+            values = {"row_no": index}
+            error = None
+            for name in names:
+                required = not table.c[name].nullable and name not in defaults
+                value, error = cls._validate_value(table.c[name], row.get(name), required)
+                if error:
+                    break
+                values[name] = value
+            if error:
+                errors.append((index, error))
+                continue
+            valid_count += 1
+            staged[tuple(values[name] for name in key_columns)] = values
+
+        if not staged:
+            return {"inserted": 0, "updated": 0, "errors": errors}
+
+        # 第二步：写入临时表（事务结束时自动删除）
+        stage = Table(
+            f"import_stage_{uuid.uuid4().hex[:12]}",
+            MetaData(),
+            Column("row_no", Integer),
+            *[Column(name, table.c[name].type) for name in names],
+            prefixes=["TEMPORARY"],
+            postgresql_on_commit="DROP",
+        )
+        cls._load_stage(db, stage, list(staged.values()))
+
+        # 第三步：与目标表做集合比较，一次更新/删除，一次插入
+        key_match = and_(
+            table.c.hospital_id == hospital_id,
+            *[table.c[name] == stage.c[name] for name in key_columns]
+        )
+        if mode == "update":
+            set_values = {
+                name: func.coalesce(stage.c[name], table.c[name]) if name in defaults else stage.c[name]
+                for name in names if name not in key_columns
+            }
+            if set_values:
+                db.execute(update(table).where(key_match).values(set_values))
+        else:
+            db.execute(delete(table).where(key_match))
+
+        source = select(
+            literal(hospital_id, type_=table.c.hospital_id.type),
+            *[
+                func.coalesce(stage.c[name], literal(defaults[name], type_=table.c[name].type))
+                if name in defaults else stage.c[name]
+                for name in names
+            ]
+        )
+        if mode == "update":
+            source = source.where(~exists().where(key_match))
+        inserted = db.execute(
+            insert(table).from_select(["hospital_id"] + names, source)
+        ).rowcount
+
+        return {"inserted": inserted, "updated": valid_count - inserted, "errors": errors}
@@ -0,0 +1,121 @@
+"""
+计算步骤语句级性能剖析服务
+
+执行步骤时记录每条语句的耗时和影响行数，写入步骤日志的 statement_profile；
+语句耗时超过 STEP_PROFILE_EXPLAIN_MS 时，在保存点中用 EXPLAIN (ANALYZE, BUFFERS)
+重新执行该语句并回滚，记录执行计划（仅 PostgreSQL 数据源，诊断时开启，耗时约增加一倍）。
+任务日志接口按 任务 → 步骤 → 语句 汇总为火焰图结构（name/value/children）。
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from app.config import settings
+from app.utils.sql_template import CompiledStatement
+
+
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS) "
+
+
+class StepProfileService:
+    """步骤语句级性能剖析服务"""
+
+    @staticmethod
+    def new_entry(index: int, statement: CompiledStatement, duration_ms: float, rowcount: Optional[int]) -> dict:
+        """生成一条语句的剖析记录"""
+        return {
+            "index": index,
+            "sql": statement.label(),
+            "duration_ms": round(duration_ms, 1),
+            "rows": rowcount if rowcount is not None and rowcount >= 0 else None,
+        }
+
+    @staticmethod
+    def should_explain(connection, duration_ms: float) -> bool:
+        threshold = settings.STEP_PROFILE_EXPLAIN_MS
+        return threshold > 0 and duration_ms >= threshold and connection.dialect.name == "postgresql"
+
+    @staticmethod
+    def explain(connection, statement: CompiledStatement, params: dict) -> dict:
+        """
+        在保存点中执行 EXPLAIN (ANALYZE, BUFFERS) 后回滚，不影响步骤结果
+
+        语句已执行过一次，计划反映的是执行后的数据状态（如 DELETE 重新执行时删除行数为 0）。
+        不支持 EXPLAIN 的语句（DDL、TRUNCATE 等）只记录原因。
+
+        Returns:
+            {"explain": 执行计划文本} 或 {"explain_error": 原因}
+        """
+        savepoint = connection.begin_nested()
+        try:
+            rows = connection.execute(statement.to_clause(params, prefix=EXPLAIN_PREFIX)).fetchall()
+            return {"explain": "\n".join(row[0] for row in rows)}
+        except Exception as e:
+            return {"explain_error": str(e).split("\n")[0]}
+        finally:
+            savepoint.rollback()
+
+    @staticmethod
+    def build_breakdown(task_id: str, logs: Iterable, step_names: Dict[int, str]) -> dict:
+        """
+        按 任务 → 步骤 → 语句 汇总耗时（火焰图结构）
+
+        同一步骤在各科室的执行合并，语句按摘要合并；各层按耗时降序。
+
+        Args:
+            logs: 步骤日志
+            step_names: {步骤ID: 步骤名称}
+        """
+        steps: "OrderedDict[int, dict]" = OrderedDict()
+        for log in logs:
+            if log.status == "reused":
+                continue
+            node = steps.get(log.step_id)
+            if node is None:
+                node = steps[log.step_id] = {
+                    "name": step_names.get(log.step_id, f"步骤 {log.step_id}"),
+                    "step_id": log.step_id,
+                    "value": 0,
+                    "executions": 0,
+                    "failed": 0,
+                    "children": OrderedDict(),
+                }
+            node["value"] += log.duration_ms or 0
+            node["executions"] += 1
+            if log.status == "failed":
+                node["failed"] += 1
+
+            for entry in log.statement_profile or []:
+                key = (entry.get("index"), entry.get("sql"))
+                child = node["children"].get(key)
+                if child is None:
+                    child = node["children"][key] = {
+                        "name": f"#{entry.get('index')} {entry.get('sql')}",
+                        "value": 0,
+                        "rows": 0,
+                        "executions": 0,
+                        "max_ms": 0,
+                    }
+                duration = entry.get("duration_ms", 0) + entry.get("fetch_ms", 0)
+                child["value"] += duration
+                child["rows"] += entry.get("rows") or 0
+                child["executions"] += 1
+                child["max_ms"] = max(child["max_ms"], duration)
+                if entry.get("explain") and duration >= child.get("explain_ms", 0):
+                    # 保留最慢一次的执行计划
+                    child["explain"] = entry["explain"]
+                    child["explain_ms"] = duration
+
+        children: List[dict] = []
+        for node in steps.values():
+            statements = sorted(node["children"].values(), key=lambda c: c["value"], reverse=True)
+            for statement in statements:
+                statement["value"] = round(statement["value"], 1)
+            node["children"] = statements
+            children.append(node)
+        children.sort(key=lambda c: c["value"], reverse=True)
+
+        return {
+            "name": task_id,
+            "value": sum(child["value"] for child in children),
+            "children": children,
+        }
@@ -4,14 +4,18 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from decimal import Decimal
 import json
+import os
+import time
 
+from celery import chord, group
 from celery.exceptions import SoftTimeLimitExceeded
 from app.celery_app import celery_app
+from app.config import settings
 from app.database import SessionLocal
-from app.models.calculation_task import CalculationTask, CalculationResult, CalculationSummary
+from app.models.calculation_task import CalculationTask
 from app.models.calculation_workflow import CalculationWorkflow
 from app.models.calculation_step import CalculationStep
 from app.models.calculation_step_log import CalculationStepLog
@@ -19,6 +23,16 @@ from app.models.department import Department
 from app.models.model_node import ModelNode
 from app.models.model_version import ModelVersion
 from app.models.data_source import DataSource
+from app.services.batch_report_service import BatchReportService
+from app.services.charge_detail_store_service import ChargeDetailStoreService
+from app.services.his_extract_service import HisExtractService
+from app.services.incremental_calculation_service import IncrementalCalculationService
+from app.services.result_rollup_cache_service import ResultRollupCacheService
+from app.services.drilldown_cube_service import DrilldownCubeService
+from app.services.step_profile_service import StepProfileService
+from app.utils.sql_template import CompiledSqlTemplate, get_compiled_template, referenced_placeholders
+from app.utils.step_result_capture import StepResultCapture
+from app.utils.step_dag import build_step_dependencies, run_step_dag
 
 
 @celery_app.task(bind=True, max_retries=0, time_limit=3600, soft_time_limit=3500)
@@ -28,7 +42,9 @@ def execute_calculation_task(
     model_version_id: int,
     workflow_id: Optional[int],
     department_ids: Optional[List[int]],
-    period: str
+    period: str,
+    chunk_size: Optional[int] = None,
+    recalculate_mode: Optional[str] = None
 ):
     """执行计算任务
     
@@ -38,6 +54,8 @@ def execute_calculation_task(
         workflow_id: 计算流程ID
         department_ids: 科室ID列表
         period: 计算周期
+        chunk_size: 并行模式下每个子任务处理的科室数，为空则在当前worker中串行执行
+        recalculate_mode: 重新计算已有任务时的模式（incremental/full），为空表示首次计算
         
     Task配置:
         max_retries: 0 - 不自动重试
@@ -54,9 +72,11 @@ def execute_calculation_task(
             print(f"任务不存在: {task_id}")
             return {"success": False, "error": "任务不存在"}
         
-        # 更新为运行中
+        # 更新为运行中（重新执行时旧的汇总缓存失效）
         task.status = "running"
         task.started_at = datetime.utcnow()
+        ResultRollupCacheService.invalidate(db, task_id)
+        DrilldownCubeService.invalidate(db, task_id)
         db.commit()
         print(f"[INFO] 任务 {task_id} 开始执行")
         print(f"[INFO] 参数: model_version_id={model_version_id}, workflow_id={workflow_id}, period={period}")
@@ -117,6 +137,31 @@ def execute_calculation_task(
             print(f"[INFO] 找到 {len(steps)} 个启用的步骤")
             print(f"[INFO] 需要处理 {total_departments} 个科室/批次")
             
+            # 步骤读取的HIS镜像表先抽取增量（只传输上次抽取后新增或变化的数据）
+            extracted = HisExtractService.run_for_targets(
+                db, [step.data_source_id for step in steps if step.code_type == "sql" and step.data_source_id]
+            )
+            if extracted:
+                print(f"[INFO] HIS增量抽取: {extracted}")
+            
+            # 源表版本戳在抽取完成后查询一次，所有科室和并行子任务共用
+            source_stamps = _collect_source_stamps(
+                db, steps, departments, period, task_id, model_version_id, hospital_id
+            )
+            
+            # 并行模式：按科室分块分发为独立子任务，汇总和完成状态由 chord 回调处理
+            if chunk_size and departments[0] is not None:
+                return _dispatch_department_chunks(
+                    task_id=task_id,
+                    model_version_id=model_version_id,
+                    workflow_id=workflow_id,
+                    department_ids=[d.id for d in departments],
+                    period=period,
+                    chunk_size=chunk_size,
+                    recalculate_mode=recalculate_mode,
+                    source_stamps=source_stamps
+                )
+            
             # 执行计算流程
             has_failed_step = False
             failed_error = None
@@ -127,17 +172,17 @@ def execute_calculation_task(
                 
                 try:
                     # 执行所有步骤
-                    for step in steps:
-                        print(f"[INFO] 执行步骤 {step.id}: {step.name}")
-                        execute_calculation_step(
-                            db=db,
-                            task_id=task_id,
-                            step=step,
-                            department=department,  # 可能为 None
-                            period=period,
-                            model_version_id=model_version_id,
-                            hospital_id=hospital_id
-                        )
+                    _run_workflow_steps(
+                        db=db,
+                        task_id=task_id,
+                        steps=steps,
+                        department=department,  # 可能为 None
+                        period=period,
+                        model_version_id=model_version_id,
+                        hospital_id=hospital_id,
+                        recalculate_mode=recalculate_mode,
+                        source_stamps=source_stamps
+                    )
                     
                     # 更新进度
                     progress = (idx + 1) / total_departments * 100
@@ -197,6 +242,9 @@ def execute_calculation_task(
         db.commit()
         print(f"任务 {task_id} 状态已更新为完成")
         
+        _build_result_rollups(db, task_id)
+        _build_drilldown_cube(db, task_id)
+        
         return {"success": True, "message": "计算完成"}
     
     except SoftTimeLimitExceeded:
@@ -250,14 +298,831 @@ def execute_calculation_task(
             pass
 
 
-def execute_calculation_step(
+def _dispatch_department_chunks(
+    task_id: str,
+    model_version_id: int,
+    workflow_id: int,
+    department_ids: List[int],
+    period: str,
+    chunk_size: int,
+    recalculate_mode: Optional[str] = None,
+    source_stamps: Optional[Dict[int, Optional[Dict[str, Optional[str]]]]] = None
+) -> dict:
+    """将科室按块分发为并行子任务
+    
+    每个科室块作为独立的Celery子任务执行，所有子任务完成后由
+    finalize_calculation_task 回调计算汇总并更新任务状态。
+    源表版本戳随子任务参数传递，子任务不再重复查询。
+    """
+    chunks = [
+        department_ids[i:i + chunk_size]
+        for i in range(0, len(department_ids), chunk_size)
+    ]
+    total_departments = len(department_ids)
+    
+    header = group(
+        execute_department_chunk.s(
+            task_id=task_id,
+            model_version_id=model_version_id,
+            workflow_id=workflow_id,
+            department_ids=chunk,
+            period=period,
+            total_departments=total_departments,
+            recalculate_mode=recalculate_mode,
+            source_stamps=source_stamps
+        )
+        for chunk in chunks
+    )
+    callback = finalize_calculation_task.s(
+        task_id=task_id,
+        department_ids=department_ids
+    ).on_error(fail_calculation_task.s(task_id=task_id))
+    
+    chord(header)(callback)
+    print(f"[INFO] 任务 {task_id} 已分发 {len(chunks)} 个并行子任务，共 {total_departments} 个科室")
+    
+    return {"success": True, "message": "已分发并行子任务", "chunks": len(chunks)}
+
+
+def _increment_task_progress(db: Session, task_id: str, delta: float):
+    """原子累加任务进度
+    
+    多个子任务并发更新同一任务，使用单条UPDATE避免读-改-写竞争。
+    进度上限为99.99，100%由汇总回调在任务完成时设置。
+    """
+    db.execute(
+        text("""
+            UPDATE calculation_tasks
+            SET progress = LEAST(COALESCE(progress, 0) + :delta, 99.99)
+            WHERE task_id = :task_id
+        """),
+        {"delta": Decimal(str(round(delta, 2))), "task_id": task_id}
+    )
+    db.commit()
+
+
+@celery_app.task(bind=True, max_retries=0, time_limit=3600, soft_time_limit=3500)
+def execute_department_chunk(
+    self,
+    task_id: str,
+    model_version_id: int,
+    workflow_id: int,
+    department_ids: List[int],
+    period: str,
+    total_departments: int,
+    recalculate_mode: Optional[str] = None,
+    source_stamps: Optional[dict] = None
+):
+    """并行模式子任务：对一组科室执行计算流程的所有步骤
+    
+    单个科室失败不影响同块内其他科室，失败信息随返回值交给回调汇总。
+    子任务自身不抛出异常，保证 chord 回调总能执行。
+    source_stamps 为主任务查询的源表版本戳（经JSON传递后数据源ID为字符串）。
+    
+    Returns:
+        {"completed": [科室ID], "failed": [{"department_id", "department_name", "error"}]}
+    """
+    db = SessionLocal()
+    completed = []
+    failed = []
+    pending_ids = list(department_ids)
+    if source_stamps is not None:
+        source_stamps = {int(data_source_id): stamps for data_source_id, stamps in source_stamps.items()}
+    
+    try:
+        model_version = db.query(ModelVersion).filter(ModelVersion.id == model_version_id).first()
+        hospital_id = model_version.hospital_id if model_version else None
+        
+        steps = db.query(CalculationStep).filter(
+            CalculationStep.workflow_id == workflow_id,
+            CalculationStep.is_enabled == True
+        ).order_by(CalculationStep.sort_order).all()
+        
+        departments = db.query(Department).filter(
+            Department.id.in_(department_ids)
+        ).all()
+        dept_map = {d.id: d for d in departments}
+        
+        for dept_id in department_ids:
+            department = dept_map.get(dept_id)
+            pending_ids.remove(dept_id)
+            if not department:
+                failed.append({"department_id": dept_id, "department_name": None, "error": "科室不存在"})
+                continue
+            
+            try:
+                _run_workflow_steps(
+                    db=db,
+                    task_id=task_id,
+                    steps=steps,
+                    department=department,
+                    period=period,
+                    model_version_id=model_version_id,
+                    hospital_id=hospital_id,
+                    recalculate_mode=recalculate_mode,
+                    source_stamps=source_stamps
+                )
+                completed.append(dept_id)
+            except Exception as e:
+                db.rollback()
+                print(f"[ERROR] 科室 {department.his_name} 计算失败: {str(e)}")
+                failed.append({
+                    "department_id": dept_id,
+                    "department_name": department.his_name,
+                    "error": str(e)
+                })
+            
+            _increment_task_progress(db, task_id, 100 / total_departments)
+    
+    except SoftTimeLimitExceeded:
+        # 未执行的科室全部记为失败
+        db.rollback()
+        for dept_id in pending_ids:
+            failed.append({"department_id": dept_id, "department_name": None, "error": "子任务执行超时"})
+    except Exception as e:
+        db.rollback()
+        import traceback
+        traceback.print_exc()
+        for dept_id in pending_ids:
+            failed.append({"department_id": dept_id, "department_name": None, "error": str(e)})
+    finally:
+        try:
+            db.close()
+        except Exception:
+            pass
+    
+    return {"completed": completed, "failed": failed}
+
+
+@celery_app.task(bind=True, max_retries=0, time_limit=3600, soft_time_limit=3500)
+def finalize_calculation_task(self, chunk_results: list, task_id: str, department_ids: List[int]):
+    """并行模式 chord 回调：汇总子任务结果，计算汇总数据并更新任务状态"""
+    db = SessionLocal()
+    
+    try:
+        task = db.query(CalculationTask).filter(CalculationTask.task_id == task_id).first()
+        if not task:
+            return {"success": False, "error": "任务不存在"}
+        
+        failures = [f for result in chunk_results for f in result.get("failed", [])]
+        
+        if failures:
+            details = "；".join(
+                f"科室 {f['department_name'] or f['department_id']}: {f['error']}"
+                for f in failures[:10]
+            )
+            if len(failures) > 10:
+                details += f"；等共 {len(failures)} 个科室"
+            task.status = "failed"
+            task.error_message = f"{len(failures)} 个科室计算失败: {details}"
+            task.completed_at = datetime.utcnow()
+            db.commit()
+            print(f"[ERROR] 任务 {task_id} 有 {len(failures)} 个科室计算失败")
+            return {"success": False, "error": task.error_message, "failed": failures}
+        
+        if task.status == "cancelled":
+            return {"success": False, "error": "任务已取消"}
+        
+        departments = db.query(Department).filter(Department.id.in_(department_ids)).all()
+        print(f"任务 {task_id} 开始计算汇总数据")
+        calculate_summaries(db, task_id, departments)
+        
+        task.status = "completed"
+        task.progress = Decimal("100.00")
+        task.completed_at = datetime.utcnow()
+        db.commit()
+        print(f"任务 {task_id} 状态已更新为完成")
+        
+        _build_result_rollups(db, task_id)
+        _build_drilldown_cube(db, task_id)
+        
+        return {"success": True, "message": "计算完成"}
+    
+    except Exception as e:
+        error_msg = str(e)
+        print(f"[ERROR] 任务 {task_id} 汇总失败: {error_msg}")
+        import traceback
+        traceback.print_exc()
+        db.rollback()
+        _mark_task_failed(db, task_id, f"汇总计算失败: {error_msg}")
+        return {"success": False, "error": error_msg}
+    
+    finally:
+        try:
+            db.close()
+        except Exception:
+            pass
+
+
+@celery_app.task
+def fail_calculation_task(request, exc, traceback, task_id: str):
+    """并行模式 chord 错误回调：子任务被强制终止等情况下将任务标记为失败"""
+    db = SessionLocal()
+    try:
+        _mark_task_failed(db, task_id, f"并行子任务异常: {exc}")
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True, max_retries=0, time_limit=3600, soft_time_limit=3500)
+def export_batch_reports_task(self, export_id: str, batch_id: str, hospital_id: int, task_ids: List[str]):
+    """后台生成批次报表压缩包，写入导出目录后通过下载接口获取
+
+    生成前先清理超过保留期限的导出文件，结果记录到导出记录供下载接口查询。
+    """
+    db = SessionLocal()
+    try:
+        try:
+            removed = BatchReportService.cleanup_expired_exports(db)
+            if removed:
+                print(f"[INFO] 已清理 {removed} 个过期的导出目录")
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] 清理过期导出文件失败: {str(e)}")
+        
+        try:
+            tasks = db.query(CalculationTask).filter(
+                CalculationTask.task_id.in_(task_ids)
+            ).order_by(CalculationTask.period).all()
+            if not tasks:
+                raise ValueError("批次不存在或没有已完成的任务")
+            
+            file_path = BatchReportService.write_batch_archive(db, tasks, hospital_id, export_id, batch_id)
+        except Exception as e:
+            db.rollback()
+            BatchReportService.finish_export(db, export_id, error=str(e))
+            raise
+        
+        BatchReportService.finish_export(db, export_id, file_path=file_path)
+        print(f"[INFO] 批次 {batch_id} 报表已生成: {file_path}")
+        return {"success": True, "file_path": file_path}
+    finally:
+        db.close()
+
+
+def _mark_task_failed(db: Session, task_id: str, error_msg: str):
+    """将任务标记为失败（不覆盖已有的失败状态）"""
+    try:
+        task = db.query(CalculationTask).filter(CalculationTask.task_id == task_id).first()
+        if task and task.status != "failed":
+            task.status = "failed"
+            task.error_message = error_msg
+            task.completed_at = datetime.utcnow()
+            db.commit()
+    except Exception as update_error:
+        db.rollback()
+        print(f"[ERROR] 更新任务失败状态时出错: {str(update_error)}")
+
+
+def _run_workflow_steps(
+    db: Session,
+    task_id: str,
+    steps: List[CalculationStep],
+    department: Optional[Department],
+    period: str,
+    model_version_id: int,
+    hospital_id: int,
+    recalculate_mode: Optional[str] = None,
+    source_stamps: Optional[Dict[int, Optional[Dict[str, Optional[str]]]]] = None
+):
+    """执行流程的所有步骤
+    
+    没有步骤声明 depends_on 时按 sort_order 串行执行；否则按依赖图
+    并发执行相互独立的步骤，每个步骤使用独立的会话和数据源连接。
+    
+    执行前计算每个步骤的输入指纹并记录到步骤日志。重新计算时：
+    - recalculate_mode="incremental"：指纹与上次执行一致的步骤直接复用已有结果，
+      只重新执行失效的步骤及其下游步骤
+    - recalculate_mode="full"：重新执行全部步骤
+    重新执行前先清除这些步骤输出表中本任务（科室）的数据，避免结果重复。
+    
+    加载收费明细月份分区的步骤，若该月份已由其他任务以相同输入加载，
+    直接使用已加载的分区，不再重新加载（recalculate_mode="full" 时除外）。
+    
+    Args:
+        source_stamps: 本次任务已查询的源表版本戳（见 _collect_source_stamps），为空时按科室查询
+    """
+    dependencies = build_step_dependencies(steps)
+    fingerprints, reuse_fingerprints, step_writes, shared_outputs, period_loads = _compute_step_fingerprints(
+        db, steps, department, period, task_id, model_version_id, hospital_id,
+        include_outputs=recalculate_mode == "incremental",
+        source_stamps=source_stamps
+    )
+    rerun_ids = {step.id for step in steps}
+    
+    if recalculate_mode:
+        previous_fingerprints = (
+            _get_previous_fingerprints(db, task_id, department)
+            if recalculate_mode == "incremental" else {}
+        )
+        rerun_ids = IncrementalCalculationService.plan_rerun(
+            [step.id for step in steps],
+            dependencies,
+            reuse_fingerprints,
+            previous_fingerprints,
+            step_writes
+        )
+        _clear_step_outputs(db, task_id, [s for s in steps if s.id in rerun_ids], step_writes, department)
+        _log_reused_steps(db, task_id, [s for s in steps if s.id not in rerun_ids], department, reuse_fingerprints)
+        print(f"[INFO] 增量重算: 复用 {len(steps) - len(rerun_ids)} 个步骤，重新执行 {len(rerun_ids)} 个步骤")
+    
+    if recalculate_mode != "full":
+        loaded_ids = _find_loaded_period_steps(db, [s for s in steps if s.id in rerun_ids], period_loads)
+        if loaded_ids:
+            rerun_ids -= loaded_ids
+            _log_reused_steps(
+                db, task_id, [s for s in steps if s.id in loaded_ids], department,
+                {step_id: period_loads[step_id][1] for step_id in loaded_ids},
+                message="该月份收费明细已加载且输入未变化，跳过重新加载"
+            )
+            print(f"[INFO] 月份 {period} 的收费明细已加载，跳过 {len(loaded_ids)} 个加载步骤")
+    
+    steps_to_run = [step for step in steps if step.id in rerun_ids]
+    
+    if not any(step.depends_on is not None for step in steps):
+        for step in steps_to_run:
+            print(f"[INFO] 执行步骤 {step.id}: {step.name}")
+            execute_calculation_step(
+                db=db,
+                task_id=task_id,
+                step=step,
+                department=department,
+                period=period,
+                model_version_id=model_version_id,
+                hospital_id=hospital_id,
+                fingerprint=fingerprints.get(step.id),
+                shared_outputs=shared_outputs.get(step.id),
+                period_load=period_loads.get(step.id)
+            )
+        return
+    
+    department_id = department.id if department else None
+    
+    def run_step(step_id: int):
+        # Session 不能跨线程共享，每个步骤在自己的会话中重新加载步骤和科室
+        step_db = SessionLocal()
+        try:
+            step = step_db.get(CalculationStep, step_id)
+            step_department = step_db.get(Department, department_id) if department_id else None
+            print(f"[INFO] 执行步骤 {step.id}: {step.name}（依赖: {sorted(dependencies[step_id]) or '无'}）")
+            execute_calculation_step(
+                db=step_db,
+                task_id=task_id,
+                step=step,
+                department=step_department,
+                period=period,
+                model_version_id=model_version_id,
+                hospital_id=hospital_id,
+                fingerprint=fingerprints.get(step_id),
+                shared_outputs=shared_outputs.get(step_id),
+                period_load=period_loads.get(step_id)
+            )
+        finally:
+            step_db.close()
+    
+    # 复用的步骤视为已完成，不再作为依赖
+    run_step_dag(
+        [step.id for step in steps_to_run],
+        {step_id: dependencies[step_id] & rerun_ids for step_id in rerun_ids},
+        run_step,
+        max_workers=settings.CALCULATION_STEP_MAX_WORKERS
+    )
+
+
+def _compute_step_fingerprints(
+    db: Session,
+    steps: List[CalculationStep],
+    department: Optional[Department],
+    period: str,
+    task_id: str,
+    model_version_id: int,
+    hospital_id: int,
+    include_outputs: bool = False,
+    source_stamps: Optional[Dict[int, Optional[Dict[str, Optional[str]]]]] = None
+) -> Tuple[
+    Dict[int, Optional[str]],
+    Dict[int, Optional[str]],
+    Dict[int, Set[str]],
+    Dict[int, Set[str]],
+    Dict[int, Tuple[str, str]]
+]:
+    """计算各步骤的输入指纹
+    
+    流程内步骤写入的表（中间表、结果表）由上游步骤的指纹和依赖关系覆盖，
+    不纳入版本戳；其余输入表按数据源批量查询版本戳。
+    写入非任务隔离表（如收费明细暂存表）的步骤，其输出可能已被其他任务覆盖，
+    执行后将输出表版本并入日志中的指纹，比对时也需并入当前输出表版本。
+    指纹计算失败不影响执行，此时指纹为空，重新计算时该步骤总是重新执行。
+    
+    加载收费明细月份分区的步骤另计算月份加载指纹，只包含月份、医疗机构和代码引用的
+    占位符（不含任务ID），不同任务、科室和模型版本加载同一月份时指纹相同，
+    用于判断该月份是否已经加载。
+    
+    Args:
+        include_outputs: 是否查询共享输出表的当前版本（仅增量重算比对时需要）
+        source_stamps: 本次任务已查询的源表版本戳，为空时在此查询
+    
+    Returns:
+        ({步骤ID: 输入指纹}, {步骤ID: 用于比对的指纹}, {步骤ID: 写入的表}, {步骤ID: 写入的共享表},
+         {步骤ID: (加载的月份, 月份加载指纹)})
+    """
+    from app.services.data_source_service import connection_manager
+    
+    rendered, step_reads, step_writes, workflow_outputs = _extract_step_tables(
+        steps, department, period, task_id, model_version_id, hospital_id
+    )
+    
+    # 源表版本戳（非 PostgreSQL 数据源为 None）优先使用任务级查询结果
+    source_reads, source_writes = _group_tables_by_source(steps, step_reads, step_writes, workflow_outputs)
+    if source_stamps is None:
+        source_stamps = _query_source_stamps(db, source_reads)
+    stamps_by_source = dict(source_stamps)
+    
+    # 按数据源查询共享输出表
+    shared_by_source = {}
+    output_stamps_by_source = {}
+    for data_source_id, written in source_writes.items():
+        if stamps_by_source.get(data_source_id) is None:
+            continue
+        try:
+            data_source = db.query(DataSource).filter(DataSource.id == data_source_id).first()
+            pool = connection_manager.get_pool(data_source.id) or connection_manager.create_pool(data_source)
+            with pool.connect() as connection:
+                shared = written - set(IncrementalCalculationService.get_task_scoped_tables(connection, written))
+                shared_by_source[data_source_id] = shared
+                if include_outputs and shared:
+                    output_stamps_by_source[data_source_id] = IncrementalCalculationService.get_table_stamps(
+                        connection, shared, exact=True
+                    )
+        except Exception as e:
+            stamps_by_source[data_source_id] = None
+            print(f"[WARNING] 查询数据源 {data_source_id} 的输出表失败: {str(e)}")
+    
+    params = {
+        "period": period,
+        "task_id": task_id,
+        "version_id": model_version_id,
+        "hospital_id": hospital_id,
+        "department_id": department.id if department else None,
+    }
+    fingerprints = {}
+    reuse_fingerprints = {}
+    shared_outputs = {}
+    period_loads = {}
+    for step in steps:
+        fingerprints[step.id] = IncrementalCalculationService.compute_fingerprint(
+            step.code_type,
+            step.data_source_id,
+            rendered[step.id],
+            params,
+            step_reads[step.id] - workflow_outputs,
+            stamps_by_source.get(step.data_source_id)
+        )
+        shared_outputs[step.id] = step_writes[step.id] & shared_by_source.get(step.data_source_id, set())
+        output_stamps = output_stamps_by_source.get(step.data_source_id, {})
+        reuse_fingerprints[step.id] = IncrementalCalculationService.combine_output_stamps(
+            fingerprints[step.id],
+            {table: output_stamps[table] for table in shared_outputs[step.id] if table in output_stamps}
+        )
+        
+        load_period = ChargeDetailStoreService.extract_load_period(rendered[step.id])
+        if load_period:
+            used = referenced_placeholders(step.code_content) - {"task_id"}
+            load_params = {
+                name: value
+                for name, value in _build_step_params(department, period, task_id, model_version_id, hospital_id).items()
+                if name in used
+            }
+            load_params.update(period=period, hospital_id=hospital_id)
+            period_key = IncrementalCalculationService.compute_fingerprint(
+                step.code_type,
+                step.data_source_id,
+                step.code_content,
+                load_params,
+                step_reads[step.id] - workflow_outputs,
+                stamps_by_source.get(step.data_source_id)
+            )
+            if period_key:
+                period_loads[step.id] = (load_period, period_key)
+    
+    return fingerprints, reuse_fingerprints, step_writes, shared_outputs, period_loads
+
+
+def _extract_step_tables(
+    steps: List[CalculationStep],
+    department: Optional[Department],
+    period: str,
+    task_id: str,
+    model_version_id: int,
+    hospital_id: int
+) -> Tuple[Dict[int, str], Dict[int, Set[str]], Dict[int, Set[str]], Set[str]]:
+    """渲染步骤代码并提取读写的表
+    
+    Returns:
+        ({步骤ID: 渲染后的代码}, {步骤ID: 读取的表}, {步骤ID: 写入的表}, 流程内写入的所有表)
+    """
+    rendered = {}
+    step_reads = {}
+    step_writes = {}
+    for step in steps:
+        rendered[step.id] = _render_step_code(step, department, period, task_id, model_version_id, hospital_id)
+        step_reads[step.id], step_writes[step.id] = IncrementalCalculationService.extract_table_references(
+            rendered[step.id]
+        )
+    
+    workflow_outputs = set()
+    for tables in step_writes.values():
+        workflow_outputs |= tables
+    return rendered, step_reads, step_writes, workflow_outputs
+
+
+def _group_tables_by_source(
+    steps: List[CalculationStep],
+    step_reads: Dict[int, Set[str]],
+    step_writes: Dict[int, Set[str]],
+    workflow_outputs: Set[str]
+) -> Tuple[Dict[int, Set[str]], Dict[int, Set[str]]]:
+    """按数据源汇总 SQL 步骤读取的源表（不含流程内写入的表）和写入的表"""
+    source_reads = {}
+    source_writes = {}
+    for step in steps:
+        if step.code_type == "sql" and step.data_source_id:
+            source_reads.setdefault(step.data_source_id, set()).update(step_reads[step.id] - workflow_outputs)
+            source_writes.setdefault(step.data_source_id, set()).update(step_writes[step.id])
+    return source_reads, source_writes
+
+
+def _query_source_stamps(
+    db: Session,
+    source_reads: Dict[int, Set[str]]
+) -> Dict[int, Optional[Dict[str, Optional[str]]]]:
+    """按数据源查询源表版本戳，非 PostgreSQL 数据源或查询失败时为 None"""
+    from app.services.data_source_service import connection_manager
+    
+    stamps_by_source = {}
+    for data_source_id, tables in source_reads.items():
+        stamps_by_source[data_source_id] = None
+        try:
+            data_source = db.query(DataSource).filter(DataSource.id == data_source_id).first()
+            if not data_source or data_source.db_type != "postgresql":
+                continue
+            pool = connection_manager.get_pool(data_source.id) or connection_manager.create_pool(data_source)
+            with pool.connect() as connection:
+                stamps_by_source[data_source_id] = IncrementalCalculationService.get_table_stamps(connection, tables)
+        except Exception as e:
+            stamps_by_source[data_source_id] = None
+            print(f"[WARNING] 查询数据源 {data_source_id} 的表版本失败: {str(e)}")
+    return stamps_by_source
+
+
+def _collect_source_stamps(
+    db: Session,
+    steps: List[CalculationStep],
+    departments: List[Optional[Department]],
+    period: str,
+    task_id: str,
+    model_version_id: int,
+    hospital_id: int
+) -> Dict[int, Optional[Dict[str, Optional[str]]]]:
+    """查询本次任务所有科室的步骤读取的源表版本戳
+    
+    源表不含流程内步骤写入的表，任务执行期间不会变化。任务开始时合并所有科室
+    读取的表，每个数据源只查询一次，各科室和并行子任务计算指纹时共用。
+    
+    Returns:
+        {数据源ID: {表名: 版本戳}}，数据源不支持版本戳时为 None
+    """
+    source_reads = {}
+    for department in departments:
+        _, step_reads, step_writes, workflow_outputs = _extract_step_tables(
+            steps, department, period, task_id, model_version_id, hospital_id
+        )
+        reads, _ = _group_tables_by_source(steps, step_reads, step_writes, workflow_outputs)
+        for data_source_id, tables in reads.items():
+            source_reads.setdefault(data_source_id, set()).update(tables)
+    return _query_source_stamps(db, source_reads)
+
+
+def _find_loaded_period_steps(
+    db: Session,
+    steps: List[CalculationStep],
+    period_loads: Dict[int, Tuple[str, str]]
+) -> Set[int]:
+    """查找月份分区已按相同输入加载、可以跳过的加载步骤"""
+    from app.services.data_source_service import connection_manager
+    
+    loaded = set()
+    for step in steps:
+        if step.id not in period_loads:
+            continue
+        year_month, period_key = period_loads[step.id]
+        try:
+            data_source = db.query(DataSource).filter(DataSource.id == step.data_source_id).first()
+            pool = connection_manager.get_pool(data_source.id) or connection_manager.create_pool(data_source)
+            with pool.connect() as connection:
+                if ChargeDetailStoreService.get_loaded_fingerprint(connection, year_month) == period_key:
+                    loaded.add(step.id)
+        except Exception as e:
+            print(f"[WARNING] 查询月份 {year_month} 的收费明细加载状态失败: {str(e)}")
+    return loaded
+
+
+def _get_previous_fingerprints(
+    db: Session,
+    task_id: str,
+    department: Optional[Department]
+) -> Dict[int, Optional[str]]:
+    """获取任务中各步骤（在该科室）最近一次成功执行或复用时的指纹
+    
+    最近一次执行失败的步骤不返回，重新计算时必然重新执行。
+    """
+    rows = db.execute(
+        text("""
+            SELECT step_id, fingerprint, status
+            FROM (
+                SELECT DISTINCT ON (step_id) step_id, fingerprint, status
+                FROM calculation_step_logs
+                WHERE task_id = :task_id
+                  AND department_id IS NOT DISTINCT FROM :department_id
+                ORDER BY step_id, id DESC
+            ) latest
+        """),
+        {"task_id": task_id, "department_id": department.id if department else None}
+    ).fetchall()
+    
+    return {
+        row.step_id: row.fingerprint
+        for row in rows
+        if row.status in ("success", "reused")
+    }
+
+
+def _clear_step_outputs(
+    db: Session,
+    task_id: str,
+    steps: List[CalculationStep],
+    step_writes: Dict[int, Set[str]],
+    department: Optional[Department]
+):
+    """清除将要重新执行的步骤输出表中本任务（科室）的数据"""
+    from app.services.data_source_service import connection_manager
+    
+    tables_by_source = {}
+    for step in steps:
+        if step.code_type == "sql" and step.data_source_id and step_writes.get(step.id):
+            tables_by_source.setdefault(step.data_source_id, set()).update(step_writes[step.id])
+    
+    for data_source_id, tables in tables_by_source.items():
+        data_source = db.query(DataSource).filter(DataSource.id == data_source_id).first()
+        if not data_source:
+            raise ValueError(f"数据源不存在: {data_source_id}")
+        pool = connection_manager.get_pool(data_source.id) or connection_manager.create_pool(data_source)
+        with pool.connect() as connection:
+            deleted = IncrementalCalculationService.clear_task_outputs(
+                connection,
+                tables,
+                task_id,
+                department.id if department else None
+            )
+            connection.commit()
+        if deleted:
+            print(f"[INFO] 已清除上次计算结果: {deleted}")
+
+
+def _log_reused_steps(
     db: Session,
     task_id: str,
+    steps: List[CalculationStep],
+    department: Optional[Department],
+    fingerprints: Dict[int, Optional[str]],
+    message: str = "输入未变化，复用上次计算结果"
+):
+    """为复用已有结果的步骤记录日志"""
+    if not steps:
+        return
+    
+    now = datetime.utcnow()
+    for step in steps:
+        db.add(CalculationStepLog(
+            task_id=task_id,
+            step_id=step.id,
+            department_id=department.id if department else None,
+            status="reused",
+            fingerprint=fingerprints.get(step.id),
+            start_time=now,
+            end_time=now,
+            duration_ms=0,
+            execution_info=message
+        ))
+    db.commit()
+
+
+def _build_step_params(
+    department: Optional[Department],
+    period: str,
+    task_id: str,
+    model_version_id: int,
+    hospital_id: int
+) -> dict:
+    """构建步骤代码占位符的参数值
+    
+    Args:
+        department: 科室对象，如果为 None 表示不针对特定科室（批量处理模式）
+        period: 计算周期
+        task_id: 任务ID
+        model_version_id: 模型版本ID
+        hospital_id: 医疗机构ID
+    """
+    # 日期相关参数（从 period 计算）
+    # period 格式: YYYY-MM
+    year, month = period.split("-")
+    
+    # 计算月份的第一天和最后一天
+    from calendar import monthrange
+    last_day = monthrange(int(year), int(month))[1]
+    
+    params = {
+        # 基础参数
+        "current_year_month": period,
+        "period": period,  # 别名
+        "year_month": period,  # 导向调整步骤使用
+        "year": year,
+        "month": month,
+        "start_date": f"{period}-01",
+        "end_date": f"{period}-{last_day:02d}",
+        # 任务相关参数
+        "task_id": task_id,
+        "version_id": model_version_id,
+    }
+    
+    # 科室相关参数
+    if department:
+        # 指定了科室：使用具体科室的信息
+        params.update({
+            "hospital_id": department.hospital_id,
+            "department_id": department.id,
+            "department_code": department.his_code or "",
+            "department_name": department.his_name or "",
+            "cost_center_code": department.cost_center_code or "",
+            "cost_center_name": department.cost_center_name or "",
+            "accounting_unit_code": department.accounting_unit_code or "",
+            "accounting_unit_name": department.accounting_unit_name or "",
+        })
+    else:
+        # 未指定科室：批量处理模式，使用传入的hospital_id，科室ID为 NULL
+        params.update({
+            "hospital_id": hospital_id,
+            "department_id": None,
+            "department_code": "",
+            "department_name": "",
+            "cost_center_code": "",
+            "cost_center_name": "",
+            "accounting_unit_code": "",
+            "accounting_unit_name": "",
+        })
+    
+    return params
+
+
+def _get_step_template(step: CalculationStep) -> CompiledSqlTemplate:
+    """获取步骤代码编译后的SQL模板（按步骤ID和更新时间缓存）"""
+    return get_compiled_template((step.id, step.updated_at), step.code_content)
+
+
+def _render_step_code(
     step: CalculationStep,
     department: Optional[Department],
     period: str,
+    task_id: str,
     model_version_id: int,
     hospital_id: int
+) -> str:
+    """将步骤代码中的占位符替换为字面值（用于指纹和表引用分析，执行时使用绑定参数）"""
+    params = _build_step_params(department, period, task_id, model_version_id, hospital_id)
+    return _get_step_template(step).render_literal(params)
+
+
+def _step_result_path(task_id: str, step: CalculationStep, department: Optional[Department]) -> Optional[str]:
+    """步骤完整结果集的文件路径（未启用写文件时为 None）"""
+    if not settings.STEP_RESULT_SPILL_ENABLED:
+        return None
+    department_part = department.id if department else "all"
+    return os.path.join(
+        settings.STEP_RESULT_SPILL_DIR, task_id, f"step_{step.id}_{department_part}.zip"
+    )
+
+
+def execute_calculation_step(
+    db: Session,
+    task_id: str,
+    step: CalculationStep,
+    department: Optional[Department],
+    period: str,
+    model_version_id: int,
+    hospital_id: int,
+    fingerprint: Optional[str] = None,
+    shared_outputs: Optional[Set[str]] = None,
+    period_load: Optional[Tuple[str, str]] = None
 ):
     """执行单个计算步骤
     
@@ -269,57 +1134,18 @@ def execute_calculation_step(
         period: 计算周期
         model_version_id: 模型版本ID
         hospital_id: 医疗机构ID
+        fingerprint: 步骤输入指纹，记录到日志中供增量重算比对
+        shared_outputs: 步骤写入的非任务隔离表，执行后将其版本并入指纹
+        period_load: (月份, 月份加载指纹)，加载收费明细的步骤执行成功后登记该月份已加载
     """
     start_time = datetime.utcnow()
+    # 语句级耗时，失败时记录到失败语句为止
+    statement_profile = []
     
     try:
-        # 替换占位符
-        code = step.code_content
-        
-        # 基础参数
-        code = code.replace("{current_year_month}", period)
-        code = code.replace("{period}", period)  # 别名
-        code = code.replace("{year_month}", period)  # 导向调整步骤使用
-        
-        # 科室相关参数
-        if department:
-            # 指定了科室：使用具体科室的信息
-            code = code.replace("{hospital_id}", str(department.hospital_id))
-            code = code.replace("{department_id}", str(department.id))
-            code = code.replace("{department_code}", department.his_code or "")
-            code = code.replace("{department_name}", department.his_name or "")
-            code = code.replace("{cost_center_code}", department.cost_center_code or "")
-            code = code.replace("{cost_center_name}", department.cost_center_name or "")
-            code = code.replace("{accounting_unit_code}", department.accounting_unit_code or "")
-            code = code.replace("{accounting_unit_name}", department.accounting_unit_name or "")
-        else:
-            # 未指定科室：批量处理模式，使用传入的hospital_id
-            code = code.replace("{hospital_id}", str(hospital_id))
-            code = code.replace("{department_id}", "NULL")
-            code = code.replace("{department_code}", "")
-            code = code.replace("{department_name}", "")
-            code = code.replace("{cost_center_code}", "")
-            code = code.replace("{cost_center_name}", "")
-            code = code.replace("{accounting_unit_code}", "")
-            code = code.replace("{accounting_unit_name}", "")
-        
-        # 日期相关参数（从 period 计算）
-        # period 格式: YYYY-MM
-        year, month = period.split("-")
-        code = code.replace("{year}", year)
-        code = code.replace("{month}", month)
-        
-        # 计算月份的第一天和最后一天
-        from calendar import monthrange
-        last_day = monthrange(int(year), int(month))[1]
-        start_date = f"{period}-01"
-        end_date = f"{period}-{last_day:02d}"
-        code = code.replace("{start_date}", start_date)
-        code = code.replace("{end_date}", end_date)
-        
-        # 任务相关参数
-        code = code.replace("{task_id}", task_id)
-        code = code.replace("{version_id}", str(model_version_id))
+        params = _build_step_params(department, period, task_id, model_version_id, hospital_id)
+        template = _get_step_template(step)
+        code = template.render_literal(params)
         
         result_data = {}
         
@@ -351,55 +1177,53 @@ def execute_calculation_step(
             print(f"[DEBUG] SQL模板包含'cr.weight': {'cr.weight' in code}")
             print(f"[DEBUG] SQL模板包含'ms.weight': {'ms.weight' in code}")
             with pool.connect() as connection:
-                # 分割多个SQL语句（以分号分隔）
-                statements = []
-                for s in code.split(';'):
-                    s = s.strip()
-                    if not s:
-                        continue
-                    # 过滤掉纯注释的语句
-                    lines = [line.strip() for line in s.split('\n') if line.strip() and not line.strip().startswith('--')]
-                    if lines:
-                        statements.append(s)
+                # 模板已按分号拆分为多条语句（忽略纯注释语句），占位符以绑定参数传入
+                statements = template.statements
                 
                 last_result = None
                 total_affected = 0
                 
-                for statement in statements:
-                    result = connection.execute(text(statement))
+                for index, statement in enumerate(statements):
+                    is_last = index == len(statements) - 1
+                    statement_start = time.perf_counter()
+                    if is_last and statement.is_query:
+                        # 最后一条语句是查询时用服务端游标按批读取结果集，
+                        # DML/DDL 不能放在游标中执行
+                        result = connection.execute(
+                            statement.to_clause(params),
+                            execution_options={
+                                "stream_results": True,
+                                "yield_per": settings.STEP_RESULT_FETCH_SIZE,
+                            }
+                        )
+                    else:
+                        result = connection.execute(statement.to_clause(params))
                     last_result = result
                     
+                    rowcount = None if result.returns_rows else result.rowcount
+                    statement_profile.append(StepProfileService.new_entry(
+                        index + 1, statement, (time.perf_counter() - statement_start) * 1000, rowcount
+                    ))
+                    
                     # 如果是DML语句，累计影响行数
                     if hasattr(result, 'rowcount') and result.rowcount > 0:
                         total_affected += result.rowcount
+                    
+                    # 慢语句执行后立即采集执行计划；最后一条语句在结果集读取完毕后采集
+                    if not is_last and StepProfileService.should_explain(connection, statement_profile[-1]["duration_ms"]):
+                        statement_profile[-1].update(StepProfileService.explain(connection, statement, params))
                 
-                # 提交事务
-                print(f"[DEBUG] 提交事务，共执行 {len(statements)} 个语句，影响 {total_affected} 行")
-                connection.commit()
-                print(f"[DEBUG] 事务提交成功")
-                
-                # 处理最后一个语句的结果
+                # 处理最后一个语句的结果（服务端游标在提交时关闭，需先读取完毕）
                 if last_result and last_result.returns_rows:
-                    columns = list(last_result.keys())
-                    rows = []
-                    for row in last_result.fetchall():
-                        row_dict = {}
-                        for key, value in row._mapping.items():
-                            # 将 datetime 对象转换为字符串
-                            if isinstance(value, datetime):
-                                row_dict[key] = value.isoformat()
-                            elif isinstance(value, Decimal):
-                                row_dict[key] = float(value)
-                            else:
-                                row_dict[key] = value
-                        rows.append(row_dict)
-                    
-                    result_data = {
-                        "columns": columns,
-                        "rows": rows,
-                        "row_count": len(rows),
-                        "total_affected": total_affected
-                    }
+                    fetch_start = time.perf_counter()
+                    capture = StepResultCapture(
+                        sample_rows=settings.STEP_RESULT_SAMPLE_ROWS,
+                        spill_path=_step_result_path(task_id, step, department),
+                        fetch_size=settings.STEP_RESULT_FETCH_SIZE
+                    ).consume(last_result)
+                    result_data = capture.summary(total_affected)
+                    statement_profile[-1]["fetch_ms"] = round((time.perf_counter() - fetch_start) * 1000, 1)
+                    statement_profile[-1]["rows"] = capture.row_count
                 else:
                     # DDL/DML 语句
                     result_data = {
@@ -407,6 +1231,38 @@ def execute_calculation_step(
                         "affected_rows": total_affected,
                         "statements_executed": len(statements)
                     }
+                
+                if statement_profile:
+                    last_entry = statement_profile[-1]
+                    last_ms = last_entry["duration_ms"] + last_entry.get("fetch_ms", 0)
+                    if StepProfileService.should_explain(connection, last_ms):
+                        last_entry.update(StepProfileService.explain(connection, statements[-1], params))
+                
+                # 提交事务
+                print(f"[DEBUG] 提交事务，共执行 {len(statements)} 个语句，影响 {total_affected} 行")
+                connection.commit()
+                print(f"[DEBUG] 事务提交成功")
+                
+                # 登记失败只影响其他任务能否跳过加载，不影响本步骤结果
+                if period_load:
+                    try:
+                        row_count = ChargeDetailStoreService.mark_loaded(connection, *period_load, task_id=task_id)
+                        connection.commit()
+                        print(f"[INFO] 已登记月份 {period_load[0]} 的收费明细，共 {row_count} 行")
+                    except Exception as mark_error:
+                        connection.rollback()
+                        print(f"[WARNING] 登记月份 {period_load[0]} 的收费明细失败: {str(mark_error)}")
+                
+                # 共享输出表可能被其他任务覆盖，记录执行后的版本
+                if fingerprint and shared_outputs:
+                    try:
+                        fingerprint = IncrementalCalculationService.combine_output_stamps(
+                            fingerprint,
+                            IncrementalCalculationService.get_table_stamps(connection, shared_outputs, exact=True)
+                        )
+                    except Exception as stamp_error:
+                        fingerprint = None
+                        print(f"[WARNING] 查询步骤输出表版本失败: {str(stamp_error)}")
                     
         elif step.code_type == "python":
             # Python代码执行（暂未实现）
@@ -431,10 +1287,12 @@ def execute_calculation_step(
                 step_id=step.id,
                 department_id=department.id if department else None,  # 批量模式时为 None
                 status="success",
+                fingerprint=fingerprint,
                 start_time=start_time,
                 end_time=end_time,
                 duration_ms=duration_ms,
                 result_data=result_data,
+                statement_profile=statement_profile or None,
                 execution_info=execution_info
             )
             db.add(log)
@@ -463,9 +1321,11 @@ def execute_calculation_step(
                 step_id=step.id,
                 department_id=department.id if department else None,  # 批量模式时为 None
                 status="failed",
+                fingerprint=fingerprint,
                 start_time=start_time,
                 end_time=end_time,
                 duration_ms=duration_ms,
+                statement_profile=statement_profile or None,
                 execution_info=f"执行失败: {error_msg}"
             )
             db.add(log)
@@ -481,48 +1341,94 @@ def execute_calculation_step(
         raise
 
 
+def _build_result_rollups(db: Session, task_id: str):
+    """生成报表汇总缓存（失败不影响任务状态，报表接口会回退为实时汇总）"""
+    try:
+        count = ResultRollupCacheService.build(db, task_id)
+        db.commit()
+        print(f"任务 {task_id} 汇总缓存已生成: {count} 条")
+    except Exception as e:
+        db.rollback()
+        print(f"[WARNING] 任务 {task_id} 生成汇总缓存失败: {str(e)}")
+
+
+def _build_drilldown_cube(db: Session, task_id: str):
+    """生成维度下钻汇总（失败不影响任务状态，下钻接口会回退为实时查询）"""
+    try:
+        count = DrilldownCubeService.build(db, task_id)
+        db.commit()
+        print(f"任务 {task_id} 下钻汇总已生成: {count} 条")
+    except Exception as e:
+        db.rollback()
+        print(f"[WARNING] 任务 {task_id} 生成下钻汇总失败: {str(e)}")
+
+
 def calculate_summaries(db: Session, task_id: str, departments: List[Department]):
-    """计算汇总数据"""
-    for department in departments:
-        # 查询该科室的所有序列结果
-        results = db.query(CalculationResult).filter(
-            CalculationResult.task_id == task_id,
-            CalculationResult.department_id == department.id,
-            CalculationResult.node_type == "sequence"
-        ).all()
-        
-        # 计算各序列的价值
-        doctor_value = Decimal("0")
-        nurse_value = Decimal("0")
-        tech_value = Decimal("0")
-        
-        for result in results:
-            if "医生" in result.node_name:
-                doctor_value += result.value or Decimal("0")
-            elif "护理" in result.node_name:
-                nurse_value += result.value or Decimal("0")
-            elif "医技" in result.node_name:
-                tech_value += result.value or Decimal("0")
-        
-        total_value = doctor_value + nurse_value + tech_value
-        
-        # 计算占比
-        doctor_ratio = doctor_value / total_value * 100 if total_value > 0 else Decimal("0")
-        nurse_ratio = nurse_value / total_value * 100 if total_value > 0 else Decimal("0")
-        tech_ratio = tech_value / total_value * 100 if total_value > 0 else Decimal("0")
-        
-        # 创建汇总记录
-        summary = CalculationSummary(
-            task_id=task_id,
-            department_id=department.id,
-            doctor_value=doctor_value,
-            doctor_ratio=doctor_ratio,
-            nurse_value=nurse_value,
-            nurse_ratio=nurse_ratio,
-            tech_value=tech_value,
-            tech_ratio=tech_ratio,
-            total_value=total_value
-        )
-        db.add(summary)
+    """计算汇总数据
+    
+    一条语句聚合整个任务的序列结果并批量写入，序列类别取自模型节点的 sequence_type。
+    没有序列结果的科室也写入一条零值记录；已有记录（重新计算）按
+    uq_calculation_summaries_task_dept 约束覆盖。
+    """
+    department_ids = [department.id for department in departments]
+    if not department_ids:
+        return
     
+    db.execute(
+        text("""
+            INSERT INTO calculation_summaries (
+                task_id, department_id,
+                doctor_value, doctor_ratio,
+                nurse_value, nurse_ratio,
+                tech_value, tech_ratio,
+                total_value, created_at
+            )
+            SELECT
+                :task_id,
+                v.department_id,
+                v.doctor_value,
+                CASE WHEN v.total_value > 0 THEN v.doctor_value / v.total_value * 100 ELSE 0 END,
+                v.nurse_value,
+                CASE WHEN v.total_value > 0 THEN v.nurse_value / v.total_value * 100 ELSE 0 END,
+                v.tech_value,
+                CASE WHEN v.total_value > 0 THEN v.tech_value / v.total_value * 100 ELSE 0 END,
+                v.total_value,
+                :created_at
+            FROM (
+                SELECT
+                    s.department_id,
+                    s.doctor_value,
+                    s.nurse_value,
+                    s.tech_value,
+                    s.doctor_value + s.nurse_value + s.tech_value AS total_value
+                FROM (
+                    SELECT
+                        d.department_id,
+                        COALESCE(SUM(cr.value) FILTER (WHERE mn.sequence_type = 'doctor'), 0) AS doctor_value,
+                        COALESCE(SUM(cr.value) FILTER (WHERE mn.sequence_type = 'nurse'), 0) AS nurse_value,
+                        COALESCE(SUM(cr.value) FILTER (WHERE mn.sequence_type = 'tech'), 0) AS tech_value
+                    FROM unnest(CAST(:department_ids AS integer[])) AS d(department_id)
+                    LEFT JOIN calculation_results cr
+                        ON cr.task_id = :task_id
+                       AND cr.department_id = d.department_id
+                       AND cr.node_type = 'sequence'
+                    LEFT JOIN model_nodes mn ON mn.id = cr.node_id
+                    GROUP BY d.department_id
+                ) s
+            ) v
+            ON CONFLICT (task_id, department_id) DO UPDATE SET
+                doctor_value = EXCLUDED.doctor_value,
+                doctor_ratio = EXCLUDED.doctor_ratio,
+                nurse_value = EXCLUDED.nurse_value,
+                nurse_ratio = EXCLUDED.nurse_ratio,
+                tech_value = EXCLUDED.tech_value,
+                tech_ratio = EXCLUDED.tech_ratio,
+                total_value = EXCLUDED.total_value
+        """),
+        {
+            "task_id": task_id,
+            "department_ids": department_ids,
+            "created_at": datetime.utcnow()
+        }
+    )
     db.commit()
@@ -3,14 +3,17 @@ AI分类任务Celery任务
 """
 import time
 import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Tuple
+from functools import partial
+from typing import Optional, Tuple
 from decimal import Decimal
 
 from sqlalchemy.orm import Session
 from celery.exceptions import SoftTimeLimitExceeded
 
 from app.celery_app import celery_app
+from app.config import settings
 from app.database import SessionLocal
 from app.models.classification_task import ClassificationTask, TaskStatus
 from app.models.classification_plan import ClassificationPlan, PlanStatus
@@ -21,13 +24,16 @@ from app.models.model_node import ModelNode
 from app.models.model_version import ModelVersion
 from app.models.charge_item import ChargeItem
 from app.models.api_usage_log import APIUsageLog
+from app.services.classification_cache_service import ClassificationCacheService
+from app.services.model_tree_service import ModelTreeService
 from app.utils.encryption import decrypt_api_key
 from app.utils.ai_interface import call_ai_classification_batch, AIClassificationError
+from app.utils.rate_limiter import TokenBucket
 
 logger = logging.getLogger(__name__)
 
 
-def _get_classification_ai_config(db: Session, hospital_id: int) -> Tuple[str, str, str, str, str, float, int, int]:
+def _get_classification_ai_config(db: Session, hospital_id: int) -> Tuple[str, str, str, str, str, float, int, int, int]:
     """
     获取分类任务的AI配置（使用ai_interfaces + ai_prompt_modules体系）
     
@@ -36,7 +42,7 @@ def _get_classification_ai_config(db: Session, hospital_id: int) -> Tuple[str, s
         hospital_id: 医疗机构ID
         
     Returns:
-        (api_endpoint, api_key, model_name, system_prompt, user_prompt, call_delay, daily_limit, batch_size) 元组
+        (api_endpoint, api_key, model_name, system_prompt, user_prompt, call_delay, daily_limit, batch_size, max_concurrency) 元组
         
     Raises:
         ValueError: 如果没有找到有效的AI配置
@@ -92,7 +98,8 @@ def _get_classification_ai_config(db: Session, hospital_id: int) -> Tuple[str, s
         module.user_prompt,
         float(ai_interface.call_delay or 1.0),
         int(ai_interface.daily_limit or 10000),
-        20  # 默认批次大小
+        20,  # 默认批次大小
+        int(ai_interface.max_concurrency or 1)
     )
 
 
@@ -105,6 +112,12 @@ def classify_items_task(
     """
     异步执行医技项目AI分类任务
     
+    待处理项目按ID顺序分批，最多 max_concurrency 个批次同时调用AI接口（线程池，
+    工作线程不访问数据库），请求发起由令牌桶按 call_delay 间隔放行，
+    当日剩余额度（daily_limit）用完后不再发起新请求并暂停任务。
+    结果按批次顺序写入，已提交的批次构成连续前缀，中断后重新执行时
+    从未完成的项目（pending/processing/failed）继续。
+    
     Args:
         task_id: 分类任务ID
         hospital_id: 医疗机构ID
@@ -139,7 +152,7 @@ def classify_items_task(
         # 2. 加载AI配置
         try:
             (api_endpoint, api_key, model_name, system_prompt, prompt_template,
-             call_delay, daily_limit, batch_size) = _get_classification_ai_config(db, hospital_id)
+             call_delay, daily_limit, batch_size, max_concurrency) = _get_classification_ai_config(db, hospital_id)
             logger.info(f"[AI分类任务] 加载AI配置: endpoint={api_endpoint}, model={model_name}")
         except ValueError as e:
             raise ValueError(str(e))
@@ -160,11 +173,13 @@ def classify_items_task(
             db.commit()
             logger.info(f"[AI分类任务] 创建分类预案 {plan.id}")
         
-        # 4. 查询待处理项目（pending或failed）
+        # 4. 查询待处理项目（pending、failed，以及上次中断时未提交结果的processing）
         pending_items = db.query(PlanItem).filter(
             PlanItem.plan_id == plan.id,
-            PlanItem.processing_status.in_([ProcessingStatus.pending, ProcessingStatus.failed])
-        ).all()
+            PlanItem.processing_status.in_([
+                ProcessingStatus.pending, ProcessingStatus.processing, ProcessingStatus.failed
+            ])
+        ).order_by(PlanItem.id).all()
         
         if not pending_items:
             # 如果没有待处理项目，可能是首次执行，需要创建项目
@@ -174,7 +189,15 @@ def classify_items_task(
             if not pending_items:
                 raise ValueError("没有找到符合条件的医技项目")
         
-        logger.info(f"[AI分类任务] 找到 {len(pending_items)} 个待处理项目")
+        # 断点续传：已完成的项目计入进度
+        processed_count = db.query(PlanItem).filter(
+            PlanItem.plan_id == plan.id,
+            PlanItem.processing_status == ProcessingStatus.completed
+        ).count()
+        failed_count = 0
+        total_items = processed_count + len(pending_items)
+        
+        logger.info(f"[AI分类任务] 找到 {len(pending_items)} 个待处理项目，已完成 {processed_count} 个")
         
         # 5. 加载目标模型版本的末级维度
         dimensions = db.query(ModelNode).filter(
@@ -187,230 +210,170 @@ def classify_items_task(
         
         logger.info(f"[AI分类任务] 加载 {len(dimensions)} 个末级维度")
         
-        # 构建维度列表（用于AI接口）
+        # 构建维度列表（用于AI接口），路径取自版本的路径索引
+        path_index = ModelTreeService.get_path_index(db, task.model_version_id)
         dimension_list = []
         for dim in dimensions:
-            # 构建路径：从父节点递归获取完整路径
-            path_parts = [dim.name]
-            current = dim
-            while current.parent_id:
-                parent = db.query(ModelNode).filter(ModelNode.id == current.parent_id).first()
-                if parent:
-                    path_parts.insert(0, parent.name)
-                    current = parent
-                else:
-                    break
-            
             dimension_list.append({
                 "id": dim.id,
+                "code": dim.code,
                 "name": dim.name,
-                "path": " / ".join(path_parts)
+                "path": path_index.path(dim.id, " / ")
             })
         
-        # 6. 批量调用AI接口处理项目
-        total_items = len(pending_items)
-        processed_count = 0
-        failed_count = 0
+        # 6. 项目名称和维度列表相同的项目复用缓存的分类结果，不再调用AI接口
+        cache_context = None
+        if settings.CLASSIFICATION_CACHE_ENABLED:
+            cache_context = ClassificationCacheService.context_hash(
+                dimension_list, model_name, system_prompt, prompt_template
+            )
+            cached_items = ClassificationCacheService.apply_cached(
+                db, hospital_id, cache_context, pending_items, dimension_list
+            )
+            if cached_items:
+                processed_count += len(cached_items)
+                task.processed_items = processed_count
+                db.commit()
+                cached_ids = {item.id for item in cached_items}
+                pending_items = [item for item in pending_items if item.id not in cached_ids]
+                logger.info(f"[AI分类任务] {len(cached_items)} 个项目命中分类缓存，剩余 {len(pending_items)} 个")
+        
+        # 7. 并发调用AI接口，按批次顺序提交结果
+        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        today_calls = db.query(APIUsageLog).filter(
+            APIUsageLog.hospital_id == hospital_id,
+            APIUsageLog.created_at >= today_start
+        ).count()
+        rate_limiter = TokenBucket.from_call_delay(call_delay, limit=max(daily_limit - today_calls, 0))
         
-        # 使用从配置获取的限流参数（已在_get_classification_ai_config中获取）
         logger.info(
-            f"[AI分类任务] 批量处理配置: 批次大小={batch_size}, "
-            f"调用延迟={call_delay}秒, 每日限额={daily_limit}, 模型={model_name}"
+            f"[AI分类任务] 批量处理配置: 批次大小={batch_size}, 最大并发={max_concurrency}, "
+            f"调用间隔={call_delay}秒, 每日限额={daily_limit}（今日已用 {today_calls}）, 模型={model_name}"
         )
         
-        # 将待处理项目分批
-        for batch_start in range(0, total_items, batch_size):
-            batch_end = min(batch_start + batch_size, total_items)
-            batch_items = pending_items[batch_start:batch_end]
-            
-            try:
-                # 检查每日限额
-                today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-                today_calls = db.query(APIUsageLog).filter(
-                    APIUsageLog.hospital_id == hospital_id,
-                    APIUsageLog.created_at >= today_start
-                ).count()
-                
-                if today_calls >= daily_limit:
-                    error_msg = f"已达到每日API调用限额 ({daily_limit} 次)，任务已暂停"
-                    logger.warning(f"[AI分类任务] {error_msg}")
+        call_batch = partial(
+            call_ai_classification_batch,
+            api_endpoint=api_endpoint,
+            api_key=api_key,
+            prompt_template=prompt_template,
+            dimensions=dimension_list,
+            max_retries=3,
+            timeout=60.0,
+            model_name=model_name,
+            system_prompt=system_prompt
+        )
+        
+        batches = [
+            pending_items[batch_start:batch_start + batch_size]
+            for batch_start in range(0, len(pending_items), batch_size)
+        ]
+        # 已发起但未按顺序提交的批次数上限，避免队首批次较慢时积压过多结果
+        window = max_concurrency * 2
+        
+        executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"classify-{task_id}")
+        in_flight = {}  # {future: 批次序号}
+        finished = {}  # {批次序号: 调用结果}
+        next_dispatch = 0
+        next_commit = 0
+        limit_reached = False
+        
+        try:
+            while next_commit < len(batches):
+                # 发起请求：并发数和积压数未满，且限流器放行
+                while (
+                    not limit_reached
+                    and next_dispatch < len(batches)
+                    and len(in_flight) < max_concurrency
+                    and next_dispatch - next_commit < window
+                ):
+                    if not rate_limiter.acquire():
+                        limit_reached = True
+                        break
                     
-                    task.status = TaskStatus.paused
-                    task.error_message = error_msg
+                    batch_items = batches[next_dispatch]
+                    for item in batch_items:
+                        item.processing_status = ProcessingStatus.processing
                     db.commit()
                     
-                    return {
-                        "success": False,
-                        "error": error_msg,
-                        "total": total_items,
-                        "processed": processed_count,
-                        "failed": failed_count,
-                        "paused_at": batch_start
-                    }
-                
-                logger.info(f"[AI分类任务] 处理批次 {batch_start//batch_size + 1}: 项目 {batch_start+1}-{batch_end}/{total_items}")
-                
-                # 更新批次内项目状态为处理中
-                for item in batch_items:
-                    item.processing_status = ProcessingStatus.processing
-                db.commit()
-                
-                # 构建批量请求数据
-                items_for_ai = [
-                    {"id": item.id, "name": item.charge_item_name}
-                    for item in batch_items
-                ]
-                
-                # 批量调用AI接口
-                call_start_time = datetime.utcnow()
-                results = call_ai_classification_batch(
-                    api_endpoint=api_endpoint,
-                    api_key=api_key,
-                    prompt_template=prompt_template,
-                    items=items_for_ai,
-                    dimensions=dimension_list,
-                    max_retries=3,
-                    timeout=60.0,
-                    model_name=model_name,
-                    system_prompt=system_prompt
-                )
-                call_duration = (datetime.utcnow() - call_start_time).total_seconds()
-                
-                # 构建结果映射：优先使用 item_name，其次使用 item_id
-                result_by_id = {r['item_id']: r for r in results if r.get('item_id')}
-                result_by_name = {r['item_name']: r for r in results if r.get('item_name')}
-                
-                # 处理每个项目的结果
-                batch_processed = 0
-                batch_failed = 0
-                for item in batch_items:
-                    # 优先通过 item_name 匹配，其次通过 item_id
-                    result = result_by_name.get(item.charge_item_name) or result_by_id.get(item.id)
-                    if result:
-                        item.ai_suggested_dimension_id = result['dimension_id']
-                        item.ai_confidence = Decimal(str(result['confidence']))
-                        item.processing_status = ProcessingStatus.completed
-                        item.error_message = None
-                        batch_processed += 1
-                        logger.debug(
-                            f"[AI分类任务] 项目分类成功: {item.charge_item_name}, "
-                            f"维度ID={result['dimension_id']}, 确信度={result['confidence']}"
-                        )
-                    else:
-                        item.processing_status = ProcessingStatus.failed
-                        item.error_message = "AI未返回该项目的分类结果"
-                        batch_failed += 1
-                        logger.warning(f"[AI分类任务] 项目无结果: {item.charge_item_name}")
-                
-                db.commit()
-                processed_count += batch_processed
-                failed_count += batch_failed
-                
-                logger.info(
-                    f"[AI分类任务] 批次处理完成: 成功={batch_processed}, 失败={batch_failed}, "
-                    f"耗时={call_duration:.2f}秒"
-                )
-                
-                # 记录API使用日志（每批一条）
-                try:
-                    log = APIUsageLog(
-                        hospital_id=hospital_id,
-                        task_id=task_id,
-                        charge_item_id=batch_items[0].charge_item_id,  # 使用批次第一个项目ID
-                        request_data={
-                            "batch_size": len(batch_items),
-                            "item_names": [item.charge_item_name for item in batch_items],
-                            "dimensions_count": len(dimension_list)
-                        },
-                        response_data={"results_count": len(results), "results": results},
-                        status_code=200,
-                        call_duration=call_duration
+                    logger.info(
+                        f"[AI分类任务] 发起批次 {next_dispatch + 1}/{len(batches)}: {len(batch_items)} 个项目"
                     )
-                    db.add(log)
-                    db.commit()
-                except Exception as log_error:
-                    logger.warning(f"[AI分类任务] 记录API使用日志失败: {str(log_error)}")
-                    db.rollback()
-                
-                # 更新任务进度
-                task.processed_items = processed_count
-                task.failed_items = failed_count
-                db.commit()
-                
-                # 更新Celery任务状态
-                self.update_state(
-                    state='PROGRESS',
-                    meta={
-                        'current': processed_count,
-                        'total': total_items,
-                        'failed': failed_count,
-                        'batch': batch_start // batch_size + 1
-                    }
-                )
-                
-                # 批次间延迟
-                if batch_end < total_items:
-                    logger.debug(f"[AI分类任务] 批次间延迟 {call_delay} 秒")
-                    time.sleep(call_delay)
-                
-            except AIClassificationError as e:
-                # AI接口调用失败，整批标记为失败
-                error_msg = str(e)
-                logger.error(f"[AI分类任务] 批次处理失败: {error_msg}")
+                    future = executor.submit(
+                        _run_batch,
+                        call_batch,
+                        [{"id": item.id, "name": item.charge_item_name} for item in batch_items]
+                    )
+                    in_flight[future] = next_dispatch
+                    next_dispatch += 1
                 
-                for item in batch_items:
-                    item.processing_status = ProcessingStatus.failed
-                    item.error_message = error_msg
-                    failed_count += 1
-                db.commit()
+                if next_commit not in finished:
+                    if not in_flight:
+                        # 当日额度已用完，已发起的批次均已提交
+                        break
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished[in_flight.pop(future)] = future.result()
                 
-                # 记录失败日志
-                try:
-                    log = APIUsageLog(
-                        hospital_id=hospital_id,
-                        task_id=task_id,
-                        charge_item_id=batch_items[0].charge_item_id,
-                        request_data={"batch_size": len(batch_items)},
-                        response_data=None,
-                        status_code=500,
-                        error_message=error_msg
+                # 按批次顺序提交结果
+                while next_commit in finished:
+                    batch_processed, batch_failed = _commit_batch(
+                        db, task_id, hospital_id, batches[next_commit],
+                        finished.pop(next_commit), dimension_list, cache_context
                     )
-                    db.add(log)
+                    processed_count += batch_processed
+                    failed_count += batch_failed
+                    next_commit += 1
+                    
+                    # 更新任务进度
+                    task.processed_items = processed_count
+                    task.failed_items = failed_count
                     db.commit()
-                except Exception as log_error:
-                    logger.warning(f"[AI分类任务] 记录失败日志失败: {str(log_error)}")
-                    db.rollback()
-                
-                task.failed_items = failed_count
-                db.commit()
-                
-                # 继续处理下一批
-                continue
-                
-            except Exception as e:
-                # 其他未预期的错误
-                error_msg = f"未知错误: {str(e)}"
-                logger.error(f"[AI分类任务] 批次处理异常: {error_msg}", exc_info=True)
-                
-                for item in batch_items:
-                    item.processing_status = ProcessingStatus.failed
-                    item.error_message = error_msg
-                    failed_count += 1
-                db.commit()
-                
-                task.failed_items = failed_count
-                db.commit()
-                
-                # 继续处理下一批
-                continue
+                    
+                    # 更新Celery任务状态
+                    self.update_state(
+                        state='PROGRESS',
+                        meta={
+                            'current': processed_count,
+                            'total': total_items,
+                            'failed': failed_count,
+                            'batch': next_commit
+                        }
+                    )
+        finally:
+            # 超时或异常时不等待进行中的请求，未提交的项目下次继续处理
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        # 7. 完成后更新任务状态
+        if next_commit < len(batches):
+            error_msg = f"已达到每日API调用限额 ({daily_limit} 次)，任务已暂停"
+            logger.warning(f"[AI分类任务] {error_msg}")
+            
+            # 未发起的项目保持待处理
+            for batch_items in batches[next_commit:]:
+                for item in batch_items:
+                    item.processing_status = ProcessingStatus.pending
+            task.status = TaskStatus.paused
+            task.error_message = error_msg
+            db.commit()
+            
+            return {
+                "success": False,
+                "error": error_msg,
+                "total": total_items,
+                "processed": processed_count,
+                "failed": failed_count,
+                "paused_at": sum(len(batch_items) for batch_items in batches[:next_commit])
+            }
+        
+        # 8. 完成后更新任务状态
         task.status = TaskStatus.completed
         task.completed_at = datetime.utcnow()
         task.processed_items = processed_count
         task.failed_items = failed_count
         db.commit()
         
+        if cache_context:
+            _evict_classification_cache(db, hospital_id)
+        
         logger.info(
             f"[AI分类任务] 任务 {task_id} 执行完成: "
             f"总数={total_items}, 成功={processed_count}, 失败={failed_count}"
@@ -476,6 +439,156 @@ def classify_items_task(
             pass
 
 
+def _run_batch(call_batch, items_for_ai: list) -> dict:
+    """
+    在工作线程中调用AI接口（不访问数据库）
+    
+    Returns:
+        {"results": 分类结果, "duration": 耗时（秒）, "error": 错误信息, "ai_error": 是否为AI接口错误}
+    """
+    call_start_time = time.monotonic()
+    try:
+        results = call_batch(items=items_for_ai)
+        return {"results": results, "duration": time.monotonic() - call_start_time, "error": None, "ai_error": False}
+    except AIClassificationError as e:
+        # AI接口调用失败，整批标记为失败
+        return {"results": None, "duration": time.monotonic() - call_start_time, "error": str(e), "ai_error": True}
+    except Exception as e:
+        # 其他未预期的错误
+        logger.error(f"[AI分类任务] 批次处理异常: {str(e)}", exc_info=True)
+        return {"results": None, "duration": time.monotonic() - call_start_time, "error": f"未知错误: {str(e)}", "ai_error": False}
+
+
+def _commit_batch(
+    db: Session,
+    task_id: int,
+    hospital_id: int,
+    batch_items: list,
+    outcome: dict,
+    dimension_list: list,
+    cache_context: Optional[str] = None
+) -> Tuple[int, int]:
+    """
+    写入一个批次的分类结果和API使用日志，成功的结果同时写入分类缓存
+    
+    Returns:
+        (成功数, 失败数)
+    """
+    if outcome["error"] is not None:
+        error_msg = outcome["error"]
+        logger.error(f"[AI分类任务] 批次处理失败: {error_msg}")
+        
+        for item in batch_items:
+            item.processing_status = ProcessingStatus.failed
+            item.error_message = error_msg
+        db.commit()
+        
+        # 记录失败日志
+        if outcome["ai_error"]:
+            _add_usage_log(db, APIUsageLog(
+                hospital_id=hospital_id,
+                task_id=task_id,
+                charge_item_id=batch_items[0].charge_item_id,
+                request_data={"batch_size": len(batch_items)},
+                response_data=None,
+                status_code=500,
+                error_message=error_msg
+            ))
+        return 0, len(batch_items)
+    
+    results = outcome["results"]
+    
+    # 构建结果映射：优先使用 item_name，其次使用 item_id
+    result_by_id = {r['item_id']: r for r in results if r.get('item_id')}
+    result_by_name = {r['item_name']: r for r in results if r.get('item_name')}
+    
+    # 处理每个项目的结果
+    dimensions_by_id = {dim["id"]: dim for dim in dimension_list}
+    cache_results = []
+    batch_processed = 0
+    batch_failed = 0
+    for item in batch_items:
+        # 优先通过 item_name 匹配，其次通过 item_id
+        result = result_by_name.get(item.charge_item_name) or result_by_id.get(item.id)
+        if result:
+            item.ai_suggested_dimension_id = result['dimension_id']
+            item.ai_confidence = Decimal(str(result['confidence']))
+            item.processing_status = ProcessingStatus.completed
+            item.error_message = None
+            batch_processed += 1
+            dimension = dimensions_by_id.get(result['dimension_id'])
+            if dimension:
+                cache_results.append({
+                    "item_name": item.charge_item_name,
+                    "dimension_code": dimension["code"],
+                    "dimension_path": dimension["path"],
+                    "confidence": item.ai_confidence,
+                })
+            logger.debug(
+                f"[AI分类任务] 项目分类成功: {item.charge_item_name}, "
+                f"维度ID={result['dimension_id']}, 确信度={result['confidence']}"
+            )
+        else:
+            item.processing_status = ProcessingStatus.failed
+            item.error_message = "AI未返回该项目的分类结果"
+            batch_failed += 1
+            logger.warning(f"[AI分类任务] 项目无结果: {item.charge_item_name}")
+    
+    db.commit()
+    
+    if cache_context and cache_results:
+        try:
+            ClassificationCacheService.store(db, hospital_id, cache_context, cache_results)
+            db.commit()
+        except Exception as cache_error:
+            logger.warning(f"[AI分类任务] 写入分类缓存失败: {str(cache_error)}")
+            db.rollback()
+    
+    logger.info(
+        f"[AI分类任务] 批次处理完成: 成功={batch_processed}, 失败={batch_failed}, "
+        f"耗时={outcome['duration']:.2f}秒"
+    )
+    
+    # 记录API使用日志（每批一条）
+    _add_usage_log(db, APIUsageLog(
+        hospital_id=hospital_id,
+        task_id=task_id,
+        charge_item_id=batch_items[0].charge_item_id,  # 使用批次第一个项目ID
+        request_data={
+            "batch_size": len(batch_items),
+            "item_names": [item.charge_item_name for item in batch_items],
+            "dimensions_count": len(dimension_list)
+        },
+        response_data={"results_count": len(results), "results": results},
+        status_code=200,
+        call_duration=outcome["duration"]
+    ))
+    return batch_processed, batch_failed
+
+
+def _evict_classification_cache(db: Session, hospital_id: int):
+    """清理过期和超出上限的分类缓存（失败不影响任务状态）"""
+    try:
+        deleted = ClassificationCacheService.evict(db, hospital_id)
+        db.commit()
+        if deleted:
+            logger.info(f"[AI分类任务] 清理分类缓存 {deleted} 条")
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"[AI分类任务] 清理分类缓存失败: {str(e)}")
+
+
+def _add_usage_log(db: Session, log: APIUsageLog):
+    """记录API使用日志（失败不影响分类结果）"""
+    try:
+        db.add(log)
+        db.commit()
+    except Exception as log_error:
+        logger.warning(f"[AI分类任务] 记录API使用日志失败: {str(log_error)}")
+        db.rollback()
+
+
+
 def _create_plan_items(
     db: Session,
     task: ClassificationTask,
@@ -0,0 +1,29 @@
+"""
+HIS源表增量抽取 Celery 任务
+"""
+from typing import List, Optional
+
+from app.celery_app import celery_app
+from app.database import SessionLocal
+from app.services.his_extract_service import HisExtractService
+
+
+@celery_app.task(bind=True, max_retries=0, name="run_his_extract")
+def run_his_extract_task(self, extract_ids: Optional[List[int]] = None, target_data_source_id: Optional[int] = None):
+    """
+    执行HIS源表增量抽取（可由定时任务在夜间调用，提前搬运增量）
+
+    Args:
+        extract_ids: 抽取配置ID列表
+        target_data_source_id: 暂存库数据源ID，指定时抽取写入该库的所有启用配置
+    """
+    db = SessionLocal()
+    try:
+        results = {}
+        if target_data_source_id:
+            results.update(HisExtractService.run_for_targets(db, [target_data_source_id]))
+        for extract_id in extract_ids or []:
+            results[str(extract_id)] = HisExtractService.extract_table(db, extract_id)
+        return {"success": True, "rows": results}
+    finally:
+        db.close()
@@ -0,0 +1,68 @@
+"""
+模型版本复制 Celery 任务
+"""
+from typing import Optional
+
+from app.celery_app import celery_app
+from app.database import SessionLocal
+from app.models.model_version import ModelVersion
+from app.services.model_version_copy_service import ModelVersionCopyService
+from app.services.model_version_import_service import ModelVersionImportService
+
+
+@celery_app.task(bind=True, max_retries=0, name="copy_model_version")
+def copy_model_version_task(
+    self,
+    source_version_id: int,
+    target_version_id: int,
+    import_type: Optional[str] = None,
+    user_id: Optional[int] = None
+):
+    """
+    后台复制模型版本内容
+
+    目标版本已由接口创建并以 copying 状态提交，复制完成后清除该状态；
+    复制失败时删除目标版本，不留下不完整的版本。
+
+    Args:
+        source_version_id: 源版本ID
+        target_version_id: 目标版本ID
+        import_type: 导入类型（structure_only/with_workflows），为空时按基础版本复制（节点和学科规则）
+        user_id: 导入用户ID（导入时记录导入历史）
+    """
+    def progress_callback(current: int, total: int, status: str):
+        self.update_state(
+            state='PROCESSING',
+            meta={'current': current, 'total': total, 'status': status}
+        )
+
+    db = SessionLocal()
+    try:
+        if import_type:
+            result = ModelVersionImportService(db).copy_version_content(
+                source_version_id=source_version_id,
+                target_version_id=target_version_id,
+                import_type=import_type,
+                user_id=user_id,
+                progress_callback=progress_callback
+            )
+        else:
+            copy_service = ModelVersionCopyService(db, progress_callback)
+            statistics = copy_service.copy_version(
+                source_version_id,
+                target_version_id,
+                copy_discipline_rules=True
+            )
+            result = {"id": target_version_id, "statistics": statistics, "warnings": copy_service.warnings}
+        db.query(ModelVersion).filter(ModelVersion.id == target_version_id).update(
+            {"copy_status": None}, synchronize_session=False
+        )
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        db.query(ModelVersion).filter(ModelVersion.id == target_version_id).delete()
+        db.commit()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,129 @@
+"""
+字符 n-gram TF-IDF 建议索引
+
+智能导入为导入值（维度预案、科室名称等）推荐系统中的维度或科室时，
+先对候选项的文本字段（名称、编码）建立倒排索引，再为每个导入值计算相似度：
+
+- 文本统一转小写，切分为单字和两侧补空格后的相邻二字（"内科" -> 内、科、" 内"、"内科"、"科 "）
+- 词权重为 TF-IDF：tf 为出现次数，idf = ln((1 + N) / (1 + df)) + 1，
+  N 为所有候选项的字段数，df 为包含该 n-gram 的字段数；索引中没有的 n-gram 按 df = 0 计算，
+  计入导入值的向量长度，多余的字符会降低相似度
+- 字段相似度为两个向量的余弦值（0 到 1），候选项的相似度取各字段的最大值
+
+导入值只与倒排表中共享 n-gram 的候选项累加点积（稀疏矩阵乘法），
+与候选项没有任何公共字符时相似度为 0，不参与评分。
+调用方在相似度基础上按各自规则加分（如包含关系），得分超过阈值的按得分从高到低取前 N 个，
+得分相同时保持候选项的原始顺序。
+"""
+import math
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+
+def text_ngrams(text: str) -> Counter:
+    """切分单字和相邻二字（两侧补空格）"""
+    text = (text or "").lower().strip()
+    if not text:
+        return Counter()
+    padded = f" {text} "
+    grams = Counter(text)
+    grams.update(padded[i:i + 2] for i in range(len(padded) - 1))
+    return grams
+
+
+class NgramSuggestionIndex:
+    """候选项的 n-gram TF-IDF 倒排索引"""
+
+    def __init__(self, candidates: Sequence[Dict[str, Any]], fields: Sequence[str] = ("name", "code")):
+        """
+        Args:
+            candidates: 候选项列表（如维度、科室）
+            fields: 参与相似度计算的文本字段
+        """
+        self.candidates = list(candidates)
+        self.fields = tuple(fields)
+
+        documents = []  # [(候选项序号, 字段序号, n-gram 计数)]
+        document_frequency = Counter()
+        for position, candidate in enumerate(self.candidates):
+            for field_index, field in enumerate(self.fields):
+                grams = text_ngrams(str(candidate.get(field) or ""))
+                if grams:
+                    documents.append((position, field_index, grams))
+                    document_frequency.update(grams.keys())
+
+        self._document_count = len(documents)
+        self._idf = {
+            gram: self._smooth_idf(df) for gram, df in document_frequency.items()
+        }
+
+        # 倒排表：{n-gram: [(候选项序号, 字段序号, 归一化权重), ...]}
+        self._postings: Dict[str, List[tuple]] = defaultdict(list)
+        for position, field_index, grams in documents:
+            weights = {gram: count * self._idf[gram] for gram, count in grams.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+            for gram, weight in weights.items():
+                self._postings[gram].append((position, field_index, weight / norm))
+
+    def _smooth_idf(self, df: int) -> float:
+        return math.log((1 + self._document_count) / (1 + df)) + 1
+
+    def similarities(self, value: str) -> Dict[int, float]:
+        """
+        计算导入值与候选项的相似度
+
+        Returns:
+            {候选项序号: 相似度}，只包含相似度大于 0 的候选项
+        """
+        grams = text_ngrams(value)
+        if not grams:
+            return {}
+
+        unseen_idf = self._smooth_idf(0)
+        weights = {gram: count * self._idf.get(gram, unseen_idf) for gram, count in grams.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+
+        # 每个字段分别累加点积
+        dot_products: Dict[tuple, float] = defaultdict(float)
+        for gram, weight in weights.items():
+            for position, field_index, document_weight in self._postings.get(gram, ()):
+                dot_products[(position, field_index)] += weight * document_weight
+
+        similarities: Dict[int, float] = {}
+        for (position, _), dot_product in dot_products.items():
+            similarity = min(dot_product / norm, 1.0)
+            if similarity > similarities.get(position, 0.0):
+                similarities[position] = similarity
+        return similarities
+
+    def suggest(
+        self,
+        value: str,
+        limit: int = 5,
+        threshold: float = 0.3,
+        score: Optional[Callable[[str, Dict[str, Any], float], float]] = None
+    ) -> List[tuple]:
+        """
+        为导入值推荐候选项
+
+        Args:
+            value: 导入值
+            limit: 返回的候选项数
+            threshold: 得分阈值（大于该值才返回）
+            score: 评分函数 (导入值, 候选项, 相似度) -> 得分，默认为相似度
+
+        Returns:
+            [(候选项, 得分), ...]，按得分从高到低排序
+        """
+        scored = []
+        for position, similarity in sorted(self.similarities(value).items()):
+            candidate = self.candidates[position]
+            candidate_score = score(value, candidate, similarity) if score else similarity
+            if candidate_score > threshold:
+                scored.append((candidate, candidate_score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def suggest_many(self, values: Iterable[str], **kwargs) -> Dict[str, List[tuple]]:
+        """批量推荐（相同的导入值只计算一次）"""
+        return {value: self.suggest(value, **kwargs) for value in dict.fromkeys(values)}
@@ -0,0 +1,71 @@
+"""
+令牌桶限流器
+
+按固定速率发放令牌，调用方取得令牌后才能发起请求；桶容量决定允许的突发调用数。
+另可设置令牌总量（如当日剩余调用额度），用完后 acquire 返回 False。
+多个线程共享同一个限流器时，请求的发起间隔仍不小于 1/速率。
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int = 1,
+        limit: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        Args:
+            rate: 每秒发放的令牌数
+            capacity: 桶容量（允许的突发调用数），初始为满
+            limit: 令牌总量，None 表示不限制
+            clock: 单调时钟（测试时可替换）
+            sleep: 等待函数（测试时可替换）
+        """
+        if rate <= 0:
+            raise ValueError("限流速率必须大于0")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.remaining = limit
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.capacity)
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_call_delay(cls, call_delay: float, limit: Optional[int] = None, **kwargs) -> "TokenBucket":
+        """按调用间隔（秒）创建：每 call_delay 秒发放一个令牌，不允许突发"""
+        return cls(rate=1.0 / max(call_delay, 0.001), capacity=1, limit=limit, **kwargs)
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self) -> bool:
+        """
+        取得一个令牌，令牌不足时等待
+
+        Returns:
+            令牌总量已用完时返回 False
+        """
+        while True:
+            with self._lock:
+                if self.remaining is not None and self.remaining <= 0:
+                    return False
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
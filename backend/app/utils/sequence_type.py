@@ -0,0 +1,45 @@
+"""
+序列类别工具
+
+序列节点通过 sequence_type 标记类别（医生/护理/医技），汇总计算和报表按该字段归类。
+"""
+from typing import Optional
+
+
+SEQUENCE_TYPE_DOCTOR = "doctor"
+SEQUENCE_TYPE_NURSE = "nurse"
+SEQUENCE_TYPE_TECH = "tech"
+
+SEQUENCE_TYPES = (SEQUENCE_TYPE_DOCTOR, SEQUENCE_TYPE_NURSE, SEQUENCE_TYPE_TECH)
+
+# 按优先级匹配：先匹配主关键字，再匹配别名和英文名称（英文不区分大小写）
+_SEQUENCE_KEYWORDS = [
+    ("医生", SEQUENCE_TYPE_DOCTOR),
+    ("护理", SEQUENCE_TYPE_NURSE),
+    ("医技", SEQUENCE_TYPE_TECH),
+    ("医师", SEQUENCE_TYPE_DOCTOR),
+    ("医疗", SEQUENCE_TYPE_DOCTOR),
+    ("护士", SEQUENCE_TYPE_NURSE),
+    ("技师", SEQUENCE_TYPE_TECH),
+    ("doctor", SEQUENCE_TYPE_DOCTOR),
+    ("physician", SEQUENCE_TYPE_DOCTOR),
+    ("nurse", SEQUENCE_TYPE_NURSE),
+    ("nursing", SEQUENCE_TYPE_NURSE),
+    ("tech", SEQUENCE_TYPE_TECH),
+]
+
+
+def infer_sequence_type(name: Optional[str]) -> Optional[str]:
+    """
+    根据序列名称推断序列类别（仅在创建节点且未指定类别时使用）
+
+    Returns:
+        doctor/nurse/tech，无法推断时返回 None
+    """
+    if not name:
+        return None
+    name = name.lower()
+    for keyword, sequence_type in _SEQUENCE_KEYWORDS:
+        if keyword in name:
+            return sequence_type
+    return None
@@ -0,0 +1,165 @@
+"""
+流式表格读取工具
+
+导入服务读取上传的 Excel（.xlsx）或 CSV 文件时逐行产出，不把整个工作表读入内存：
+- Excel 使用 openpyxl 只读模式逐行读取，读取结束后关闭工作簿
+- CSV 按文件内容识别（不是 ZIP 格式即按文本处理），编码依次尝试 UTF-8（含 BOM）和 GB18030，
+  空单元格读取为 None，与 Excel 一致
+
+iter_sheet_rows 逐行产出数据行，scan_rows 一次遍历得到表头、预览行和行数，
+内存占用与文件行数无关。
+"""
+import codecs
+import csv
+import io
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import openpyxl
+
+
+# CSV 文件的工作表名称
+CSV_SHEET_NAME = "CSV"
+
+# 识别 CSV 编码时检查的字节数（分块解码）
+_ENCODING_SAMPLE_SIZE = 1024 * 1024
+_ENCODING_CHUNK_SIZE = 64 * 1024
+
+_ZIP_MAGIC = b"PK\x03\x04"
+_OLE_MAGIC = b"\xd0\xcf\x11\xe0"  # Excel 97-2003（.xls）
+
+
+def _detect_encoding(file_content: bytes) -> str:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for start in range(0, min(len(file_content), _ENCODING_SAMPLE_SIZE), _ENCODING_CHUNK_SIZE):
+            decoder.decode(file_content[start:start + _ENCODING_CHUNK_SIZE], final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "gb18030"
+
+
+class SpreadsheetReader:
+    """
+    流式读取 Excel 或 CSV 文件
+    
+    用法：
+        with SpreadsheetReader(file_content, sheet_name) as reader:
+            for row in reader.iter_rows(skip_rows=1):
+                ...
+    """
+
+    def __init__(self, file_content: bytes, sheet_name: Optional[str] = None):
+        """
+        Args:
+            file_content: 文件内容
+            sheet_name: 工作表名称（不存在时使用活动工作表，CSV 忽略）
+        
+        Raises:
+            ValueError: 文件为空或格式无法识别
+        """
+        if not file_content:
+            raise ValueError("文件内容为空")
+
+        self._file_content = file_content
+        self._workbook = None
+        self._worksheet = None
+
+        if file_content.startswith(_ZIP_MAGIC):
+            try:
+                self._workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True)
+            except Exception as e:
+                raise ValueError(f"无法读取 Excel 文件: {str(e)}")
+            self.sheet_names = self._workbook.sheetnames
+            if sheet_name and sheet_name in self.sheet_names:
+                self._worksheet = self._workbook[sheet_name]
+            else:
+                self._worksheet = self._workbook.active
+            self.sheet_name = self._worksheet.title
+        else:
+            if file_content.startswith(_OLE_MAGIC) or b"\x00" in file_content[:4096]:
+                raise ValueError("文件格式错误，请上传有效的 Excel 文件（.xlsx 格式）或 CSV 文件")
+            self.sheet_names = [CSV_SHEET_NAME]
+            self.sheet_name = CSV_SHEET_NAME
+
+    @property
+    def is_csv(self) -> bool:
+        return self._workbook is None
+
+    def _iter_csv(self) -> Iterator[tuple]:
+        text = io.TextIOWrapper(
+            io.BytesIO(self._file_content),
+            encoding=_detect_encoding(self._file_content),
+            errors="replace",
+            newline=""
+        )
+        for row in csv.reader(text):
+            yield tuple(value if value != "" else None for value in row)
+
+    def iter_rows(self, skip_rows: int = 0) -> Iterator[tuple]:
+        """
+        逐行读取单元格值
+        
+        Args:
+            skip_rows: 跳过前N行
+        """
+        if self.is_csv:
+            rows = self._iter_csv()
+        else:
+            rows = self._worksheet.iter_rows(values_only=True)
+        return islice(rows, skip_rows, None)
+
+    def count_rows(self, skip_rows: int = 0) -> int:
+        """统计行数（遍历一次，不保留数据）"""
+        return sum(1 for _ in self.iter_rows(skip_rows))
+
+    def close(self) -> None:
+        if self._workbook is not None:
+            self._workbook.close()
+
+    def __enter__(self) -> "SpreadsheetReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def iter_sheet_rows(file_content: bytes, sheet_name: Optional[str] = None, skip_rows: int = 0) -> Iterator[tuple]:
+    """逐行读取文件（遍历结束或迭代器关闭时释放工作簿）"""
+    with SpreadsheetReader(file_content, sheet_name) as reader:
+        yield from reader.iter_rows(skip_rows)
+
+
+def scan_rows(rows: Iterable[tuple], header_index: int = 0, preview_count: int = 10) -> Dict[str, Any]:
+    """
+    一次遍历得到表头、预览行和行数
+    
+    Args:
+        rows: 行迭代器
+        header_index: 表头所在行（从0开始）
+        preview_count: 保留的预览行数（表头之后）
+    
+    Returns:
+        {
+            "header": 表头行（行数不足时为 None）,
+            "preview_rows": [表头之后的前N行],
+            "total_rows": 总行数,
+            "data_rows": 表头之后的行数
+        }
+    """
+    header = None
+    preview_rows: List[tuple] = []
+    total_rows = 0
+    for index, row in enumerate(rows):
+        total_rows += 1
+        if index == header_index:
+            header = row
+        elif index > header_index and len(preview_rows) < preview_count:
+            preview_rows.append(row)
+
+    return {
+        "header": header,
+        "preview_rows": preview_rows,
+        "total_rows": total_rows,
+        "data_rows": max(total_rows - header_index - 1, 0)
+    }
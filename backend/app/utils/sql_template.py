@@ -0,0 +1,381 @@
+"""
+SQL模板编译工具
+
+计算步骤代码中的占位符（{task_id}、{hospital_id}、{current_year_month} 等）
+按所在位置编译为绑定参数或文本替换：
+- 完整的字符串字面量 '{task_id}'：编译为字符串绑定参数 :task_id
+- 独立的数值占位符 {hospital_id}：编译为数值绑定参数 :hospital_id_num（批量模式科室ID为 NULL）
+- 其他位置（字面量的一部分 '{period}-01'、类型字面量 DATE '{end_date}'、
+  标识符、注释、$$ 函数体）：执行时做文本替换，字符串字面量内的值会转义单引号
+
+编译结果按步骤版本缓存，同一步骤在各科室执行时语句文本不变，
+数据源（尤其是 SQL Server、Oracle）可以复用执行计划。
+语句按分号拆分时忽略字符串、标识符、注释和 $$ 函数体中的分号。
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+
+# 支持的占位符
+PLACEHOLDERS = {
+    "current_year_month", "period", "year_month",
+    "hospital_id", "department_id", "department_code", "department_name",
+    "cost_center_code", "cost_center_name", "accounting_unit_code", "accounting_unit_name",
+    "year", "month", "start_date", "end_date",
+    "task_id", "version_id",
+}
+
+# 独立出现时作为数值绑定的占位符
+NUMERIC_PLACEHOLDERS = {"hospital_id", "department_id", "version_id", "year", "month"}
+
+# 这些关键字后的字符串是类型字面量（如 DATE '2025-01-31'），不能替换为绑定参数
+_TYPED_LITERAL_KEYWORDS = {"DATE", "TIME", "TIMESTAMP", "TIMESTAMPTZ", "INTERVAL"}
+
+_PLACEHOLDER_PATTERN = re.compile(r"\{([a-z_]+)\}")
+_DOLLAR_TAG_PATTERN = re.compile(r"\$(?:[A-Za-z_]\w*)?\$")
+_COLON_PATTERN = re.compile(r"(?<![:\w\\]):(?=\w)")
+_WORD_BEFORE_PATTERN = re.compile(r"([A-Za-z_]\w*)\s*$")
+# 判断语句类型时去掉注释、字符串、带引号的标识符和 $$ 函数体
+_NON_CODE_PATTERN = re.compile(
+    r"--[^\n]*|/\*.*?(?:\*/|$)|'(?:[^']|'')*'?|\"[^\"]*\"?|\$(\w*)\$.*?(?:\$\1\$|$)", re.S
+)
+_KEYWORD_PATTERN = re.compile(r"[()]|[A-Za-z_]\w*")
+# 可用服务端游标读取结果集的查询语句；WITH 语句取 CTE 之后的主语句判断
+_QUERY_KEYWORDS = {"SELECT", "VALUES", "TABLE"}
+_MAIN_STATEMENT_KEYWORDS = {"SELECT", "VALUES", "TABLE", "INSERT", "UPDATE", "DELETE", "MERGE"}
+
+# 编译缓存：{(步骤ID, 更新时间): CompiledSqlTemplate}
+_CACHE_SIZE = 256
+_cache: "OrderedDict[tuple, CompiledSqlTemplate]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _escape_colons(sql: str) -> str:
+    """转义会被 text() 误识别为绑定参数的冒号（如字符串中的 ' :abc'）"""
+    return _COLON_PATTERN.sub(r"\\:", sql)
+
+
+def _string_value(value) -> str:
+    # 与原文本替换一致：批量模式的科室ID替换为 NULL
+    return "NULL" if value is None else str(value)
+
+
+def _numeric_value(value):
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+class CompiledStatement:
+    """编译后的单条语句
+
+    parts 由以下片段组成：
+    - ("sql", 文本)
+    - ("bind", 占位符, 是否数值)
+    - ("value", 占位符, 是否在字符串字面量内)
+
+    is_query 表示语句为查询，执行时可用服务端游标按批读取结果集
+    """
+
+    def __init__(self, parts: List[tuple]):
+        self.parts = parts
+        self.is_static = not any(part[0] == "value" for part in parts)
+        self.is_query = _is_query("".join(part[1] if part[0] == "sql" else " 0 " for part in parts))
+        self._clause = text(self._build_sql({})) if self.is_static else None
+
+    def _build_sql(self, params: dict) -> str:
+        chunks = []
+        for part in self.parts:
+            if part[0] == "sql":
+                chunks.append(_escape_colons(part[1]))
+            elif part[0] == "bind":
+                chunks.append(":" + _bind_name(part[1], part[2]))
+            else:
+                value = _string_value(params.get(part[1]))
+                if part[2]:
+                    value = value.replace("'", "''")
+                chunks.append(_escape_colons(value))
+        return "".join(chunks)
+
+    def to_clause(self, params: dict, prefix: str = ""):
+        """生成可执行的 text() 语句并绑定参数
+
+        Args:
+            prefix: 语句前缀（如 EXPLAIN），有前缀时不使用缓存的语句
+        """
+        if prefix:
+            clause = text(prefix + self._build_sql(params))
+        else:
+            clause = self._clause if self.is_static else text(self._build_sql(params))
+        binds = {}
+        for part in self.parts:
+            if part[0] == "bind":
+                value = params.get(part[1])
+                if part[2]:
+                    binds[_bind_name(part[1], part[2])] = _numeric_value(value)
+                else:
+                    binds[_bind_name(part[1], part[2])] = None if value is None else str(value)
+        return clause.bindparams(**binds) if binds else clause
+
+    def label(self, max_length: int = 200) -> str:
+        """语句摘要：占位符保留为 {名称}，同一步骤在各科室执行时摘要相同"""
+        chunks = [part[1] if part[0] == "sql" else "{" + part[1] + "}" for part in self.parts]
+        label = " ".join("".join(chunks).split())
+        return label if len(label) <= max_length else label[:max_length - 3] + "..."
+
+    def render_literal(self, params: dict) -> str:
+        """将所有占位符替换为字面值（用于日志、指纹和表引用分析）"""
+        chunks = []
+        for part in self.parts:
+            if part[0] == "sql":
+                chunks.append(part[1])
+            elif part[0] == "bind":
+                value = params.get(part[1])
+                if part[2]:
+                    value = _numeric_value(value)
+                    chunks.append("NULL" if value is None else str(value))
+                elif value is None:
+                    chunks.append("NULL")
+                else:
+                    chunks.append("'" + str(value).replace("'", "''") + "'")
+            else:
+                value = _string_value(params.get(part[1]))
+                chunks.append(value.replace("'", "''") if part[2] else value)
+        return "".join(chunks)
+
+
+def _is_query(sql: str) -> bool:
+    """语句是否为查询（SELECT / WITH ... SELECT / VALUES / TABLE），SELECT ... INTO 建表不算"""
+    tokens = _KEYWORD_PATTERN.findall(_NON_CODE_PATTERN.sub(" ", sql))
+    depth = 0
+    base_depth = None
+    main = None
+    for token in tokens:
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif base_depth is None:
+            # 语句开头的括号（如 (SELECT ...) UNION ...）不影响判断
+            base_depth = depth
+            main = None if token.upper() == "WITH" else token.upper()
+        elif depth <= base_depth:
+            keyword = token.upper()
+            if main is None and keyword in _MAIN_STATEMENT_KEYWORDS:
+                main = keyword
+            elif main == "SELECT" and keyword == "INTO":
+                return False
+    return main in _QUERY_KEYWORDS
+
+
+def _bind_name(placeholder: str, numeric: bool) -> str:
+    return f"{placeholder}_num" if numeric else placeholder
+
+
+class CompiledSqlTemplate:
+    """编译后的SQL模板（多条语句）"""
+
+    def __init__(self, source: str, statements: List[CompiledStatement]):
+        self.source = source
+        self.statements = statements
+
+    def render_literal(self, params: dict) -> str:
+        return ";\n".join(statement.render_literal(params) for statement in self.statements)
+
+
+def _split_placeholders(segment: str, in_string: bool) -> List[tuple]:
+    """将文本片段中的占位符拆分为文本替换片段"""
+    parts = []
+    pos = 0
+    for match in _PLACEHOLDER_PATTERN.finditer(segment):
+        if match.group(1) not in PLACEHOLDERS:
+            continue
+        if match.start() > pos:
+            parts.append(("sql", segment[pos:match.start()]))
+        parts.append(("value", match.group(1), in_string))
+        pos = match.end()
+    if pos < len(segment):
+        parts.append(("sql", segment[pos:]))
+    return parts
+
+
+def _code_parts(segment: str) -> List[tuple]:
+    """处理代码区域：独立的数值占位符编译为数值绑定，其余做文本替换"""
+    parts = []
+    pos = 0
+    for match in _PLACEHOLDER_PATTERN.finditer(segment):
+        name = match.group(1)
+        if name not in PLACEHOLDERS:
+            continue
+        before = segment[match.start() - 1] if match.start() > 0 else " "
+        after = segment[match.end()] if match.end() < len(segment) else " "
+        standalone = not re.match(r"[\w\"'$.]", before) and not re.match(r"[\w\"'$]", after)
+        if match.start() > pos:
+            parts.append(("sql", segment[pos:match.start()]))
+        if name in NUMERIC_PLACEHOLDERS and standalone:
+            parts.append(("bind", name, True))
+            if after == ":":
+                # :name::type 会被 text() 误解析，绑定参数后补空格
+                parts.append(("sql", " "))
+        else:
+            parts.append(("value", name, False))
+        pos = match.end()
+    if pos < len(segment):
+        parts.append(("sql", segment[pos:]))
+    return parts
+
+
+def _string_literal_parts(literal: str, preceding: str) -> List[tuple]:
+    """处理单引号字符串字面量（含两侧引号）"""
+    content = literal[1:-1]
+    match = _PLACEHOLDER_PATTERN.fullmatch(content)
+    word_before = _WORD_BEFORE_PATTERN.search(preceding)
+    prefixed = bool(preceding) and (preceding[-1].isalnum() or preceding[-1] in "_&")
+    typed = bool(word_before) and word_before.group(1).upper() in _TYPED_LITERAL_KEYWORDS
+    if match and match.group(1) in PLACEHOLDERS and not prefixed and not typed:
+        return [("bind", match.group(1), False)]
+    return _split_placeholders(literal, True)
+
+
+def compile_sql_template(code: str) -> CompiledSqlTemplate:
+    """
+    编译SQL模板
+
+    Args:
+        code: 步骤代码（可包含多条以分号分隔的语句）
+
+    Returns:
+        编译后的模板，纯注释的语句会被丢弃
+    """
+    statements: List[CompiledStatement] = []
+    parts: List[tuple] = []
+    has_content = False
+    code_start = 0
+    i = 0
+    n = len(code)
+
+    def flush_code(end: int):
+        nonlocal has_content
+        segment = code[code_start:end]
+        if segment.strip():
+            has_content = True
+        parts.extend(_code_parts(segment))
+
+    def finish_statement():
+        nonlocal parts, has_content
+        if has_content:
+            # 去掉首尾空白，与拆分前的行为一致
+            while parts and parts[0][0] == "sql" and not parts[0][1].strip():
+                parts.pop(0)
+            if parts and parts[0][0] == "sql":
+                parts[0] = ("sql", parts[0][1].lstrip())
+            while parts and parts[-1][0] == "sql" and not parts[-1][1].strip():
+                parts.pop()
+            if parts and parts[-1][0] == "sql":
+                parts[-1] = ("sql", parts[-1][1].rstrip())
+            statements.append(CompiledStatement(_merge_sql_parts(parts)))
+        parts = []
+        has_content = False
+
+    while i < n:
+        ch = code[i]
+        nxt = code[i + 1] if i + 1 < n else ""
+
+        if ch == "-" and nxt == "-":
+            flush_code(i)
+            end = code.find("\n", i)
+            end = n if end == -1 else end
+            parts.extend(_split_placeholders(code[i:end], False))
+            i = code_start = end
+        elif ch == "/" and nxt == "*":
+            flush_code(i)
+            end = code.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+            parts.extend(_split_placeholders(code[i:end], False))
+            i = code_start = end
+        elif ch == "'":
+            flush_code(i)
+            j = i + 1
+            while j < n:
+                if code[j] == "'":
+                    if j + 1 < n and code[j + 1] == "'":
+                        j += 2
+                        continue
+                    break
+                j += 1
+            end = min(j + 1, n)
+            parts.extend(_string_literal_parts(code[i:end], code[max(0, i - 20):i]))
+            has_content = True
+            i = code_start = end
+        elif ch == '"':
+            flush_code(i)
+            end = code.find('"', i + 1)
+            end = n if end == -1 else end + 1
+            parts.extend(_split_placeholders(code[i:end], False))
+            has_content = True
+            i = code_start = end
+        elif ch == "$" and (i == 0 or not (code[i - 1].isalnum() or code[i - 1] == "_")) \
+                and _DOLLAR_TAG_PATTERN.match(code, i):
+            flush_code(i)
+            tag = _DOLLAR_TAG_PATTERN.match(code, i).group(0)
+            end = code.find(tag, i + len(tag))
+            end = n if end == -1 else end + len(tag)
+            parts.extend(_split_placeholders(code[i:end], False))
+            has_content = True
+            i = code_start = end
+        elif ch == ";":
+            flush_code(i)
+            finish_statement()
+            i = code_start = i + 1
+        else:
+            i += 1
+
+    flush_code(n)
+    finish_statement()
+    return CompiledSqlTemplate(code, statements)
+
+
+def referenced_placeholders(code: str) -> Set[str]:
+    """步骤代码中引用的占位符"""
+    return {name for name in _PLACEHOLDER_PATTERN.findall(code) if name in PLACEHOLDERS}
+
+
+def _merge_sql_parts(parts: List[tuple]) -> List[tuple]:
+    """合并相邻的文本片段"""
+    merged: List[tuple] = []
+    for part in parts:
+        if part[0] == "sql" and merged and merged[-1][0] == "sql":
+            merged[-1] = ("sql", merged[-1][1] + part[1])
+        elif part[0] != "sql" or part[1]:
+            merged.append(part)
+    return merged
+
+
+def get_compiled_template(cache_key: Optional[Tuple], code: str) -> CompiledSqlTemplate:
+    """
+    获取编译后的模板（按步骤版本缓存）
+
+    Args:
+        cache_key: 缓存键，通常为 (步骤ID, 更新时间)；为 None 时不缓存
+        code: 步骤代码
+    """
+    if cache_key is None:
+        return compile_sql_template(code)
+
+    with _cache_lock:
+        compiled = _cache.get(cache_key)
+        if compiled is not None and compiled.source == code:
+            _cache.move_to_end(cache_key)
+            return compiled
+
+    compiled = compile_sql_template(code)
+    with _cache_lock:
+        _cache[cache_key] = compiled
+        _cache.move_to_end(cache_key)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
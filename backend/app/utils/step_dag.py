@@ -0,0 +1,130 @@
+"""
+计算步骤依赖图工具
+
+步骤通过 depends_on 声明依赖关系：
+- depends_on 为 None：依赖所有排序在前的步骤（与原有的串行语义一致）
+- depends_on 为 []：不依赖任何步骤，可与其他步骤并发执行
+- depends_on 为步骤ID列表：仅依赖列出的步骤
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+
+def build_step_dependencies(steps: Iterable) -> Dict[int, Set[int]]:
+    """
+    构建步骤依赖图
+
+    Args:
+        steps: 按 sort_order 排序的步骤列表（需有 id 和 depends_on 属性）
+
+    Returns:
+        {步骤ID: 依赖的步骤ID集合}，引用未在列表中的步骤（如已禁用）会被忽略
+
+    Raises:
+        ValueError: 依赖关系存在环
+    """
+    dependencies: Dict[int, Set[int]] = {}
+    step_ids = [step.id for step in steps]
+    known_ids = set(step_ids)
+    previous: List[int] = []
+
+    for step in steps:
+        if step.depends_on is None:
+            dependencies[step.id] = set(previous)
+        else:
+            dependencies[step.id] = {
+                dep_id for dep_id in step.depends_on
+                if dep_id in known_ids and dep_id != step.id
+            }
+        previous.append(step.id)
+
+    topological_order(step_ids, dependencies)
+    return dependencies
+
+
+def topological_order(step_ids: List[int], dependencies: Dict[int, Set[int]]) -> List[int]:
+    """
+    按依赖关系排序（同层内保持原有顺序）
+
+    Raises:
+        ValueError: 依赖关系存在环
+    """
+    remaining = {step_id: set(dependencies.get(step_id, ())) for step_id in step_ids}
+    ordered: List[int] = []
+
+    while remaining:
+        ready = [step_id for step_id in step_ids if step_id in remaining and not remaining[step_id]]
+        if not ready:
+            raise ValueError(f"计算步骤依赖关系存在循环: {sorted(remaining.keys())}")
+        for step_id in ready:
+            del remaining[step_id]
+            ordered.append(step_id)
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+    return ordered
+
+
+def run_step_dag(
+    step_ids: List[int],
+    dependencies: Dict[int, Set[int]],
+    run_step: Callable[[int], None],
+    max_workers: int = 4
+):
+    """
+    按依赖图并发执行步骤
+
+    依赖全部完成的步骤会立即提交执行，最多同时执行 max_workers 个。
+    任一步骤失败后不再提交新步骤，等待已提交的步骤结束后抛出第一个异常。
+
+    Args:
+        step_ids: 步骤ID列表（决定同时就绪时的提交顺序）
+        dependencies: build_step_dependencies 的返回值
+        run_step: 执行单个步骤的函数，在工作线程中调用
+        max_workers: 最大并发数
+    """
+    remaining = {step_id: set(dependencies.get(step_id, ())) for step_id in step_ids}
+    running = {}
+    first_error = None
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        def submit_ready():
+            for step_id in step_ids:
+                if step_id in remaining and not remaining[step_id]:
+                    del remaining[step_id]
+                    running[executor.submit(run_step, step_id)] = step_id
+
+        submit_ready()
+        while running:
+            finished, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for future in finished:
+                step_id = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    if first_error is None:
+                        first_error = error
+                    continue
+                for deps in remaining.values():
+                    deps.discard(step_id)
+            if first_error is None:
+                submit_ready()
+
+    if first_error is not None:
+        raise first_error
+    if remaining:
+        raise ValueError(f"计算步骤依赖关系存在循环: {sorted(remaining.keys())}")
+
+
+def remap_step_dependencies(step_pairs: List[Tuple]):
+    """
+    复制流程后重映射步骤依赖
+
+    Args:
+        step_pairs: [(源步骤, 新步骤)]，新步骤须已 flush 获得ID
+    """
+    id_map = {source.id: target.id for source, target in step_pairs}
+    for source, target in step_pairs:
+        if source.depends_on is None:
+            target.depends_on = None
+        else:
+            target.depends_on = [id_map[dep_id] for dep_id in source.depends_on if dep_id in id_map]
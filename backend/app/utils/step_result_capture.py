@@ -0,0 +1,215 @@
+"""
+计算步骤结果采集工具
+
+步骤最后一条语句返回结果集时，按批读取（服务端游标），不把整个结果集载入内存：
+- 保留前 N 行作为样本，记录总行数和各列统计（非空数、最小值、最大值、数值列合计）
+- 可选将完整结果集按列写入压缩文件（ZIP，每列一个 JSON Lines 条目），
+  日志中只记录样本、统计和文件路径
+"""
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional
+
+
+def to_json_value(value: Any) -> Any:
+    """转换为可写入 JSONB 的值"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return value
+
+
+class _ColumnStats:
+    """单列统计"""
+
+    __slots__ = ("non_null", "min", "max", "sum", "comparable", "numeric")
+
+    def __init__(self):
+        self.non_null = 0
+        self.min = None
+        self.max = None
+        self.sum = Decimal(0)
+        self.comparable = True
+        self.numeric = True
+
+    def add(self, value: Any):
+        if value is None:
+            return
+        self.non_null += 1
+
+        if self.numeric:
+            if isinstance(value, (int, Decimal)) and not isinstance(value, bool):
+                self.sum += value
+            elif isinstance(value, float):
+                self.sum += Decimal(repr(value))
+            else:
+                self.numeric = False
+
+        if self.comparable:
+            try:
+                if self.min is None or value < self.min:
+                    self.min = value
+                if self.max is None or value > self.max:
+                    self.max = value
+            except TypeError:
+                # 同一列出现不可比较的类型时不再统计最值
+                self.comparable = False
+                self.min = self.max = None
+
+    def to_dict(self) -> dict:
+        stats = {"non_null": self.non_null}
+        if self.comparable and self.non_null:
+            stats["min"] = to_json_value(self.min)
+            stats["max"] = to_json_value(self.max)
+        if self.numeric and self.non_null:
+            stats["sum"] = float(self.sum)
+        return stats
+
+
+class StepResultCapture:
+    """
+    流式采集步骤结果集
+
+    Args:
+        sample_rows: 保留的样本行数
+        spill_path: 完整结果集的写入路径（.zip），为空时不写文件
+        fetch_size: 每批读取的行数
+    """
+
+    def __init__(self, sample_rows: int = 100, spill_path: Optional[str] = None, fetch_size: int = 5000):
+        self.sample_rows = sample_rows
+        self.fetch_size = fetch_size
+        self.spill_path = spill_path
+        self.spill_error: Optional[str] = None
+        self.columns: List[str] = []
+        self.rows: List[dict] = []
+        self.row_count = 0
+        self._stats: List[_ColumnStats] = []
+        self._spill_dir: Optional[str] = None
+        self._spill_files = []
+
+    def consume(self, result) -> "StepResultCapture":
+        """
+        按批读取结果集（结果集应以 stream_results/yield_per 执行）
+
+        读取完毕前不能提交事务，服务端游标在事务结束时关闭。
+        """
+        self.columns = list(result.keys())
+        self._stats = [_ColumnStats() for _ in self.columns]
+        self._open_spill()
+        try:
+            # 显式指定批大小，否则 partitions() 会一次读入全部结果
+            for batch in result.partitions(self.fetch_size):
+                self._add_batch(batch)
+            self._finish_spill()
+        finally:
+            self._cleanup_spill()
+        return self
+
+    def _add_batch(self, batch):
+        for row in batch:
+            if len(self.rows) < self.sample_rows:
+                self.rows.append({key: to_json_value(value) for key, value in row._mapping.items()})
+            for stats, value in zip(self._stats, row):
+                stats.add(value)
+        self.row_count += len(batch)
+
+        if self._spill_files:
+            try:
+                for index, handle in enumerate(self._spill_files):
+                    handle.write("".join(
+                        json.dumps(to_json_value(row[index]), ensure_ascii=False, default=str) + "\n"
+                        for row in batch
+                    ))
+            except OSError as e:
+                self._spill_failed(e)
+
+    def _open_spill(self):
+        if not self.spill_path:
+            return
+        try:
+            self._spill_dir = tempfile.mkdtemp(prefix="step_result_")
+            self._spill_files = [
+                open(os.path.join(self._spill_dir, f"col_{index:04d}.jsonl"), "w", encoding="utf-8")
+                for index in range(len(self.columns))
+            ]
+        except OSError as e:
+            self._spill_failed(e)
+
+    def _finish_spill(self):
+        """将各列临时文件逐个压缩写入ZIP，内存占用与列数据大小无关"""
+        if not self._spill_files:
+            return
+        try:
+            for handle in self._spill_files:
+                handle.close()
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            partial_path = self.spill_path + ".part"
+            with zipfile.ZipFile(partial_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr("manifest.json", json.dumps(
+                    {"columns": self.columns, "row_count": self.row_count},
+                    ensure_ascii=False
+                ))
+                for index, handle in enumerate(self._spill_files):
+                    with open(handle.name, "rb") as source, archive.open(f"col_{index:04d}.jsonl", "w") as target:
+                        shutil.copyfileobj(source, target)
+            os.replace(partial_path, self.spill_path)
+        except OSError as e:
+            if os.path.exists(self.spill_path + ".part"):
+                os.remove(self.spill_path + ".part")
+            self._spill_failed(e)
+
+    def _spill_failed(self, error: Exception):
+        # 写文件失败不影响步骤执行，只在结果中记录原因
+        self.spill_error = str(error)
+        self._close_spill_files()
+        print(f"[WARNING] 写入步骤结果文件失败: {self.spill_error}")
+
+    def _close_spill_files(self):
+        for handle in self._spill_files:
+            if not handle.closed:
+                handle.close()
+        self._spill_files = []
+
+    def _cleanup_spill(self):
+        self._close_spill_files()
+        if self._spill_dir:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def summary(self, total_affected: int = 0) -> Dict[str, Any]:
+        """生成写入步骤日志的结果摘要"""
+        summary = {
+            "columns": self.columns,
+            "rows": self.rows,
+            "row_count": self.row_count,
+            "sample_count": len(self.rows),
+            "truncated": self.row_count > len(self.rows),
+            "column_stats": {
+                column: stats.to_dict() for column, stats in zip(self.columns, self._stats)
+            },
+            "total_affected": total_affected,
+        }
+        if self.spill_path and not self.spill_error:
+            summary["result_file"] = self.spill_path
+        if self.spill_error:
+            summary["result_file_error"] = self.spill_error
+        return summary
+
+
+def iter_result_column(path: str, column: str) -> Iterator[Any]:
+    """逐行读取结果文件中的一列"""
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        index = manifest["columns"].index(column)
+        with archive.open(f"col_{index:04d}.jsonl") as handle:
+            for line in handle:
+                yield json.loads(line)
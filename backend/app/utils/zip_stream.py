@@ -0,0 +1,78 @@
+"""
+流式ZIP打包工具
+
+ZIP条目逐个写入、逐段产出，不在内存中保留整个压缩包，
+内存占用只与当前条目大小有关。输出流不可回退，条目使用数据描述符
+（data descriptor）记录CRC和长度，与常见解压工具兼容。
+"""
+import io
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+
+class _StreamBuffer(io.RawIOBase):
+    """只写缓冲区：记录已写出的偏移量，不支持回退"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def drain(self) -> bytes:
+        """取出自上次调用以来写入的数据"""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip_stream(
+    entries: Iterable[Tuple[str, bytes]],
+    compression: int = zipfile.ZIP_DEFLATED
+) -> Iterator[bytes]:
+    """
+    将 (文件名, 内容) 序列流式打包为ZIP
+
+    Args:
+        entries: 条目序列，可以是生成器，每产出一个条目即写入
+        compression: 压缩方式
+
+    Yields:
+        ZIP文件的字节片段
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for filename, content in entries:
+            archive.writestr(filename, content)
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    # 关闭时写入中央目录
+    chunk = buffer.drain()
+    if chunk:
+        yield chunk
+
+
+def write_zip_file(entries: Iterable[Tuple[str, bytes]], fileobj) -> int:
+    """
+    将条目流式打包写入文件对象
+
+    Returns:
+        写入的字节数
+    """
+    size = 0
+    for chunk in iter_zip_stream(entries):
+        fileobj.write(chunk)
+        size += len(chunk)
+    return size
@@ -7,6 +7,7 @@
 -- 输入参数(通过占位符):
 --   {hospital_id}   - 医疗机构ID (用于数据隔离,如果需要)
 --   {task_id}       - 任务ID (用于日志追踪)
+--   {current_year_month} - 计算月份 (YYYY-MM), 只加载该月份的收费明细
 --
 -- 输出: 插入到 charge_details 表
 --   patient_id           - 患者ID (来自BRZSY)
@@ -17,21 +18,22 @@
 --   quantity             - 数量 (来自MXXMSL)
 --   charge_time          - 收费时间 (来自FYFSSJ)
 --   business_type        - 业务类别 (门诊/住院)
+--   year_month           - 月份 (分区键, 来自FYFSSJ)
 --
 -- 数据来源:
 --   TB_MZ_SFMXB - 门诊收费明细表 (外部数据源)
 --   TB_ZY_SFMXB - 住院收费明细表 (外部数据源)
 --
 -- 注意事项:
---   1. 每次执行前会清空 charge_details 表的现有数据
+--   1. charge_details 按月份分区, 每次执行只重建本月分区, 其他月份的数据不受影响
 --   2. 不处理退费标志(TFBZ)和修改标志(XGBZ)
 --   3. 使用实收金额(MXXMSSJE)而非应收金额
---   4. 不在此步骤进行时间范围过滤(由后续步骤处理)
+--   4. 只加载计算月份的数据, 同一月份已由其他任务加载且源表未变化时, 计算引擎跳过本步骤
 -- ============================================================================
 
--- 第1步: 清空现有数据
--- 建议每次执行前清除,避免数据重复
-TRUNCATE TABLE charge_details;
+-- 第1步: 清空（或创建）本月分区
+-- 同一月份的加载串行执行, 不同月份可以同时计算
+SELECT prepare_charge_details_period('{current_year_month}');
 
 -- 第2步: 从门诊收费明细表插入数据
 -- 业务类别标记为 '门诊'
@@ -44,6 +46,7 @@ INSERT INTO charge_details (
     quantity,
     charge_time,
     business_type,
+    year_month,
     created_at
 )
 SELECT 
@@ -55,12 +58,14 @@ SELECT
     COALESCE("MXXMSL", 0) as quantity,
     "FYFSSJ" as charge_time,
     '门诊' as business_type,
+    '{current_year_month}' as year_month,
     NOW() as created_at
 FROM "TB_MZ_SFMXB"
 WHERE "BRZSY" IS NOT NULL
   AND "KDKSBM" IS NOT NULL
   AND "MXXMBM" IS NOT NULL
-  AND "FYFSSJ" IS NOT NULL;
+  AND "FYFSSJ" >= DATE '{start_date}'
+  AND "FYFSSJ" < DATE '{end_date}' + INTERVAL '1 day';
 
 -- 第3步: 从住院收费明细表插入数据
 -- 业务类别标记为 '住院'
@@ -73,6 +78,7 @@ INSERT INTO charge_details (
     quantity,
     charge_time,
     business_type,
+    year_month,
     created_at
 )
 SELECT 
@@ -84,12 +90,14 @@ SELECT
     COALESCE("MXXMSL", 0) as quantity,
     "FYFSSJ" as charge_time,
     '住院' as business_type,
+    '{current_year_month}' as year_month,
     NOW() as created_at
 FROM "TB_ZY_SFMXB"
 WHERE "BRZSY" IS NOT NULL
   AND "KDKSBM" IS NOT NULL
   AND "MXXMBM" IS NOT NULL
-  AND "FYFSSJ" IS NOT NULL;
+  AND "FYFSSJ" >= DATE '{start_date}'
+  AND "FYFSSJ" < DATE '{end_date}' + INTERVAL '1 day';
 
 -- 第4步: 返回统计信息
 SELECT 
@@ -103,11 +111,12 @@ SELECT
     MIN(charge_time) as earliest_charge,
     MAX(charge_time) as latest_charge
 FROM charge_details
+WHERE year_month = '{current_year_month}'
 GROUP BY business_type
 ORDER BY business_type;
 
 -- 返回总记录数
-SELECT COUNT(*) as total_inserted_count FROM charge_details;
+SELECT COUNT(*) as total_inserted_count FROM charge_details WHERE year_month = '{current_year_month}';
 
 -- ============================================================================
 -- 数据验证建议
@@ -117,7 +117,8 @@ charge_data AS (
         SUM(cd.quantity) as total_quantity,
         COUNT(DISTINCT cd.patient_id) as patient_count
     FROM charge_details cd
-    WHERE cd.charge_time >= '{start_date}'
+    WHERE cd.year_month = '{current_year_month}'  -- 只扫描本月分区
+      AND cd.charge_time >= '{start_date}'
       AND cd.charge_time < DATE '{end_date}' + INTERVAL '1 day'  -- 包含结束日期当天
       AND cd.prescribing_dept_code IN (
           -- 只统计参与评估的科室
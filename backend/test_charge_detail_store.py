@@ -0,0 +1,55 @@
+"""
+测试收费明细月份分区：加载步骤识别和月份加载指纹
+"""
+import os
+import sys
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.charge_detail_store_service import ChargeDetailStoreService
+from app.services.incremental_calculation_service import IncrementalCalculationService
+from app.utils.sql_template import compile_sql_template
+
+
+def test_extract_load_period():
+    """标准数据准备模板渲染后能识别加载的月份，普通步骤不是加载步骤"""
+    template_path = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "standard_workflow_templates",
+        "step1_data_preparation.sql"
+    )
+    with open(template_path, encoding="utf-8") as f:
+        template = compile_sql_template(f.read())
+
+    rendered = template.render_literal({
+        "current_year_month": "2025-10",
+        "start_date": "2025-10-01",
+        "end_date": "2025-10-31",
+    })
+    assert ChargeDetailStoreService.extract_load_period(rendered) == "2025-10"
+    assert ChargeDetailStoreService.extract_load_period("SELECT * FROM charge_details") is None
+    assert ChargeDetailStoreService.extract_load_period(None) is None
+    print("✅ 加载步骤识别正确")
+
+
+def test_period_key_shared_across_tasks():
+    """月份加载指纹不含任务ID：不同任务加载同一月份时一致，源表变化时改变"""
+    compute = IncrementalCalculationService.compute_fingerprint
+    code = "SELECT prepare_charge_details_period('{current_year_month}')"
+    params = {"current_year_month": "2025-10", "hospital_id": 1}
+    stamps = {"TB_MZ_SFMXB": "public.TB_MZ_SFMXB:100"}
+
+    key1 = compute("sql", 1, code, params, {"TB_MZ_SFMXB"}, stamps)
+    key2 = compute("sql", 1, code, dict(params), {"TB_MZ_SFMXB"}, dict(stamps))
+    assert key1 == key2
+
+    changed = compute("sql", 1, code, params, {"TB_MZ_SFMXB"}, {"TB_MZ_SFMXB": "public.TB_MZ_SFMXB:101"})
+    assert changed != key1
+    print("✅ 月份加载指纹正确")
+
+
+if __name__ == "__main__":
+    test_extract_load_period()
+    test_period_key_shared_across_tasks()
+    print("\n所有测试通过！")
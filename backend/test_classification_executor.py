@@ -0,0 +1,174 @@
+"""
+测试AI分类任务的并发执行：令牌桶限流、按批次顺序提交、每日限额暂停后断点续传、分类结果缓存
+"""
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.models.ai_interface import AIInterface
+from app.models.ai_prompt_module import AIPromptModule, PromptModuleCode
+from app.models.api_usage_log import APIUsageLog
+from app.models.charge_item import ChargeItem
+from app.models.classification_plan import ClassificationPlan
+from app.models.classification_cache import ClassificationCacheEntry
+from app.models.classification_task import ClassificationTask, TaskStatus
+from app.models.hospital import Hospital
+from app.models.model_node import ModelNode
+from app.models.model_version import ModelVersion
+from app.models.plan_item import PlanItem, ProcessingStatus
+from app.models.user import User
+from app.services.classification_cache_service import ClassificationCacheService
+from app.tasks import classification_tasks
+from app.utils.encryption import encrypt_api_key
+from app.utils.rate_limiter import TokenBucket
+
+
+def test_token_bucket():
+    """按调用间隔放行，令牌总量用完后返回 False"""
+    now = [0.0]
+    waits = []
+
+    def fake_sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket.from_call_delay(0.5, limit=3, clock=lambda: now[0], sleep=fake_sleep)
+    assert bucket.acquire() and bucket.acquire() and bucket.acquire()
+    assert not bucket.acquire()
+    assert waits == [0.5, 0.5]
+    print("✅ 令牌桶按间隔放行并遵守总量")
+
+
+def test_normalize_name():
+    """全角、大小写和空白不影响缓存键"""
+    assert ClassificationCacheService.normalize_name(" ＣＴ 平扫（头颅） ") == ClassificationCacheService.normalize_name("ct平扫(头颅)")
+    print("✅ 项目名称规范化")
+
+
+def test_concurrent_classification():
+    """并发调用、按顺序提交；达到每日限额后暂停，继续执行时从未完成的项目开始"""
+    db = SessionLocal()
+    suffix = uuid.uuid4().hex[:8]
+    hospital = db.query(Hospital).first()
+    user = db.query(User).first()
+
+    interface = AIInterface(
+        hospital_id=hospital.id, name=f"测试接口{suffix}", api_endpoint="http://localhost:9/v1",
+        model_name="test", api_key_encrypted=encrypt_api_key("sk-test-key"),
+        call_delay=0.1, daily_limit=3, max_concurrency=4,
+    )
+    version = ModelVersion(hospital_id=hospital.id, version=f"cls-{suffix}", name="分类测试")
+    db.add_all([interface, version])
+    db.flush()
+    module = AIPromptModule(
+        hospital_id=hospital.id, module_code=PromptModuleCode.CLASSIFICATION, module_name="分类",
+        ai_interface_id=interface.id, user_prompt="{items}{dimensions}", placeholders=[],
+    )
+    leaf = ModelNode(version_id=version.id, name="检查", code=f"L-{suffix}", node_type="dimension", is_leaf=True)
+    db.add_all([module, leaf])
+    db.add_all([
+        ChargeItem(hospital_id=hospital.id, item_code=f"C{i:03d}-{suffix}", item_name=f"项目{i:03d}-{suffix}",
+                   item_category=f"测试类别{suffix}")
+        for i in range(95)
+    ])
+    db.flush()
+    task = ClassificationTask(
+        hospital_id=hospital.id, task_name="并发分类测试", model_version_id=version.id,
+        charge_categories=[f"测试类别{suffix}"], created_by=user.id,
+    )
+    db.add(task)
+    db.commit()
+    ids = {"task": task.id, "interface": interface.id, "module": module.id, "version": version.id}
+
+    in_flight = [0]
+    peak = [0]
+    lock = threading.Lock()
+
+    ai_items = []
+
+    def fake_batch(items, dimensions, **kwargs):
+        ai_items.extend(items)
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(random.uniform(0.05, 0.3))
+        with lock:
+            in_flight[0] -= 1
+        return [
+            {"item_id": item["id"], "item_name": item["name"], "dimension_id": dimensions[0]["id"], "confidence": 0.9}
+            for item in items
+        ]
+
+    commit_order = []
+    original_commit = classification_tasks._commit_batch
+
+    def recording_commit(db, task_id, hospital_id, batch_items, *args):
+        commit_order.append(batch_items[0].id)
+        return original_commit(db, task_id, hospital_id, batch_items, *args)
+
+    try:
+        with patch.object(classification_tasks, "call_ai_classification_batch", fake_batch), \
+                patch.object(classification_tasks, "_commit_batch", recording_commit), \
+                patch.object(classification_tasks.classify_items_task, "update_state"):
+            result = classification_tasks.classify_items_task(ids["task"], hospital.id)
+            assert result["success"] is False and result["processed"] == 60 and result["paused_at"] == 60
+            db.expire_all()
+            task = db.get(ClassificationTask, ids["task"])
+            assert task.status == TaskStatus.paused and task.processed_items == 60
+            print("✅ 达到每日限额后暂停（3 个批次）")
+
+            db.query(AIInterface).filter(AIInterface.id == ids["interface"]).update({"daily_limit": 100})
+            db.commit()
+            result = classification_tasks.classify_items_task(ids["task"], hospital.id)
+            assert result["success"] is True and result["processed"] == 95 and result["total"] == 95
+            assert len(ai_items) == 95
+
+            # 新任务中相同名称的项目全部命中缓存，不再调用AI接口
+            second = ClassificationTask(
+                hospital_id=hospital.id, task_name="缓存测试", model_version_id=ids["version"],
+                charge_categories=[f"测试类别{suffix}"], created_by=user.id,
+            )
+            db.add(second)
+            db.commit()
+            ids["second"] = second.id
+            result = classification_tasks.classify_items_task(ids["second"], hospital.id)
+            assert result["success"] is True and result["processed"] == 95
+            assert len(ai_items) == 95
+            print("✅ 新任务复用分类缓存，没有调用AI接口")
+
+        assert commit_order == sorted(commit_order)
+        assert 1 < peak[0] <= 4
+        plan = db.query(ClassificationPlan).filter(ClassificationPlan.task_id == ids["task"]).one()
+        statuses = {item.processing_status for item in db.query(PlanItem).filter(PlanItem.plan_id == plan.id)}
+        assert statuses == {ProcessingStatus.completed}
+        print(f"✅ 并发执行（峰值 {peak[0]}）并按批次顺序提交，继续执行后全部完成")
+    finally:
+        db.rollback()
+        task_ids = [ids["task"], ids.get("second")]
+        db.query(APIUsageLog).filter(APIUsageLog.task_id.in_(task_ids)).delete(synchronize_session=False)
+        db.query(ClassificationTask).filter(ClassificationTask.id.in_(task_ids)).delete(synchronize_session=False)
+        db.query(ClassificationCacheEntry).filter(
+            ClassificationCacheEntry.name_key.like(f"%-{suffix}")
+        ).delete(synchronize_session=False)
+        db.query(ChargeItem).filter(ChargeItem.item_code.like(f"%-{suffix}")).delete(synchronize_session=False)
+        db.query(AIPromptModule).filter(AIPromptModule.id == ids["module"]).delete()
+        db.query(AIInterface).filter(AIInterface.id == ids["interface"]).delete()
+        db.query(ModelNode).filter(ModelNode.version_id == ids["version"]).delete()
+        db.query(ModelVersion).filter(ModelVersion.id == ids["version"]).delete()
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    test_token_bucket()
+    test_normalize_name()
+    test_concurrent_classification()
+    print("\n所有测试通过")
@@ -0,0 +1,117 @@
+"""
+测试分类预案提交：预览与批量提交的新增/覆盖数量一致，已有映射只更新最早的一条
+"""
+import os
+import sys
+import uuid
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.models.charge_item import ChargeItem
+from app.models.classification_plan import ClassificationPlan, PlanStatus
+from app.models.classification_task import ClassificationTask
+from app.models.dimension_item_mapping import DimensionItemMapping
+from app.models.hospital import Hospital
+from app.models.model_node import ModelNode
+from app.models.model_version import ModelVersion
+from app.models.plan_item import PlanItem
+from app.models.user import User
+from app.schemas.classification_plan import SubmitPlanRequest
+from app.services.classification_plan_service import ClassificationPlanService
+
+
+def test_submit_plan():
+    db = SessionLocal()
+    suffix = uuid.uuid4().hex[:8]
+    hospital = db.query(Hospital).first()
+    user = db.query(User).first()
+
+    version = ModelVersion(hospital_id=hospital.id, version=f"plan-{suffix}", name="预案提交测试")
+    db.add(version)
+    db.flush()
+    ids = {"version": version.id}
+    try:
+        old = ModelNode(version_id=version.id, name="旧维度", code=f"OLD-{suffix}", node_type="dimension", is_leaf=True)
+        new = ModelNode(version_id=version.id, name="新维度", code=f"NEW-{suffix}", node_type="dimension", is_leaf=True)
+        charge_items = [
+            ChargeItem(hospital_id=hospital.id, item_code=f"C{i}-{suffix}", item_name=f"项目{i}-{suffix}")
+            for i in range(4)
+        ]
+        db.add_all([old, new] + charge_items)
+        db.flush()
+        task = ClassificationTask(
+            hospital_id=hospital.id, task_name="预案提交测试", model_version_id=version.id,
+            charge_categories=[], created_by=user.id,
+        )
+        db.add(task)
+        db.flush()
+        ids["task"] = task.id
+        plan = ClassificationPlan(hospital_id=hospital.id, task_id=task.id, plan_name="预案提交测试")
+        db.add(plan)
+        db.flush()
+        ids["plan"] = plan.id
+
+        def plan_item(charge_item, ai_dimension=None, user_dimension=None):
+            return PlanItem(
+                hospital_id=hospital.id, plan_id=plan.id, charge_item_id=charge_item.id,
+                charge_item_name=charge_item.item_name, ai_suggested_dimension_id=ai_dimension,
+                user_set_dimension_id=user_dimension,
+            )
+
+        db.add_all([
+            plan_item(charge_items[0], ai_dimension=new.id),
+            plan_item(charge_items[1], ai_dimension=old.id, user_dimension=new.id),
+            plan_item(charge_items[2], ai_dimension=new.id),
+            plan_item(charge_items[3]),
+        ])
+        # 项目1已有两条映射（历史数据），只覆盖最早的一条
+        db.add_all([
+            DimensionItemMapping(hospital_id=hospital.id, dimension_code=old.code,
+                                 item_code=charge_items[1].item_code, charge_item_id=charge_items[1].id),
+            DimensionItemMapping(hospital_id=hospital.id, dimension_code=f"OTHER-{suffix}",
+                                 item_code=charge_items[1].item_code, charge_item_id=charge_items[1].id),
+        ])
+        db.commit()
+
+        preview = ClassificationPlanService.generate_submit_preview(db, hospital.id, plan.id)
+        assert preview.total_items == 4 and preview.new_count == 2 and preview.overwrite_count == 1
+        assert preview.overwrite_items[0].old_dimension_name == "旧维度"
+        assert len(preview.warnings) == 1
+        print("✅ 提交预览：新增 2 项，覆盖 1 项，跳过 1 项")
+
+        result = ClassificationPlanService.submit_plan(db, hospital.id, plan.id, SubmitPlanRequest(confirm=True))
+        assert result.success and result.new_count == 2 and result.overwrite_count == 1
+
+        mappings = db.query(DimensionItemMapping).filter(
+            DimensionItemMapping.item_code.like(f"%-{suffix}")
+        ).all()
+        codes = sorted((m.item_code.split("-")[0], m.dimension_code.split("-")[0]) for m in mappings)
+        assert codes == [("C0", "NEW"), ("C1", "NEW"), ("C1", "OTHER"), ("C2", "NEW")]
+        assert db.get(ClassificationPlan, plan.id).status == PlanStatus.submitted
+        print("✅ 批量提交结果与预览一致")
+
+        try:
+            ClassificationPlanService.submit_plan(db, hospital.id, plan.id, SubmitPlanRequest(confirm=True))
+            assert False, "重复提交应失败"
+        except ValueError:
+            db.rollback()
+        print("✅ 已提交的预案不可重复提交")
+    finally:
+        db.rollback()
+        db.query(DimensionItemMapping).filter(
+            DimensionItemMapping.item_code.like(f"%-{suffix}")
+        ).delete(synchronize_session=False)
+        if "task" in ids:
+            db.query(ClassificationTask).filter(ClassificationTask.id == ids["task"]).delete()
+        db.query(ChargeItem).filter(ChargeItem.item_code.like(f"%-{suffix}")).delete(synchronize_session=False)
+        db.query(ModelNode).filter(ModelNode.version_id == ids["version"]).delete()
+        db.query(ModelVersion).filter(ModelVersion.id == ids["version"]).delete()
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    test_submit_plan()
+    print("\n所有测试通过")
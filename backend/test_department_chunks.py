@@ -0,0 +1,181 @@
+"""
+测试科室并行模式：子任务按科室累加进度，失败科室由汇总回调标记任务失败，
+子任务异常时由 chord 错误回调标记失败，汇总数据和报表汇总缓存只生成一次
+"""
+import os
+import sys
+import uuid
+from decimal import Decimal
+from unittest.mock import patch
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from billiard.exceptions import WorkerLostError
+from celery import signature
+
+from app.database import SessionLocal
+from app.models.calculation_task import CalculationTask, CalculationSummary
+from app.models.department import Department
+from app.models.hospital import Hospital
+from app.models.model_version import ModelVersion
+from app.tasks import calculation_tasks
+
+
+def eager_chord(header):
+    """按 chord 的语义在当前进程执行：子任务异常时调用回调的错误回调，否则把结果交给回调"""
+    def run(callback):
+        results = [task.apply() for task in header.tasks]
+        failed = [result for result in results if result.failed()]
+        if failed:
+            for errback in callback.options.get("link_error", []):
+                signature(errback).apply(args=(None, failed[0].result, failed[0].traceback))
+            return None
+        return callback.apply(args=([result.get() for result in results],))
+    return run
+
+
+class Fixture:
+    def __init__(self, count):
+        self.db = SessionLocal()
+        self.suffix = uuid.uuid4().hex[:8]
+        hospital = self.db.query(Hospital).first()
+        self.version = ModelVersion(hospital_id=hospital.id, version=f"chunk-{self.suffix}", name="并行测试")
+        self.departments = [
+            Department(hospital_id=hospital.id, his_code=f"P{i}-{self.suffix}", his_name=f"并行科室{i}")
+            for i in range(count)
+        ]
+        self.db.add(self.version)
+        self.db.add_all(self.departments)
+        self.db.flush()
+        self.task = CalculationTask(
+            task_id=f"chunk-test-{self.suffix}", model_version_id=self.version.id,
+            period="2026-01", status="running", progress=0,
+        )
+        self.db.add(self.task)
+        self.db.commit()
+        self.task_id = self.task.task_id
+        self.department_ids = [d.id for d in self.departments]
+
+    def reload_task(self):
+        self.db.expire_all()
+        return self.db.query(CalculationTask).filter(CalculationTask.task_id == self.task_id).one()
+
+    def progress(self):
+        db = SessionLocal()
+        try:
+            return db.query(CalculationTask.progress).filter(CalculationTask.task_id == self.task_id).scalar()
+        finally:
+            db.close()
+
+    def dispatch(self, chunk_size):
+        return calculation_tasks._dispatch_department_chunks(
+            task_id=self.task_id, model_version_id=self.version.id, workflow_id=0,
+            department_ids=self.department_ids, period="2026-01", chunk_size=chunk_size,
+        )
+
+    def cleanup(self):
+        self.db.rollback()
+        self.db.query(CalculationSummary).filter(CalculationSummary.task_id == self.task_id).delete()
+        self.db.query(CalculationTask).filter(CalculationTask.task_id == self.task_id).delete()
+        self.db.query(Department).filter(Department.id.in_(self.department_ids)).delete(synchronize_session=False)
+        self.db.query(ModelVersion).filter(ModelVersion.id == self.version.id).delete()
+        self.db.commit()
+        self.db.close()
+
+
+def run_chunks(fixture, chunk_size, fake_steps):
+    """并行执行所有科室块，返回汇总数据、报表汇总缓存和下钻汇总的生成次数"""
+    calls = {"summaries": 0, "rollups": 0, "cube": 0}
+    original_summaries = calculation_tasks.calculate_summaries
+
+    def counting_summaries(db, task_id, departments):
+        calls["summaries"] += 1
+        return original_summaries(db, task_id, departments)
+
+    def counting(name):
+        def record(db, task_id):
+            calls[name] += 1
+        return record
+
+    with patch.object(calculation_tasks, "chord", eager_chord), \
+            patch.object(calculation_tasks, "_run_workflow_steps", fake_steps), \
+            patch.object(calculation_tasks, "calculate_summaries", counting_summaries), \
+            patch.object(calculation_tasks, "_build_result_rollups", counting("rollups")), \
+            patch.object(calculation_tasks, "_build_drilldown_cube", counting("cube")):
+        result = fixture.dispatch(chunk_size)
+    assert result["chunks"] == -(-len(fixture.department_ids) // chunk_size)
+    return calls
+
+
+def test_progress_and_single_finalize():
+    """5 个科室分 3 块执行：每个科室完成后进度累加 20%，汇总只生成一次"""
+    fixture = Fixture(5)
+    try:
+        seen_progress = []
+
+        def fake_steps(db, task_id, steps, department, **kwargs):
+            seen_progress.append(fixture.progress())
+
+        calls = run_chunks(fixture, 2, fake_steps)
+        assert seen_progress == [Decimal("0.00"), Decimal("20.00"), Decimal("40.00"), Decimal("60.00"), Decimal("80.00")]
+        assert calls == {"summaries": 1, "rollups": 1, "cube": 1}
+
+        task = fixture.reload_task()
+        assert task.status == "completed" and task.progress == Decimal("100.00")
+        summaries = fixture.db.query(CalculationSummary).filter(CalculationSummary.task_id == fixture.task_id).count()
+        assert summaries == 5
+        print("✅ 进度按科室累加，汇总数据和汇总缓存只生成一次")
+    finally:
+        fixture.cleanup()
+
+
+def test_failed_department():
+    """块内单个科室失败不影响其他科室，回调将任务标记为失败且不生成汇总"""
+    fixture = Fixture(4)
+    try:
+        executed = []
+        failing_id = fixture.department_ids[1]
+
+        def fake_steps(db, task_id, steps, department, **kwargs):
+            executed.append(department.id)
+            if department.id == failing_id:
+                raise RuntimeError("步骤执行失败")
+
+        calls = run_chunks(fixture, 2, fake_steps)
+        assert executed == fixture.department_ids
+        assert calls == {"summaries": 0, "rollups": 0, "cube": 0}
+
+        task = fixture.reload_task()
+        assert task.status == "failed"
+        assert task.error_message == "1 个科室计算失败: 科室 并行科室1: 步骤执行失败"
+        assert task.progress == Decimal("99.99")
+        print("✅ 失败科室由汇总回调标记任务失败，不生成汇总")
+    finally:
+        fixture.cleanup()
+
+
+def test_crashed_chunk():
+    """子任务本身异常（如被强制终止）时，由 chord 错误回调将任务标记为失败"""
+    fixture = Fixture(3)
+    try:
+        def crash(**kwargs):
+            raise WorkerLostError("Worker exited prematurely: signal 9 (SIGKILL).")
+
+        with patch.object(calculation_tasks.execute_department_chunk, "run", crash):
+            calls = run_chunks(fixture, 2, lambda *args, **kwargs: None)
+        assert calls == {"summaries": 0, "rollups": 0, "cube": 0}
+
+        task = fixture.reload_task()
+        assert task.status == "failed"
+        assert task.error_message == "并行子任务异常: Worker exited prematurely: signal 9 (SIGKILL)."
+        print("✅ 子任务异常时由错误回调标记任务失败")
+    finally:
+        fixture.cleanup()
+
+
+if __name__ == "__main__":
+    test_progress_and_single_finalize()
+    test_failed_department()
+    test_crashed_chunk()
+    print("\n所有测试通过")
@@ -0,0 +1,94 @@
+"""
+测试维度下钻汇总：汇总结果与实时分组聚合一致，超出前 N 个的项目只计入合计
+"""
+import os
+import sys
+import uuid
+from decimal import Decimal
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.models.calculation_detail import CalculationDetail, CalculationDrilldownItem
+from app.models.calculation_task import CalculationTask
+from app.models.charge_item import ChargeItem
+from app.models.hospital import Hospital
+from app.models.model_version import ModelVersion
+from app.api.analysis_reports import query_drilldown_from_calculation_details
+from app.services.drilldown_cube_service import DrilldownCubeService
+
+
+def detail(task_id, hospital_id, department_id, item_code, amount, quantity, item_name=None):
+    return CalculationDetail(
+        hospital_id=hospital_id, task_id=task_id, department_id=department_id,
+        department_code=f"D{department_id}", node_id=1, node_code="dim-1", node_name="检查",
+        item_code=item_code, item_name=item_name, item_category="检查费",
+        amount=Decimal(amount), quantity=Decimal(quantity), period="2026-01",
+    )
+
+
+def test_drilldown_cube():
+    db = SessionLocal()
+    suffix = uuid.uuid4().hex[:8]
+    task_id = f"drilldown-test-{suffix}"
+    hospital = db.query(Hospital).first()
+    version = ModelVersion(hospital_id=hospital.id, version=f"dd-{suffix}", name="下钻测试")
+    db.add(version)
+    db.flush()
+    version_id = version.id
+    try:
+        db.add(CalculationTask(task_id=task_id, model_version_id=version_id, period="2026-01", status="completed"))
+        db.add(ChargeItem(hospital_id=hospital.id, item_code=f"X1-{suffix}", item_name="彩超", unit_price="120"))
+        db.add_all([
+            detail(task_id, hospital.id, 11, f"X1-{suffix}", "300", "3"),
+            detail(task_id, hospital.id, 11, f"X2-{suffix}", "50", "5", "心电图"),
+            detail(task_id, hospital.id, 11, f"X3-{suffix}", "80", "1", "CT"),
+            detail(task_id, hospital.id, 12, f"X2-{suffix}", "70", "7", "心电图"),
+            detail(task_id, hospital.id, 12, f"X3-{suffix}", "400", "5", "CT"),
+        ])
+        db.commit()
+
+        # 实时查询作为基准
+        live = {
+            department_id: query_drilldown_from_calculation_details(db, task_id, department_id, 1, hospital.id)
+            for department_id in (0, 11, 12)
+        }
+        assert live[11][0][0]["item_name"] == "彩超" and live[11][0][0]["unit_price"] == "120"
+
+        count = DrilldownCubeService.build(db, task_id, top_n=2)
+        db.commit()
+        # 3 个分组（全院、科室11、科室12）各 2 个项目 + 合计行
+        assert count == 9
+
+        for department_id in (0, 11, 12):
+            items, error_msg, totals = query_drilldown_from_calculation_details(db, task_id, department_id, 1, hospital.id)
+            live_items, _, live_totals = live[department_id]
+            assert items == live_items[:2]
+            assert totals == live_totals
+        print("✅ 下钻汇总与实时查询一致")
+
+        items, _, totals = query_drilldown_from_calculation_details(db, task_id, 0, 1, hospital.id)
+        assert [item["amount"] for item in items] == [Decimal("480"), Decimal("300")]
+        assert totals["total_amount"] == Decimal("900") and totals["item_count"] == 3
+        print("✅ 全院汇总只保留前 N 个项目，合计包含全部项目")
+
+        assert DrilldownCubeService.get_node(db, task_id, 11, 999) is None
+        DrilldownCubeService.invalidate(db, task_id)
+        db.commit()
+        assert DrilldownCubeService.get_node(db, task_id, 11, 1) is None
+        print("✅ 没有汇总数据时回退为实时查询")
+    finally:
+        db.rollback()
+        db.query(CalculationDrilldownItem).filter(CalculationDrilldownItem.task_id == task_id).delete()
+        db.query(CalculationDetail).filter(CalculationDetail.task_id == task_id).delete()
+        db.query(CalculationTask).filter(CalculationTask.task_id == task_id).delete()
+        db.query(ChargeItem).filter(ChargeItem.item_code.like(f"%-{suffix}")).delete(synchronize_session=False)
+        db.query(ModelVersion).filter(ModelVersion.id == version_id).delete()
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    test_drilldown_cube()
+    print("\n所有测试通过")
@@ -0,0 +1,122 @@
+"""
+测试导入会话存储：进程内 LRU 的过期与淘汰、压缩序列化、大小上限
+"""
+import os
+import pickle
+import sys
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from io import BytesIO
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import openpyxl
+
+from app.config import settings
+from app.services import import_session_store
+from app.services.dimension_import_service import DimensionImportService
+from app.services.import_session_store import ImportSessionStore, MemorySessionBackend
+
+
+def test_memory_backend():
+    """按 TTL 过期、读取时刷新过期时间，按条数和总字节数淘汰最久未使用的会话"""
+    now = [0.0]
+    backend = MemorySessionBackend(ttl=60, max_entries=2, max_bytes=100, clock=lambda: now[0])
+
+    backend.set("a", b"1" * 10)
+    backend.set("b", b"2" * 10)
+    now[0] = 50
+    assert backend.get("a") == b"1" * 10  # 刷新 a 的过期时间
+    now[0] = 70
+    assert backend.get("b") is None
+    assert backend.get("a") is not None
+    print("✅ 会话按 TTL 过期，读取时刷新")
+
+    backend.set("c", b"3" * 10)
+    backend.set("d", b"4" * 10)
+    assert backend.get("a") is None and backend.get("c") is not None
+    backend.set("e", b"5" * 95)
+    assert backend.get("c") is None and backend.get("d") is None and backend.get("e") is not None
+    print("✅ 超出条数或总大小时淘汰最久未使用的会话")
+
+
+def test_session_store():
+    """Redis 不可用时回退到进程内存储，会话数据压缩后保存"""
+    import_session_store._backend = None
+    original = settings.REDIS_URL
+    settings.REDIS_URL = "redis://127.0.0.1:1/0"
+    try:
+        store = ImportSessionStore("test")
+        assert isinstance(import_session_store.get_session_backend(), MemorySessionBackend)
+    finally:
+        settings.REDIS_URL = original
+
+    store.set("s1", {"file_content": b"x" * 100000, "items": [{"amount": Decimal("1.5")}]})
+    store.update("s1", match_by="name")
+    data = store.get("s1")
+    assert data["match_by"] == "name" and data["items"][0]["amount"] == Decimal("1.5")
+    assert len(import_session_store.get_session_backend().get("import_session:test:s1")) < 2000
+    assert ImportSessionStore("other").get("s1") is None
+    store.delete("s1")
+    assert store.get("s1") is None
+    print("✅ 会话压缩保存，按导入类型隔离")
+
+    original = settings.IMPORT_SESSION_MAX_BYTES
+    settings.IMPORT_SESSION_MAX_BYTES = 1000
+    try:
+        store.set("s2", {"file_content": os.urandom(5000)})
+        assert False, "超过大小上限应失败"
+    except ValueError:
+        pass
+    finally:
+        settings.IMPORT_SESSION_MAX_BYTES = original
+    print("✅ 超过大小上限的会话拒绝保存")
+
+
+def test_json_payload():
+    """会话以 JSON 保存并还原 bytes、Decimal 和日期时间，不反序列化 pickle 数据"""
+    store = ImportSessionStore("test")
+    data = {
+        "file_content": b"\x00\xffPK",
+        "items": [{"amount": Decimal("-0.10"), "period": date(2026, 1, 1), "at": datetime(2026, 1, 1, 8, 30)}],
+        "headers": ["科室", "金额"],
+        "mapping": {"__bytes__": "字段名", "other": 1},
+    }
+    store.set("s3", data)
+    payload = import_session_store.get_session_backend().get("import_session:test:s3")
+    assert zlib.decompress(payload).startswith(b"{")
+    assert store.get("s3") == data
+
+    class Exploit:
+        def __reduce__(self):
+            return (os.system, ("echo pwned",))
+
+    import_session_store.get_session_backend().set(
+        "import_session:test:s4", zlib.compress(pickle.dumps({"x": Exploit()}))
+    )
+    assert store.get("s4") is None
+    print("✅ 会话以 JSON 保存，不解析 pickle 数据")
+
+
+def test_dimension_import_session():
+    """智能导入解析后的会话可以在后续步骤读取"""
+    wb = openpyxl.Workbook()
+    wb.active.append(["收费编码", "维度预案"])
+    wb.active.append(["C001", "4D"])
+    buffer = BytesIO()
+    wb.save(buffer)
+
+    result = DimensionImportService.parse_excel(buffer.getvalue())
+    session = DimensionImportService._sessions.get(result["session_id"])
+    assert session["headers"] == result["headers"] and session["file_content"] == buffer.getvalue()
+    print("✅ 维度目录导入会话写入共享存储")
+
+
+if __name__ == "__main__":
+    test_memory_backend()
+    test_session_store()
+    test_json_payload()
+    test_dimension_import_session()
+    print("\n所有测试通过")
@@ -0,0 +1,75 @@
+"""
+测试增量计算：表引用提取和重算步骤规划
+"""
+import os
+import sys
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.incremental_calculation_service import IncrementalCalculationService
+
+
+def test_extract_table_references():
+    """识别读取/写入的表，忽略CTE、函数调用和字符串中的内容"""
+    sql = """
+        -- FROM comment_table
+        WITH dept_totals AS (
+            SELECT department_id, SUM(amount) FROM charge_details GROUP BY department_id
+        )
+        INSERT INTO calculation_results (task_id, node_id, value)
+        SELECT '{task_id}', mn.id, dt.sum * mn.weight
+        FROM dept_totals dt
+        JOIN public.model_nodes mn ON mn.version_id = 1
+        LEFT JOIN "TB_MZ_SFMXB" mz ON EXTRACT(YEAR FROM mz.fsrq) = 2025
+        WHERE mn.name <> 'FROM fake_table';
+        UPDATE calculation_results SET value = 0 WHERE value IS NULL;
+    """
+    reads, writes = IncrementalCalculationService.extract_table_references(sql)
+    assert writes == {"calculation_results"}
+    assert {"charge_details", "model_nodes", "TB_MZ_SFMXB"} <= reads
+    assert "dept_totals" not in reads
+    assert "comment_table" not in reads
+    assert "fake_table" not in reads
+    print(f"✅ 读取: {sorted(reads)}，写入: {sorted(writes)}")
+
+
+def test_fingerprint_changes_with_table_stamp():
+    """源表版本变化时指纹变化，视图输入时指纹为空"""
+    compute = IncrementalCalculationService.compute_fingerprint
+    fp1 = compute("sql", 1, "SELECT 1", {}, {"model_nodes"}, {"model_nodes": "public.model_nodes:10"})
+    fp2 = compute("sql", 1, "SELECT 1", {}, {"model_nodes"}, {"model_nodes": "public.model_nodes:11"})
+    assert fp1 and fp2 and fp1 != fp2
+    assert compute("sql", 1, "SELECT 1", {}, {"v_items"}, {"v_items": None}) is None
+    assert compute("sql", 1, "SELECT 1", {}, {"model_nodes"}, None) is None
+    print("✅ 指纹随源表版本变化")
+
+
+def test_plan_rerun_invalidated_suffix():
+    """只重新执行失效步骤及其下游，以及与之写入同一输出表的步骤"""
+    step_ids = [1, 2, 3, 4]
+    dependencies = {1: set(), 2: {1}, 3: {1}, 4: {2, 3}}
+    previous = {1: "a", 2: "b", 3: "c", 4: "d"}
+    writes = {1: {"charge_details"}, 2: {"calculation_results"}, 3: {"calculation_results"}, 4: {"calculation_summaries_tmp"}}
+
+    # 步骤3输入变化：步骤3、下游步骤4、同样写 calculation_results 的步骤2 都要重算
+    current = {1: "a", 2: "b", 3: "c2", 4: "d"}
+    rerun = IncrementalCalculationService.plan_rerun(step_ids, dependencies, current, previous, writes)
+    assert rerun == {2, 3, 4}
+
+    # 无变化：全部复用
+    rerun = IncrementalCalculationService.plan_rerun(step_ids, dependencies, previous, previous, writes)
+    assert rerun == set()
+
+    # 指纹为空（无法确定输入版本）：必须重算
+    current = {1: "a", 2: "b", 3: "c", 4: None}
+    rerun = IncrementalCalculationService.plan_rerun(step_ids, dependencies, current, previous, writes)
+    assert rerun == {4}
+    print("✅ 重算步骤规划正确")
+
+
+if __name__ == "__main__":
+    test_extract_table_references()
+    test_fingerprint_changes_with_table_stamp()
+    test_plan_rerun_invalidated_suffix()
+    print("\n所有测试通过！")
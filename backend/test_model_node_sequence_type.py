@@ -0,0 +1,58 @@
+"""
+测试模型节点序列类别：更新名称或节点类型且未指定类别时按名称重新推断
+"""
+import os
+import sys
+import uuid
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.api.model_nodes import update_model_node
+from app.database import SessionLocal
+from app.middleware.hospital_context import set_current_hospital_id
+from app.models.hospital import Hospital
+from app.models.model_node import ModelNode
+from app.models.model_version import ModelVersion
+from app.schemas.model_node import ModelNodeUpdate
+
+
+def test_update_infers_sequence_type():
+    """改名、改为序列节点时重新推断，显式指定的类别优先，改为维度节点时清空"""
+    db = SessionLocal()
+    hospital_id = db.query(Hospital.id).first()[0]
+    version = ModelVersion(hospital_id=hospital_id, version=f"seq-{uuid.uuid4().hex[:8]}", name="序列类别测试")
+    db.add(version)
+    db.flush()
+    node = ModelNode(version_id=version.id, name="维度", code="n1", node_type="dimension", sort_order=1)
+    db.add(node)
+    db.commit()
+
+    def update(**fields):
+        return update_model_node(node.id, ModelNodeUpdate(**fields), db=db, current_user=None)["sequence_type"]
+
+    try:
+        set_current_hospital_id(hospital_id)
+        assert update(node_type="sequence", name="Nursing Sequence") == "nurse"
+        assert update(name="医生序列") == "doctor"
+        # 改名后无法推断时保留原类别
+        assert update(name="第一序列") == "doctor"
+        # 显式指定优先，显式传 null 时按名称推断
+        assert update(name="医技序列", sequence_type="nurse") == "nurse"
+        assert update(sequence_type=None) == "tech"
+        # 表单每次提交名称和类型，未改动时不重新推断
+        assert update(name="医技序列", node_type="sequence", sequence_type="doctor") == "doctor"
+        assert update(name="医技序列", node_type="sequence") == "doctor"
+        assert update(node_type="dimension") is None
+        print("✅ 更新节点时按名称重新推断序列类别")
+    finally:
+        set_current_hospital_id(None)
+        db.rollback()
+        db.query(ModelVersion).filter(ModelVersion.id == version.id).delete()
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    test_update_infers_sequence_type()
+    print("\n所有测试通过")
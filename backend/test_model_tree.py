@@ -0,0 +1,71 @@
+"""
+测试模型节点树：内存组装层级和导向规则名称
+"""
+import os
+import sys
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.model_tree_service import ModelTreeService, NodePathIndex
+
+
+def node(node_id, parent_id, name, rule_ids=None):
+    return {"id": node_id, "parent_id": parent_id, "name": name, "orientation_rule_ids": rule_ids}
+
+
+def test_assemble():
+    """按行顺序挂接子节点，导向规则名称按ID列表顺序"""
+    rows = [
+        node(1, None, "医生序列"),
+        node(2, None, "护理序列"),
+        node(3, 1, "门诊", [20, 10]),
+        node(4, 3, "门诊诊察"),
+        node(5, 1, "住院", [30]),
+        node(6, 99, "孤立节点"),
+    ]
+    tree = ModelTreeService.assemble(rows, {10: "规则A", 20: "规则B"})
+
+    assert [item["name"] for item in tree.children_of(None)] == ["医生序列", "护理序列"]
+    assert [item["name"] for item in tree.children_of(1)] == ["门诊", "住院"]
+    assert tree.get(1)["has_children"] and not tree.get(2)["has_children"]
+    assert tree.get(3)["children"][0]["name"] == "门诊诊察"
+    assert tree.get(3)["orientation_rule_names"] == ["规则B", "规则A"]
+    assert tree.get(5)["orientation_rule_names"] == []
+    assert tree.children_of(99) == []
+    print("✅ 节点树组装正确")
+
+
+def test_path_index():
+    """路径、末级维度和所属序列都从索引取得，父节点缺失或成环时不死循环"""
+    def path_node(node_id, parent_id, name, node_type="dimension", is_leaf=False, sort_order=0):
+        return {"id": node_id, "parent_id": parent_id, "name": name, "code": f"C{node_id}",
+                "node_type": node_type, "is_leaf": is_leaf, "sort_order": sort_order}
+
+    index = NodePathIndex([
+        path_node(1, None, "全院", node_type="root"),
+        path_node(2, 1, "医生序列", node_type="sequence"),
+        path_node(3, 2, "成本"),
+        path_node(4, 3, "药品", is_leaf=True),
+        path_node(5, 3, "耗材"),
+        path_node(6, 5, "高值耗材", is_leaf=True),
+        path_node(7, 99, "孤立"),
+        path_node(8, 9, "环A"),
+        path_node(9, 8, "环B"),
+    ])
+
+    assert index.path(6) == "全院 > 医生序列 > 成本 > 耗材 > 高值耗材"
+    assert index.path(4, " / ") == "全院 / 医生序列 / 成本 / 药品"
+    assert index.path(7) == "孤立"
+    assert index.path(100) == ""
+    assert index.get_by_code("C4")["id"] == 4
+    assert [node["id"] for node in index.leaves_under(3)] == [4, 6]
+    assert index.sequence_of(6)["name"] == "医生序列"
+    assert index.sequence_of(2) is None
+    assert index.path(8) and index.path(9)
+    print("✅ 路径索引正确")
+
+
+if __name__ == "__main__":
+    test_assemble()
+    test_path_index()
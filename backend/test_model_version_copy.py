@@ -0,0 +1,206 @@
+"""
+测试模型版本集合复制：节点父子关系、步骤依赖换算、跨医疗机构导向规则映射，
+以及后台复制完成前版本不能激活或创建计算任务
+"""
+import os
+import sys
+import uuid
+from unittest.mock import patch
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+
+from app.api.calculation_tasks import create_calculation_task
+from app.api.model_versions import activate_model_version
+from app.database import SessionLocal
+from app.middleware.hospital_context import set_current_hospital_id
+from app.models.calculation_step import CalculationStep
+from app.models.calculation_workflow import CalculationWorkflow
+from app.models.discipline_rule import DisciplineRule
+from app.models.hospital import Hospital
+from app.models.model_node import ModelNode
+from app.models.model_version import ModelVersion
+from app.models.orientation_rule import OrientationRule, OrientationCategory
+from app.schemas.calculation_task import CalculationTaskCreate
+from app.services.model_version_copy_service import ModelVersionCopyService
+from app.tasks.model_version_tasks import copy_model_version_task
+
+
+class Fixture:
+    """源医疗机构的模型版本（三层节点、带依赖的步骤、学科规则）和另一个医疗机构"""
+
+    def __init__(self):
+        self.db = db = SessionLocal()
+        self.suffix = uuid.uuid4().hex[:8]
+        self.source_hospital = Hospital(code=f"copy-src-{self.suffix}", name="复制测试源医院")
+        self.target_hospital = Hospital(code=f"copy-dst-{self.suffix}", name="复制测试目标医院")
+        db.add_all([self.source_hospital, self.target_hospital])
+        db.flush()
+
+        def rule(hospital, name):
+            return OrientationRule(hospital_id=hospital.id, name=name, category=OrientationCategory.other)
+
+        self.shared_rule = rule(self.source_hospital, "共有导向")
+        self.missing_rule = rule(self.source_hospital, "源医院导向")
+        self.target_rule = rule(self.target_hospital, "共有导向")
+        db.add_all([self.shared_rule, self.missing_rule, self.target_rule])
+
+        self.version = self.new_version(self.source_hospital)
+        db.flush()
+
+        sequence = self.node(None, "seq", "sequence", sequence_type="doctor")
+        dimension = self.node(sequence, "dim", "dimension")
+        self.node(dimension, "dim-a", "dimension", is_leaf=True,
+                  orientation_rule_ids=[self.shared_rule.id, self.missing_rule.id])
+        self.node(dimension, "dim-b", "dimension", is_leaf=True, orientation_rule_ids=[self.missing_rule.id])
+        self.node(sequence, "dim-c", "dimension", is_leaf=True, orientation_rule_ids=[self.shared_rule.id])
+
+        workflow = CalculationWorkflow(version_id=self.version.id, name="计算流程")
+        db.add(workflow)
+        db.flush()
+        steps = []
+        for index, name in enumerate(["准备", "计算", "汇总"]):
+            step = CalculationStep(
+                workflow_id=workflow.id, name=name, code_type="sql", code_content="SELECT 1",
+                sort_order=index + 1, depends_on=[s.id for s in reversed(steps)] or None,
+            )
+            db.add(step)
+            db.flush()
+            steps.append(step)
+
+        for code in ("D1", "D2"):
+            db.add(DisciplineRule(
+                hospital_id=self.source_hospital.id, version_id=self.version.id, department_code=code,
+                department_name=f"科室{code}", dimension_code="dim-a", dimension_name="维度A", rule_coefficient=1,
+            ))
+        db.commit()
+
+    def new_version(self, hospital):
+        version = ModelVersion(hospital_id=hospital.id, version=f"v-{uuid.uuid4().hex[:8]}", name="复制测试")
+        self.db.add(version)
+        self.db.flush()
+        return version
+
+    def node(self, parent, code, node_type, **kwargs):
+        node = ModelNode(
+            version_id=self.version.id, parent_id=parent.id if parent else None, name=code, code=code,
+            node_type=node_type, sort_order=1, **kwargs
+        )
+        self.db.add(node)
+        self.db.flush()
+        return node
+
+    def nodes_by_code(self, version_id):
+        return {n.code: n for n in self.db.query(ModelNode).filter(ModelNode.version_id == version_id)}
+
+    def steps_by_name(self, version_id):
+        return {
+            s.name: s for s in self.db.query(CalculationStep).join(CalculationWorkflow).filter(
+                CalculationWorkflow.version_id == version_id
+            )
+        }
+
+    def cleanup(self):
+        self.db.rollback()
+        hospital_ids = [self.source_hospital.id, self.target_hospital.id]
+        self.db.query(DisciplineRule).filter(DisciplineRule.hospital_id.in_(hospital_ids)).delete(synchronize_session=False)
+        self.db.query(Hospital).filter(Hospital.id.in_(hospital_ids)).delete(synchronize_session=False)
+        self.db.commit()
+        self.db.close()
+
+
+def test_copy_same_hospital():
+    """同一医疗机构内复制：父节点、步骤依赖换算为新ID，导向规则保留，统计数量正确"""
+    fixture = Fixture()
+    try:
+        db = fixture.db
+        target = fixture.new_version(fixture.source_hospital)
+        service = ModelVersionCopyService(db)
+        statistics = service.copy_version(fixture.version.id, target.id, copy_workflows=True, copy_discipline_rules=True)
+        db.commit()
+        assert statistics == {"node_count": 5, "workflow_count": 1, "step_count": 3, "discipline_rule_count": 2}
+        assert service.warnings == []
+
+        source_nodes = fixture.nodes_by_code(fixture.version.id)
+        nodes = fixture.nodes_by_code(target.id)
+        assert not set(n.id for n in nodes.values()) & set(n.id for n in source_nodes.values())
+        parent_codes = {code: next((p.code for p in nodes.values() if p.id == n.parent_id), None) for code, n in nodes.items()}
+        assert parent_codes == {"seq": None, "dim": "seq", "dim-a": "dim", "dim-b": "dim", "dim-c": "seq"}
+        assert nodes["seq"].sequence_type == "doctor" and nodes["dim-a"].is_leaf
+        assert nodes["dim-a"].orientation_rule_ids == source_nodes["dim-a"].orientation_rule_ids
+
+        steps = fixture.steps_by_name(target.id)
+        assert steps["准备"].depends_on is None
+        assert steps["计算"].depends_on == [steps["准备"].id]
+        assert steps["汇总"].depends_on == [steps["计算"].id, steps["准备"].id]
+        assert db.query(DisciplineRule).filter(DisciplineRule.version_id == target.id).count() == 2
+        print("✅ 同一医疗机构内复制节点树、步骤依赖和学科规则")
+    finally:
+        fixture.cleanup()
+
+
+def test_copy_cross_hospital():
+    """跨医疗机构导入：导向规则按名称映射，找不到的规则移除并给出警告"""
+    fixture = Fixture()
+    try:
+        db = fixture.db
+        target = fixture.new_version(fixture.target_hospital)
+        service = ModelVersionCopyService(db)
+        statistics = service.copy_version(fixture.version.id, target.id, copy_discipline_rules=True)
+        db.commit()
+        assert statistics["node_count"] == 5 and statistics["discipline_rule_count"] == 2
+
+        nodes = fixture.nodes_by_code(target.id)
+        assert nodes["dim-a"].orientation_rule_ids == [fixture.target_rule.id]
+        assert nodes["dim-b"].orientation_rule_ids == []
+        assert nodes["dim-c"].orientation_rule_ids == [fixture.target_rule.id]
+        assert service.warnings == ["导向规则 '源医院导向' 在目标医疗机构不存在，已移除 2 个模型节点的关联"]
+        rules = db.query(DisciplineRule).filter(DisciplineRule.version_id == target.id).all()
+        assert {r.hospital_id for r in rules} == {fixture.target_hospital.id}
+        print("✅ 跨医疗机构导入时映射导向规则并警告缺失规则")
+    finally:
+        fixture.cleanup()
+
+
+def test_copying_version_blocked():
+    """后台复制完成前不能激活或创建计算任务，复制完成后清除复制状态"""
+    fixture = Fixture()
+    try:
+        db = fixture.db
+        target = fixture.new_version(fixture.source_hospital)
+        target.copy_status = "copying"
+        db.commit()
+        set_current_hospital_id(fixture.source_hospital.id)
+
+        for call in (
+            lambda: activate_model_version(target.id, db=db, current_user=None),
+            lambda: create_calculation_task(
+                CalculationTaskCreate(model_version_id=target.id, period="2026-01"), db=db, current_user=None
+            ),
+        ):
+            try:
+                call()
+                raise AssertionError("复制中的版本不应通过校验")
+            except HTTPException as e:
+                assert e.status_code == 400 and "复制中" in e.detail
+
+        with patch.object(copy_model_version_task, "update_state", lambda **kwargs: None):
+            result = copy_model_version_task.apply(args=(fixture.version.id, target.id)).get()
+        assert result["statistics"]["node_count"] == 5
+
+        db.expire_all()
+        assert db.query(ModelVersion.copy_status).filter(ModelVersion.id == target.id).scalar() is None
+        assert activate_model_version(target.id, db=db, current_user=None).is_active
+        print("✅ 复制完成前版本不能激活或创建计算任务")
+    finally:
+        set_current_hospital_id(None)
+        fixture.cleanup()
+
+
+if __name__ == "__main__":
+    test_copy_same_hospital()
+    test_copy_cross_hospital()
+    test_copying_version_blocked()
+    print("\n所有测试通过")
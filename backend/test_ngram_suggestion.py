@@ -0,0 +1,102 @@
+"""
+测试 n-gram TF-IDF 建议索引：维度和科室推荐的得分规则、批量推荐的耗时
+"""
+import os
+import random
+import sys
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.cost_report_import_service import CostReportImportService
+from app.services.dimension_import_service import DimensionImportService
+from app.services.reference_value_import_service import ReferenceValueImportService
+from app.utils.ngram_index import NgramSuggestionIndex, text_ngrams
+
+
+DEPARTMENTS = [
+    {"id": 1, "code": "XNK", "name": "心内科", "score": 1.0},
+    {"id": 2, "code": "XXGNK", "name": "心血管内科", "score": 1.0},
+    {"id": 3, "code": "WK", "name": "外科", "score": 1.0},
+    {"id": 4, "code": "EK", "name": "儿科", "score": 1.0},
+    {"id": 5, "code": "FSK", "name": None, "score": 1.0},
+]
+
+
+def test_ngrams():
+    """单字加两侧补空格的二字"""
+    assert text_ngrams("内科") == {"内": 1, "科": 1, " 内": 1, "内科": 1, "科 ": 1}
+    assert text_ngrams("  ") == {}
+    print("✅ n-gram 切分")
+
+
+def test_department_suggestions():
+    """名称或编码完全相同的排在最前，没有公共字符的科室不推荐"""
+    index = NgramSuggestionIndex(DEPARTMENTS, fields=("name", "code"))
+
+    suggestions = ReferenceValueImportService._suggest_departments("心内科", index)
+    assert suggestions[0]["id"] == 1 and suggestions[0]["score"] == 1.0
+    assert [s["id"] for s in suggestions] == [1, 2]
+
+    suggestions = ReferenceValueImportService._suggest_departments("WK", index)
+    assert suggestions[0]["id"] == 3 and suggestions[0]["score"] == 1.0
+
+    suggestions = CostReportImportService._suggest_departments(" 心血管 ", index)
+    assert suggestions[0]["id"] == 2 and suggestions[0]["score"] <= 1.0
+
+    assert CostReportImportService._suggest_departments("骨科门诊", index) == []
+    assert ReferenceValueImportService._suggest_departments("fsk", index)[0]["id"] == 5
+    print("✅ 科室推荐：完全匹配优先，包含关系加分")
+
+
+def test_dimension_suggestions():
+    """维度名称包含导入值时加分，路径包含时再加分，最多返回5个"""
+    dimensions = [
+        {"id": i, "name": f"检查{i}", "code": f"D{i:03d}", "full_path": f"医技 > 检查 > 检查{i}"}
+        for i in range(20)
+    ] + [
+        {"id": 100, "name": "CT检查", "code": "CT01", "full_path": "医技 > 影像 > CT检查"},
+        {"id": 101, "name": "护理", "code": "HL01", "full_path": "护理 > 护理"},
+    ]
+    index = NgramSuggestionIndex(dimensions, fields=("name", "code"))
+
+    suggestions = DimensionImportService._suggest_dimensions("CT", index)
+    assert suggestions[0]["id"] == 100 and suggestions[0]["score"] > 1.0
+
+    suggestions = DimensionImportService._suggest_dimensions("检查", index)
+    assert len(suggestions) == 5 and all(s["score"] > 0.5 for s in suggestions)
+    assert [s["score"] for s in suggestions] == sorted((s["score"] for s in suggestions), reverse=True)
+
+    for dimension in dimensions:
+        assert DimensionImportService._suggest_dimensions(dimension["name"], index)[0]["id"] == dimension["id"]
+    print("✅ 维度推荐：名称完全相同的维度排在首位，最多5个")
+
+
+def test_batch_performance():
+    """3000 个导入值 × 800 个维度"""
+    random.seed(1)
+    chars = "心内外儿妇产科检查治疗手术护理影像超声放射检验病理麻醉康复中医口腔眼耳鼻喉"
+    dimensions = [
+        {"id": i, "name": "".join(random.sample(chars, 4)), "code": f"D{i:04d}", "full_path": ""}
+        for i in range(800)
+    ]
+    values = ["".join(random.sample(chars, random.randint(2, 6))) for _ in range(3000)]
+
+    started = time.time()
+    index = NgramSuggestionIndex(dimensions, fields=("name", "code"))
+    results = index.suggest_many(values, limit=5, threshold=0.3, score=DimensionImportService._dimension_score)
+    elapsed = time.time() - started
+
+    assert len(results) == len(set(values))
+    assert all(len(suggestions) <= 5 for suggestions in results.values())
+    assert elapsed < 30
+    print(f"✅ 批量推荐 {len(results)} 个导入值 × {len(dimensions)} 个维度，耗时 {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    test_ngrams()
+    test_department_suggestions()
+    test_dimension_suggestions()
+    test_batch_performance()
+    print("\n所有测试通过")
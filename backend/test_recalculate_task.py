@@ -0,0 +1,88 @@
+"""
+测试重新计算任务：只重新计算部分科室时保留其他科室的汇总数据
+"""
+import os
+import sys
+import uuid
+from decimal import Decimal
+from unittest.mock import patch
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.api import calculation_tasks as calculation_tasks_api
+from app.database import SessionLocal
+from app.middleware.hospital_context import set_current_hospital_id
+from app.models.calculation_task import CalculationTask, CalculationSummary
+from app.models.calculation_workflow import CalculationWorkflow
+from app.models.department import Department
+from app.models.hospital import Hospital
+from app.models.model_version import ModelVersion
+from app.schemas.calculation_task import CalculationTaskRecalculate
+from app.tasks.calculation_tasks import calculate_summaries
+
+
+def test_recalculate_subset_keeps_other_summaries():
+    """两个科室的任务只重新计算一个科室，另一个科室的汇总数据不受影响"""
+    db = SessionLocal()
+    suffix = uuid.uuid4().hex[:8]
+    hospital_id = db.query(Hospital.id).first()[0]
+    version = ModelVersion(hospital_id=hospital_id, version=f"recalc-{suffix}", name="重新计算测试")
+    departments = [
+        Department(hospital_id=hospital_id, his_code=f"R{i}-{suffix}", his_name=f"重算科室{i}") for i in range(2)
+    ]
+    db.add(version)
+    db.add_all(departments)
+    db.flush()
+    workflow = CalculationWorkflow(version_id=version.id, name="重新计算测试")
+    db.add(workflow)
+    db.flush()
+    task_id = f"recalc-test-{suffix}"
+    db.add(CalculationTask(
+        task_id=task_id, model_version_id=version.id, workflow_id=workflow.id,
+        period="2026-01", status="completed", progress=100,
+    ))
+    db.flush()
+    for department in departments:
+        db.add(CalculationSummary(
+            task_id=task_id, department_id=department.id,
+            doctor_value=Decimal("10"), nurse_value=0, tech_value=0, total_value=Decimal("10"),
+        ))
+    db.commit()
+    kept_id, recalculated_id = departments[0].id, departments[1].id
+
+    try:
+        set_current_hospital_id(hospital_id)
+        with patch.object(calculation_tasks_api.execute_calculation_task, "delay") as delay:
+            calculation_tasks_api.recalculate_calculation_task(
+                task_id, CalculationTaskRecalculate(department_ids=[recalculated_id]), db=db, current_user=None
+            )
+        assert delay.call_args.kwargs["department_ids"] == [recalculated_id]
+
+        def summaries():
+            db.expire_all()
+            return {
+                s.department_id: s.total_value
+                for s in db.query(CalculationSummary).filter(CalculationSummary.task_id == task_id)
+            }
+
+        assert summaries() == {kept_id: Decimal("10")}
+
+        # 计算完成后只重新生成重新计算科室的汇总数据
+        calculate_summaries(db, task_id, [departments[1]])
+        db.commit()
+        assert summaries() == {kept_id: Decimal("10"), recalculated_id: Decimal("0")}
+        print("✅ 部分科室重新计算时保留其他科室的汇总数据")
+    finally:
+        set_current_hospital_id(None)
+        db.rollback()
+        db.query(CalculationTask).filter(CalculationTask.task_id == task_id).delete()
+        db.query(Department).filter(Department.id.in_([kept_id, recalculated_id])).delete(synchronize_session=False)
+        db.query(ModelVersion).filter(ModelVersion.id == version.id).delete()
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    test_recalculate_subset_keeps_other_summaries()
+    print("\n所有测试通过")
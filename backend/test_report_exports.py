@@ -0,0 +1,137 @@
+"""
+测试后台报表导出记录：未知或已过期的导出ID返回 404，过期导出文件按保留期限清理
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+
+from app.api.calculation_tasks import download_export
+from app.celery_app import celery_app
+from app.database import SessionLocal
+from app.middleware.hospital_context import set_current_hospital_id
+from app.models.hospital import Hospital
+from app.models.report_export import ReportExport
+from app.services.batch_report_service import BatchReportService
+
+
+class PendingResult:
+    state = "PENDING"
+
+
+def download(db, export_id):
+    """调用下载接口，返回状态码"""
+    with patch.object(celery_app, "AsyncResult", lambda task_id: PendingResult()):
+        try:
+            response = download_export(export_id, db=db, current_user=None)
+        except HTTPException as e:
+            return e.status_code
+    return response.status_code
+
+
+def write_export_file(hospital_id, export_id):
+    export_dir = os.path.join(BatchReportService.EXPORT_DIR, str(hospital_id), export_id)
+    os.makedirs(export_dir)
+    file_path = os.path.join(export_dir, "批次报表.zip")
+    with open(file_path, "wb") as f:
+        f.write(b"PK")
+    return file_path
+
+
+def test_download_status():
+    """未登记、其他医疗机构、生成中、失败、完成和超时的导出分别返回对应状态码"""
+    db = SessionLocal()
+    export_ids = []
+    with tempfile.TemporaryDirectory() as export_root, \
+            patch.object(BatchReportService, "EXPORT_DIR", export_root):
+        try:
+            hospital_id = db.query(Hospital.id).first()[0]
+            set_current_hospital_id(hospital_id)
+
+            assert download(db, str(uuid.uuid4())) == 404
+
+            pending_id = str(uuid.uuid4())
+            export_ids.append(pending_id)
+            BatchReportService.create_export(db, pending_id, hospital_id, "batch-export-test")
+            assert download(db, pending_id) == 202
+
+            set_current_hospital_id(hospital_id + 100000)
+            assert download(db, pending_id) == 404
+            set_current_hospital_id(hospital_id)
+
+            file_path = write_export_file(hospital_id, pending_id)
+            BatchReportService.finish_export(db, pending_id, file_path=file_path)
+            assert download(db, pending_id) == 200
+
+            failed_id = str(uuid.uuid4())
+            export_ids.append(failed_id)
+            BatchReportService.create_export(db, failed_id, hospital_id, "batch-export-test")
+            BatchReportService.finish_export(db, failed_id, error="报表生成失败")
+            assert download(db, failed_id) == 500
+
+            # 工作进程被终止，记录一直停留在生成中
+            stale_id = str(uuid.uuid4())
+            export_ids.append(stale_id)
+            export = BatchReportService.create_export(db, stale_id, hospital_id, "batch-export-test")
+            export.created_at = datetime.utcnow() - timedelta(hours=2)
+            db.commit()
+            assert download(db, stale_id) == 500
+            print("✅ 下载接口区分生成中、失败、超时与未知的导出ID")
+        finally:
+            set_current_hospital_id(None)
+            db.query(ReportExport).filter(ReportExport.id.in_(export_ids)).delete(synchronize_session=False)
+            db.commit()
+            db.close()
+
+
+def test_cleanup_expired_exports():
+    """超过保留期限的导出记录和目录被删除，删除后下载返回 404；无记录的旧目录按修改时间删除"""
+    db = SessionLocal()
+    export_ids = []
+    with tempfile.TemporaryDirectory() as export_root, \
+            patch.object(BatchReportService, "EXPORT_DIR", export_root):
+        try:
+            hospital_id = db.query(Hospital.id).first()[0]
+            set_current_hospital_id(hospital_id)
+
+            expired_id, recent_id, orphan_id = (str(uuid.uuid4()) for _ in range(3))
+            export_ids += [expired_id, recent_id]
+            for export_id in (expired_id, recent_id):
+                BatchReportService.create_export(db, export_id, hospital_id, "batch-export-test")
+                BatchReportService.finish_export(db, export_id, file_path=write_export_file(hospital_id, export_id))
+            db.query(ReportExport).filter(ReportExport.id == expired_id).update(
+                {"created_at": datetime.utcnow() - timedelta(days=2)}
+            )
+            db.commit()
+
+            orphan_file = write_export_file(hospital_id, orphan_id)
+            old = time.time() - 3 * 24 * 3600
+            os.utime(os.path.dirname(orphan_file), (old, old))
+
+            assert BatchReportService.cleanup_expired_exports(db) == 2
+            assert not os.path.exists(os.path.join(export_root, str(hospital_id), expired_id))
+            assert not os.path.exists(os.path.dirname(orphan_file))
+            assert BatchReportService.find_export_file(hospital_id, recent_id)
+
+            assert download(db, expired_id) == 404
+            assert download(db, recent_id) == 200
+            print("✅ 过期导出文件和记录按保留期限清理")
+        finally:
+            set_current_hospital_id(None)
+            db.query(ReportExport).filter(ReportExport.id.in_(export_ids)).delete(synchronize_session=False)
+            db.commit()
+            db.close()
+
+
+if __name__ == "__main__":
+    test_download_status()
+    test_cleanup_expired_exports()
+    print("\n所有测试通过")
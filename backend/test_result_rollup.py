@@ -0,0 +1,111 @@
+"""
+测试计算结果逐级汇总引擎
+"""
+import json
+import os
+import sys
+from decimal import Decimal
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.result_rollup_service import ResultRollup
+from app.utils.sequence_type import infer_sequence_type
+
+
+class MockResult:
+    def __init__(self, department_id, node_id, parent_id, node_type, value, workload=None, node_name=""):
+        self.department_id = department_id
+        self.node_id = node_id
+        self.parent_id = parent_id
+        self.node_type = node_type
+        self.value = value
+        self.workload = workload
+        self.node_name = node_name
+
+
+def _results():
+    # 科室1：序列10 -> 维度11 -> (维度12, 维度13)；科室2 只有维度11的末级数据
+    return [
+        MockResult(1, 10, None, "sequence", Decimal("999"), node_name="医生序列"),
+        MockResult(1, 11, 10, "dimension", Decimal("500")),
+        MockResult(1, 12, 11, "dimension", Decimal("30"), Decimal("3")),
+        MockResult(1, 13, 11, "dimension", None, Decimal("2")),
+        MockResult(1, 14, 10, "dimension", Decimal("7"), Decimal("1")),
+        MockResult(2, 10, None, "sequence", Decimal("0"), node_name="医生序列"),
+        MockResult(2, 11, 10, "dimension", Decimal("40"), Decimal("4")),
+    ]
+
+
+def test_rollup_by_department():
+    """有子节点的节点取子节点之和，末级节点取自身值"""
+    rollup = ResultRollup(_results())
+    assert rollup.totals(1, 11) == (Decimal("5"), Decimal("30"))
+    assert rollup.value(1, 10) == Decimal("37")
+    assert rollup.value(2, 10) == Decimal("40")
+    assert [r.node_id for r in rollup.children(1, 11)] == [12, 13]
+    assert [r.node_id for r in rollup.sequences(2)] == [10]
+    print("✅ 按科室逐级汇总")
+
+
+def test_rollup_merged_group():
+    """按全院分组时同一节点的多行结果先合并"""
+    rollup = ResultRollup(_results(), group_key=lambda r: None)
+    assert rollup.own(None, 11) == (Decimal("4"), Decimal("540"))
+    assert rollup.value(None, 10) == Decimal("37")
+    assert len(rollup.sequences(None)) == 1
+    print("✅ 合并分组汇总")
+
+
+def test_cycle_does_not_hang():
+    """父子关系成环时不会死循环"""
+    results = [
+        MockResult(1, 1, 2, "dimension", Decimal("1")),
+        MockResult(1, 2, 1, "dimension", Decimal("2")),
+    ]
+    rollup = ResultRollup(results)
+    assert rollup.value(1, 1) == Decimal("0")
+    print("✅ 成环数据不死循环")
+
+
+def test_snapshot_roundtrip():
+    """快照可以 JSON 序列化，恢复后汇总值和树结构不变"""
+    rollup = ResultRollup(_results(), group_key=lambda r: None, sequence_types={10: "doctor"})
+    nodes = json.loads(json.dumps(rollup.to_snapshot(None)))
+    restored = ResultRollup.from_snapshot(nodes)
+    assert restored.totals(None, 11) == rollup.totals(None, 11)
+    assert restored.own(None, 11) == (Decimal("4"), Decimal("540"))
+    assert [r.node_id for r in restored.children(None, 10)] == [11, 14]
+    assert restored.sequence_values(None) == (Decimal("37"), Decimal("0"), Decimal("0"))
+    print("✅ 快照序列化与恢复")
+
+
+def test_sequence_values_by_type():
+    """序列按节点的 sequence_type 归类，不按名称判断"""
+    results = _results() + [MockResult(1, 20, None, "sequence", Decimal("5"), node_name="医生辅助序列")]
+    rollup = ResultRollup(results, sequence_types={10: "nurse", 20: "tech"})
+    assert rollup.sequence_values(1) == (Decimal("0"), Decimal("37"), Decimal("5"))
+    assert rollup.sequence_type(10) == "nurse"
+    # 未指定类别的序列不计入任何类别
+    assert ResultRollup(results).sequence_values(1) == (Decimal("0"), Decimal("0"), Decimal("0"))
+    print("✅ 序列按类别归类")
+
+
+def test_infer_sequence_type():
+    """按中文关键字和不区分大小写的英文名称推断序列类别"""
+    assert infer_sequence_type("医生序列") == "doctor"
+    assert infer_sequence_type("Physician Sequence") == "doctor"
+    assert infer_sequence_type("NURSING") == "nurse"
+    assert infer_sequence_type("Medical Technician") == "tech"
+    assert infer_sequence_type("其他序列") is None
+    print("✅ 序列类别按名称推断")
+
+
+if __name__ == "__main__":
+    test_rollup_by_department()
+    test_rollup_merged_group()
+    test_cycle_does_not_hang()
+    test_snapshot_roundtrip()
+    test_sequence_values_by_type()
+    test_infer_sequence_type()
+    print("\n所有测试通过！")
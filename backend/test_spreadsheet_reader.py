@@ -0,0 +1,93 @@
+"""
+测试流式表格读取：Excel 与 CSV 读取结果一致，解析大文件时内存占用与行数无关
+"""
+import os
+import sys
+import tracemalloc
+from io import BytesIO
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import openpyxl
+
+from app.config.import_configs import CHARGE_ITEM_IMPORT_CONFIG
+from app.services.dimension_import_service import DimensionImportService
+from app.services.excel_import_service import ExcelImportService
+from app.utils.spreadsheet_reader import SpreadsheetReader, scan_rows
+
+
+ROWS = [
+    ["说明"],
+    ["收费编码", "项目名称", "维度预案"],
+    ["C001", "CT平扫", "4D"],
+    ["C002", "", "4D"],
+    ["C003", "彩超", "5D"],
+]
+
+
+def make_xlsx(rows):
+    wb = openpyxl.Workbook()
+    for row in rows:
+        wb.active.append([value if value != "" else None for value in row])
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def make_csv(rows, encoding="utf-8-sig"):
+    return "\r\n".join(",".join(row) for row in rows).encode(encoding)
+
+
+def test_xlsx_and_csv():
+    """Excel、UTF-8 CSV、GB18030 CSV 读取结果一致，空单元格为 None"""
+    expected = None
+    for content in (make_xlsx(ROWS), make_csv(ROWS), make_csv(ROWS, "gb18030")):
+        with SpreadsheetReader(content) as reader:
+            scan = scan_rows(reader.iter_rows(), header_index=1, preview_count=2)
+            rows = list(reader.iter_rows(skip_rows=2))
+        assert scan["header"][:3] == ("收费编码", "项目名称", "维度预案")
+        assert scan["total_rows"] == 5 and scan["data_rows"] == 3 and len(scan["preview_rows"]) == 2
+        assert rows[1][1] is None
+        result = [tuple(row[:3]) for row in rows]
+        assert expected is None or result == expected
+        expected = result
+    print("✅ Excel 与 CSV 读取结果一致")
+
+    try:
+        SpreadsheetReader(b"\xd0\xcf\x11\xe0" + b"\x00" * 100)
+        assert False, "xls 文件应提示格式错误"
+    except ValueError:
+        pass
+    print("✅ 不支持的格式提示错误")
+
+
+def test_dimension_import_csv():
+    """维度目录智能导入支持 CSV：跳过行、表头、唯一值提取"""
+    result = DimensionImportService.parse_excel(make_csv(ROWS), skip_rows=1)
+    assert result["current_sheet"] == "CSV" and result["total_rows"] == 3
+    assert result["headers"] == ["收费编码 (A)", "项目名称 (B)", "维度预案 (C)"]
+    print("✅ 维度目录导入解析 CSV")
+
+
+def test_constant_memory():
+    """解析 30 万行的 CSV 时只保留预览行"""
+    lines = ["项目编码,项目名称,项目分类"] + [f"C{i:07d},项目{i},检查" for i in range(300000)]
+    content = "\n".join(lines).encode("utf-8")
+    del lines
+
+    tracemalloc.start()
+    result = ExcelImportService(CHARGE_ITEM_IMPORT_CONFIG).parse_excel(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert result["total_rows"] == 300000 and len(result["preview_data"]) == 10
+    assert peak < len(content) / 4, f"峰值内存 {peak}"
+    print(f"✅ 解析 30 万行 CSV，峰值内存 {peak // 1024} KB（文件 {len(content) // 1024} KB）")
+
+
+if __name__ == "__main__":
+    test_xlsx_and_csv()
+    test_dimension_import_csv()
+    test_constant_memory()
+    print("\n所有测试通过")
@@ -0,0 +1,102 @@
+"""
+测试SQL模板编译（占位符绑定参数、语句拆分）
+"""
+import os
+import sys
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.sql_template import compile_sql_template, get_compiled_template
+
+
+PARAMS = {
+    "task_id": "task-1",
+    "hospital_id": 1,
+    "department_id": None,
+    "department_name": "O'Brien",
+    "version_id": 7,
+    "period": "2025-10",
+    "year": "2025",
+    "end_date": "2025-10-31",
+}
+
+
+def test_placeholders_become_bind_parameters():
+    """完整字面量和独立数值占位符编译为绑定参数，其他位置文本替换"""
+    template = compile_sql_template(
+        "INSERT INTO t SELECT '{task_id}', {department_id}, {version_id}::int, "
+        "DATE '{end_date}', '{period}-01', \"T_{year}\", '{department_name}' "
+        "FROM s WHERE hospital_id = {hospital_id}"
+    )
+    assert len(template.statements) == 1
+    clause = template.statements[0].to_clause(PARAMS)
+    sql = clause.text
+
+    assert ":task_id" in sql and ":department_id_num" in sql
+    assert ":version_id_num ::int" in sql
+    assert "DATE '2025-10-31'" in sql
+    assert "'2025-10-01'" in sql and '"T_2025"' in sql
+    assert ":department_name" in sql
+    assert ":hospital_id_num" in sql
+    print("✅ 占位符编译为绑定参数")
+
+
+def test_literal_render_matches_text_replacement():
+    """字面渲染与原有的文本替换结果一致，并转义单引号"""
+    template = compile_sql_template("SELECT '{task_id}', {department_id}, '{department_name}'")
+    assert template.render_literal(PARAMS) == "SELECT 'task-1', NULL, 'O''Brien'"
+    print("✅ 字面渲染正确")
+
+
+def test_split_ignores_semicolons_in_strings_and_comments():
+    """只在语句之间的分号处拆分，纯注释语句被丢弃"""
+    template = compile_sql_template(
+        "-- 说明; 不是语句\n"
+        "UPDATE t SET code = 'a; b';\n"
+        "DO $$ BEGIN PERFORM 1; END $$;\n"
+        "/* 纯注释 */;\n"
+        "SELECT 1"
+    )
+    assert len(template.statements) == 3
+    assert "'a; b'" in template.statements[0].render_literal({})
+    assert template.statements[1].render_literal({}) == "DO $$ BEGIN PERFORM 1; END $$"
+    print("✅ 语句拆分正确")
+
+
+def test_compiled_template_cached_per_step_version():
+    """同一步骤版本复用编译结果，代码变化后重新编译"""
+    first = get_compiled_template((1, "v1"), "SELECT {hospital_id}")
+    assert get_compiled_template((1, "v1"), "SELECT {hospital_id}") is first
+    assert get_compiled_template((1, "v1"), "SELECT {version_id}") is not first
+    print("✅ 编译结果按步骤版本缓存")
+
+
+def test_statement_is_query():
+    """忽略注释和字符串判断语句是否为查询，WITH 语句按主语句判断"""
+    queries = [
+        "-- 说明\nSELECT * FROM t WHERE a = 'INSERT'",
+        "/* 说明 */ (SELECT 1) UNION SELECT 2",
+        "WITH a AS (DELETE FROM t RETURNING *) SELECT * FROM a",
+        "VALUES (1, '{task_id}')",
+        "TABLE t",
+    ]
+    statements = [
+        "INSERT INTO t SELECT '{task_id}', {department_id}",
+        "WITH a AS (SELECT 1) INSERT INTO t SELECT * FROM a",
+        "SELECT * INTO t2 FROM t",
+        "CREATE TABLE t2 AS SELECT * FROM t",
+        "DO $$ BEGIN PERFORM 1; END $$",
+    ]
+    assert all(compile_sql_template(sql).statements[0].is_query for sql in queries)
+    assert not any(compile_sql_template(sql).statements[0].is_query for sql in statements)
+    print("✅ 查询语句识别正确")
+
+
+if __name__ == "__main__":
+    test_placeholders_become_bind_parameters()
+    test_literal_render_matches_text_replacement()
+    test_split_ignores_semicolons_in_strings_and_comments()
+    test_compiled_template_cached_per_step_version()
+    test_statement_is_query()
+    print("\n所有测试通过！")
@@ -0,0 +1,112 @@
+"""
+测试分阶段批量导入：维度目录、成本报表、参考价值的执行导入
+"""
+import os
+import sys
+import uuid
+from decimal import Decimal
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.models.cost_report import CostReport
+from app.models.dimension_item_mapping import DimensionItemMapping
+from app.models.hospital import Hospital
+from app.models.reference_value import ReferenceValue
+from app.services.cost_report_import_service import CostReportImportService
+from app.services.dimension_import_service import DimensionImportService
+from app.services.reference_value_import_service import ReferenceValueImportService
+
+
+def test_dimension_import(db, hospital_id, suffix):
+    """已存在的映射被覆盖，单行错误不影响其他行"""
+    db.add(DimensionItemMapping(hospital_id=hospital_id, dimension_code=f"D1-{suffix}", item_code=f"I1-{suffix}"))
+    db.commit()
+
+    items = [
+        {"item_code": f"I1-{suffix}", "dimension_code": f"D1-{suffix}", "status": "ok"},
+        {"item_code": f"I2-{suffix}", "dimension_code": f"D1-{suffix}", "status": "warning"},
+        {"item_code": f"I3-{suffix}", "dimension_code": "X" * 200, "status": "ok"},
+        {"item_code": f"I4-{suffix}", "dimension_code": "", "status": "error", "message": "目标维度不存在"},
+    ] + [
+        {"item_code": f"B{i}-{suffix}", "dimension_code": f"D2-{suffix}", "status": "ok"}
+        for i in range(2000)
+    ]
+    report = DimensionImportService.execute_import("", items, db, hospital_id)["report"]
+    assert report["success_count"] == 2002 and report["error_count"] == 2
+    assert {error["item_code"] for error in report["errors"]} == {f"I3-{suffix}", f"I4-{suffix}"}
+
+    count = db.query(DimensionItemMapping).filter(
+        DimensionItemMapping.hospital_id == hospital_id,
+        DimensionItemMapping.item_code.like(f"%-{suffix}")
+    ).count()
+    assert count == 2002
+    print("✅ 维度目录导入：覆盖已有映射，超长字段按行报告错误")
+
+
+def test_cost_report_import(db, hospital_id, suffix):
+    """已有记录更新，文件内重复的科室以最后一行为准"""
+    period = "2099-01"
+    db.add(CostReport(hospital_id=hospital_id, period=period, department_code=f"A-{suffix}",
+                      department_name="原科室", personnel_cost=1))
+    db.commit()
+
+    items = [
+        {"period": period, "department_code": f"A-{suffix}", "department_name": None, "personnel_cost": 10, "status": "ok"},
+        {"period": period, "department_code": f"B-{suffix}", "department_name": "新科室", "personnel_cost": 5, "status": "ok"},
+        {"period": period, "department_code": f"B-{suffix}", "department_name": "新科室", "personnel_cost": 6, "status": "ok"},
+        {"period": period, "department_code": f"C-{suffix}", "status": "skip"},
+        {"period": period, "department_code": "", "status": "ok"},
+    ]
+    report = CostReportImportService.execute_import("", items, db, hospital_id)["report"]
+    assert report["success_count"] == 1 and report["update_count"] == 2
+    assert report["skip_count"] == 1 and report["error_count"] == 1
+
+    records = {
+        record.department_code.split("-")[0]: record
+        for record in db.query(CostReport).filter(CostReport.department_code.like(f"%-{suffix}"))
+    }
+    assert records["A"].department_name == "原科室" and records["A"].personnel_cost == Decimal("10")
+    assert records["B"].personnel_cost == Decimal("6")
+    print("✅ 成本报表导入：更新已有记录，重复行以最后一行为准")
+
+
+def test_reference_value_import(db, hospital_id, suffix):
+    """数值不合法的行按行报告错误，其余行正常导入"""
+    period = "2099-01"
+    items = [
+        {"period": period, "department_code": f"A-{suffix}", "department_name": "内科",
+         "reference_value": "100.5", "doctor_reference_value": 60, "status": "ok"},
+        {"period": period, "department_code": f"B-{suffix}", "department_name": "外科",
+         "reference_value": "abc", "status": "ok"},
+        {"period": period, "department_code": f"C-{suffix}", "department_name": "儿科",
+         "reference_value": None, "status": "ok"},
+    ]
+    report = ReferenceValueImportService.execute_import("", items, db, hospital_id)["report"]
+    assert report["success_count"] == 1 and report["error_count"] == 2
+    assert [error["department_code"] for error in report["errors"]] == [f"B-{suffix}", f"C-{suffix}"]
+
+    record = db.query(ReferenceValue).filter(ReferenceValue.department_code == f"A-{suffix}").one()
+    assert record.reference_value == Decimal("100.5") and record.nurse_reference_value is None
+    print("✅ 参考价值导入：数值错误按行报告，不影响其他行")
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    suffix = uuid.uuid4().hex[:8]
+    hospital_id = db.query(Hospital).first().id
+    try:
+        test_dimension_import(db, hospital_id, suffix)
+        test_cost_report_import(db, hospital_id, suffix)
+        test_reference_value_import(db, hospital_id, suffix)
+    finally:
+        db.rollback()
+        db.query(DimensionItemMapping).filter(
+            DimensionItemMapping.item_code.like(f"%-{suffix}")
+        ).delete(synchronize_session=False)
+        db.query(CostReport).filter(CostReport.department_code.like(f"%-{suffix}")).delete(synchronize_session=False)
+        db.query(ReferenceValue).filter(ReferenceValue.department_code.like(f"%-{suffix}")).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+    print("\n所有测试通过")
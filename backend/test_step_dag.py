@@ -0,0 +1,99 @@
+"""
+测试计算步骤依赖图
+"""
+import os
+import sys
+import threading
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.step_dag import build_step_dependencies, run_step_dag
+
+
+class MockStep:
+    def __init__(self, id, depends_on=None):
+        self.id = id
+        self.depends_on = depends_on
+
+
+def test_default_dependencies_are_sequential():
+    """未声明依赖时依赖所有排序在前的步骤"""
+    steps = [MockStep(1), MockStep(2), MockStep(3)]
+    deps = build_step_dependencies(steps)
+    assert deps == {1: set(), 2: {1}, 3: {1, 2}}
+    print("✅ 默认串行依赖")
+
+
+def test_independent_steps_run_concurrently():
+    """医生/护理/医技价值步骤只依赖数据准备步骤，应并发执行"""
+    steps = [
+        MockStep(116),
+        MockStep(117, [116]),
+        MockStep(118, [116]),
+        MockStep(119, [116]),
+        MockStep(120),  # 汇总步骤：依赖前面所有步骤
+    ]
+    deps = build_step_dependencies(steps)
+    assert deps[120] == {116, 117, 118, 119}
+
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+    finished = []
+
+    def run_step(step_id):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+            finished.append(step_id)
+
+    run_step_dag([s.id for s in steps], deps, run_step, max_workers=4)
+
+    assert finished[0] == 116
+    assert finished[-1] == 120
+    assert peak[0] == 3
+    print(f"✅ 并发执行，最大并发 {peak[0]}")
+
+
+def test_cycle_detected():
+    """依赖成环时报错"""
+    steps = [MockStep(1, [2]), MockStep(2, [1])]
+    try:
+        build_step_dependencies(steps)
+    except ValueError as e:
+        print(f"✅ 检测到循环依赖: {e}")
+        return
+    raise AssertionError("未检测到循环依赖")
+
+
+def test_failure_stops_dependents():
+    """步骤失败后不再执行依赖它的步骤"""
+    steps = [MockStep(1), MockStep(2, [1]), MockStep(3, [])]
+    deps = build_step_dependencies(steps)
+    executed = []
+
+    def run_step(step_id):
+        executed.append(step_id)
+        if step_id == 1:
+            raise RuntimeError("步骤1失败")
+
+    try:
+        run_step_dag([s.id for s in steps], deps, run_step, max_workers=2)
+    except RuntimeError:
+        assert 2 not in executed
+        print("✅ 失败后停止执行依赖步骤")
+        return
+    raise AssertionError("未抛出步骤异常")
+
+
+if __name__ == "__main__":
+    test_default_dependencies_are_sequential()
+    test_independent_steps_run_concurrently()
+    test_cycle_detected()
+    test_failure_stops_dependents()
+    print("\n所有测试通过！")
@@ -0,0 +1,127 @@
+"""
+测试计算步骤执行：最后一条语句为查询时流式读取结果集，为 DML 时直接执行
+"""
+import os
+import sys
+import uuid
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+
+from app.database import SessionLocal, engine
+from app.models.calculation_step import CalculationStep
+from app.models.calculation_step_log import CalculationStepLog
+from app.models.calculation_task import CalculationTask
+from app.models.calculation_workflow import CalculationWorkflow
+from app.models.data_source import DataSource
+from app.models.hospital import Hospital
+from app.models.model_version import ModelVersion
+from app.services.data_source_service import connection_manager
+from app.tasks.calculation_tasks import execute_calculation_step
+
+
+class Fixture:
+    def __init__(self):
+        self.db = SessionLocal()
+        suffix = uuid.uuid4().hex[:8]
+        self.hospital_id = self.db.query(Hospital.id).first()[0]
+        self.version = ModelVersion(hospital_id=self.hospital_id, version=f"exec-{suffix}", name="步骤执行测试")
+        self.db.add(self.version)
+        self.db.flush()
+        self.workflow = CalculationWorkflow(version_id=self.version.id, name="步骤执行测试")
+        self.data_source = DataSource(
+            name=f"步骤执行测试-{suffix}", db_type="postgresql", host="localhost", port=5432,
+            database_name="calc", username="postgres", password="-",
+        )
+        self.db.add_all([self.workflow, self.data_source])
+        self.db.flush()
+        self.task = CalculationTask(
+            task_id=f"exec-test-{suffix}", model_version_id=self.version.id,
+            period="2026-01", status="running", progress=0,
+        )
+        self.db.add(self.task)
+        self.db.commit()
+        connection_manager.pools[self.data_source.id] = engine
+        with engine.begin() as connection:
+            connection.execute(text("CREATE TABLE IF NOT EXISTS step_exec_test (task_id varchar(100), n integer)"))
+
+    def add_step(self, name, code):
+        step = CalculationStep(
+            workflow_id=self.workflow.id, name=name, code_type="sql", code_content=code,
+            data_source_id=self.data_source.id, sort_order=1,
+        )
+        self.db.add(step)
+        self.db.commit()
+        return step
+
+    def run(self, step):
+        execute_calculation_step(
+            self.db, self.task.task_id, step, None, "2026-01", self.version.id, self.hospital_id
+        )
+        return self.db.query(CalculationStepLog).filter(
+            CalculationStepLog.task_id == self.task.task_id,
+            CalculationStepLog.step_id == step.id
+        ).one()
+
+    def cleanup(self):
+        self.db.rollback()
+        connection_manager.pools.pop(self.data_source.id, None)
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS step_exec_test"))
+        self.db.query(CalculationTask).filter(CalculationTask.task_id == self.task.task_id).delete()
+        self.db.query(ModelVersion).filter(ModelVersion.id == self.version.id).delete()
+        self.db.query(DataSource).filter(DataSource.id == self.data_source.id).delete()
+        self.db.commit()
+        self.db.close()
+
+
+def test_step_ending_with_insert():
+    """最后一条语句为 INSERT 时不使用服务端游标，累计影响行数"""
+    fixture = Fixture()
+    try:
+        step = fixture.add_step("写入结果", """
+            DELETE FROM step_exec_test WHERE task_id = '{task_id}';
+            -- 最后一条语句写入结果
+            INSERT INTO step_exec_test SELECT '{task_id}', g FROM generate_series(1, 3) g
+        """)
+        log = fixture.run(step)
+        assert log.status == "success"
+        assert log.result_data["affected_rows"] == 3
+        assert [entry["rows"] for entry in log.statement_profile] == [0, 3]
+
+        step = fixture.add_step("写入汇总", """
+            WITH totals AS (SELECT task_id, SUM(n) AS n FROM step_exec_test WHERE task_id = '{task_id}' GROUP BY task_id)
+            INSERT INTO step_exec_test SELECT task_id, n FROM totals
+        """)
+        log = fixture.run(step)
+        assert log.status == "success" and log.result_data["affected_rows"] == 1
+        print("✅ 以 INSERT 结尾的步骤执行成功")
+    finally:
+        fixture.cleanup()
+
+
+def test_step_ending_with_query():
+    """最后一条语句为查询时按批读取结果集"""
+    fixture = Fixture()
+    try:
+        step = fixture.add_step("查询结果", """
+            INSERT INTO step_exec_test SELECT '{task_id}', g FROM generate_series(1, 5) g;
+            /* 最后一条语句返回结果 */
+            WITH rows AS (SELECT n FROM step_exec_test WHERE task_id = '{task_id}')
+            SELECT n FROM rows ORDER BY n
+        """)
+        log = fixture.run(step)
+        assert log.status == "success"
+        assert log.result_data["row_count"] == 5
+        assert log.statement_profile[-1]["rows"] == 5
+        print("✅ 以查询结尾的步骤按批读取结果集")
+    finally:
+        fixture.cleanup()
+
+
+if __name__ == "__main__":
+    test_step_ending_with_insert()
+    test_step_ending_with_query()
+    print("\n所有测试通过")
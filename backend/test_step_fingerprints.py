@@ -0,0 +1,144 @@
+"""
+测试步骤输入指纹：源表版本戳按任务查询一次，各科室复用；
+收费明细月份加载指纹不随科室和模型版本变化
+"""
+import os
+import sys
+import uuid
+from datetime import datetime
+from unittest.mock import patch
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal, engine
+from app.models.calculation_step import CalculationStep
+from app.models.data_source import DataSource
+from app.models.department import Department
+from app.services.data_source_service import connection_manager
+from app.services.incremental_calculation_service import IncrementalCalculationService
+from app.tasks import calculation_tasks
+
+
+def make_data_source(db):
+    """登记一个指向测试库的 PostgreSQL 数据源"""
+    data_source = DataSource(
+        name=f"指纹测试-{uuid.uuid4().hex[:8]}", db_type="postgresql", host="localhost", port=5432,
+        database_name="calc", username="postgres", password="-",
+    )
+    db.add(data_source)
+    db.commit()
+    connection_manager.pools[data_source.id] = engine
+    return data_source
+
+
+def make_steps(data_source_id):
+    updated_at = datetime(2026, 1, 1)
+    return [
+        CalculationStep(
+            id=-1001, name="准备", code_type="sql", data_source_id=data_source_id, updated_at=updated_at,
+            code_content="""
+                DELETE FROM fp_test_tmp WHERE task_id = '{task_id}';
+                INSERT INTO fp_test_tmp SELECT '{task_id}', id FROM model_nodes WHERE version_id = {version_id}
+            """,
+        ),
+        CalculationStep(
+            id=-1002, name="计算", code_type="sql", data_source_id=data_source_id, updated_at=updated_at,
+            code_content="""
+                INSERT INTO calculation_results (task_id, department_id)
+                SELECT t.task_id, d.id FROM fp_test_tmp t JOIN departments d ON d.id = {department_id}
+            """,
+        ),
+    ]
+
+
+def test_source_stamps_queried_once():
+    """多个科室共用任务级源表版本戳，指纹与各科室单独查询时一致"""
+    db = SessionLocal()
+    data_source = make_data_source(db)
+    try:
+        steps = make_steps(data_source.id)
+        departments = [Department(id=-i, hospital_id=1, his_code=f"D{i}", his_name=f"科室{i}") for i in range(1, 4)]
+        args = ("2026-01", "fp-task", 1, 1)
+
+        calls = []
+        original = IncrementalCalculationService.get_table_stamps
+
+        def counting(connection, tables, exact=False):
+            calls.append(set(tables))
+            return original(connection, tables, exact)
+
+        with patch.object(IncrementalCalculationService, "get_table_stamps", counting):
+            source_stamps = calculation_tasks._collect_source_stamps(db, steps, departments, *args)
+            assert len(calls) == 1
+            # 流程内写入的中间表不纳入源表版本戳
+            assert calls[0] == {"model_nodes", "departments"}
+            assert set(source_stamps[data_source.id]) == {"model_nodes", "departments"}
+
+            shared = [
+                calculation_tasks._compute_step_fingerprints(db, steps, department, *args, source_stamps=source_stamps)[0]
+                for department in departments
+            ]
+            assert len(calls) == 1
+
+            separate = [
+                calculation_tasks._compute_step_fingerprints(db, steps, department, *args)[0]
+                for department in departments
+            ]
+            assert len(calls) == 1 + len(departments)
+
+        assert shared == separate
+        assert all(fingerprint for fingerprints in shared for fingerprint in fingerprints.values())
+        print("✅ 源表版本戳每个任务查询一次，各科室指纹不变")
+    finally:
+        connection_manager.pools.pop(data_source.id, None)
+        db.query(DataSource).filter(DataSource.id == data_source.id).delete()
+        db.commit()
+        db.close()
+
+
+def test_period_load_key_shared():
+    """不同科室、模型版本加载同一月份时月份加载指纹相同，不同月份不同"""
+    db = SessionLocal()
+    data_source = make_data_source(db)
+    try:
+        step = CalculationStep(
+            id=-1003, name="加载收费明细", code_type="sql", data_source_id=data_source.id,
+            updated_at=datetime(2026, 1, 1),
+            code_content="""
+                SELECT prepare_charge_details_period('{current_year_month}');
+                INSERT INTO charge_details (charge_time, item_code)
+                SELECT '{start_date}'::date, code FROM model_nodes WHERE code IS NOT NULL
+            """,
+        )
+        departments = [Department(id=-i, hospital_id=1, his_code=f"D{i}", his_name=f"科室{i}") for i in range(1, 3)]
+
+        def period_load(department, period, version_id):
+            period_loads = calculation_tasks._compute_step_fingerprints(
+                db, [step], department, period, f"fp-task-{version_id}", version_id, 1
+            )[4]
+            return period_loads[step.id]
+
+        keys = {
+            period_load(department, "2026-01", version_id)
+            for department in departments
+            for version_id in (1, 2)
+        }
+        assert len(keys) == 1
+        year_month, period_key = keys.pop()
+        assert year_month == "2026-01" and period_key
+
+        other_month, other_key = period_load(departments[0], "2026-02", 1)
+        assert other_month == "2026-02" and other_key != period_key
+        print("✅ 各科室、各模型版本加载同一月份时复用月份加载指纹")
+    finally:
+        connection_manager.pools.pop(data_source.id, None)
+        db.query(DataSource).filter(DataSource.id == data_source.id).delete()
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    test_source_stamps_queried_once()
+    test_period_load_key_shared()
+    print("\n所有测试通过")
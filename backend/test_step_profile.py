@@ -0,0 +1,61 @@
+"""
+测试步骤语句级剖析：语句摘要和任务耗时汇总
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.step_profile_service import StepProfileService
+from app.utils.sql_template import compile_sql_template
+
+
+def test_statement_label():
+    """摘要保留占位符名称，各科室执行时相同"""
+    template = compile_sql_template("""
+        DELETE FROM calculation_results
+        WHERE task_id = '{task_id}'
+          AND department_id = {department_id};
+        SELECT * FROM charge_details WHERE year_month = '{current_year_month}'
+    """)
+    labels = [statement.label() for statement in template.statements]
+    assert labels[0] == "DELETE FROM calculation_results WHERE task_id = {task_id} AND department_id = {department_id}"
+    assert labels[1] == "SELECT * FROM charge_details WHERE year_month = {current_year_month}"
+    assert len(template.statements[1].label(max_length=20)) == 20
+    print("✅ 语句摘要正确")
+
+
+def test_build_breakdown():
+    """按步骤、语句合并各科室的耗时，按耗时降序，复用的步骤不计入"""
+    def log(step_id, duration_ms, profile, status="success"):
+        return SimpleNamespace(step_id=step_id, duration_ms=duration_ms, status=status, statement_profile=profile)
+
+    logs = [
+        log(1, 100, [{"index": 1, "sql": "INSERT A", "duration_ms": 60, "rows": 10},
+                     {"index": 2, "sql": "SELECT B", "duration_ms": 5, "fetch_ms": 30, "rows": 3}]),
+        log(1, 200, [{"index": 1, "sql": "INSERT A", "duration_ms": 150, "rows": 20, "explain": "plan"},
+                     {"index": 2, "sql": "SELECT B", "duration_ms": 10, "rows": 3}]),
+        log(2, 500, [{"index": 1, "sql": "UPDATE C", "duration_ms": 480, "rows": 1}], status="failed"),
+        log(3, 0, None, status="reused"),
+    ]
+    tree = StepProfileService.build_breakdown("task-1", logs, {1: "数据准备", 2: "价值计算"})
+
+    assert tree["value"] == 800
+    assert [child["name"] for child in tree["children"]] == ["价值计算", "数据准备"]
+    assert tree["children"][0]["failed"] == 1
+
+    prepare = tree["children"][1]
+    assert prepare["executions"] == 2
+    insert, select = prepare["children"]
+    assert insert["name"] == "#1 INSERT A" and insert["value"] == 210 and insert["rows"] == 30
+    assert insert["max_ms"] == 150 and insert["explain"] == "plan"
+    assert select["value"] == 45
+    print("✅ 耗时汇总正确")
+
+
+if __name__ == "__main__":
+    test_statement_label()
+    test_build_breakdown()
+    print("\n所有测试通过！")
@@ -0,0 +1,89 @@
+"""
+测试步骤结果采集：样本、统计和按列写入的结果文件
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.step_result_capture import StepResultCapture, iter_result_column
+
+
+class FakeRow(tuple):
+    """模拟 SQLAlchemy Row：可按位置迭代，也有 _mapping"""
+
+    def __new__(cls, columns, values):
+        row = super().__new__(cls, values)
+        row._mapping = dict(zip(columns, values))
+        return row
+
+
+class FakeResult:
+    """模拟流式结果集，记录每批读取的行数"""
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.data = [FakeRow(columns, values) for values in rows]
+        self.batch_sizes = []
+
+    def keys(self):
+        return self.columns
+
+    def partitions(self, size):
+        for start in range(0, len(self.data), size):
+            batch = self.data[start:start + size]
+            self.batch_sizes.append(len(batch))
+            yield batch
+
+
+def _make_result(count):
+    rows = [
+        (i, Decimal(i) / 2, f"科室{i}", datetime(2025, 10, 1, 0, 0, i % 60), None if i % 2 else i)
+        for i in range(1, count + 1)
+    ]
+    return FakeResult(["id", "amount", "name", "charge_time", "even"], rows)
+
+
+def test_sample_and_stats():
+    """只保留样本行，统计覆盖全部行"""
+    result = _make_result(250)
+    summary = StepResultCapture(sample_rows=10, fetch_size=100).consume(result).summary(total_affected=3)
+
+    assert result.batch_sizes == [100, 100, 50]
+    assert summary["row_count"] == 250
+    assert summary["sample_count"] == 10 and summary["truncated"]
+    assert summary["rows"][0] == {
+        "id": 1, "amount": 0.5, "name": "科室1", "charge_time": "2025-10-01T00:00:01", "even": None
+    }
+    stats = summary["column_stats"]
+    assert stats["id"] == {"non_null": 250, "min": 1, "max": 250, "sum": 31375.0}
+    assert stats["amount"]["sum"] == 15687.5
+    assert stats["name"]["non_null"] == 250 and "sum" not in stats["name"]
+    assert stats["even"]["non_null"] == 125 and stats["even"]["min"] == 2
+    assert summary["total_affected"] == 3
+    print("✅ 样本和统计正确")
+
+
+def test_spill_file():
+    """完整结果集按列写入压缩文件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "task", "step_1_all.zip")
+        summary = StepResultCapture(sample_rows=5, spill_path=path, fetch_size=40).consume(
+            _make_result(100)
+        ).summary()
+
+        assert summary["result_file"] == path
+        assert list(iter_result_column(path, "id")) == list(range(1, 101))
+        assert list(iter_result_column(path, "even"))[:4] == [None, 2, None, 4]
+        assert not os.path.exists(path + ".part")
+    print("✅ 结果文件正确")
+
+
+if __name__ == "__main__":
+    test_sample_and_stats()
+    test_spill_file()
+    print("\n所有测试通过！")
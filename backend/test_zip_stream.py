@@ -0,0 +1,44 @@
+"""
+测试流式ZIP打包
+"""
+import io
+import zipfile
+
+from app.utils.zip_stream import iter_zip_stream
+
+
+def test_stream_is_readable():
+    """逐个产出的条目打包后可以被正常读取"""
+    produced = []
+
+    def entries():
+        for i in range(3):
+            name = f"2025-0{i + 1}/科室业务价值明细表_{i}.xlsx"
+            produced.append(name)
+            yield name, bytes(range(256)) * 1000 * (i + 1)
+
+    chunks = []
+    for chunk in iter_zip_stream(entries()):
+        chunks.append(chunk)
+        # 条目边生成边写出，而不是全部生成后一次性写出
+        if len(chunks) == 1:
+            assert len(produced) == 1
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.testzip() is None
+    assert archive.namelist() == produced
+    assert [len(archive.read(name)) for name in produced] == [256000, 512000, 768000]
+    print("✅ 流式ZIP可以被正常读取")
+
+
+def test_empty_archive():
+    """没有条目时生成空压缩包"""
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(iter_zip_stream([]))))
+    assert archive.namelist() == []
+    print("✅ 空压缩包正确")
+
+
+if __name__ == "__main__":
+    test_stream_is_readable()
+    test_empty_archive()
+    print("\n所有测试通过")
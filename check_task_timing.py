@@ -0,0 +1,63 @@
+"""
+查看计算任务的耗时分布（任务 → 步骤 → 语句）
+
+与 /api/v1/calculation/tasks/{task_id}/logs 返回的 breakdown 相同，
+用于在命令行定位慢步骤和慢语句。
+
+用法: python check_task_timing.py <task_id> [每个步骤显示的语句数]
+"""
+import os
+import sys
+sys.path.insert(0, 'backend')
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+load_dotenv('backend/.env')
+DATABASE_URL = os.getenv('DATABASE_URL')
+engine = create_engine(DATABASE_URL)
+
+from app.services.step_profile_service import StepProfileService
+
+
+def check(task_id, top_n=5):
+    with engine.connect() as conn:
+        logs = conn.execute(text("""
+            SELECT step_id, status, duration_ms, statement_profile
+            FROM calculation_step_logs
+            WHERE task_id = :task_id
+            ORDER BY start_time
+        """), {"task_id": task_id}).all()
+        step_names = dict(conn.execute(text("""
+            SELECT id, name FROM calculation_steps
+            WHERE id IN (SELECT DISTINCT step_id FROM calculation_step_logs WHERE task_id = :task_id)
+        """), {"task_id": task_id}).all())
+    
+    if not logs:
+        print(f"任务 {task_id} 没有步骤日志")
+        return
+    
+    breakdown = StepProfileService.build_breakdown(task_id, logs, step_names)
+    total = breakdown["value"] or 1
+    
+    print("=" * 80)
+    print(f"任务 {task_id} 步骤耗时合计 {breakdown['value']} ms")
+    print("=" * 80)
+    
+    for step in breakdown["children"]:
+        failed = f"，失败 {step['failed']} 次" if step["failed"] else ""
+        print(f"\n步骤 {step['step_id']} ({step['name']}): {step['value']} ms "
+              f"({step['value'] * 100 / total:.1f}%)，执行 {step['executions']} 次{failed}")
+        for statement in step["children"][:top_n]:
+            print(f"  {statement['value']:>10} ms  最慢 {statement['max_ms']:.1f} ms  "
+                  f"{statement['rows']} 行  {statement['name']}")
+            if statement.get("explain"):
+                print("    最慢一次的执行计划:")
+                for line in statement["explain"].splitlines():
+                    print(f"      {line}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    check(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 5)
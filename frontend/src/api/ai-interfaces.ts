@@ -18,6 +18,7 @@ export interface AIInterface {
   api_key_masked: string
   call_delay: number
   daily_limit: number
+  max_concurrency: number
   is_active: boolean
   created_at: string
   updated_at: string
@@ -32,6 +33,7 @@ export interface AIInterfaceCreate {
   api_key: string
   call_delay?: number
   daily_limit?: number
+  max_concurrency?: number
   is_active?: boolean
 }
 
@@ -43,6 +45,7 @@ export interface AIInterfaceUpdate {
   api_key?: string
   call_delay?: number
   daily_limit?: number
+  max_concurrency?: number
   is_active?: boolean
 }
 
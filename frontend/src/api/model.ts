@@ -100,6 +100,7 @@ export interface ModelNode {
   name: string
   code: string
   node_type: 'sequence' | 'dimension'
+  sequence_type?: 'doctor' | 'nurse' | 'tech' | null
   is_leaf: boolean
   calc_type?: 'statistical' | 'calculational'
   weight?: number
@@ -122,6 +123,7 @@ export interface ModelNodeCreate {
   name: string
   code: string
   node_type: 'sequence' | 'dimension'
+  sequence_type?: 'doctor' | 'nurse' | 'tech' | null
   is_leaf?: boolean
   calc_type?: 'statistical' | 'calculational'
   weight?: number
@@ -135,6 +137,7 @@ export interface ModelNodeUpdate {
   name?: string
   code?: string
   node_type?: 'sequence' | 'dimension'
+  sequence_type?: 'doctor' | 'nurse' | 'tech' | null
   sort_order?: number
   is_leaf?: boolean
   calc_type?: 'statistical' | 'calculational'